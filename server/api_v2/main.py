@@ -8,13 +8,20 @@ from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from dotenv import load_dotenv
+import anyio.to_thread
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"))
 
-from database.db import init_db  # noqa: E402
-from api_v2.routers import tasks, plans, feedback, analytics, settings, session, mood, focus, songs, fortune, assistant  # noqa: E402
+_IMPORTS_STARTED = time.perf_counter()
+from database.db import THREADPOOL_WORKERS, init_db  # noqa: E402
+from core.fortune import start_fortune_pregeneration_scheduler  # noqa: E402
+from core.warmup import is_ready, start_warm_up, startup_report  # noqa: E402
+from api_v2.routers import tasks, plans, feedback, analytics, settings, session, mood, focus, songs, fortune, assistant, system  # noqa: E402
+
+# Reported by /ready with the rest of the startup breakdown.
+_APP_IMPORTS_MS = (time.perf_counter() - _IMPORTS_STARTED) * 1000
 
 app = FastAPI(title="Deletion Planner API v2", version="2.0.0")
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
@@ -37,7 +44,17 @@ _rate_buckets = defaultdict(list)
 
 @app.on_event("startup")
 def startup():
-    init_db()
+    # Size the sync-handler threadpool to match the DB pool defaults.
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_WORKERS
+    started = time.perf_counter()
+    init_db_steps = init_db()
+    init_db_ms = (time.perf_counter() - started) * 1000
+    start_warm_up({
+        "app_imports": _APP_IMPORTS_MS,
+        "init_db": init_db_ms,
+        **{f"init_db.{name}": value for name, value in init_db_steps.items()},
+    })
+    start_fortune_pregeneration_scheduler()
 
 
 # ── API Key Auth (optional) ──────────────────────────────
@@ -48,8 +65,8 @@ API_KEY = os.getenv("API_KEY", "")
 async def auth_and_timing_middleware(request: Request, call_next):
     start = time.perf_counter()
 
-    # Skip auth for health check and OPTIONS
-    if request.url.path == "/health" or request.method == "OPTIONS":
+    # Skip auth for health/readiness checks and OPTIONS
+    if request.url.path in ("/health", "/ready") or request.method == "OPTIONS":
         response = await call_next(request)
     else:
         # API key check (only if API_KEY env var is set)
@@ -113,6 +130,16 @@ def health():
     return {"ok": True, "service": "Deletion Planner API v2"}
 
 
+@app.get("/ready")
+def ready():
+    if not is_ready():
+        return JSONResponse(
+            status_code=503,
+            content={"ready": False, "error_code": "WARMING_UP", "message": "Worker is still warming up"},
+        )
+    return {"ready": True, "startup": startup_report()}
+
+
 app.include_router(tasks.router, prefix="/api")
 app.include_router(plans.router, prefix="/api")
 app.include_router(feedback.router, prefix="/api")
@@ -124,3 +151,4 @@ app.include_router(focus.router, prefix="/api")
 app.include_router(songs.router, prefix="/api")
 app.include_router(fortune.router, prefix="/api")
 app.include_router(assistant.router, prefix="/api")
+app.include_router(system.router, prefix="/api")
@@ -1,18 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 from typing import Optional
+import hashlib
 import json
-import time
 
 from fastapi import APIRouter, Query, Request
+from sqlalchemy import case, func
 
-from api_v2.user_context import plan_storage_key, require_current_user
+from api_v2.user_context import plan_storage_key, read_setting, require_current_user, write_setting
+from core.cache import get_cache
 from core.time import local_today
 from core.llm import get_llm_service
-from database.db import get_db
-from database.models import DailyPlan, FocusSession, MoodEntry, PlanTask, PlanTaskStatus, Task, TaskHistory, TaskStatus
+from core.llm.prompts import compact_json
+from core.offload import run_upstream
+from database.db import get_async_db, get_async_read_db, get_read_db
+from database.models import (
+    DailyPlan,
+    FocusSession,
+    HistoryAction,
+    MoodEntry,
+    PlanTask,
+    PlanTaskStatus,
+    Task,
+    TaskHistory,
+    TaskStatus,
+)
 
 router = APIRouter(tags=["analytics"])
-_stats_cache: dict[int, dict] = {}
+_stats_cache = get_cache("analytics.stats", max_entries=2048, ttl_seconds=10)
+REVIEW_CACHE_KEY_PREFIX = "review_insight"
+_review_text_cache = get_cache("analytics.review_text", max_entries=512)
+REVIEW_PROMPT_TOKEN_BUDGET = 400
 
 
 def _safe_parse_date(value: str):
@@ -127,16 +145,19 @@ def _fallback_review_text(snapshot: dict, scope: str, lang: str) -> str:
     return " ".join(parts)
 
 
-def _llm_review_text(snapshot: dict, scope: str, lang: str) -> str:
+def _request_llm_review_text(snapshot: dict, scope: str, lang: str) -> str | None:
     llm = get_llm_service(lang=lang)
     if not hasattr(llm, "_call_deepseek") or not getattr(llm, "api_key", ""):
-        return _fallback_review_text(snapshot, scope, lang)
+        return None
 
     lang_instruction = "Respond in Simplified Chinese." if lang == "zh" else "Respond in English."
+    # The clicked day is not a signal for the period, and the text is cached
+    # per period rollup anyway (see _review_digest).
+    signals = {key: value for key, value in snapshot.items() if key != "selected_date"}
     prompt = f"""You are writing a concise review summary for a personal planning app.
 Scope: {scope}
 Signals:
-{json.dumps(snapshot, ensure_ascii=False)}
+{compact_json(signals, token_budget=REVIEW_PROMPT_TOKEN_BUDGET)}
 
 Write 2-4 sentences.
 - Include mood if it exists.
@@ -150,9 +171,99 @@ Return plain text only."""
             "You write concise behavioral review summaries for a personal planning product.",
             prompt,
             max_tokens=220,
-        )
+        ) or None
     except Exception:
-        return _fallback_review_text(snapshot, scope, lang)
+        return None
+
+
+def _llm_review_text(snapshot: dict, scope: str, lang: str) -> str:
+    return _request_llm_review_text(snapshot, scope, lang) or _fallback_review_text(snapshot, scope, lang)
+
+
+def _review_digest(snapshot: dict, scope: str, lang: str) -> str:
+    # selected_date only says which day was clicked, not what happened in the period.
+    rollup = {key: value for key, value in snapshot.items() if key != "selected_date"}
+    raw = json.dumps({"scope": scope, "lang": lang, "snapshot": rollup}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _review_cache_key(user_id: int, digest: str) -> str:
+    # The user id stays last so developer reset can attribute the row to its owner.
+    return f"{REVIEW_CACHE_KEY_PREFIX}:{digest}:{user_id}"
+
+
+def _review_llm_available(lang: str) -> bool:
+    llm = get_llm_service(lang=lang)
+    return bool(hasattr(llm, "_call_deepseek") and getattr(llm, "api_key", ""))
+
+
+def _cached_review_texts(db, user_id: int, jobs: list[dict], lang: str) -> tuple[dict[str, str], list[dict]]:
+    """Resolve review text per scope from cache; return the texts and the misses.
+
+    A closed period (one that ended before today) can no longer change, so its
+    text is persisted in app_settings and served from there indefinitely. Open
+    periods are keyed by the snapshot digest in the shared cache, which means
+    they only regenerate once their rollup actually changes.
+    """
+
+    today_key = local_today().isoformat()
+    results: dict[str, str] = {}
+    misses: list[dict] = []
+    for job in jobs:
+        job["digest"] = _review_digest(job["snapshot"], job["scope"], lang)
+        job["persist"] = job["snapshot"]["end"] < today_key
+        cached = _review_text_cache.get(job["digest"])
+        if cached is None and job["persist"]:
+            stored = read_setting(db, _review_cache_key(user_id, job["digest"]), {})
+            cached = stored.get("text") or None
+            if cached is not None:
+                _review_text_cache.set(job["digest"], cached)
+        if cached is not None:
+            results[job["name"]] = cached
+        else:
+            misses.append(job)
+    return results, misses
+
+
+def _generate_review_texts(misses: list[dict], lang: str) -> dict[str, str]:
+    """Generate text for cache misses concurrently; needs no DB session."""
+
+    results: dict[str, str] = {}
+    if not misses:
+        return results
+    if not _review_llm_available(lang):
+        for job in misses:
+            results[job["name"]] = _fallback_review_text(job["snapshot"], job["scope"], lang)
+        return results
+
+    with ThreadPoolExecutor(max_workers=len(misses)) as executor:
+        generated = list(
+            executor.map(lambda job: _request_llm_review_text(job["snapshot"], job["scope"], lang), misses)
+        )
+    for job, text in zip(misses, generated):
+        if not text:
+            results[job["name"]] = _fallback_review_text(job["snapshot"], job["scope"], lang)
+            continue
+        results[job["name"]] = text
+        _review_text_cache.set(job["digest"], text)
+        job["generated"] = text
+    return results
+
+
+def _persist_review_texts(db, user_id: int, misses: list[dict], lang: str) -> None:
+    for job in misses:
+        if job["persist"] and job.get("generated"):
+            write_setting(
+                db,
+                _review_cache_key(user_id, job["digest"]),
+                {
+                    "text": job["generated"],
+                    "scope": job["scope"],
+                    "lang": lang,
+                    "start": job["snapshot"]["start"],
+                    "end": job["snapshot"]["end"],
+                },
+            )
 
 
 @router.get("/history")
@@ -162,7 +273,7 @@ def get_history(
     limit: int = Query(default=50),
     offset: int = Query(default=0),
 ):
-    with get_db() as db:
+    with get_read_db() as db:
         user = require_current_user(db, request)
         query = db.query(TaskHistory).join(Task).filter(Task.user_id == user.id)
         if task_id:
@@ -173,12 +284,11 @@ def get_history(
 
 @router.get("/stats")
 def get_stats(request: Request):
-    with get_db() as db:
+    with get_read_db() as db:
         user = require_current_user(db, request)
-        now = time.time()
-        user_cache = _stats_cache.get(user.id)
-        if user_cache and user_cache["expires_at"] > now:
-            return user_cache["payload"]
+        cached_payload = _stats_cache.get(user.id)
+        if cached_payload is not None:
+            return cached_payload
         plan_prefix = f"{user.id}:%"
         total_tasks = db.query(Task).filter(Task.user_id == user.id).count()
         active_tasks = db.query(Task).filter(Task.user_id == user.id, Task.status == TaskStatus.ACTIVE.value).count()
@@ -205,8 +315,7 @@ def get_stats(request: Request):
             "completed_plan_tasks": completed_plan_tasks,
             "completion_rate": completion_rate,
         }
-        _stats_cache[user.id] = {"payload": payload, "expires_at": now + 10}
-        return payload
+        return _stats_cache.set(user.id, payload)
 
 
 @router.get("/weekly-summary")
@@ -218,21 +327,21 @@ def get_weekly_summary(request: Request, lang: str = Query(default="en")):
     week_start_str = week_start.isoformat()
     today_str = today.isoformat()
 
-    with get_db() as db:
+    with get_read_db() as db:
         user = require_current_user(db, request)
-        entries = (
-            db.query(TaskHistory)
+        action_counts = dict(
+            db.query(TaskHistory.action, func.count(TaskHistory.id))
             .join(Task)
             .filter(Task.user_id == user.id)
             .filter(TaskHistory.date >= week_start_str, TaskHistory.date <= today_str)
+            .group_by(TaskHistory.action)
             .all()
         )
-
-        created = sum(1 for entry in entries if entry.action == "created")
-        completed = sum(1 for entry in entries if entry.action == "completed")
-        deleted = sum(1 for entry in entries if entry.action == "deleted")
-        deferred = sum(1 for entry in entries if entry.action == "deferred")
-        planned = sum(1 for entry in entries if entry.action == "planned")
+        created = int(action_counts.get(HistoryAction.CREATED.value, 0))
+        completed = int(action_counts.get(HistoryAction.COMPLETED.value, 0))
+        deleted = int(action_counts.get(HistoryAction.DELETED.value, 0))
+        deferred = int(action_counts.get(HistoryAction.DEFERRED.value, 0))
+        planned = int(action_counts.get(HistoryAction.PLANNED.value, 0))
 
         active_count = db.query(Task).filter(Task.user_id == user.id, Task.status == TaskStatus.ACTIVE.value).count()
         plan_keys = [plan_storage_key(user.id, value) for value in (week_start_str, today_str)]
@@ -242,16 +351,20 @@ def get_weekly_summary(request: Request, lang: str = Query(default="en")):
             DailyPlan.date <= end_key,
         ).count()
 
-        week_plan_tasks = (
-            db.query(PlanTask)
+        week_total_plan, week_completed_plan = (
+            db.query(
+                func.count(PlanTask.id),
+                func.coalesce(
+                    func.sum(case((PlanTask.status == PlanTaskStatus.COMPLETED.value, 1), else_=0)),
+                    0,
+                ),
+            )
             .join(DailyPlan)
             .filter(DailyPlan.date >= start_key, DailyPlan.date <= end_key)
-            .all()
-        )
-        week_completed_plan = sum(
-            1 for plan_task in week_plan_tasks if plan_task.status == PlanTaskStatus.COMPLETED.value
+            .one()
         )
-        week_total_plan = len(week_plan_tasks)
+        week_total_plan = int(week_total_plan or 0)
+        week_completed_plan = int(week_completed_plan or 0)
         week_rate = round(week_completed_plan / week_total_plan * 100, 1) if week_total_plan > 0 else 0
 
     if lang == "zh":
@@ -301,7 +414,7 @@ def get_weekly_summary(request: Request, lang: str = Query(default="en")):
 
 
 @router.get("/review-insights")
-def get_review_insights(
+async def get_review_insights(
     request: Request,
     date: str = Query(...),
     month: str = Query(default=""),
@@ -323,13 +436,24 @@ def get_review_insights(
         next_month = month_start.replace(month=month_start.month + 1, day=1)
     month_end = next_month - timedelta(days=1)
 
-    with get_db() as db:
+    def read_phase(db):
         user = require_current_user(db, request)
-        daily_snapshot = _review_snapshot(db, user.id, target_date, target_date, target_date.isoformat())
-        weekly_snapshot = _review_snapshot(db, user.id, week_start, week_end, target_date.isoformat())
-        monthly_snapshot = _review_snapshot(db, user.id, month_start, month_end, target_date.isoformat())
-        return {
-            "daily": _llm_review_text(daily_snapshot, "daily review", lang),
-            "weekly": _llm_review_text(weekly_snapshot, "weekly review", lang),
-            "monthly": _llm_review_text(monthly_snapshot, "monthly review", lang),
-        }
+        jobs = [
+            {"name": "daily", "scope": "daily review", "snapshot": _review_snapshot(db, user.id, target_date, target_date, target_date.isoformat())},
+            {"name": "weekly", "scope": "weekly review", "snapshot": _review_snapshot(db, user.id, week_start, week_end, target_date.isoformat())},
+            {"name": "monthly", "scope": "monthly review", "snapshot": _review_snapshot(db, user.id, month_start, month_end, target_date.isoformat())},
+        ]
+        return user.id, *_cached_review_texts(db, user.id, jobs, lang)
+
+    async with get_async_read_db() as db:
+        user_id, texts, misses = await db.run_sync(read_phase)
+    if misses:
+        texts.update(await run_upstream(_generate_review_texts, misses, lang))
+        if any(job["persist"] and job.get("generated") for job in misses):
+            async with get_async_db() as db:
+                await db.run_sync(_persist_review_texts, user_id, misses, lang)
+    return {
+        "daily": texts["daily"],
+        "weekly": texts["weekly"],
+        "monthly": texts["monthly"],
+    }
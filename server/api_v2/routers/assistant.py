@@ -10,10 +10,24 @@ from typing import Any, Dict, List
 from fastapi import APIRouter, Request
 
 from api_v2.schemas import AssistantChatRequest
+from api_v2.two_phase import (
+    PlanMaintenance,
+    PlanSnapshot,
+    StaleSnapshot,
+    apply_plan_maintenance,
+    check_plan_snapshot,
+    delete_plan,
+    maintain_plan,
+    read_compute_write,
+    snapshot_plan_inputs,
+    store_plan,
+)
 from api_v2.user_context import plan_storage_key, read_setting, require_current_user, write_setting
 from core.llm import get_llm_service
+from core.offload import run_upstream
 from core.planner import generate_daily_plan
-from core.task_kind import WEEKDAY_PATTERNS, infer_recurrence_weekday, infer_relative_due_date, infer_task_kind, strip_task_kind_markers
+from core.recurrence import complete_occurrence, is_recurring, occurrence_index
+from core.task_kind import WEEKDAY_REGEXES, infer_recurrence_weekday, infer_relative_due_date, infer_task_kind, strip_task_kind_markers
 from core.time import (
     local_date_offset_iso,
     local_today,
@@ -25,13 +39,12 @@ from core.time import (
     upcoming_weekday_iso,
     upcoming_weekend_iso,
 )
-from database.db import get_db
+from database.db import get_async_db, get_async_read_db, get_db
 from database.models import (
     DailyPlan,
     FocusSession,
     HistoryAction,
     MoodEntry,
-    PlanTask,
     PlanTaskStatus,
     Task,
     TaskHistory,
@@ -225,6 +238,7 @@ def _user_context(db, user) -> Dict[str, Any]:
     )
     completed_total = db.query(Task).filter(Task.user_id == user_id, Task.status == TaskStatus.COMPLETED.value).count()
     return {
+        "user_id": user_id,
         "today": today,
         "active_tasks": active_tasks,
         "plan_tasks": plan_tasks,
@@ -379,6 +393,9 @@ def _is_account_birthday_question(message: str) -> bool:
     return not _mentions_other_person(message)
 
 
+_RELATIVE_WEEKDAY_ZH_RE = re.compile(r"(下下|下|这|本)?(?:周|星期)([一二三四五六日天12345670])")
+
+
 def _looks_like_scheduled_birthday_statement(message: str) -> bool:
     normalized = (message or "").strip()
     if not _mentions_birthday(message) or _looks_like_question(message):
@@ -387,7 +404,7 @@ def _looks_like_scheduled_birthday_statement(message: str) -> bool:
         return True
     if _extract_due_date_hint(normalized):
         return True
-    return bool(re.search(r"(下下|下|这|本)?(?:周|星期)([一二三四五六日天12345670])", normalized))
+    return bool(_RELATIVE_WEEKDAY_ZH_RE.search(normalized))
 
 
 def _looks_like_smalltalk(message: str) -> bool:
@@ -489,13 +506,9 @@ def _visible_tasks(tasks: List[Task]) -> List[Task]:
     return [task for task in list(tasks or []) if not _looks_like_junk_task_title(task.title)]
 
 
-def _extract_task_date_question_query(message: str) -> str:
-    normalized = (message or "").strip()
-    lower = normalized.lower()
-    if not normalized or not _looks_like_question(message):
-        return ""
-
-    zh_patterns = [
+_TASK_DATE_QUESTION_ZH_PATTERNS = tuple(
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
         r"^(.+?)的?日期是什么时候[？?]?$",
         r"^(.+?)是什么日期[？?]?$",
         r"^(.+?)是什么时候[？?]?$",
@@ -503,31 +516,44 @@ def _extract_task_date_question_query(message: str) -> str:
         r"^(.+?)是哪一天[？?]?$",
         r"^(.+?)是哪天[？?]?$",
         r"^(.+?)几号[？?]?$",
-    ]
-    en_patterns = [
+    )
+)
+_TASK_DATE_QUESTION_EN_PATTERNS = tuple(
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
         r"^when is (?:my task )?(.+?)[?]?$",
         r"^what date is (?:my task )?(.+?)[?]?$",
         r"^what day is (?:my task )?(.+?)[?]?$",
         r"^when do i have (.+?)[?]?$",
         r"^when is (.+?) scheduled[?]?$",
-    ]
+    )
+)
+_TASK_QUERY_PREFIX_RE = re.compile(r"^(我的|我那个|那个|这个|任务[:：]?\s*|task[:：]?\s*)", re.IGNORECASE)
+_TASK_QUERY_SUFFIX_RE = re.compile(r"(的任务|这个任务|那个任务)$")
+
+
+def _extract_task_date_question_query(message: str) -> str:
+    normalized = (message or "").strip()
+    lower = normalized.lower()
+    if not normalized or not _looks_like_question(message):
+        return ""
 
     extracted = ""
-    for pattern in zh_patterns:
-        match = re.match(pattern, normalized, flags=re.IGNORECASE)
+    for pattern in _TASK_DATE_QUESTION_ZH_PATTERNS:
+        match = pattern.match(normalized)
         if match:
             extracted = match.group(1)
             break
     if not extracted:
-        for pattern in en_patterns:
-            match = re.match(pattern, lower, flags=re.IGNORECASE)
+        for pattern in _TASK_DATE_QUESTION_EN_PATTERNS:
+            match = pattern.match(lower)
             if match:
                 extracted = match.group(1)
                 break
 
     cleaned = (extracted or "").strip()
-    cleaned = re.sub(r"^(我的|我那个|那个|这个|任务[:：]?\s*|task[:：]?\s*)", "", cleaned, flags=re.IGNORECASE)
-    cleaned = re.sub(r"(的任务|这个任务|那个任务)$", "", cleaned)
+    cleaned = _TASK_QUERY_PREFIX_RE.sub("", cleaned)
+    cleaned = _TASK_QUERY_SUFFIX_RE.sub("", cleaned)
     return _normalize_task_query_text(cleaned)
 
 
@@ -586,12 +612,19 @@ def _task_matches_date(task: Task, date_key: str, weekday: int) -> bool:
     return normalized_due_date == date_key
 
 
+def _tasks_on_date(ctx: Dict[str, Any], date_key: str, weekday: int) -> List[Task]:
+    active_tasks = ctx.get("active_tasks", []) or []
+    visible = _visible_tasks(active_tasks)
+    if ctx.get("user_id") is not None:
+        index = occurrence_index(ctx["user_id"], [task.to_dict() for task in active_tasks])
+        if index.covers(date_key):
+            by_id = {task.id: task for task in visible}
+            return [by_id[task_id] for task_id in index.on(date_key) if task_id in by_id]
+    return [task for task in visible if _task_matches_date(task, date_key, weekday)]
+
+
 def _agenda_reply_for_date(ctx: Dict[str, Any], date_key: str, weekday: int, label: str, lang: str) -> Dict[str, Any]:
-    tasks = [
-        task
-        for task in _visible_tasks(ctx.get("active_tasks", []) or [])
-        if _task_matches_date(task, date_key, weekday)
-    ]
+    tasks = _tasks_on_date(ctx, date_key, weekday)
     if not tasks:
         reply = (
             f"{label} 目前还没有挂上的安排。"
@@ -639,18 +672,38 @@ def _recent_history_items(history: Dict[str, Any], current_message: str, roles:
     return list(reversed(items[-12:]))
 
 
+# Agenda questions ("周三有什么安排", "下周二呢"), shared by the agenda handlers below.
+_WEEKLY_AGENDA_RE = re.compile(
+    r"^我?(?:每周|每星期|每礼拜|周|星期|礼拜)([一二三四五六日天12345670])(?:都)?(?:需要)?"
+    r"(?:的计划(?:是哪些|是什么)?|计划(?:是哪些|是什么|有哪些)?|要做什么|做什么|干嘛|有哪些任务|有什么任务|有哪些安排|有什么安排|有啥安排|有安排吗)[？?]?$",
+)
+_DATED_AGENDA_RE = re.compile(
+    r"^我?(?:(这|本|下|下下)周|(?:这|本|下|下下)星期)([一二三四五六日天12345670])(?:都)?(?:需要)?"
+    r"(?:的计划(?:是哪些|是什么)?|计划(?:是哪些|是什么|有哪些)?|要做什么|做什么|干嘛|有哪些任务|有什么任务|有哪些安排|有什么安排|有啥安排|有安排吗)[？?]?$",
+)
+_DATED_SUBJECT_AGENDA_RE = re.compile(
+    r"^(?:(这|本|下|下下)周|(?:这|本|下|下下)星期)([一二三四五六日天12345670])我?"
+    r"(?:的计划(?:是哪些|是什么)?|计划(?:是哪些|是什么|有哪些)?|有哪些任务|有什么任务|有哪些安排|有什么安排|有啥安排|有安排吗)[？?]?$",
+)
+_THAT_DAY_AGENDA_RE = re.compile(r"^那天(?:我)?(?:有哪些任务|有什么任务|有哪些安排|有什么安排|有啥安排|有安排吗|呢)[？?]?$")
+_WEEKDAY_FOLLOWUP_RE = re.compile(r"^那?(?:(这|本|下|下下)周|(?:这|本|下|下下)星期)([一二三四五六日天12345670])呢[？?]?$")
+_WEEKLY_FOLLOWUP_RE = re.compile(r"^那?(?:每周|每星期|每礼拜)([一二三四五六日天12345670])呢[？?]?$")
+_GENERIC_FOLLOWUP_RE = re.compile(r"^那?(.+?)呢[？?]?$")
+_WEEKDAY_ONLY_RE = re.compile(r"^(?:周|星期)([一二三四五六日天12345670])$")
+_AGENDA_QUERY_PATTERNS = (
+    _WEEKLY_AGENDA_RE,
+    _DATED_AGENDA_RE,
+    _DATED_SUBJECT_AGENDA_RE,
+    _THAT_DAY_AGENDA_RE,
+    _WEEKDAY_FOLLOWUP_RE,
+)
+
+
 def _looks_like_agenda_query(message: str) -> bool:
     normalized = _strip_conversation_fillers((message or "").strip())
     if not normalized or _has_explicit_command_intent(normalized):
         return False
-    patterns = [
-        r"^我?(?:每周|每星期|每礼拜|周|星期|礼拜)([一二三四五六日天12345670])(?:都)?(?:需要)?(?:的计划(?:是哪些|是什么)?|计划(?:是哪些|是什么|有哪些)?|要做什么|做什么|干嘛|有哪些任务|有什么任务|有哪些安排|有什么安排|有啥安排|有安排吗)[？?]?$",
-        r"^我?(?:(这|本|下|下下)周|(?:这|本|下|下下)星期)([一二三四五六日天12345670])(?:都)?(?:需要)?(?:的计划(?:是哪些|是什么)?|计划(?:是哪些|是什么|有哪些)?|要做什么|做什么|干嘛|有哪些任务|有什么任务|有哪些安排|有什么安排|有啥安排|有安排吗)[？?]?$",
-        r"^(?:(这|本|下|下下)周|(?:这|本|下|下下)星期)([一二三四五六日天12345670])我?(?:的计划(?:是哪些|是什么)?|计划(?:是哪些|是什么|有哪些)?|有哪些任务|有什么任务|有哪些安排|有什么安排|有啥安排|有安排吗)[？?]?$",
-        r"^那天(?:我)?(?:有哪些任务|有什么任务|有哪些安排|有什么安排|有啥安排|有安排吗|呢)[？?]?$",
-        r"^那?(?:(这|本|下|下下)周|(?:这|本|下|下下)星期)([一二三四五六日天12345670])呢[？?]?$",
-    ]
-    return any(re.match(pattern, normalized) for pattern in patterns)
+    return any(pattern.match(normalized) for pattern in _AGENDA_QUERY_PATTERNS)
 
 
 def _last_due_date_from_history(history: Dict[str, Any], current_message: str) -> str | None:
@@ -662,13 +715,15 @@ def _last_due_date_from_history(history: Dict[str, Any], current_message: str) -
     return None
 
 
+_ASSISTANT_SUMMARY_TITLE_RE = re.compile(
+    r"^(?:已添加任务|已更新任务|已推迟任务|已完成任务|已删除任务|Added task|Updated task|Deferred task|Completed task|Deleted task)[:：]\s*(.+?)\s*$",
+    re.IGNORECASE,
+)
+
+
 def _extract_task_title_from_assistant_summary(content: str) -> str:
     for line in (content or "").splitlines():
-        match = re.match(
-            r"^(?:已添加任务|已更新任务|已推迟任务|已完成任务|已删除任务|Added task|Updated task|Deferred task|Completed task|Deleted task)[:：]\s*(.+?)\s*$",
-            line.strip(),
-            flags=re.IGNORECASE,
-        )
+        match = _ASSISTANT_SUMMARY_TITLE_RE.match(line.strip())
         if match:
             return match.group(1).strip()
     return ""
@@ -707,29 +762,17 @@ def _agenda_focus_for_message(ctx: Dict[str, Any], message: str, history: Dict[s
         return None
 
     def build_focus(date_key: str, weekday: int, label: str) -> Dict[str, Any]:
-        tasks = [
-            task
-            for task in _visible_tasks(ctx.get("active_tasks", []) or [])
-            if _task_matches_date(task, date_key, weekday)
-        ]
+        tasks = _tasks_on_date(ctx, date_key, weekday)
         return {"date_key": date_key, "weekday": weekday, "label": label, "tasks": tasks}
 
-    weekly_match = re.match(
-        r"^我?(?:每周|每星期|每礼拜|周|星期|礼拜)([一二三四五六日天12345670])(?:都)?(?:需要)?"
-        r"(?:的计划(?:是哪些|是什么)?|计划(?:是哪些|是什么|有哪些)?|要做什么|做什么|干嘛|有哪些任务|有什么任务|有哪些安排|有什么安排|有啥安排|有安排吗)[？?]?$",
-        normalized,
-    )
+    weekly_match = _WEEKLY_AGENDA_RE.match(normalized)
     if weekly_match:
         weekday = _weekday_from_token(weekly_match.group(1))
         if weekday is not None:
             label = f"每{_weekday_label(weekday, lang)}" if lang == "zh" else f"every {_weekday_label(weekday, lang)}"
             return build_focus(upcoming_weekday_iso(weekday), weekday, label)
 
-    dated_match = re.match(
-        r"^我?(?:(这|本|下|下下)周|(?:这|本|下|下下)星期)([一二三四五六日天12345670])(?:都)?(?:需要)?"
-        r"(?:的计划(?:是哪些|是什么)?|计划(?:是哪些|是什么|有哪些)?|要做什么|做什么|干嘛|有哪些任务|有什么任务|有哪些安排|有什么安排|有啥安排|有安排吗)[？?]?$",
-        normalized,
-    )
+    dated_match = _DATED_AGENDA_RE.match(normalized)
     if dated_match:
         prefix = dated_match.group(1)
         weekday = _weekday_from_token(dated_match.group(2))
@@ -737,11 +780,7 @@ def _agenda_focus_for_message(ctx: Dict[str, Any], message: str, history: Dict[s
             date_key = _relative_weekday_iso(prefix, weekday)
             return build_focus(date_key, weekday, f"{prefix}{_weekday_label(weekday, lang)}" if lang == "zh" else f"{prefix} {_weekday_label(weekday, lang)}")
 
-    dated_subject_match = re.match(
-        r"^(?:(这|本|下|下下)周|(?:这|本|下|下下)星期)([一二三四五六日天12345670])我?"
-        r"(?:的计划(?:是哪些|是什么)?|计划(?:是哪些|是什么|有哪些)?|有哪些任务|有什么任务|有哪些安排|有什么安排|有啥安排|有安排吗)[？?]?$",
-        normalized,
-    )
+    dated_subject_match = _DATED_SUBJECT_AGENDA_RE.match(normalized)
     if dated_subject_match:
         prefix = dated_subject_match.group(1)
         weekday = _weekday_from_token(dated_subject_match.group(2))
@@ -755,7 +794,7 @@ def _agenda_focus_for_message(ctx: Dict[str, Any], message: str, history: Dict[s
     ]
     previous_agenda_context = any(_looks_like_agenda_query(item) for item in previous_user_messages)
 
-    if re.match(r"^那天(?:我)?(?:有哪些任务|有什么任务|有哪些安排|有什么安排|有啥安排|有安排吗|呢)[？?]?$", normalized):
+    if _THAT_DAY_AGENDA_RE.match(normalized):
         date_key = _last_due_date_from_history(history, message)
         if date_key:
             try:
@@ -764,26 +803,23 @@ def _agenda_focus_for_message(ctx: Dict[str, Any], message: str, history: Dict[s
                 return None
             return build_focus(date_key, weekday, f"那天（{date_key}）" if lang == "zh" else f"that day ({date_key})")
 
-    weekday_followup = re.match(
-        r"^那?(?:(这|本|下|下下)周|(?:这|本|下|下下)星期)([一二三四五六日天12345670])呢[？?]?$",
-        normalized,
-    )
+    weekday_followup = _WEEKDAY_FOLLOWUP_RE.match(normalized)
     if weekday_followup and previous_agenda_context:
         prefix = weekday_followup.group(1)
         weekday = _weekday_from_token(weekday_followup.group(2))
         if weekday is not None:
             return build_focus(_relative_weekday_iso(prefix, weekday), weekday, f"{prefix}{_weekday_label(weekday, lang)}" if lang == "zh" else f"{prefix} {_weekday_label(weekday, lang)}")
 
-    weekly_followup = re.match(r"^那?(?:每周|每星期|每礼拜)([一二三四五六日天12345670])呢[？?]?$", normalized)
+    weekly_followup = _WEEKLY_FOLLOWUP_RE.match(normalized)
     if weekly_followup and previous_agenda_context:
         weekday = _weekday_from_token(weekly_followup.group(1))
         if weekday is not None:
             return build_focus(upcoming_weekday_iso(weekday), weekday, f"每{_weekday_label(weekday, lang)}" if lang == "zh" else f"every {_weekday_label(weekday, lang)}")
 
-    generic_followup = re.match(r"^那?(.+?)呢[？?]?$", normalized)
+    generic_followup = _GENERIC_FOLLOWUP_RE.match(normalized)
     if generic_followup and previous_agenda_context:
         subject = generic_followup.group(1).strip()
-        weekday_only = re.match(r"^(?:周|星期)([一二三四五六日天12345670])$", subject)
+        weekday_only = _WEEKDAY_ONLY_RE.match(subject)
         if weekday_only:
             weekday = _weekday_from_token(weekday_only.group(1))
             if weekday is not None:
@@ -809,17 +845,14 @@ def _contextual_agenda_reply(ctx: Dict[str, Any], message: str, history: Dict[st
     ]
     previous_agenda_context = any(_looks_like_agenda_query(item) for item in previous_user_messages)
 
-    if re.match(r"^那天(?:我)?(?:有哪些任务|有什么任务|有哪些安排|有什么安排|有啥安排|有安排吗|呢)[？?]?$", normalized):
+    if _THAT_DAY_AGENDA_RE.match(normalized):
         date_key = _last_due_date_from_history(history, message)
         if not date_key:
             return None
         label = f"那天（{date_key}）" if lang == "zh" else f"that day ({date_key})"
         return _agenda_reply_for_iso_date(ctx, date_key, label, lang)
 
-    weekday_followup = re.match(
-        r"^那?(?:(这|本|下|下下)周|(?:这|本|下|下下)星期)([一二三四五六日天12345670])呢[？?]?$",
-        normalized,
-    )
+    weekday_followup = _WEEKDAY_FOLLOWUP_RE.match(normalized)
     if weekday_followup:
         if not previous_agenda_context:
             return None
@@ -832,7 +865,7 @@ def _contextual_agenda_reply(ctx: Dict[str, Any], message: str, history: Dict[st
         label = f"{prefix}{weekday_label}" if lang == "zh" else f"{prefix} {weekday_label}"
         return _agenda_reply_for_date(ctx, date_key, weekday, label, lang)
 
-    weekly_followup = re.match(r"^那?(?:每周|每星期|每礼拜)([一二三四五六日天12345670])呢[？?]?$", normalized)
+    weekly_followup = _WEEKLY_FOLLOWUP_RE.match(normalized)
     if weekly_followup and previous_agenda_context:
         weekday = _weekday_from_token(weekly_followup.group(1))
         if weekday is None:
@@ -840,11 +873,11 @@ def _contextual_agenda_reply(ctx: Dict[str, Any], message: str, history: Dict[st
         label = f"每{_weekday_label(weekday, lang)}" if lang == "zh" else f"every {_weekday_label(weekday, lang)}"
         return _agenda_reply_for_date(ctx, upcoming_weekday_iso(weekday), weekday, label, lang)
 
-    generic_followup = re.match(r"^那?(.+?)呢[？?]?$", normalized)
+    generic_followup = _GENERIC_FOLLOWUP_RE.match(normalized)
     if generic_followup and previous_agenda_context:
         subject = generic_followup.group(1).strip()
-        if re.match(r"^(?:周|星期)([一二三四五六日天12345670])$", subject):
-            weekday = _weekday_from_token(re.match(r"^(?:周|星期)([一二三四五六日天12345670])$", subject).group(1))
+        if _WEEKDAY_ONLY_RE.match(subject):
+            weekday = _weekday_from_token(_WEEKDAY_ONLY_RE.match(subject).group(1))
             if weekday is None:
                 return None
             label = _weekday_label(weekday, lang) if lang == "zh" else subject
@@ -862,11 +895,7 @@ def _task_agenda_reply(ctx: Dict[str, Any], message: str, lang: str) -> Dict[str
     if not normalized or _has_explicit_command_intent(message):
         return None
 
-    weekly_match = re.match(
-        r"^我?(?:每周|每星期|每礼拜|周|星期|礼拜)([一二三四五六日天12345670])(?:都)?(?:需要)?"
-        r"(?:的计划(?:是哪些|是什么)?|计划(?:是哪些|是什么|有哪些)?|要做什么|做什么|干嘛|有哪些任务|有什么任务|有哪些安排|有什么安排|有啥安排|有安排吗)[？?]?$",
-        normalized,
-    )
+    weekly_match = _WEEKLY_AGENDA_RE.match(normalized)
     if weekly_match:
         weekday = _weekday_from_token(weekly_match.group(1))
         if weekday is None:
@@ -875,11 +904,7 @@ def _task_agenda_reply(ctx: Dict[str, Any], message: str, lang: str) -> Dict[str
         label = f"每{label}" if lang == "zh" else f"every {label}"
         return _agenda_reply_for_date(ctx, upcoming_weekday_iso(weekday), weekday, label, lang)
 
-    dated_match = re.match(
-        r"^我?(?:(这|本|下|下下)周|(?:这|本|下|下下)星期)([一二三四五六日天12345670])(?:都)?(?:需要)?"
-        r"(?:的计划(?:是哪些|是什么)?|计划(?:是哪些|是什么|有哪些)?|要做什么|做什么|干嘛|有哪些任务|有什么任务|有哪些安排|有什么安排|有啥安排|有安排吗)[？?]?$",
-        normalized,
-    )
+    dated_match = _DATED_AGENDA_RE.match(normalized)
     if dated_match:
         prefix = dated_match.group(1)
         weekday = _weekday_from_token(dated_match.group(2))
@@ -898,11 +923,7 @@ def _task_agenda_reply(ctx: Dict[str, Any], message: str, lang: str) -> Dict[str
         )
         return _agenda_reply_for_date(ctx, date_key, weekday, label, lang)
 
-    dated_subject_match = re.match(
-        r"^(?:(这|本|下|下下)周|(?:这|本|下|下下)星期)([一二三四五六日天12345670])我?"
-        r"(?:的计划(?:是哪些|是什么)?|计划(?:是哪些|是什么|有哪些)?|有哪些任务|有什么任务|有哪些安排|有什么安排|有啥安排|有安排吗)[？?]?$",
-        normalized,
-    )
+    dated_subject_match = _DATED_SUBJECT_AGENDA_RE.match(normalized)
     if dated_subject_match:
         prefix = dated_subject_match.group(1)
         weekday = _weekday_from_token(dated_subject_match.group(2))
@@ -985,14 +1006,14 @@ def _task_schedule_reply(ctx: Dict[str, Any], message: str, lang: str, query_ove
     }
 
 
+_TASK_DATE_FOLLOWUP_RE = re.compile(r"^(?:那)?(?:这个|那个)?任务(?:呢)?(?:的)?(?:日期是什么时候|是什么日期|是什么时候|在哪一天|是哪一天|是哪天|几号)[？?]?$")
+
+
 def _contextual_task_schedule_reply(ctx: Dict[str, Any], message: str, history: Dict[str, Any], lang: str) -> Dict[str, Any] | None:
     normalized = _strip_conversation_fillers((message or "").strip())
     if not normalized or _has_explicit_command_intent(normalized):
         return None
-    if not re.match(
-        r"^(?:那)?(?:这个|那个)?任务(?:呢)?(?:的)?(?:日期是什么时候|是什么日期|是什么时候|在哪一天|是哪一天|是哪天|几号)[？?]?$",
-        normalized,
-    ):
+    if not _TASK_DATE_FOLLOWUP_RE.match(normalized):
         return None
     query = _last_task_reference_from_history(history, message)
     if not query:
@@ -1124,6 +1145,9 @@ def _looks_like_fresh_request(message: str) -> bool:
     )
 
 
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
 def _sanitize_assistant_text(text: str) -> str:
     cleaned = (text or "").strip()
     if not cleaned:
@@ -1131,95 +1155,119 @@ def _sanitize_assistant_text(text: str) -> str:
     if cleaned.startswith("{") and cleaned.endswith("}"):
         return ""
     cleaned = cleaned.replace("Additional clarification:", "").replace("Clarification:", "").strip()
-    cleaned = re.sub(r"\s+", " ", cleaned)
+    cleaned = _WHITESPACE_RE.sub(" ", cleaned)
     return cleaned
 
 
+_LEADING_FILLER_RE = re.compile(r"^(?:那(?!天|周|星期|个|下|这|本)|然后|哦|噢|啊|嗯|呃|额)[，,\s]*")
+
+
 def _strip_conversation_fillers(text: str) -> str:
     cleaned = (text or "").strip()
     if not cleaned:
         return ""
     while True:
-        updated = re.sub(r"^(?:那(?!天|周|星期|个|下|这|本)|然后|哦|噢|啊|嗯|呃|额)[，,\s]*", "", cleaned)
+        updated = _LEADING_FILLER_RE.sub("", cleaned)
         if updated == cleaned:
             break
         cleaned = updated.strip()
     return cleaned
 
 
-def _normalize_task_title_text(text: str) -> str:
-    cleaned = _strip_conversation_fillers(text)
-    if not cleaned:
-        return ""
-
-    clarification_patterns = [
+_TITLE_CLARIFICATION_PATTERNS = tuple(
+    re.compile(pattern, re.IGNORECASE | re.DOTALL)
+    for pattern in (
         r"^.*\n(?:Additional clarification|Clarification)[:：]\s*",
         r"^(?:Additional clarification|Clarification)[:：]\s*",
         r"^补充说明[:：]\s*",
         r"^补充[:：]\s*",
-    ]
-    for pattern in clarification_patterns:
-        cleaned = re.sub(pattern, "", cleaned, flags=re.IGNORECASE | re.DOTALL)
-
-    patterns = [
+    )
+)
+_TITLE_COMMAND_PATTERNS = tuple(
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
         r"^(帮我|给我|请|麻烦你)?\s*(加上一个|加入一个|添加一个|新增一个|加一个|加一项|加一条|加上|加入|添加|新增|加个|记录一下)\s*",
         r"^(帮我|给我|请|麻烦你)?\s*(add|create)\s+(a\s+)?(task:?\s*)?",
         r"^(任务[:：]\s*)",
-    ]
-    for pattern in patterns:
-        cleaned = re.sub(pattern, "", cleaned, flags=re.IGNORECASE)
-
-    # Strip recurring/date shells from natural Chinese task phrases so the title
-    # only keeps the actual thing to do.
-    recurring_shell_patterns = [
+    )
+)
+# Recurring/date shells of natural Chinese task phrases, so the title only
+# keeps the actual thing to do.
+_TITLE_RECURRING_SHELL_PATTERNS = tuple(
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
         r"^(?:我)?(?:(?:这|本|下|下下)?(?:每周|每星期|每礼拜|周|星期|礼拜))[一二三四五六日天12345670]\s*(?:有个|有|要去|要做|要|得去|得做|得|会有|会去|会做)?\s*",
         r"^(?:我)?(?:(?:这|本|下|下下)?(?:每周|每星期|每礼拜|周|星期|礼拜))[一二三四五六日天12345670]\s*",
-    ]
-    for pattern in recurring_shell_patterns:
-        cleaned = re.sub(pattern, "", cleaned, flags=re.IGNORECASE)
-
-    cleaned = re.sub(r"(?:这|本|下|下下)(?:周|星期)[一二三四五六日天12345670]", "", cleaned, flags=re.IGNORECASE)
-    cleaned = re.sub(r"^(这个|一个|一项|一条|一个要|一个去)\s*", "", cleaned)
-    cleaned = re.sub(r"(这个|一个|一项|一条)\s*$", "", cleaned)
-    cleaned = re.sub(r"(这个)?任务$", "", cleaned)
-    cleaned = re.sub(r"的$", "", cleaned)
-    cleaned = re.sub(r"[。．.!！]+$", "", cleaned)
-    cleaned = re.sub(r"\s+", " ", cleaned).strip(" ：:，,.")
+    )
+)
+_TITLE_RELATIVE_WEEKDAY_RE = re.compile(r"(?:这|本|下|下下)(?:周|星期)[一二三四五六日天12345670]", re.IGNORECASE)
+_TITLE_LEADING_QUANTIFIER_RE = re.compile(r"^(这个|一个|一项|一条|一个要|一个去)\s*")
+_TITLE_TRAILING_QUANTIFIER_RE = re.compile(r"(这个|一个|一项|一条)\s*$")
+_TITLE_TASK_SUFFIX_RE = re.compile(r"(这个)?任务$")
+_TRAILING_DE_RE = re.compile(r"的$")
+_TRAILING_PUNCTUATION_RE = re.compile(r"[。．.!！]+$")
+
+
+def _normalize_task_title_text(text: str) -> str:
+    cleaned = _strip_conversation_fillers(text)
+    if not cleaned:
+        return ""
+
+    for pattern in _TITLE_CLARIFICATION_PATTERNS + _TITLE_COMMAND_PATTERNS + _TITLE_RECURRING_SHELL_PATTERNS:
+        cleaned = pattern.sub("", cleaned)
+
+    cleaned = _TITLE_RELATIVE_WEEKDAY_RE.sub("", cleaned)
+    cleaned = _TITLE_LEADING_QUANTIFIER_RE.sub("", cleaned)
+    cleaned = _TITLE_TRAILING_QUANTIFIER_RE.sub("", cleaned)
+    cleaned = _TITLE_TASK_SUFFIX_RE.sub("", cleaned)
+    cleaned = _TRAILING_DE_RE.sub("", cleaned)
+    cleaned = _TRAILING_PUNCTUATION_RE.sub("", cleaned)
+    cleaned = _WHITESPACE_RE.sub(" ", cleaned).strip(" ：:，,.")
     return cleaned
 
 
+_QUERY_POLITE_PREFIX_RE = re.compile(r"^(帮我|给我|请|麻烦你)?\s*(把|吧)?")
+_QUERY_EN_VERB_PREFIX_RE = re.compile(
+    r"^(delete|remove|drop|complete|finish|defer|postpone|mark done|mark|mark as)\s+",
+    re.IGNORECASE,
+)
+_QUERY_ZH_VERB_SUFFIX_RE = re.compile(r"(删掉|删除|去掉|移除|完成|做完|标记完成|延后|推迟|稍后再做|标成临时|改成临时|临时任务|标成每日|改成每日|日常任务|每天任务)$")
+_QUERY_KIND_SUFFIX_RE = re.compile(r"\s+as\s+(daily|temporary)$", re.IGNORECASE)
+_TASK_WORD_SUFFIX_RE = re.compile(r"(这个|那个)?任务$")
+
+
 def _normalize_task_query_text(text: str) -> str:
     cleaned = _strip_conversation_fillers(text)
     if not cleaned:
         return ""
-    cleaned = re.sub(r"^(帮我|给我|请|麻烦你)?\s*(把|吧)?", "", cleaned)
-    cleaned = re.sub(
-        r"^(delete|remove|drop|complete|finish|defer|postpone|mark done|mark|mark as)\s+",
-        "",
-        cleaned,
-        flags=re.IGNORECASE,
-    )
-    cleaned = re.sub(r"(删掉|删除|去掉|移除|完成|做完|标记完成|延后|推迟|稍后再做|标成临时|改成临时|临时任务|标成每日|改成每日|日常任务|每天任务)$", "", cleaned)
-    cleaned = re.sub(r"\s+as\s+(daily|temporary)$", "", cleaned, flags=re.IGNORECASE)
-    cleaned = re.sub(r"(这个|那个)?任务$", "", cleaned)
-    cleaned = re.sub(r"的$", "", cleaned)
-    cleaned = re.sub(r"\s+", " ", cleaned).strip(" ：:，,.")
+    cleaned = _QUERY_POLITE_PREFIX_RE.sub("", cleaned)
+    cleaned = _QUERY_EN_VERB_PREFIX_RE.sub("", cleaned)
+    cleaned = _QUERY_ZH_VERB_SUFFIX_RE.sub("", cleaned)
+    cleaned = _QUERY_KIND_SUFFIX_RE.sub("", cleaned)
+    cleaned = _TASK_WORD_SUFFIX_RE.sub("", cleaned)
+    cleaned = _TRAILING_DE_RE.sub("", cleaned)
+    cleaned = _WHITESPACE_RE.sub(" ", cleaned).strip(" ：:，,.")
     return cleaned
 
 
+_CANONICAL_INTENT_PREFIX_RE = re.compile(r"^(我要|我想|我得|我需要|今天要|等会要)\s*")
+_CANONICAL_DOU_PREFIX_RE = re.compile(r"^(都要|都得|都需要|都会)\s*")
+_CANONICAL_EN_INTENT_PREFIX_RE = re.compile(r"^(?:i\s+)?(?:need to|have to|should|want to)\s+", re.IGNORECASE)
+
+
 def _canonical_task_text(text: str) -> str:
     cleaned = _normalize_task_title_text(text)
     if not cleaned:
         cleaned = _normalize_task_query_text(text)
-    cleaned = re.sub(r"^(我要|我想|我得|我需要|今天要|等会要)\s*", "", cleaned)
-    cleaned = re.sub(r"^(都要|都得|都需要|都会)\s*", "", cleaned)
-    cleaned = re.sub(r"^(?:i\s+)?(?:need to|have to|should|want to)\s+", "", cleaned, flags=re.IGNORECASE)
-    cleaned = re.sub(r"\s+", " ", cleaned).strip().lower()
+    cleaned = _CANONICAL_INTENT_PREFIX_RE.sub("", cleaned)
+    cleaned = _CANONICAL_DOU_PREFIX_RE.sub("", cleaned)
+    cleaned = _CANONICAL_EN_INTENT_PREFIX_RE.sub("", cleaned)
+    cleaned = _WHITESPACE_RE.sub(" ", cleaned).strip().lower()
     return cleaned
 
 
 def _compact_task_text(text: str) -> str:
-    return re.sub(r"\s+", "", _canonical_task_text(text))
+    return _WHITESPACE_RE.sub("", _canonical_task_text(text))
 
 
 def _extract_all_recurrence_weekdays(text: str) -> List[int]:
@@ -1227,21 +1275,24 @@ def _extract_all_recurrence_weekdays(text: str) -> List[int]:
     if not combined:
         return []
     weekdays: List[int] = []
-    for weekday, patterns in WEEKDAY_PATTERNS:
-        if any(re.search(pattern, combined, flags=re.IGNORECASE) for pattern in patterns):
+    for weekday, pattern in WEEKDAY_REGEXES:
+        if pattern.search(combined):
             weekdays.append(weekday)
     return sorted(set(weekdays))
 
 
 SEMANTIC_REPLACEMENTS = [
-    (r"(吃午饭|午饭|吃午餐|午餐|eatlunch|havelunch|lunch)", "lunch"),
-    (r"(吃早饭|早餐|早饭|eatbreakfast|havebreakfast|breakfast)", "breakfast"),
-    (r"(吃晚饭|晚饭|晚餐|eatdinner|havedinner|dinner|supper)", "dinner"),
-    (r"(睡觉|sleeping|sleep)", "sleep"),
-    (r"(跑步|running|run)", "run"),
-    (r"(遛狗|walkdog|dogwalk)", "walkdog"),
-    (r"(买咖啡|喝咖啡|buycoffee|getcoffee|coffee)", "coffee"),
-    (r"(买菜|买 groceries|groceries|groceryshopping|grocery)", "groceries"),
+    (re.compile(pattern, re.IGNORECASE), replacement)
+    for pattern, replacement in (
+        (r"(吃午饭|午饭|吃午餐|午餐|eatlunch|havelunch|lunch)", "lunch"),
+        (r"(吃早饭|早餐|早饭|eatbreakfast|havebreakfast|breakfast)", "breakfast"),
+        (r"(吃晚饭|晚饭|晚餐|eatdinner|havedinner|dinner|supper)", "dinner"),
+        (r"(睡觉|sleeping|sleep)", "sleep"),
+        (r"(跑步|running|run)", "run"),
+        (r"(遛狗|walkdog|dogwalk)", "walkdog"),
+        (r"(买咖啡|喝咖啡|buycoffee|getcoffee|coffee)", "coffee"),
+        (r"(买菜|买 groceries|groceries|groceryshopping|grocery)", "groceries"),
+    )
 ]
 
 
@@ -1249,31 +1300,44 @@ def _semantic_task_key(text: str) -> str:
     compact = _compact_task_text(text)
     if not compact:
         return ""
-    normalized = re.sub(r"(这个|那个)?任务$", "", compact)
+    normalized = _TASK_WORD_SUFFIX_RE.sub("", compact)
     normalized = normalized.replace("的", "")
     for pattern, replacement in SEMANTIC_REPLACEMENTS:
-        normalized = re.sub(pattern, replacement, normalized, flags=re.IGNORECASE)
+        normalized = pattern.sub(replacement, normalized)
     return normalized
 
 
+_EN_WEEKDAYS = {
+    "monday": 0, "mon": 0,
+    "tuesday": 1, "tue": 1,
+    "wednesday": 2, "wed": 2,
+    "thursday": 3, "thu": 3,
+    "friday": 4, "fri": 4,
+    "saturday": 5, "sat": 5,
+    "sunday": 6, "sun": 6,
+}
+# (this <weekday>, next <weekday>, weekday), in _EN_WEEKDAYS order.
+_EN_RELATIVE_WEEKDAY_PATTERNS = tuple(
+    (re.compile(rf"\bthis {re.escape(token)}\b"), re.compile(rf"\bnext {re.escape(token)}\b"), weekday)
+    for token, weekday in _EN_WEEKDAYS.items()
+)
+_EN_WEEKDAY_PATTERNS = tuple((re.compile(rf"\b{re.escape(token)}\b"), weekday) for token, weekday in _EN_WEEKDAYS.items())
+_EN_TOMORROW_RE = re.compile(r"\b(?:tomorrow morning|tomorrow|tmr)\b")
+_EN_TODAY_RE = re.compile(r"\b(?:tonight|this evening|today)\b")
+_EXPLICIT_DATE_RE = re.compile(r"(\d{4}[./]\d{1,2}[./]\d{1,2}|\d{1,2}[./-]\d{1,2})")
+_NEXT_MONTH_RE = re.compile(r"\bnext month\b")
+_NEXT_WEEK_RE = re.compile(r"\bnext week\b")
+
+
 def _extract_due_date_hint(message: str) -> str | None:
     normalized = (message or "").strip().lower()
     if not normalized:
         return None
-    explicit_match = re.search(r"(\d{4}[./]\d{1,2}[./]\d{1,2}|\d{1,2}[./-]\d{1,2})", message)
+    explicit_match = _EXPLICIT_DATE_RE.search(message)
     if explicit_match:
         normalized_date = normalize_date_string(explicit_match.group(1))
         if normalized_date:
             return normalized_date
-    weekday_map = {
-        "monday": 0, "mon": 0,
-        "tuesday": 1, "tue": 1,
-        "wednesday": 2, "wed": 2,
-        "thursday": 3, "thu": 3,
-        "friday": 4, "fri": 4,
-        "saturday": 5, "sat": 5,
-        "sunday": 6, "sun": 6,
-    }
     zh_weekday_map = {
         "周一": 0, "星期一": 0, "周1": 0, "星期1": 0,
         "周二": 1, "星期二": 1, "周2": 1, "星期2": 1,
@@ -1283,36 +1347,36 @@ def _extract_due_date_hint(message: str) -> str | None:
         "周六": 5, "星期六": 5, "周6": 5, "星期6": 5,
         "周日": 6, "周天": 6, "星期日": 6, "星期天": 6, "周7": 6, "星期7": 6,
     }
-    explicit_relative_zh = re.search(r"(下下|下|这|本)?(?:周|星期)([一二三四五六日天12345670])", message)
+    explicit_relative_zh = _RELATIVE_WEEKDAY_ZH_RE.search(message)
     if explicit_relative_zh:
         weekday = _weekday_from_token(explicit_relative_zh.group(2))
         if weekday is not None:
             return _relative_weekday_iso(explicit_relative_zh.group(1), weekday)
-    for token, weekday in weekday_map.items():
-        if re.search(rf"\bthis {re.escape(token)}\b", normalized):
+    for this_weekday, next_weekday, weekday in _EN_RELATIVE_WEEKDAY_PATTERNS:
+        if this_weekday.search(normalized):
             return upcoming_weekday_iso(weekday)
-        if re.search(rf"\bnext {re.escape(token)}\b", normalized):
+        if next_weekday.search(normalized):
             return next_weekday_iso(weekday)
     for token, weekday in zh_weekday_map.items():
         if f"这{token}" in message or f"本{token}" in message or f"到这{token}" in message or f"到本{token}" in message:
             return upcoming_weekday_iso(weekday)
         if f"下{token}" in message or f"到下{token}" in message or f"下星期{token[-1]}" in message:
             return next_weekday_iso(weekday)
-    if re.search(r"\bnext month\b", normalized) or "下个月" in message:
+    if _NEXT_MONTH_RE.search(normalized) or "下个月" in message:
         return next_month_iso()
     if any(token in normalized for token in ["this weekend", "next weekend", "weekend"]) or any(
         token in message for token in ["这个周末", "这周末", "本周末", "下周末", "周末"]
     ):
         return upcoming_weekend_iso()
-    if "下周" in message or "下星期" in message or re.search(r"\bnext week\b", normalized):
+    if "下周" in message or "下星期" in message or _NEXT_WEEK_RE.search(normalized):
         return next_week_iso()
     if "大后天" in message or "three days later" in normalized:
         return local_date_offset_iso(3)
     if any(token in normalized for token in ["day after tomorrow", "after tomorrow"]) or any(token in message for token in ["后天"]):
         return local_date_offset_iso(2)
-    if any(re.search(rf"\b{re.escape(token)}\b", normalized) for token in ["tomorrow morning", "tomorrow", "tmr"]) or any(token in message for token in ["明天", "明早"]):
+    if _EN_TOMORROW_RE.search(normalized) or any(token in message for token in ["明天", "明早"]):
         return local_date_offset_iso(1)
-    if any(re.search(rf"\b{re.escape(token)}\b", normalized) for token in ["tonight", "this evening", "today"]) or any(token in message for token in ["今晚", "今夜", "今天"]):
+    if _EN_TODAY_RE.search(normalized) or any(token in message for token in ["今晚", "今夜", "今天"]):
         return local_date_offset_iso(0)
     return None
 
@@ -1325,15 +1389,6 @@ def _extract_plain_weekday_due_date(message: str) -> str | None:
         token in message for token in ["每周", "每星期"]
     ):
         return None
-    weekday_map = {
-        "monday": 0, "mon": 0,
-        "tuesday": 1, "tue": 1,
-        "wednesday": 2, "wed": 2,
-        "thursday": 3, "thu": 3,
-        "friday": 4, "fri": 4,
-        "saturday": 5, "sat": 5,
-        "sunday": 6, "sun": 6,
-    }
     zh_weekday_map = {
         "周一": 0, "星期一": 0,
         "周二": 1, "星期二": 1,
@@ -1346,78 +1401,75 @@ def _extract_plain_weekday_due_date(message: str) -> str | None:
     for token, weekday in zh_weekday_map.items():
         if token in message:
             return upcoming_weekday_iso(weekday)
-    for token, weekday in weekday_map.items():
-        if re.search(rf"\b{re.escape(token)}\b", normalized):
+    for pattern, weekday in _EN_WEEKDAY_PATTERNS:
+        if pattern.search(normalized):
             return upcoming_weekday_iso(weekday)
     return None
 
 
+_DUE_DATE_UPDATE_ZH_RE = re.compile(
+    r"^(?:帮我|给我|请|麻烦你)?\s*(?:把)?\s*(.+?)\s*(?:的ddl|的截止日期|的截止时间|的deadline|ddl|截止日期|截止时间|截止|deadline)?\s*(?:设置到|设到|改到|调到|安排到)\s*(.+)$",
+    re.IGNORECASE,
+)
+_DUE_DATE_UPDATE_EN_RE = re.compile(
+    r"^(?:help me\s+)?(?:set|move|schedule)\s+(.+?)\s+(?:deadline|due date|due)\s+(?:to|for)\s+(.+)$",
+    re.IGNORECASE,
+)
+
+
 def _extract_due_date_update_query(message: str) -> str:
     normalized = (message or "").strip()
     lower = normalized.lower()
-    zh_match = re.match(
-        r"^(?:帮我|给我|请|麻烦你)?\s*(?:把)?\s*(.+?)\s*(?:的ddl|的截止日期|的截止时间|的deadline|ddl|截止日期|截止时间|截止|deadline)?\s*(?:设置到|设到|改到|调到|安排到)\s*(.+)$",
-        normalized,
-        flags=re.IGNORECASE,
-    )
+    zh_match = _DUE_DATE_UPDATE_ZH_RE.match(normalized)
     if zh_match:
         return _normalize_task_query_text(zh_match.group(1))
 
-    en_match = re.match(
-        r"^(?:help me\s+)?(?:set|move|schedule)\s+(.+?)\s+(?:deadline|due date|due)\s+(?:to|for)\s+(.+)$",
-        lower,
-        flags=re.IGNORECASE,
-    )
+    en_match = _DUE_DATE_UPDATE_EN_RE.match(lower)
     if en_match:
         return _normalize_task_query_text(en_match.group(1))
 
     return ""
 
 
+_LEADING_EXPLICIT_DATE_RE = re.compile(r"^(\d{4}[./]\d{1,2}[./]\d{1,2}|\d{1,2}[./-]\d{1,2})\s*", re.IGNORECASE)
+_LEADING_ZH_DUE_HINT_RE = re.compile(
+    r"^(明天|明早|后天|大后天|下个月|这个周末|这周末|本周末|下周末|周末|今晚|今夜|今天"
+    r"|下周[一二三四五六日天]?|下星期[一二三四五六日天]?|这周[一二三四五六日天]?|本周[一二三四五六日天]?)\s*",
+)
+_LEADING_EN_DUE_HINT_RE = re.compile(
+    r"^(tomorrow morning|tomorrow|tonight|this evening|today|next week|next month|this weekend|next weekend|weekend"
+    r"|this\s+(monday|mon|tuesday|tue|wednesday|wed|thursday|thu|friday|fri|saturday|sat|sunday|sun)"
+    r"|next\s+(monday|mon|tuesday|tue|wednesday|wed|thursday|thu|friday|fri|saturday|sat|sunday|sun)"
+    r"|on\s+(monday|mon|tuesday|tue|wednesday|wed|thursday|thu|friday|fri|saturday|sat|sunday|sun))\s+",
+    re.IGNORECASE,
+)
+_TRAILING_EN_DUE_HINT_RE = re.compile(
+    r"(\s+to\s+next\s+(monday|mon|tuesday|tue|wednesday|wed|thursday|thu|friday|fri|saturday|sat|sunday|sun)"
+    r"|\s+to\s+this\s+(monday|mon|tuesday|tue|wednesday|wed|thursday|thu|friday|fri|saturday|sat|sunday|sun)"
+    r"|\s+this\s+(monday|mon|tuesday|tue|wednesday|wed|thursday|thu|friday|fri|saturday|sat|sunday|sun)"
+    r"|\s+next\s+(monday|mon|tuesday|tue|wednesday|wed|thursday|thu|friday|fri|saturday|sat|sunday|sun)"
+    r"|\s+on\s+(monday|mon|tuesday|tue|wednesday|wed|thursday|thu|friday|fri|saturday|sat|sunday|sun)"
+    r"|\s+(monday|mon|tuesday|tue|wednesday|wed|thursday|thu|friday|fri|saturday|sat|sunday|sun)"
+    r"|\s+to\s+next\s+week|\s+next\s+week|\s+to\s+next\s+month|\s+next\s+month"
+    r"|\s+to\s+this\s+weekend|\s+this\s+weekend|\s+to\s+next\s+weekend|\s+next\s+weekend|\s+weekend"
+    r"|\s+three\s+days\s+later"
+    r"|\s+to\s+the\s+day\s+after\s+tomorrow|\s+the\s+day\s+after\s+tomorrow|\s+after\s+tomorrow"
+    r"|\s+to\s+tomorrow\s+morning|\s+tomorrow\s+morning|\s+to\s+tomorrow|\s+by\s+tomorrow"
+    r"|\s+to\s+tonight|\s+by\s+tonight|\s+tonight|\s+to\s+this\s+evening|\s+this\s+evening"
+    r"|\s+(\d{4}[./]\d{1,2}[./]\d{1,2}|\d{1,2}[./-]\d{1,2})"
+    r"|到下个月|下个月|到这个周末|这个周末|到这周末|这周末|到本周末|本周末|到下周末|下周末|到周末|周末"
+    r"|到大后天|大后天|到后天|后天|到明天|明天|明早|到今晚|今晚|今夜|到下周[一二三四五六日天]?|下周[一二三四五六日天]?|到下星期[一二三四五六日天]?|下星期[一二三四五六日天]?|tomorrow)$",
+    re.IGNORECASE,
+)
+
+
 def _strip_due_hint(text: str) -> str:
     cleaned = (text or "").strip()
-    cleaned = re.sub(
-        r"^(\d{4}[./]\d{1,2}[./]\d{1,2}|\d{1,2}[./-]\d{1,2})\s*",
-        "",
-        cleaned,
-        flags=re.IGNORECASE,
-    )
-    cleaned = re.sub(
-        r"^(明天|明早|后天|大后天|下个月|这个周末|这周末|本周末|下周末|周末|今晚|今夜|今天"
-        r"|下周[一二三四五六日天]?|下星期[一二三四五六日天]?|这周[一二三四五六日天]?|本周[一二三四五六日天]?)\s*",
-        "",
-        cleaned,
-    )
-    cleaned = re.sub(
-        r"^(tomorrow morning|tomorrow|tonight|this evening|today|next week|next month|this weekend|next weekend|weekend"
-        r"|this\s+(monday|mon|tuesday|tue|wednesday|wed|thursday|thu|friday|fri|saturday|sat|sunday|sun)"
-        r"|next\s+(monday|mon|tuesday|tue|wednesday|wed|thursday|thu|friday|fri|saturday|sat|sunday|sun)"
-        r"|on\s+(monday|mon|tuesday|tue|wednesday|wed|thursday|thu|friday|fri|saturday|sat|sunday|sun))\s+",
-        "",
-        cleaned,
-        flags=re.IGNORECASE,
-    )
-    cleaned = re.sub(
-        r"(\s+to\s+next\s+(monday|mon|tuesday|tue|wednesday|wed|thursday|thu|friday|fri|saturday|sat|sunday|sun)"
-        r"|\s+to\s+this\s+(monday|mon|tuesday|tue|wednesday|wed|thursday|thu|friday|fri|saturday|sat|sunday|sun)"
-        r"|\s+this\s+(monday|mon|tuesday|tue|wednesday|wed|thursday|thu|friday|fri|saturday|sat|sunday|sun)"
-        r"|\s+next\s+(monday|mon|tuesday|tue|wednesday|wed|thursday|thu|friday|fri|saturday|sat|sunday|sun)"
-        r"|\s+on\s+(monday|mon|tuesday|tue|wednesday|wed|thursday|thu|friday|fri|saturday|sat|sunday|sun)"
-        r"|\s+(monday|mon|tuesday|tue|wednesday|wed|thursday|thu|friday|fri|saturday|sat|sunday|sun)"
-        r"|\s+to\s+next\s+week|\s+next\s+week|\s+to\s+next\s+month|\s+next\s+month"
-        r"|\s+to\s+this\s+weekend|\s+this\s+weekend|\s+to\s+next\s+weekend|\s+next\s+weekend|\s+weekend"
-        r"|\s+three\s+days\s+later"
-        r"|\s+to\s+the\s+day\s+after\s+tomorrow|\s+the\s+day\s+after\s+tomorrow|\s+after\s+tomorrow"
-        r"|\s+to\s+tomorrow\s+morning|\s+tomorrow\s+morning|\s+to\s+tomorrow|\s+by\s+tomorrow"
-        r"|\s+to\s+tonight|\s+by\s+tonight|\s+tonight|\s+to\s+this\s+evening|\s+this\s+evening"
-        r"|\s+(\d{4}[./]\d{1,2}[./]\d{1,2}|\d{1,2}[./-]\d{1,2})"
-        r"|到下个月|下个月|到这个周末|这个周末|到这周末|这周末|到本周末|本周末|到下周末|下周末|到周末|周末"
-        r"|到大后天|大后天|到后天|后天|到明天|明天|明早|到今晚|今晚|今夜|到下周[一二三四五六日天]?|下周[一二三四五六日天]?|到下星期[一二三四五六日天]?|下星期[一二三四五六日天]?|tomorrow)$",
-        "",
-        cleaned,
-        flags=re.IGNORECASE,
-    )
-    return re.sub(r"\s+", " ", cleaned).strip(" ：:，,.")
+    cleaned = _LEADING_EXPLICIT_DATE_RE.sub("", cleaned)
+    cleaned = _LEADING_ZH_DUE_HINT_RE.sub("", cleaned)
+    cleaned = _LEADING_EN_DUE_HINT_RE.sub("", cleaned)
+    cleaned = _TRAILING_EN_DUE_HINT_RE.sub("", cleaned)
+    return _WHITESPACE_RE.sub(" ", cleaned).strip(" ：:，,.")
 
 
 def _build_action_reply(reply: str, actions: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -1429,11 +1481,22 @@ def _build_action_reply(reply: str, actions: List[Dict[str, Any]]) -> Dict[str,
     }
 
 
+_ZH_DELETE_THEN_ADD_RE = re.compile(r"^.*?(删掉|删除|去掉|移除)(.+?)(再加|然后加|再添加|再新增)(.+)$")
+_EN_DELETE_THEN_ADD_RE = re.compile(r"^(delete|remove|drop)\s+(.+?)\s+(and add|and create)\s+(.+)$", re.IGNORECASE)
+_ZH_TASK_WITH_REMINDER_RE = re.compile(
+    r"^(我要|我想|我得|我需要)\s*(.+?)(?:，|,)?(?:然后|再|并且)\s*(?:明天)?(?:提醒我|记得|让我)\s*(.+?)(?:到?明天|明早)?$",
+)
+_EN_TASK_WITH_REMINDER_RE = re.compile(
+    r"^(i need to|i have to|i should|i want to)\s+(.+?),?\s+and\s+remind me to\s+(.+?)\s+tomorrow$",
+    re.IGNORECASE,
+)
+
+
 def _try_compound_action(message: str, lang: str) -> Dict[str, Any] | None:
     normalized = message.strip()
     lower = normalized.lower()
 
-    zh_delete_add = re.match(r"^.*?(删掉|删除|去掉|移除)(.+?)(再加|然后加|再添加|再新增)(.+)$", normalized)
+    zh_delete_add = _ZH_DELETE_THEN_ADD_RE.match(normalized)
     if zh_delete_add:
         delete_part = _normalize_task_query_text(zh_delete_add.group(2))
         add_part = _normalize_task_title_text(zh_delete_add.group(4))
@@ -1443,7 +1506,7 @@ def _try_compound_action(message: str, lang: str) -> Dict[str, Any] | None:
                 {"type": "add_task", "title": add_part, "description": "", "priority": 0, "due_date": None},
             ])
 
-    en_delete_add = re.match(r"^(delete|remove|drop)\s+(.+?)\s+(and add|and create)\s+(.+)$", lower, flags=re.IGNORECASE)
+    en_delete_add = _EN_DELETE_THEN_ADD_RE.match(lower)
     if en_delete_add:
         delete_part = _normalize_task_query_text(en_delete_add.group(2))
         add_part = _normalize_task_title_text(en_delete_add.group(4))
@@ -1453,10 +1516,7 @@ def _try_compound_action(message: str, lang: str) -> Dict[str, Any] | None:
                 {"type": "add_task", "title": add_part, "description": "", "priority": 0, "due_date": None},
             ])
 
-    zh_two_adds = re.match(
-        r"^(我要|我想|我得|我需要)\s*(.+?)(?:，|,)?(?:然后|再|并且)\s*(?:明天)?(?:提醒我|记得|让我)\s*(.+?)(?:到?明天|明早)?$",
-        normalized,
-    )
+    zh_two_adds = _ZH_TASK_WITH_REMINDER_RE.match(normalized)
     if zh_two_adds:
         first_title = _canonical_task_text(zh_two_adds.group(2))
         second_title = _canonical_task_text(zh_two_adds.group(3))
@@ -1466,7 +1526,7 @@ def _try_compound_action(message: str, lang: str) -> Dict[str, Any] | None:
                 {"type": "add_task", "title": second_title, "description": "", "priority": 0, "due_date": local_date_offset_iso(1)},
             ])
 
-    en_reminder = re.match(r"^(i need to|i have to|i should|i want to)\s+(.+?),?\s+and\s+remind me to\s+(.+?)\s+tomorrow$", lower, flags=re.IGNORECASE)
+    en_reminder = _EN_TASK_WITH_REMINDER_RE.match(lower)
     if en_reminder:
         first_title = _canonical_task_text(en_reminder.group(2))
         second_title = _canonical_task_text(en_reminder.group(3))
@@ -1479,20 +1539,32 @@ def _try_compound_action(message: str, lang: str) -> Dict[str, Any] | None:
     return None
 
 
+_EN_WEEKLY_PLAN_RE = re.compile(r"^i\s+have\s+(?:a\s+)?plans?\s+(?:on\s+)?every\s+(.+?)\s+to\s+(.+)$", re.IGNORECASE)
+_ZH_RELATIVE_WEEKDAY_STATEMENT_RE = re.compile(r"^(我)?(?:(?:这|本|下|下下)周|(?:这|本|下|下下)星期)([一二三四五六日天12345670]).*(.+)$")
+_ZH_WEEKLY_STATEMENT_RE = re.compile(r"^(我)?(?:每周|每星期|每礼拜|周|星期|礼拜)([一二三四五六日天12345670]).*(.+)$")
+_ZH_INTENT_STATEMENT_RE = re.compile(r"^(我要|我想|我得|我需要|今天要|等会要)\s*\S+")
+_EN_INTENT_STATEMENT_RE = re.compile(r"^(i need to|i have to|i should|i want to)\s+\S+")
+_ZH_ADD_COMMAND_RE = re.compile(r"^(帮我|给我|请|麻烦你)?\s*(加上|加入|添加|新增|加个|加一个|加一项|记录一下)")
+_EN_ADD_COMMAND_RE = re.compile(r"^(add|create)\s+((a|an)\s+)?")
+_ZH_DAILY_STATEMENT_RE = re.compile(r"^(?:我)?(?:每天|每日|每天都|每日都)\s*(?:要|得|需要|会)?\s*\S+")
+_EN_DAILY_PREFIX_STATEMENT_RE = re.compile(r"^(?:i )?(?:every day|daily)\s+\S+")
+_EN_DAILY_SUFFIX_STATEMENT_RE = re.compile(r"^(?:i\s+)?(.+?)\s+every day$")
+
+
 def _looks_like_structured_task_statement(message: str) -> bool:
     normalized = (message or "").strip()
     lower = normalized.lower()
     return any([
-        bool(re.match(r"^(我要|我想|我得|我需要|今天要|等会要)\s*\S+", normalized)),
-        bool(re.match(r"^(?:我)?(?:每天|每日|每天都|每日都)\s*(?:要|得|需要|会)?\s*\S+", normalized)),
-        bool(re.match(r"^(i need to|i have to|i should|i want to)\s+\S+", lower)),
-        bool(re.match(r"^(?:i )?(?:every day|daily)\s+\S+", lower)),
-        bool(re.match(r"^(?:i\s+)?(.+?)\s+every day$", lower)),
-        bool(re.match(r"^i\s+have\s+(?:a\s+)?plans?\s+(?:on\s+)?every\s+(.+?)\s+to\s+(.+)$", normalized, flags=re.IGNORECASE)),
-        bool(re.match(r"^(我)?(?:(?:这|本|下|下下)周|(?:这|本|下|下下)星期)([一二三四五六日天12345670]).*(.+)$", normalized)),
-        bool(re.match(r"^(我)?(?:每周|每星期|每礼拜|周|星期|礼拜)([一二三四五六日天12345670]).*(.+)$", normalized)),
-        bool(re.match(r"^(帮我|给我|请|麻烦你)?\s*(加上|加入|添加|新增|加个|加一个|加一项|记录一下)", normalized)),
-        bool(re.match(r"^(add|create)\s+((a|an)\s+)?", lower)),
+        bool(_ZH_INTENT_STATEMENT_RE.match(normalized)),
+        bool(_ZH_DAILY_STATEMENT_RE.match(normalized)),
+        bool(_EN_INTENT_STATEMENT_RE.match(lower)),
+        bool(_EN_DAILY_PREFIX_STATEMENT_RE.match(lower)),
+        bool(_EN_DAILY_SUFFIX_STATEMENT_RE.match(lower)),
+        bool(_EN_WEEKLY_PLAN_RE.match(normalized)),
+        bool(_ZH_RELATIVE_WEEKDAY_STATEMENT_RE.match(normalized)),
+        bool(_ZH_WEEKLY_STATEMENT_RE.match(normalized)),
+        bool(_ZH_ADD_COMMAND_RE.match(normalized)),
+        bool(_EN_ADD_COMMAND_RE.match(lower)),
     ])
 
 
@@ -1649,6 +1721,16 @@ Return valid JSON only:
     return None
 
 
+_ZH_DAILY_TITLE_RE = re.compile(r"^(?:我)?(?:每天|每日|每天都|每日都)\s*(?:要|得|需要|会)?\s*(.+)$")
+_EN_DAILY_PREFIX_TITLE_RE = re.compile(r"^(?:i\s+)?(?:every day|daily)\s+(.+)$", re.IGNORECASE)
+_EN_DAILY_SUFFIX_TITLE_RE = re.compile(r"^(?:i\s+)?(.+?)\s+every day$", re.IGNORECASE)
+_TITLE_LEADING_COUNT_RE = re.compile(r"^(一个任务|一个|一项|一条)\s*")
+_EN_ARTICLE_PREFIX_RE = re.compile(r"^(a|an)\s+", re.IGNORECASE)
+_TASK_SUFFIX_DE_RE = re.compile(r"的任务$")
+_LEADING_WO_RE = re.compile(r"^我")
+_EN_INTENT_PREFIX_RE = re.compile(r"^(i need to|i have to|i should|i want to)\s+", re.IGNORECASE)
+
+
 def _call_assistant_llm(message: str, lang: str, profile: Dict[str, Any], history: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
     lower = message.lower()
     normalized = message.strip()
@@ -1827,7 +1909,7 @@ def _call_assistant_llm(message: str, lang: str, profile: Dict[str, Any], histor
                     {"type": "log_mood", "mood_level": level, "note": normalized},
                 )
 
-    if allow_natural_language_fast_paths and re.match(r"^(我要|我想|我得|我需要|今天要|等会要)\s*\S+", normalized):
+    if allow_natural_language_fast_paths and _ZH_INTENT_STATEMENT_RE.match(normalized):
         title = _strip_due_hint(_canonical_task_text(normalized))
         if title:
             due_date = _extract_due_date_hint(normalized) or _extract_plain_weekday_due_date(normalized)
@@ -1836,8 +1918,8 @@ def _call_assistant_llm(message: str, lang: str, profile: Dict[str, Any], histor
                 {"type": "add_task", "title": title, "description": "", "priority": 0, "due_date": due_date},
             )
 
-    if allow_natural_language_fast_paths and re.match(r"^(i need to|i have to|i should|i want to)\s+\S+", lower):
-        title = re.sub(r"^(i need to|i have to|i should|i want to)\s+", "", normalized, flags=re.IGNORECASE).strip()
+    if allow_natural_language_fast_paths and _EN_INTENT_STATEMENT_RE.match(lower):
+        title = _EN_INTENT_PREFIX_RE.sub("", normalized).strip()
         title = _strip_due_hint(_canonical_task_text(title))
         if title:
             due_date = _extract_due_date_hint(normalized) or _extract_plain_weekday_due_date(normalized)
@@ -1846,7 +1928,7 @@ def _call_assistant_llm(message: str, lang: str, profile: Dict[str, Any], histor
                 {"type": "add_task", "title": title, "description": "", "priority": 0, "due_date": due_date},
             )
 
-    recurring_daily_zh = re.match(r"^(?:我)?(?:每天|每日|每天都|每日都)\s*(?:要|得|需要|会)?\s*(.+)$", normalized)
+    recurring_daily_zh = _ZH_DAILY_TITLE_RE.match(normalized)
     if allow_natural_language_fast_paths and not _looks_like_question(message) and recurring_daily_zh:
         title = _canonical_task_text(recurring_daily_zh.group(1))
         if title:
@@ -1863,8 +1945,8 @@ def _call_assistant_llm(message: str, lang: str, profile: Dict[str, Any], histor
             )
 
     recurring_daily_en = (
-        re.match(r"^(?:i\s+)?(?:every day|daily)\s+(.+)$", normalized, flags=re.IGNORECASE)
-        or re.match(r"^(?:i\s+)?(.+?)\s+every day$", normalized, flags=re.IGNORECASE)
+        _EN_DAILY_PREFIX_TITLE_RE.match(normalized)
+        or _EN_DAILY_SUFFIX_TITLE_RE.match(normalized)
     )
     if allow_natural_language_fast_paths and not _looks_like_question(message) and recurring_daily_en:
         title = _canonical_task_text(recurring_daily_en.group(1))
@@ -1881,11 +1963,7 @@ def _call_assistant_llm(message: str, lang: str, profile: Dict[str, Any], histor
                 },
             )
 
-    recurring_en = re.match(
-        r"^i\s+have\s+(?:a\s+)?plans?\s+(?:on\s+)?every\s+(.+?)\s+to\s+(.+)$",
-        normalized,
-        flags=re.IGNORECASE,
-    )
+    recurring_en = _EN_WEEKLY_PLAN_RE.match(normalized)
     if allow_natural_language_fast_paths and recurring_en:
         weekdays = _extract_all_recurrence_weekdays(recurring_en.group(1))
         title = _canonical_task_text(recurring_en.group(2))
@@ -1919,9 +1997,9 @@ def _call_assistant_llm(message: str, lang: str, profile: Dict[str, Any], histor
                 },
             )
 
-    relative_weekday_zh = re.match(r"^(我)?(?:(?:这|本|下|下下)周|(?:这|本|下|下下)星期)([一二三四五六日天12345670]).*(.+)$", normalized)
+    relative_weekday_zh = _ZH_RELATIVE_WEEKDAY_STATEMENT_RE.match(normalized)
     if allow_natural_language_fast_paths and not _looks_like_question(message) and relative_weekday_zh:
-        title = _canonical_task_text(re.sub(r"^我", "", normalized, count=1))
+        title = _canonical_task_text(_LEADING_WO_RE.sub("", normalized, count=1))
         if title:
             due_date = _extract_due_date_hint(normalized) or upcoming_weekday_iso(infer_recurrence_weekday(normalized) or 0)
             return action_reply(
@@ -1935,9 +2013,9 @@ def _call_assistant_llm(message: str, lang: str, profile: Dict[str, Any], histor
                 },
             )
 
-    recurring_zh = re.match(r"^(我)?(?:每周|每星期|每礼拜|周|星期|礼拜)([一二三四五六日天12345670]).*(.+)$", normalized)
+    recurring_zh = _ZH_WEEKLY_STATEMENT_RE.match(normalized)
     if allow_natural_language_fast_paths and not _looks_like_question(message) and recurring_zh:
-        title = _canonical_task_text(re.sub(r"^我", "", normalized, count=1))
+        title = _canonical_task_text(_LEADING_WO_RE.sub("", normalized, count=1))
         if title:
             return action_reply(
                 "",
@@ -1953,8 +2031,8 @@ def _call_assistant_llm(message: str, lang: str, profile: Dict[str, Any], histor
             )
 
     if allow_natural_language_fast_paths and (
-        re.match(r"^(帮我|给我|请|麻烦你)?\s*(加上|加入|添加|新增|加个|加一个|加一项|记录一下)", normalized)
-        or re.match(r"^(add|create)\s+((a|an)\s+)?", lower)
+        _ZH_ADD_COMMAND_RE.match(normalized)
+        or _EN_ADD_COMMAND_RE.match(lower)
     ):
         title = _normalize_task_title_text(normalized)
         if title:
@@ -1980,9 +2058,9 @@ def _call_assistant_llm(message: str, lang: str, profile: Dict[str, Any], histor
             title = normalized[matched_prefix:]
         for token in ["帮我", "给我", "加一个任务", "添加任务", "新增任务", "任务：", "任务:", "加上", "添加", "新增"]:
             title = title.replace(token, "")
-        title = re.sub(r"^(一个任务|一个|一项|一条)\s*", "", title.strip())
-        title = re.sub(r"^(a|an)\s+", "", title.strip(), flags=re.IGNORECASE)
-        title = re.sub(r"的任务$", "", title.strip())
+        title = _TITLE_LEADING_COUNT_RE.sub("", title.strip())
+        title = _EN_ARTICLE_PREFIX_RE.sub("", title.strip())
+        title = _TASK_SUFFIX_DE_RE.sub("", title.strip())
         return action_reply(
             "",
             {"type": "add_task", "title": title.strip(" ：:，,." ) or normalized, "description": "", "priority": 0, "due_date": None},
@@ -2118,40 +2196,53 @@ def _history(db, task_id: int, action: str, reasoning: str) -> None:
     )
 
 
-def _execute_plan_regeneration(db, user_id: int, lang: str) -> str:
-    today = local_today_iso()
-    storage_key = plan_storage_key(user_id, today)
-    existing = db.query(DailyPlan).filter(DailyPlan.date == storage_key).first()
-    if existing:
-        db.delete(existing)
-        db.flush()
-    tasks = (
-        db.query(Task)
-        .filter(Task.user_id == user_id, Task.status == TaskStatus.ACTIVE.value)
-        .order_by(Task.priority.desc(), Task.created_at.asc())
-        .all()
-    )
-    if not tasks:
+def _plan_regeneration_inputs(db, user_id: int) -> PlanSnapshot:
+    return snapshot_plan_inputs(db, user_id, local_today_iso())
+
+
+def _store_regenerated_plan(db, snapshot: PlanSnapshot, result: Dict[str, Any] | None) -> bool:
+    """Write the regenerated plan; False when there were no active tasks to plan."""
+
+    if isinstance(result, PlanMaintenance):
+        apply_plan_maintenance(db, snapshot, result, default_reason="Planned by concierge.")
+        return True
+    if result is not None:
+        store_plan(db, snapshot, result, default_reason="Planned by concierge.")
+        return True
+    check_plan_snapshot(db, snapshot)
+    if snapshot.existing_plan_id is not None:
+        delete_plan(db, snapshot.existing_plan_id)
+    return False
+
+
+async def _execute_plan_regeneration(user_id: int, lang: str) -> str:
+    """Refresh today's plan after the turn's own writes have committed.
+
+    Changes that leave the ranking boundary in place update the stored plan
+    directly; anything else replans in full.
+    """
+
+    def plan(snapshot: PlanSnapshot) -> Dict[str, Any] | PlanMaintenance | None:
+        if not snapshot.tasks:
+            return None
+        maintenance = maintain_plan(snapshot)
+        if maintenance is not None:
+            return maintenance
+        return generate_daily_plan(snapshot.tasks, snapshot.target_date, lang=lang)
+
+    try:
+        planned = await read_compute_write(lambda db: _plan_regeneration_inputs(db, user_id), plan, _store_regenerated_plan)
+    except StaleSnapshot:
+        return "任务刚刚有变动，计划没有更新，请再试一次。" if lang == "zh" else "Your tasks changed while planning; the plan was not updated. Please try again."
+    if not planned:
         return "没有可用于规划的活跃任务。" if lang == "zh" else "There are no active tasks to plan."
-    result = generate_daily_plan(tasks, today, lang=lang)
-    plan = DailyPlan(
-        date=storage_key,
-        reasoning=result["reasoning"],
-        overload_warning=result.get("overload_warning", ""),
-        max_tasks=result.get("max_tasks", 4),
-    )
-    db.add(plan)
-    db.flush()
-    for index, selected in enumerate(result.get("selected_tasks", [])):
-        db.add(PlanTask(plan_id=plan.id, task_id=selected["task_id"], status=PlanTaskStatus.PLANNED.value, order=index))
-        _history(db, selected["task_id"], HistoryAction.PLANNED.value, selected.get("reason", "Planned by concierge."))
-    db.flush()
     return "今天的计划已经更新。" if lang == "zh" else "Today's plan has been refreshed."
 
 
 def _execute_actions(db, user, actions: List[Dict[str, Any]], lang: str) -> Dict[str, Any]:
     summaries: List[str] = []
     pending: Dict[str, Any] = dict(DEFAULT_PENDING)
+    plan_slot: int | None = None
     context = _user_context(db, user.id)
     active_tasks = context["active_tasks"]
 
@@ -2240,8 +2331,15 @@ def _execute_actions(db, user, actions: List[Dict[str, Any]], lang: str) -> Dict
                 _history(db, task.id, HistoryAction.DELETED.value, "Task deleted by concierge.")
                 summaries.append(f"已删除任务：{task.title}" if lang == "zh" else f"Deleted task: {task.title}")
             elif action_type == "complete_task":
-                task.status = TaskStatus.COMPLETED.value
-                task.completed_at = datetime.now(timezone.utc)
+                if is_recurring(task.to_dict()):
+                    if not complete_occurrence(db, task, local_today_iso()):
+                        summaries.append(
+                            f"今天已经完成过了：{task.title}" if lang == "zh" else f"Already done today: {task.title}"
+                        )
+                        continue
+                else:
+                    task.status = TaskStatus.COMPLETED.value
+                    task.completed_at = datetime.now(timezone.utc)
                 task.completion_count += 1
                 _history(db, task.id, HistoryAction.COMPLETED.value, "Task completed by concierge.")
                 summaries.append(f"已完成任务：{task.title}" if lang == "zh" else f"Completed task: {task.title}")
@@ -2281,7 +2379,10 @@ def _execute_actions(db, user, actions: List[Dict[str, Any]], lang: str) -> Dict
                 summaries.append(f"已更新任务：{task.title}" if lang == "zh" else f"Updated task: {task.title}")
             active_tasks = _user_context(db, user.id)["active_tasks"]
         elif action_type == "generate_plan":
-            summaries.append(_execute_plan_regeneration(db, user.id, lang))
+            # The planner calls the LLM, so it runs after this transaction
+            # commits; the caller fills this summary slot in.
+            plan_slot = len(summaries)
+            summaries.append("")
         elif action_type == "log_mood":
             try:
                 mood_level = int(action.get("mood_level") or 0)
@@ -2291,7 +2392,7 @@ def _execute_actions(db, user, actions: List[Dict[str, Any]], lang: str) -> Dict
                 db.add(MoodEntry(user_id=user.id, date=local_today_iso(), mood_level=mood_level, note=(action.get("note") or "").strip()))
                 summaries.append("已记录心情。" if lang == "zh" else "Mood logged.")
     db.flush()
-    return {"summaries": summaries, "pending": pending}
+    return {"summaries": summaries, "pending": pending, "plan_slot": plan_slot}
 
 
 @router.get("/state")
@@ -2307,90 +2408,149 @@ def get_assistant_state(request: Request, lang: str = "en"):
         return _assistant_state(profile, history, pending, lang)
 
 
-@router.post("/chat")
-def chat_with_assistant(payload: AssistantChatRequest, request: Request):
-    with get_db() as db:
-        user = require_current_user(db, request)
-        profile = _coerce_profile(read_setting(db, _profile_key(user.id), DEFAULT_PROFILE))
-        history = read_setting(db, _history_key(user.id), DEFAULT_HISTORY)
-        pending = read_setting(db, _pending_key(user.id), DEFAULT_PENDING)
-        history = _ensure_profile_prompt(profile, history, payload.lang)
-        message = payload.message.strip()
-        history = _push_message(history, "user", message)
-        if pending.get("type") and _looks_like_fresh_request(message):
-            pending = dict(DEFAULT_PENDING)
-            write_setting(db, _pending_key(user.id), pending)
-
-        if pending.get("type") == "task_choice":
-            chosen = _select_task_from_message(message, pending.get("data", {}).get("matches", []))
-            if chosen:
-                action = dict(pending.get("data", {}).get("action", {}))
-                action["task_query"] = chosen["title"]
-                result = _execute_actions(db, user, [action], payload.lang)
-                assistant_reply = "\n".join(result["summaries"]) or ("好的，已经处理。" if payload.lang == "zh" else "Done.")
-                history = _push_message(history, "assistant", assistant_reply)
-                write_setting(db, _pending_key(user.id), result["pending"])
-            else:
-                history = _push_message(
-                    history,
-                    "assistant",
-                    "我还没能确定是哪一个，请回复数字编号，或者把任务名说得更完整一点。" if payload.lang == "zh" else "I still can't tell which one you mean. Reply with the number or a more complete task name.",
-                )
-            write_setting(db, _history_key(user.id), history)
-            return _assistant_state(profile, history, read_setting(db, _pending_key(user.id), DEFAULT_PENDING), payload.lang)
-
-        if pending.get("type") == "llm_followup":
-            original = pending.get("data", {}).get("message", "")
-            structured_action = None
-            if isinstance(original, str) and original.strip().startswith("{"):
-                try:
-                    maybe_action = json.loads(original)
-                    if isinstance(maybe_action, dict) and maybe_action.get("type") in {"add_task", "delete_task", "update_task", "complete_task", "defer_task"}:
-                        structured_action = maybe_action
-                except Exception:
-                    structured_action = None
-            if structured_action:
-                if structured_action.get("type") == "add_task":
-                    structured_action["title"] = message.strip()
-                else:
-                    structured_action["task_query"] = message.strip()
-                parsed = {"reply": "", "requires_clarification": False, "clarification_question": "", "actions": [structured_action]}
+def _chat_turn_inputs(db, request: Request, payload: AssistantChatRequest) -> Dict[str, Any]:
+    """Read everything a chat turn needs and work out what to ask the model, if anything."""
+
+    user = require_current_user(db, request)
+    profile = _coerce_profile(read_setting(db, _profile_key(user.id), DEFAULT_PROFILE))
+    history = read_setting(db, _history_key(user.id), DEFAULT_HISTORY)
+    pending = read_setting(db, _pending_key(user.id), DEFAULT_PENDING)
+    history = _ensure_profile_prompt(profile, history, payload.lang)
+    message = payload.message.strip()
+    history = _push_message(history, "user", message)
+    turn: Dict[str, Any] = {
+        "profile": profile,
+        "history": history,
+        "pending": pending,
+        "message": message,
+        "parsed": None,
+        "llm_message": None,
+        "context": None,
+    }
+    if pending.get("type") and _looks_like_fresh_request(message):
+        turn["pending"] = pending = dict(DEFAULT_PENDING)
+    if pending.get("type") == "task_choice":
+        return turn
+
+    if pending.get("type") == "llm_followup":
+        original = pending.get("data", {}).get("message", "")
+        structured_action = None
+        if isinstance(original, str) and original.strip().startswith("{"):
+            try:
+                maybe_action = json.loads(original)
+                if isinstance(maybe_action, dict) and maybe_action.get("type") in {"add_task", "delete_task", "update_task", "complete_task", "defer_task"}:
+                    structured_action = maybe_action
+            except Exception:
+                structured_action = None
+        if structured_action:
+            if structured_action.get("type") == "add_task":
+                structured_action["title"] = message.strip()
             else:
-                parsed = _call_assistant_llm(f"{original}\nClarification: {message}", payload.lang, profile, history, _user_context(db, user))
+                structured_action["task_query"] = message.strip()
+            turn["parsed"] = {"reply": "", "requires_clarification": False, "clarification_question": "", "actions": [structured_action]}
         else:
-            parsed = _call_assistant_llm(message, payload.lang, profile, history, _user_context(db, user))
-
-        if parsed.get("requires_clarification"):
-            next_pending = {
-                "type": "llm_followup",
-                "data": {"message": message, "question": parsed.get("clarification_question", "")},
-            }
-            question = parsed.get("clarification_question") or parsed.get("reply") or (
-                "我还需要你补充一点信息。" if payload.lang == "zh" else "I need a bit more detail."
-            )
-            history = _push_message(history, "assistant", question)
-            write_setting(db, _pending_key(user.id), next_pending)
-            write_setting(db, _history_key(user.id), history)
-            return _assistant_state(profile, history, next_pending, payload.lang)
-
-        execution = _execute_actions(db, user, parsed.get("actions", []), payload.lang)
-        reply_parts = []
-        if parsed.get("reply"):
-            cleaned_reply = _sanitize_assistant_text(parsed["reply"])
-            if cleaned_reply:
-                reply_parts.append(cleaned_reply)
-        reply_parts.extend(execution["summaries"])
-        if execution["pending"].get("type") == "llm_followup":
-            followup_question = execution["pending"].get("data", {}).get("question", "")
-            if followup_question:
-                reply_parts.append(followup_question)
-        elif execution["pending"].get("type") == "task_choice" and execution["summaries"]:
-            pass
-        assistant_reply = "\n".join(part for part in reply_parts if part).strip() or (
-            "好的，我已经处理。" if payload.lang == "zh" else "Done."
-        )
+            turn["llm_message"] = f"{original}\nClarification: {message}"
+    else:
+        turn["llm_message"] = message
+    if turn["parsed"] is None:
+        turn["context"] = _user_context(db, user)
+        # The context outlives this session (the model call runs after it
+        # closes); detach its rows so they keep their loaded state.
+        db.expunge_all()
+    return turn
+
+
+def _finish_task_choice(db, request: Request, payload: AssistantChatRequest, turn: Dict[str, Any]) -> Dict[str, Any]:
+    user = require_current_user(db, request)
+    profile, history, pending, message = turn["profile"], turn["history"], turn["pending"], turn["message"]
+    chosen = _select_task_from_message(message, pending.get("data", {}).get("matches", []))
+    if chosen:
+        action = dict(pending.get("data", {}).get("action", {}))
+        action["task_query"] = chosen["title"]
+        result = _execute_actions(db, user, [action], payload.lang)
+        assistant_reply = "\n".join(result["summaries"]) or ("好的，已经处理。" if payload.lang == "zh" else "Done.")
         history = _push_message(history, "assistant", assistant_reply)
-        write_setting(db, _profile_key(user.id), profile)
-        write_setting(db, _pending_key(user.id), execution["pending"])
+        write_setting(db, _pending_key(user.id), result["pending"])
+    else:
+        history = _push_message(
+            history,
+            "assistant",
+            "我还没能确定是哪一个，请回复数字编号，或者把任务名说得更完整一点。" if payload.lang == "zh" else "I still can't tell which one you mean. Reply with the number or a more complete task name.",
+        )
+    write_setting(db, _history_key(user.id), history)
+    return _assistant_state(profile, history, read_setting(db, _pending_key(user.id), DEFAULT_PENDING), payload.lang)
+
+
+def _record_chat_reply(db, user_id: int, lang: str, turn: Dict[str, Any], parsed: Dict[str, Any], execution: Dict[str, Any]) -> Dict[str, Any]:
+    profile, history = turn["profile"], turn["history"]
+    reply_parts = []
+    if parsed.get("reply"):
+        cleaned_reply = _sanitize_assistant_text(parsed["reply"])
+        if cleaned_reply:
+            reply_parts.append(cleaned_reply)
+    reply_parts.extend(execution["summaries"])
+    if execution["pending"].get("type") == "llm_followup":
+        followup_question = execution["pending"].get("data", {}).get("question", "")
+        if followup_question:
+            reply_parts.append(followup_question)
+    elif execution["pending"].get("type") == "task_choice" and execution["summaries"]:
+        pass
+    assistant_reply = "\n".join(part for part in reply_parts if part).strip() or (
+        "好的，我已经处理。" if lang == "zh" else "Done."
+    )
+    history = _push_message(history, "assistant", assistant_reply)
+    write_setting(db, _profile_key(user_id), profile)
+    write_setting(db, _pending_key(user_id), execution["pending"])
+    write_setting(db, _history_key(user_id), history)
+    return _assistant_state(profile, history, execution["pending"], lang)
+
+
+def _apply_chat_turn(db, request: Request, payload: AssistantChatRequest, turn: Dict[str, Any], parsed: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply the model's answer; returns ``{"state": ...}`` or, when a plan rebuild is still due, the execution."""
+
+    user = require_current_user(db, request)
+    profile, history, message = turn["profile"], turn["history"], turn["message"]
+    if parsed.get("requires_clarification"):
+        next_pending = {
+            "type": "llm_followup",
+            "data": {"message": message, "question": parsed.get("clarification_question", "")},
+        }
+        question = parsed.get("clarification_question") or parsed.get("reply") or (
+            "我还需要你补充一点信息。" if payload.lang == "zh" else "I need a bit more detail."
+        )
+        history = _push_message(history, "assistant", question)
+        write_setting(db, _pending_key(user.id), next_pending)
         write_setting(db, _history_key(user.id), history)
-        return _assistant_state(profile, history, execution["pending"], payload.lang)
+        return {"state": _assistant_state(profile, history, next_pending, payload.lang)}
+
+    execution = _execute_actions(db, user, parsed.get("actions", []), payload.lang)
+    if execution["plan_slot"] is not None:
+        return {"user_id": user.id, "execution": execution}
+    return {"state": _record_chat_reply(db, user.id, payload.lang, turn, parsed, execution)}
+
+
+@router.post("/chat")
+async def chat_with_assistant(payload: AssistantChatRequest, request: Request):
+    # Read, call the model with no session open, then write in a short
+    # transaction: a slow LLM turn never holds a connection or the writer.
+    async with get_async_read_db() as db:
+        turn = await db.run_sync(_chat_turn_inputs, request, payload)
+
+    if turn["pending"].get("type") == "task_choice":
+        async with get_async_db() as db:
+            return await db.run_sync(_finish_task_choice, request, payload, turn)
+
+    parsed = turn["parsed"]
+    if parsed is None:
+        parsed = await run_upstream(
+            _call_assistant_llm, turn["llm_message"], payload.lang, turn["profile"], turn["history"], turn["context"]
+        )
+    async with get_async_db() as db:
+        outcome = await db.run_sync(_apply_chat_turn, request, payload, turn, parsed)
+    if "state" in outcome:
+        return outcome["state"]
+
+    execution = outcome["execution"]
+    execution["summaries"][execution["plan_slot"]] = await _execute_plan_regeneration(outcome["user_id"], payload.lang)
+    async with get_async_db() as db:
+        return await db.run_sync(_record_chat_reply, outcome["user_id"], payload.lang, turn, parsed, execution)
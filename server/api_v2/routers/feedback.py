@@ -5,6 +5,7 @@ from api_v2.schemas import FeedbackSubmitRequest
 from api_v2.user_context import plan_storage_key, require_current_user
 from core.deletion import check_deletion_candidates
 from core.planner import build_replan_preview
+from core.recurrence import complete_occurrence, is_recurring
 from core.time import local_today_iso
 from database.db import get_db
 from database.models import (
@@ -47,11 +48,16 @@ def submit_feedback(payload: FeedbackSubmitRequest, request: Request):
 
             if new_status == PlanTaskStatus.COMPLETED.value:
                 completed_count += 1
-                task.completion_count += 1
-                task.status = TaskStatus.COMPLETED.value
-                task.completed_at = datetime.now(timezone.utc)
-                task.source = "manual"
-                task.decision_reason = "Completed from daily feedback."
+                if is_recurring(task.to_dict()):
+                    # Already done for this date (e.g. ticked off in the task list).
+                    if complete_occurrence(db, task, target_date):
+                        task.completion_count += 1
+                else:
+                    task.completion_count += 1
+                    task.status = TaskStatus.COMPLETED.value
+                    task.completed_at = datetime.now(timezone.utc)
+                    task.source = "manual"
+                    task.decision_reason = "Completed from daily feedback."
                 action = HistoryAction.COMPLETED.value
                 reasoning = "Task completed by user."
             elif new_status == PlanTaskStatus.MISSED.value:
@@ -75,6 +81,9 @@ def submit_feedback(payload: FeedbackSubmitRequest, request: Request):
                 ai_reasoning=reasoning,
             ))
 
+        # Plan task statuses are not part of the stored views' inputs hash.
+        plan.input_version = None
+        plan.artifacts = "{}"
         db.flush()
         active_tasks = db.query(Task).filter(Task.user_id == user.id, Task.status == TaskStatus.ACTIVE.value).all()
         deletion_suggestions = check_deletion_candidates(active_tasks, lang=payload.lang)
@@ -12,7 +12,7 @@ from fastapi import HTTPException
 from api_v2.schemas import FocusSessionCreateRequest
 from api_v2.user_context import require_current_user
 from core.time import local_today, local_today_iso
-from database.db import get_db
+from database.db import get_db, get_read_db
 from database.models import FocusSession, Task
 
 router = APIRouter(tags=["focus"])
@@ -50,7 +50,7 @@ def get_focus_stats(request: Request):
     week_start = (today - timedelta(days=today.weekday())).isoformat()
     today_str = today.isoformat()
 
-    with get_db() as db:
+    with get_read_db() as db:
         user = require_current_user(db, request)
 
         today_rows = (
@@ -103,7 +103,7 @@ def get_focus_history(request: Request, days: int = 90):
     today = local_today()
     start = (today - timedelta(days=max(1, days) - 1)).isoformat()
 
-    with get_db() as db:
+    with get_read_db() as db:
         user = require_current_user(db, request)
         rows = (
             db.query(FocusSession)
@@ -6,7 +6,7 @@ from fastapi import APIRouter, Request
 
 from api_v2.schemas import MoodCreateRequest
 from api_v2.user_context import require_current_user
-from database.db import get_db
+from database.db import get_db, get_read_db
 from database.models import MoodEntry
 from core.time import datetime_to_iso, local_date_offset, local_today_iso
 
@@ -38,7 +38,7 @@ def submit_mood(payload: MoodCreateRequest, request: Request):
 @router.get("/mood/today")
 def get_today_mood(request: Request):
     today = local_today_iso()
-    with get_db() as db:
+    with get_read_db() as db:
         user = require_current_user(db, request)
         entry = (
             db.query(MoodEntry)
@@ -59,7 +59,7 @@ def get_today_mood(request: Request):
 
 @router.get("/mood/history")
 def get_mood_history(request: Request, days: int = 30):
-    with get_db() as db:
+    with get_read_db() as db:
         user = require_current_user(db, request)
         cutoff = local_date_offset(-days).isoformat()
         entries = (
@@ -1,16 +1,37 @@
-from typing import Optional
+from datetime import date, timedelta
+import hashlib
+import json
+from typing import Any, Dict, Optional, Tuple
 from fastapi import APIRouter, HTTPException, Query, Request
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import func, select
 
 from api_v2.schemas import PlanGenerateRequest
+from api_v2.two_phase import (
+    PlanMaintenance,
+    PlanSnapshot,
+    StaleSnapshot,
+    apply_plan_maintenance,
+    maintain_plan,
+    read_compute_write,
+    snapshot_plan_inputs,
+    store_plan,
+)
 from api_v2.user_context import plan_storage_key, require_current_user
+from core.cache import get_cache
+from core.horizon_planner import DEFAULT_HORIZON_DAYS, MAX_HORIZON_DAYS, plan_horizon
 from core.planner import generate_daily_plan, regenerate_reasoning
-from core.time import local_today_iso
-from database.db import get_db
-from database.models import Task, DailyPlan, PlanTask, TaskHistory, TaskStatus, PlanTaskStatus, HistoryAction
+from core.recurrence import completed_between, occurrence_index
+from core.rules import normalize_capacity_units
+from core.time import local_today_iso, normalize_date_string
+from database.db import get_async_db, get_async_read_db
+from database.models import Task, DailyPlan, TaskStatus, PlanTaskStatus
 
 router = APIRouter(prefix="/plans", tags=["plans"])
 
+# Entries are keyed by the task inputs hash, so task changes never hit a
+# stale week; the TTL only bounds drift in date-relative scores.
+_horizon_cache = get_cache("plans.horizon", max_entries=2048, ttl_seconds=6 * 3600)
+
 
 def _visible_plan_tasks(plan: DailyPlan):
     visible = []
@@ -26,143 +47,281 @@ def _visible_plan_tasks(plan: DailyPlan):
     return visible
 
 
-@router.post("/generate", status_code=201)
-def generate_plan(payload: PlanGenerateRequest, request: Request):
-    target_date = payload.date or local_today_iso()
-    lang = payload.lang
-    capacity_units = payload.capacity_units
+def _existing_plan_result(db, existing: DailyPlan, user_id: int, lang: str, capacity_units: Optional[int]):
+    result = existing.to_dict(include_tasks=True)
+    result["tasks"] = _visible_plan_tasks(existing)
+    active_tasks = db.query(Task).filter(Task.user_id == user_id, Task.status == TaskStatus.ACTIVE.value).all()
+    localized = regenerate_reasoning(
+        existing, active_tasks, lang, capacity_units=capacity_units
+    )
+    result["reasoning"] = localized["reasoning"]
+    result["overload_warning"] = localized["overload_warning"]
+    result["deletion_suggestions"] = localized.get("deletion_suggestions", [])
+    result["capacity_summary"] = localized.get("capacity_summary", {})
+    result["decision_summary"] = localized.get("decision_summary", {})
+    result["coach_notes"] = localized.get("coach_notes", [])
+    result["deferred_tasks"] = localized.get("deferred_tasks", [])
+    result["selected_task_ids"] = localized.get("selected_task_ids", [])
+    result["deferred_task_ids"] = localized.get("deferred_task_ids", [])
+    return result
+
+
+# ── persisted views ─────────────────────────────────────────
+#
+# A plan stores its rendered views per language and capacity, together with
+# a hash of the task inputs they were derived from. Reading a plan fetches
+# the row and the current hash in one indexed query; only a missing view or
+# a changed hash re-runs the rule layer, for the requested view alone.
+
+
+def _inputs_version_columns(user_id: int):
+    active = select(func.count(Task.id)).where(
+        Task.user_id == user_id, Task.status == TaskStatus.ACTIVE.value
+    ).scalar_subquery()
+    # Every task write bumps updated_at, including ones that leave the active set.
+    latest = select(func.max(Task.updated_at)).where(Task.user_id == user_id).scalar_subquery()
+    return active, latest
+
+
+def _inputs_version(active_count: int, latest_update: Any) -> str:
+    return hashlib.sha1(f"{active_count}|{latest_update or ''}".encode("utf-8")).hexdigest()
+
+
+def _current_inputs_version(db, user_id: int) -> str:
+    return _inputs_version(*db.query(*_inputs_version_columns(user_id)).one())
+
+
+def _load_plan(db, user_id: int, target_date: str) -> Tuple[Optional[DailyPlan], Optional[str]]:
+    row = (
+        db.query(DailyPlan, *_inputs_version_columns(user_id))
+        .filter(DailyPlan.date == plan_storage_key(user_id, target_date))
+        .first()
+    )
+    if row is None:
+        return None, None
+    plan, active_count, latest_update = row
+    return plan, _inputs_version(active_count, latest_update)
+
+
+def _view_key(lang: str, capacity_units: Optional[int]) -> str:
+    return f"{lang}:{normalize_capacity_units(capacity_units)}"
+
+
+def _stored_views(plan: DailyPlan, version: Optional[str]) -> Dict[str, Any]:
+    if not version or plan.input_version != version:
+        return {}
+    try:
+        views = json.loads(plan.artifacts or "{}")
+    except ValueError:
+        return {}
+    return views if isinstance(views, dict) else {}
+
+
+def _set_stored_view(plan: DailyPlan, version: str, key: str, view: Dict[str, Any]) -> None:
+    views = _stored_views(plan, version)
+    views[key] = view
+    plan.input_version = version
+    plan.artifacts = json.dumps(views, ensure_ascii=False)
+
+
+def _store_plan_view(db, plan_id: int, version: str, key: str, view: Dict[str, Any]) -> None:
+    plan = db.get(DailyPlan, plan_id)
+    if plan is not None:
+        _set_stored_view(plan, version, key, view)
+
+
+async def _persist_view(pending: Optional[Tuple[int, str, str, Dict[str, Any]]]) -> None:
+    if pending is not None:
+        async with get_async_db() as db:
+            await db.run_sync(_store_plan_view, *pending)
+
+
+def _plan_result(db, plan: DailyPlan, version: str, user_id: int, lang: str, capacity_units: Optional[int]):
+    """The stored view of ``plan``, or a fresh one plus the arguments to store it."""
+
+    key = _view_key(lang, capacity_units)
+    view = _stored_views(plan, version).get(key)
+    if view is not None:
+        return view, None
+    view = _existing_plan_result(db, plan, user_id, lang, capacity_units)
+    return view, (plan.id, version, key, view)
+
+
+def _plan_request_start(db, request: Request, target_date: str, lang: str, capacity_units: Optional[int], replace: bool):
+    user = require_current_user(db, request)
+    if replace:
+        return user.id, None, None
+    existing, version = _load_plan(db, user.id, target_date)
+    if existing is None:
+        return user.id, None, None
+    return (user.id, *_plan_result(db, existing, version, user.id, lang, capacity_units))
+
+
+def _plan_inputs(db, user_id: int, target_date: str) -> PlanSnapshot:
+    snapshot = snapshot_plan_inputs(db, user_id, target_date)
+    if not snapshot.tasks:
+        raise HTTPException(status_code=400, detail={"error_code": "NO_ACTIVE_TASKS", "message": "No active tasks to plan"})
+    return snapshot
 
-    with get_db() as db:
-        user = require_current_user(db, request)
-        storage_key = plan_storage_key(user.id, target_date)
-        existing = db.query(DailyPlan).filter(DailyPlan.date == storage_key).first()
 
-        # If force=True, delete existing plan and regenerate from scratch
-        if existing and payload.force:
-            db.delete(existing)
-            db.flush()
-            existing = None
+def _compute_plan(snapshot: PlanSnapshot, lang: str, capacity_units: Optional[int], maintain: bool):
+    if maintain:
+        maintenance = maintain_plan(snapshot, capacity_units)
+        if maintenance is not None:
+            return maintenance
+    return generate_daily_plan(snapshot.tasks, snapshot.target_date, lang=lang, capacity_units=capacity_units)
 
-        if existing:
+
+def _write_generated_plan(db, snapshot: PlanSnapshot, plan_result, replace: bool, lang: str, capacity_units: Optional[int]):
+    if isinstance(plan_result, PlanMaintenance):
+        daily_plan = apply_plan_maintenance(db, snapshot, plan_result, default_reason="Added to the plan without a full replan.")
+        result = _existing_plan_result(db, daily_plan, snapshot.user_id, lang, capacity_units)
+        _set_stored_view(daily_plan, _current_inputs_version(db, snapshot.user_id), _view_key(lang, capacity_units), result)
+        return result
+
+    if not replace:
+        existing = db.query(DailyPlan).filter(DailyPlan.date == snapshot.storage_key).first()
+        if existing and existing.id != snapshot.existing_plan_id:
+            # Another request created today's plan while this one was waiting
+            # on the model; without force that plan stands.
             result = existing.to_dict(include_tasks=True)
             result["tasks"] = _visible_plan_tasks(existing)
-            active_tasks = db.query(Task).filter(Task.user_id == user.id, Task.status == TaskStatus.ACTIVE.value).all()
-            localized = regenerate_reasoning(
-                existing, active_tasks, lang, capacity_units=capacity_units
-            )
-            result["reasoning"] = localized["reasoning"]
-            result["overload_warning"] = localized["overload_warning"]
-            result["deletion_suggestions"] = localized.get("deletion_suggestions", [])
-            result["capacity_summary"] = localized.get("capacity_summary", {})
-            result["decision_summary"] = localized.get("decision_summary", {})
-            result["coach_notes"] = localized.get("coach_notes", [])
-            result["deferred_tasks"] = localized.get("deferred_tasks", [])
-            result["selected_task_ids"] = localized.get("selected_task_ids", [])
-            result["deferred_task_ids"] = localized.get("deferred_task_ids", [])
             return result
 
-        active_tasks = (
-            db.query(Task)
-            .filter(Task.user_id == user.id, Task.status == TaskStatus.ACTIVE.value)
-            .order_by(Task.priority.desc(), Task.created_at)
-            .all()
-        )
-        if not active_tasks:
-            raise HTTPException(status_code=400, detail={"error_code": "NO_ACTIVE_TASKS", "message": "No active tasks to plan"})
+    daily_plan = store_plan(db, snapshot, plan_result, category_reason="Category inferred by planning engine.")
+    result = daily_plan.to_dict(include_tasks=True)
+    result["tasks"] = _visible_plan_tasks(daily_plan)
+    result["deletion_suggestions"] = plan_result.get("deletion_suggestions", [])
+    result["deferred_tasks"] = plan_result.get("deferred_tasks", [])
+    result["capacity_summary"] = plan_result.get("capacity_summary", {})
+    result["decision_summary"] = plan_result.get("decision_summary", {})
+    result["coach_notes"] = plan_result.get("coach_notes", [])
+    result["selected_task_ids"] = plan_result.get("selected_task_ids", [])
+    result["deferred_task_ids"] = plan_result.get("deferred_task_ids", [])
+    _set_stored_view(daily_plan, _current_inputs_version(db, snapshot.user_id), _view_key(lang, capacity_units), result)
+    return result
+
+
+@router.post("/generate", status_code=201)
+async def generate_plan(payload: PlanGenerateRequest, request: Request):
+    target_date = payload.date or local_today_iso()
+    lang = payload.lang
+    capacity_units = payload.capacity_units
+    maintain = payload.maintain and not payload.force
+    replace = payload.force or maintain
 
-        plan_result = generate_daily_plan(
-            active_tasks, target_date, lang=lang, capacity_units=capacity_units
+    async with get_async_read_db() as db:
+        user_id, existing_result, pending = await db.run_sync(
+            _plan_request_start, request, target_date, lang, capacity_units, replace
         )
-        category_by_id = {item["task_id"]: item.get("category", "unclassified") for item in plan_result.get("classified_tasks", [])}
-        for task in active_tasks:
-            if task.id in category_by_id:
-                task.category = category_by_id[task.id]
-                task.source = "ai"
-                task.decision_reason = "Category inferred by planning engine."
-
-        daily_plan = DailyPlan(
-            date=storage_key,
-            reasoning=plan_result["reasoning"],
-            overload_warning=plan_result.get("overload_warning", ""),
-            max_tasks=plan_result.get("max_tasks", 4),
+    if existing_result is not None:
+        await _persist_view(pending)
+        return existing_result
+
+    try:
+        return await read_compute_write(
+            lambda db: _plan_inputs(db, user_id, target_date),
+            lambda snapshot: _compute_plan(snapshot, lang, capacity_units, maintain),
+            lambda db, snapshot, plan_result: _write_generated_plan(
+                db, snapshot, plan_result, replace, lang, capacity_units
+            ),
         )
-        db.add(daily_plan)
-        try:
-            db.flush()
-        except IntegrityError:
-            db.rollback()
-            existing = db.query(DailyPlan).filter(DailyPlan.date == storage_key).first()
-            if existing:
-                result = existing.to_dict(include_tasks=True)
-                result["tasks"] = _visible_plan_tasks(existing)
-                return result
-            raise HTTPException(status_code=409, detail={"error_code": "PLAN_CONFLICT", "message": "Plan was created concurrently"})
-
-        for i, selected in enumerate(plan_result["selected_tasks"]):
-            db.add(PlanTask(
-                plan_id=daily_plan.id,
-                task_id=selected["task_id"],
-                status=PlanTaskStatus.PLANNED.value,
-                order=i,
-            ))
-            db.add(TaskHistory(
-                task_id=selected["task_id"],
-                date=target_date,
-                action=HistoryAction.PLANNED.value,
-                ai_reasoning=selected.get("reason", ""),
-            ))
-        db.flush()
-
-        daily_plan = db.get(DailyPlan, daily_plan.id)
-        result = daily_plan.to_dict(include_tasks=True)
-        result["tasks"] = _visible_plan_tasks(daily_plan)
-        result["deletion_suggestions"] = plan_result.get("deletion_suggestions", [])
-        result["deferred_tasks"] = plan_result.get("deferred_tasks", [])
-        result["capacity_summary"] = plan_result.get("capacity_summary", {})
-        result["decision_summary"] = plan_result.get("decision_summary", {})
-        result["coach_notes"] = plan_result.get("coach_notes", [])
-        result["selected_task_ids"] = plan_result.get("selected_task_ids", [])
-        result["deferred_task_ids"] = plan_result.get("deferred_task_ids", [])
-        return result
+    except StaleSnapshot:
+        raise HTTPException(status_code=409, detail={"error_code": "PLAN_CONFLICT", "message": "Tasks changed while the plan was being generated"})
+
+
+def _plan_view(db, request: Request, plan_date: str, lang: str, capacity_units: Optional[int]):
+    user = require_current_user(db, request)
+    plan, version = _load_plan(db, user.id, plan_date)
+    if not plan:
+        raise HTTPException(status_code=404, detail={"error_code": "PLAN_NOT_FOUND", "message": "No plan found for this date"})
+    return _plan_result(db, plan, version, user.id, lang, capacity_units)
+
+
+def _parse_plan_date(value: Optional[str]) -> date:
+    normalized = normalize_date_string(value) if value else local_today_iso()
+    try:
+        return date.fromisoformat(normalized or "")
+    except ValueError:
+        raise HTTPException(status_code=400, detail={"error_code": "INVALID_DATE", "message": "Dates must be YYYY-MM-DD"})
+
+
+def _horizon(db, request: Request, start: date, days: int, capacity_units: Optional[int]):
+    user = require_current_user(db, request)
+    end = start + timedelta(days=max(1, min(MAX_HORIZON_DAYS, days)) - 1)
+    completed = completed_between(db, user.id, start.isoformat(), end.isoformat())
+    version = _current_inputs_version(db, user.id)
+    # Occurrence completions leave the tasks untouched, so they key the week too.
+    done = hashlib.sha1(json.dumps(sorted(completed)).encode("utf-8")).hexdigest()
+    key = f"{user.id}:{start.isoformat()}:{days}:{normalize_capacity_units(capacity_units)}:{version}:{done}"
+    horizon = _horizon_cache.get(key)
+    if horizon is not None:
+        return horizon
+
+    tasks = {
+        task.id: task.to_dict()
+        for task in db.query(Task).filter(Task.user_id == user.id, Task.status == TaskStatus.ACTIVE.value).all()
+    }
+    occurrences = occurrence_index(user.id, list(tasks.values()), start)
+    horizon = plan_horizon(list(tasks.values()), start, days, capacity_units, occurrences=occurrences, completed=completed)
+    for day in horizon["days"]:
+        day["tasks"] = [tasks[task_id] for task_id in day["task_ids"]]
+    for item in horizon["unscheduled"]:
+        item["task"] = tasks[item["task_id"]]
+    return _horizon_cache.set(key, horizon)
+
+
+@router.get("/week")
+async def get_week_plan(
+    request: Request,
+    start: Optional[str] = Query(default=None),
+    days: int = Query(default=DEFAULT_HORIZON_DAYS, ge=1, le=MAX_HORIZON_DAYS),
+    capacity_units: Optional[int] = Query(default=None, ge=1, le=24),
+):
+    """Schedule the active backlog across ``days`` days (rule-based, cached)."""
+
+    start_date = _parse_plan_date(start)
+    async with get_async_read_db() as db:
+        return await db.run_sync(_horizon, request, start_date, days, capacity_units)
+
+
+@router.get("/week/{plan_date}")
+async def get_week_plan_day(
+    plan_date: str,
+    request: Request,
+    days: int = Query(default=DEFAULT_HORIZON_DAYS, ge=1, le=MAX_HORIZON_DAYS),
+    capacity_units: Optional[int] = Query(default=None, ge=1, le=24),
+):
+    """One day of the horizon that starts today."""
+
+    day = _parse_plan_date(plan_date)
+    start_date = _parse_plan_date(None)
+    offset = (day - start_date).days
+    if not 0 <= offset < days:
+        raise HTTPException(status_code=400, detail={"error_code": "DATE_OUTSIDE_HORIZON", "message": "Date is outside the planning horizon"})
+    async with get_async_read_db() as db:
+        horizon = await db.run_sync(_horizon, request, start_date, days, capacity_units)
+    return horizon["days"][offset]
 
 
 @router.get("/today")
-def get_today_plan(
+async def get_today_plan(
     request: Request,
     lang: str = Query(default="en"),
     capacity_units: Optional[int] = Query(default=None),
 ):
     today = local_today_iso()
-    return get_plan(today, request, lang, capacity_units)
+    return await get_plan(today, request, lang, capacity_units)
 
 
 @router.get("/{plan_date}")
-def get_plan(
+async def get_plan(
     plan_date: str,
     request: Request,
     lang: str = Query(default="en"),
     capacity_units: Optional[int] = Query(default=None),
 ):
-    with get_db() as db:
-        user = require_current_user(db, request)
-        storage_key = plan_storage_key(user.id, plan_date)
-        plan = db.query(DailyPlan).filter(DailyPlan.date == storage_key).first()
-        if not plan:
-            raise HTTPException(status_code=404, detail={"error_code": "PLAN_NOT_FOUND", "message": "No plan found for this date"})
-
-        result = plan.to_dict(include_tasks=True)
-        result["tasks"] = _visible_plan_tasks(plan)
-        active_tasks = db.query(Task).filter(Task.user_id == user.id, Task.status == TaskStatus.ACTIVE.value).all()
-        localized = regenerate_reasoning(
-            plan, active_tasks, lang, capacity_units=capacity_units
-        )
-        result["reasoning"] = localized["reasoning"]
-        result["overload_warning"] = localized["overload_warning"]
-        result["deletion_suggestions"] = localized.get("deletion_suggestions", [])
-        result["capacity_summary"] = localized.get("capacity_summary", {})
-        result["decision_summary"] = localized.get("decision_summary", {})
-        result["coach_notes"] = localized.get("coach_notes", [])
-        result["deferred_tasks"] = localized.get("deferred_tasks", [])
-        result["selected_task_ids"] = localized.get("selected_task_ids", [])
-        result["deferred_task_ids"] = localized.get("deferred_task_ids", [])
-        return result
+    async with get_async_read_db() as db:
+        result, pending = await db.run_sync(_plan_view, request, plan_date, lang, capacity_units)
+    await _persist_view(pending)
+    return result
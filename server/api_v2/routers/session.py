@@ -2,33 +2,36 @@
 
 from __future__ import annotations
 
-from datetime import date
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
 import secrets
-from typing import Any, Dict, Iterable, Tuple
+from typing import Any, Dict, Iterable, List, Tuple
 
 from fastapi import APIRouter, HTTPException, Request
 
 from api_v2.schemas import OnboardingCompleteRequest, SessionLoginRequest
+from api_v2.two_phase import PlanSnapshot, StaleSnapshot, TaskSnapshot, read_compute_write, snapshot_plan_inputs, store_plan
 from api_v2.user_context import (
     get_active_session,
     get_session_state,
     onboarding_key,
-    plan_storage_key,
     read_setting,
     require_current_user,
     write_setting,
 )
+from core.incremental_planner import forget_plan_states
 from core.planner import generate_daily_plan
 from core.task_kind import has_explicit_weekly_recurrence, infer_recurrence_weekday, infer_task_kind
-from database.db import get_db
+from core.time import datetime_to_iso, normalize_date_string
+from database.db import get_db, get_read_db
 from database.models import (
     DailyPlan,
     HistoryAction,
     PlanTask,
-    PlanTaskStatus,
     Task,
     TaskCategory,
     TaskHistory,
+    TaskOccurrence,
     TaskStatus,
     User,
     UserSession,
@@ -174,7 +177,7 @@ def _session_response(session: Dict[str, Any], onboarding: Dict[str, Any]) -> Di
 
 @router.get("/session")
 def get_session(request: Request):
-    with get_db() as db:
+    with get_read_db() as db:
         session = get_session_state(db, request)
         onboarding = {"completed": False, "daily_capacity": 6, "profile_summary": ""}
         if session.get("user_id"):
@@ -254,7 +257,7 @@ def logout(request: Request):
 
 @router.get("/onboarding")
 def get_onboarding_state(request: Request):
-    with get_db() as db:
+    with get_read_db() as db:
         user = require_current_user(db, request)
         onboarding = read_setting(
             db,
@@ -264,132 +267,211 @@ def get_onboarding_state(request: Request):
         return onboarding
 
 
-@router.post("/onboarding/complete", status_code=201)
-def complete_onboarding(payload: OnboardingCompleteRequest, request: Request):
-    from core.time import local_today_iso
-    target_date = local_today_iso()
+@dataclass(frozen=True)
+class OnboardingImport:
+    """The tasks an onboarding request imports, before any of them is written.
+
+    ``tasks`` are the specs shaped like ``Task.to_dict`` under provisional ids
+    (1, 2, ... in import order) so the planner can run ahead of the import;
+    the write phase maps its result onto the real task ids.
+    """
+
+    user_id: int
+    session: Dict[str, Any]
+    specs: Tuple[Dict[str, Any], ...]
+    tasks: Tuple[TaskSnapshot, ...]
+
+
+def _provisional_task(user_id: int, task_id: int, spec: Dict[str, Any], created_at: datetime) -> TaskSnapshot:
+    fields = {
+        "id": task_id,
+        "user_id": user_id,
+        "title": spec["title"],
+        "description": spec["description"],
+        "category": spec["category"],
+        "status": TaskStatus.ACTIVE.value,
+        "priority": spec["priority"],
+        "sort_order": 0,
+        "deferral_count": 0,
+        "completion_count": 0,
+        "source": "manual",
+        "task_kind": spec.get("task_kind", "temporary"),
+        "recurrence_weekday": spec.get("recurrence_weekday"),
+        "decision_reason": "Imported during onboarding.",
+        "completed_at": None,
+        "deleted_at": None,
+        "due_date": normalize_date_string(spec["due_date"]),
+        "created_at": datetime_to_iso(created_at),
+        "updated_at": datetime_to_iso(created_at),
+    }
+    return TaskSnapshot(id=task_id, updated_at=created_at, fields=fields)
 
-    with get_db() as db:
-        user = require_current_user(db, request)
-        session = get_session_state(db, request)
 
-        if payload.reset_existing:
-            user_tasks = db.query(Task).filter(Task.user_id == user.id).all()
-            user_task_ids = [task.id for task in user_tasks]
-            user_plans = db.query(DailyPlan).filter(DailyPlan.date.like(f"{user.id}:%")).all()
-            user_plan_ids = [plan.id for plan in user_plans]
-            if user_task_ids:
-                db.query(TaskHistory).filter(TaskHistory.task_id.in_(user_task_ids)).delete(synchronize_session=False)
-            if user_plan_ids:
-                db.query(PlanTask).filter(PlanTask.plan_id.in_(user_plan_ids)).delete(synchronize_session=False)
-                db.query(DailyPlan).filter(DailyPlan.id.in_(user_plan_ids)).delete(synchronize_session=False)
-            db.query(Task).filter(Task.user_id == user.id).delete(synchronize_session=False)
-            db.flush()
+def _read_onboarding_import(db, request: Request, payload: OnboardingCompleteRequest) -> OnboardingImport:
+    user = require_current_user(db, request)
+    session = get_session_state(db, request)
+    specs = tuple(spec for spec in _build_task_specs(payload) if spec["title"])
+    if not specs:
+        raise HTTPException(
+            status_code=400,
+            detail={"error_code": "EMPTY_ONBOARDING", "message": "Add at least one task or commitment"},
+        )
+    now = datetime.now(timezone.utc)
+    tasks = [
+        _provisional_task(user.id, index + 1, spec, now + timedelta(microseconds=index))
+        for index, spec in enumerate(specs)
+    ]
+    # Same order as ``active_tasks_for_planning``: priority first, then import order.
+    tasks.sort(key=lambda task: -task.fields["priority"])
+    return OnboardingImport(user_id=user.id, session=session, specs=specs, tasks=tuple(tasks))
+
+
+def _import_onboarding_tasks(db, onboarding: OnboardingImport, payload: OnboardingCompleteRequest, target_date: str) -> List[Task]:
+    user_id = onboarding.user_id
+    if payload.reset_existing:
+        # Ids only: full objects would stay in the identity map after the bulk
+        # deletes below and collide with new rows that reuse their ids.
+        user_task_ids = [task_id for task_id, in db.query(Task.id).filter(Task.user_id == user_id).all()]
+        user_plan_ids = [
+            plan_id for plan_id, in db.query(DailyPlan.id).filter(DailyPlan.date.like(f"{user_id}:%")).all()
+        ]
+        if user_task_ids:
+            db.query(TaskHistory).filter(TaskHistory.task_id.in_(user_task_ids)).delete(synchronize_session=False)
+            db.query(TaskOccurrence).filter(TaskOccurrence.task_id.in_(user_task_ids)).delete(synchronize_session=False)
+        if user_plan_ids:
+            db.query(PlanTask).filter(PlanTask.plan_id.in_(user_plan_ids)).delete(synchronize_session=False)
+            db.query(DailyPlan).filter(DailyPlan.id.in_(user_plan_ids)).delete(synchronize_session=False)
+            forget_plan_states(user_plan_ids)
+        db.query(Task).filter(Task.user_id == user_id).delete(synchronize_session=False)
+        db.flush()
 
-        created_tasks = []
-        for spec in _build_task_specs(payload):
-            if not spec["title"]:
-                continue
-            task = Task(
-                user_id=user.id,
-                title=spec["title"],
-                description=spec["description"],
-                priority=spec["priority"],
-                category=spec["category"],
-                due_date=spec["due_date"],
-                task_kind=spec.get("task_kind", "temporary"),
-                recurrence_weekday=spec.get("recurrence_weekday"),
-                status=TaskStatus.ACTIVE.value,
-                source="manual",
-                decision_reason="Imported during onboarding.",
-            )
-            db.add(task)
-            db.flush()
-            db.add(
-                TaskHistory(
-                    task_id=task.id,
-                    date=target_date,
-                    action=HistoryAction.CREATED.value,
-                    ai_reasoning=_localized_history_reason("onboarding_import", payload.lang),
-                )
+    created = []
+    for spec in onboarding.specs:
+        task = Task(
+            user_id=user_id,
+            title=spec["title"],
+            description=spec["description"],
+            priority=spec["priority"],
+            category=spec["category"],
+            due_date=spec["due_date"],
+            task_kind=spec.get("task_kind", "temporary"),
+            recurrence_weekday=spec.get("recurrence_weekday"),
+            status=TaskStatus.ACTIVE.value,
+            source="manual",
+            decision_reason="Imported during onboarding.",
+        )
+        db.add(task)
+        db.flush()
+        db.add(
+            TaskHistory(
+                task_id=task.id,
+                date=target_date,
+                action=HistoryAction.CREATED.value,
+                ai_reasoning=_localized_history_reason("onboarding_import", payload.lang),
             )
-            created_tasks.append(task)
+        )
+        created.append(task)
+    return created
+
+
+def _remap_plan_result(plan_result: Dict[str, Any], task_ids: Dict[int, int], tasks: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """``plan_result`` with provisional task ids replaced by ``task_ids[provisional]``."""
+
+    def real(task_id) -> int:
+        return task_ids[int(task_id)]
+
+    remapped = dict(plan_result)
+    for key in ("selected_tasks", "classified_tasks"):
+        remapped[key] = [{**item, "task_id": real(item["task_id"])} for item in plan_result.get(key, [])]
+    for key in ("selected_task_ids", "deferred_task_ids"):
+        remapped[key] = [real(task_id) for task_id in plan_result.get(key, [])]
+    remapped["deferred_tasks"] = [tasks[real(task["id"])] for task in plan_result.get("deferred_tasks", [])]
+    remapped["deletion_suggestions"] = [
+        {**item, **tasks[real(item["id"])]} for item in plan_result.get("deletion_suggestions", [])
+    ]
+    return remapped
+
+
+def _write_onboarding_plan(
+    db,
+    snapshot: PlanSnapshot,
+    plan_result: Dict[str, Any],
+    payload: OnboardingCompleteRequest,
+    session: Dict[str, Any],
+    created_count: int,
+) -> Dict[str, Any]:
+    daily_plan = store_plan(db, snapshot, plan_result, category_reason="Category inferred during onboarding.")
+
+    onboarding = {
+        "completed": True,
+        "daily_capacity": payload.daily_capacity,
+        "profile_summary": (
+            f'{session.get("display_name", "User")} imported {created_count} task(s) '
+            "during onboarding."
+        ),
+        "brain_dump": payload.brain_dump,
+        "commitments": payload.commitments,
+        "goals": payload.goals,
+    }
+    write_setting(db, onboarding_key(snapshot.user_id), onboarding)
+    db.flush()
+
+    result = daily_plan.to_dict(include_tasks=True)
+    result["deletion_suggestions"] = plan_result.get("deletion_suggestions", [])
+    result["deferred_tasks"] = plan_result.get("deferred_tasks", [])
+    result["capacity_summary"] = plan_result.get("capacity_summary", {})
+    result["decision_summary"] = plan_result.get("decision_summary", {})
+    result["coach_notes"] = plan_result.get("coach_notes", [])
+    result["selected_task_ids"] = plan_result.get("selected_task_ids", [])
+    result["deferred_task_ids"] = plan_result.get("deferred_task_ids", [])
+    return {
+        "session": _session_response(session, onboarding),
+        "created_task_count": created_count,
+        "plan": result,
+    }
 
-        if not created_tasks:
-            raise HTTPException(
-                status_code=400,
-                detail={"error_code": "EMPTY_ONBOARDING", "message": "Add at least one task or commitment"},
-            )
 
-        plan_result = generate_daily_plan(
-            created_tasks,
-            target_date=target_date,
-            lang=payload.lang,
-            capacity_units=payload.daily_capacity,
-        )
+def _write_onboarding(
+    db,
+    onboarding: OnboardingImport,
+    plan_result: Dict[str, Any],
+    payload: OnboardingCompleteRequest,
+    target_date: str,
+) -> Dict[str, Any]:
+    """Import the tasks, store their plan and mark onboarding complete, all in one transaction."""
 
-        category_by_id = {
-            item["task_id"]: item.get("category", TaskCategory.UNCLASSIFIED.value)
-            for item in plan_result.get("classified_tasks", [])
-        }
-        for task in created_tasks:
-            if task.id in category_by_id:
-                task.category = category_by_id[task.id]
-                task.source = "ai"
-                task.decision_reason = "Category inferred during onboarding."
-
-        daily_plan = DailyPlan(
-            date=plan_storage_key(user.id, target_date),
-            reasoning=plan_result.get("reasoning", ""),
-            overload_warning=plan_result.get("overload_warning", ""),
-            max_tasks=plan_result.get("max_tasks", 4),
-        )
-        db.add(daily_plan)
-        db.flush()
+    created = _import_onboarding_tasks(db, onboarding, payload, target_date)
+    db.flush()
+    for task in created:
+        # Read the stored timestamps back, as every later snapshot will.
+        db.expire(task)
+    task_ids = {index + 1: task.id for index, task in enumerate(created)}
+    plan_result = _remap_plan_result(plan_result, task_ids, {task.id: task.to_dict() for task in created})
+    snapshot = snapshot_plan_inputs(db, onboarding.user_id, target_date, task_ids=task_ids.values())
+    return _write_onboarding_plan(db, snapshot, plan_result, payload, onboarding.session, len(created))
 
-        for index, selected in enumerate(plan_result.get("selected_tasks", [])):
-            db.add(
-                PlanTask(
-                    plan_id=daily_plan.id,
-                    task_id=selected["task_id"],
-                    status=PlanTaskStatus.PLANNED.value,
-                    order=index,
-                )
-            )
-            db.add(
-                TaskHistory(
-                    task_id=selected["task_id"],
-                    date=target_date,
-                    action=HistoryAction.PLANNED.value,
-                    ai_reasoning=selected.get("reason", ""),
-                )
-            )
 
-        onboarding = {
-            "completed": True,
-            "daily_capacity": payload.daily_capacity,
-            "profile_summary": (
-                f'{session.get("display_name", "User")} imported {len(created_tasks)} task(s) '
-                "during onboarding."
-            ),
-            "brain_dump": payload.brain_dump,
-            "commitments": payload.commitments,
-            "goals": payload.goals,
-        }
-        write_setting(db, onboarding_key(user.id), onboarding)
-        db.flush()
+@router.post("/onboarding/complete", status_code=201)
+async def complete_onboarding(payload: OnboardingCompleteRequest, request: Request):
+    from core.time import local_today_iso
+    target_date = local_today_iso()
 
-        persisted_plan = db.get(DailyPlan, daily_plan.id)
-        result = persisted_plan.to_dict(include_tasks=True)
-        result["deletion_suggestions"] = plan_result.get("deletion_suggestions", [])
-        result["deferred_tasks"] = plan_result.get("deferred_tasks", [])
-        result["capacity_summary"] = plan_result.get("capacity_summary", {})
-        result["decision_summary"] = plan_result.get("decision_summary", {})
-        result["coach_notes"] = plan_result.get("coach_notes", [])
-        result["selected_task_ids"] = plan_result.get("selected_task_ids", [])
-        result["deferred_task_ids"] = plan_result.get("deferred_task_ids", [])
-        return {
-            "session": _session_response(session, onboarding),
-            "created_task_count": len(created_tasks),
-            "plan": result,
-        }
+    # The planner runs over the parsed tasks before anything is written, and
+    # the reset, import, plan and onboarding flag commit together: a failed
+    # plan leaves the workspace as it was, so the request can simply be retried.
+    try:
+        return await read_compute_write(
+            lambda db: _read_onboarding_import(db, request, payload),
+            lambda onboarding: generate_daily_plan(
+                onboarding.tasks,
+                target_date=target_date,
+                lang=payload.lang,
+                capacity_units=payload.daily_capacity,
+            ),
+            lambda db, onboarding, plan_result: _write_onboarding(db, onboarding, plan_result, payload, target_date),
+        )
+    except StaleSnapshot:
+        raise HTTPException(
+            status_code=409,
+            detail={"error_code": "PLAN_CONFLICT", "message": "Tasks changed while the plan was being generated"},
+        )
@@ -8,6 +8,7 @@ from fastapi import APIRouter, Request
 from pydantic import BaseModel
 
 from api_v2.user_context import require_current_user
+from core.incremental_planner import forget_plan_states
 from core.llm import get_runtime_config, set_runtime_config
 from core.showcase import load_protected_showcase_usernames
 from database.db import get_db
@@ -20,6 +21,7 @@ from database.models import (
     PlanTask,
     Task,
     TaskHistory,
+    TaskOccurrence,
     User,
     UserSession,
 )
@@ -132,6 +134,7 @@ def developer_reset(request: Request):
             ]
             if task_ids_to_delete:
                 db.query(TaskHistory).filter(TaskHistory.task_id.in_(task_ids_to_delete)).delete(synchronize_session=False)
+                db.query(TaskOccurrence).filter(TaskOccurrence.task_id.in_(task_ids_to_delete)).delete(synchronize_session=False)
                 db.query(Task).filter(Task.id.in_(task_ids_to_delete)).delete(synchronize_session=False)
 
             plan_ids_to_delete = [
@@ -142,6 +145,7 @@ def developer_reset(request: Request):
             if plan_ids_to_delete:
                 db.query(PlanTask).filter(PlanTask.plan_id.in_(plan_ids_to_delete)).delete(synchronize_session=False)
                 db.query(DailyPlan).filter(DailyPlan.id.in_(plan_ids_to_delete)).delete(synchronize_session=False)
+                forget_plan_states(plan_ids_to_delete)
 
             db.query(User).filter(~User.id.in_(protected_user_ids)).delete(synchronize_session=False)
 
@@ -151,6 +155,7 @@ def developer_reset(request: Request):
                 | (AppSetting.key.like("assistant_profile:%"))
                 | (AppSetting.key.like("assistant_history:%"))
                 | (AppSetting.key.like("assistant_pending:%"))
+                | (AppSetting.key.like("review_insight:%"))
             ).all():
                 owner_id = _setting_user_id(row.key)
                 if owner_id is None or owner_id not in protected_user_ids:
@@ -164,8 +169,10 @@ def developer_reset(request: Request):
             db.query(DailyFortune).delete()
             db.query(FocusSession).delete()
             db.query(TaskHistory).delete()
+            db.query(TaskOccurrence).delete()
             db.query(PlanTask).delete()
             db.query(Task).delete()
+            forget_plan_states(plan_id for plan_id, in db.query(DailyPlan.id).all())
             db.query(DailyPlan).delete()
             db.query(User).delete()
             db.query(AppSetting).filter(
@@ -173,6 +180,7 @@ def developer_reset(request: Request):
                 | (AppSetting.key.like("assistant_profile:%"))
                 | (AppSetting.key.like("assistant_history:%"))
                 | (AppSetting.key.like("assistant_pending:%"))
+                | (AppSetting.key.like("review_insight:%"))
             ).delete(synchronize_session=False)
             message = "Developer reset completed"
         db.flush()
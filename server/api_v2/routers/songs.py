@@ -2,88 +2,176 @@
 
 from __future__ import annotations
 
-from concurrent.futures import ThreadPoolExecutor
 import hashlib
 import logging
-import threading
+import os
 import time
 
+import anyio.to_thread
 from fastapi import APIRouter, Request
 
 from api_v2.user_context import plan_storage_key, require_current_user
+from core.cache import get_cache
+from core.cache.single_flight import SingleFlight
 from core.llm import get_llm_service
-from core.spotify import enrich_song
+from core.offload import run_upstream
+from core.spotify import enrich_songs
 from core.time import local_today_iso
-from database.db import get_db
+from core.track_catalog import load_tracks, song_track_key
+from database.db import get_async_read_db
 from database.models import DailyPlan, MoodEntry, PlanTaskStatus, Task, TaskStatus
 
 router = APIRouter(tags=["songs"])
 logger = logging.getLogger(__name__)
 _RECOMMENDATION_CACHE_TTL_SECONDS = 60 * 10
-_recommendation_cache: dict[str, tuple[float, dict]] = {}
-_recommendation_cache_lock = threading.Lock()
+# Response cache key granularity: coarse | standard | fine. Coarser keys hit
+# more often (fewer LLM calls); finer keys react to smaller task changes.
+_CACHE_KEY_GRANULARITY = (os.getenv("SONG_CACHE_KEY_GRANULARITY") or "standard").strip().lower()
+if _CACHE_KEY_GRANULARITY not in {"coarse", "standard", "fine"}:
+    _CACHE_KEY_GRANULARITY = "standard"
+_recommendation_cache = get_cache(
+    "songs.recommendations", max_entries=2048, ttl_seconds=_RECOMMENDATION_CACHE_TTL_SECONDS
+)
 _RECENT_SONG_HISTORY_TTL_SECONDS = 60 * 60 * 3
-_recent_song_history: dict[int, tuple[float, list[dict[str, str]]]] = {}
-_recent_song_history_lock = threading.Lock()
+_recent_song_history = get_cache(
+    "songs.recent_history", max_entries=4096, ttl_seconds=_RECENT_SONG_HISTORY_TTL_SECONDS
+)
+# Pre-enriched candidate pools per (user, lang, mood level, strategy). Requests
+# pick from the pool; the LLM only runs in the background once a pool runs low.
+_SONG_POOL_TTL_SECONDS = 60 * 60 * 24
+_SONG_POOL_MAX_SONGS = 40
+_SONG_POOL_LOW_WATERMARK = 8
+_SONG_POOL_MIN_REFILL_INTERVAL_SECONDS = 60
+_SONG_POOL_REFILL_DEADLINE_SECONDS = 15.0
+# A cold pool blocks the request, so it only waits this long for artwork;
+# songs that miss it are filled in from the track catalog on later picks.
+_SONG_POOL_COLD_DEADLINE_SECONDS = 2.5
+_song_pools = get_cache("songs.pools", max_entries=4096, ttl_seconds=_SONG_POOL_TTL_SECONDS)
+_song_pool_refills = SingleFlight()
+
+
+def _song_pool_key(user_id: int, lang: str, mood_level: int, strategy: str) -> str:
+    return f"{user_id}:{lang}:{mood_level}:{strategy}"
+
+
+def _unseen_pool_songs(user_id: int, songs: list[dict]) -> int:
+    recent_signatures = {item.get("signature", "") for item in _get_recent_song_history(user_id)}
+    return sum(1 for song in songs if _song_signature(song) not in recent_signatures)
+
+
+def _refill_song_pool(
+    pool_key: str,
+    user_id: int,
+    lang: str,
+    context: dict,
+    deadline_seconds: float | None = _SONG_POOL_REFILL_DEADLINE_SECONDS,
+) -> dict:
+    """Generate and enrich one batch of candidates and merge it into the pool.
+
+    Newly generated songs go first; older entries fill the rest up to
+    ``_SONG_POOL_MAX_SONGS`` so the pool keeps some variety between refills.
+    """
+
+    existing = _song_pools.get(pool_key) or {"songs": [], "generation": 0}
+    generation = int(existing.get("generation", 0)) + 1
+    recent_labels = [item.get("label", "") for item in _get_recent_song_history(user_id)[:12]]
+    llm = get_llm_service(lang=lang)
+    generated = llm.recommend_songs(
+        context["mood_level"],
+        context["task_count"],
+        lang=lang,
+        mood_note=context["mood_note"],
+        top_tasks=context["recommendation_context"],
+        refresh_token=f"pool-{generation}" if generation > 1 else "initial-load",
+        exclude_songs=recent_labels,
+    )
+    merged = []
+    seen = set()
+    for song in enrich_songs(generated, deadline_seconds=deadline_seconds) + existing["songs"]:
+        signature = _song_signature(song)
+        if not signature or signature in seen:
+            continue
+        seen.add(signature)
+        merged.append(song)
+    pool = {"songs": merged[:_SONG_POOL_MAX_SONGS], "generation": generation, "refilled_at": time.time()}
+    return _song_pools.set(pool_key, pool)
+
+
+def _backfill_pool_artwork(pool_key: str, pool: dict) -> dict:
+    """Fill in artwork that missed the enrichment deadline from the track catalog.
+
+    The lookups behind a missed deadline keep running and store their result
+    in the catalog, so one query picks them up once they finish.
+    """
+
+    missing = [song for song in pool["songs"] if not song.get("cover_url")]
+    found = {
+        key: metadata
+        for key, metadata in load_tracks(missing, remember=False).items()
+        if metadata.get("cover_url")
+    }
+    if not found:
+        return pool
+    # Re-read so a refill that finished meanwhile is not overwritten.
+    current = _song_pools.get(pool_key) or pool
+    songs = [
+        {**song, **found[song_track_key(song)]}
+        if not song.get("cover_url") and song_track_key(song) in found
+        else song
+        for song in current["songs"]
+    ]
+    return _song_pools.set(pool_key, {**current, "songs": songs})
 
 
-def _enrich_songs(songs):
-    if len(songs) <= 1:
-        return [enrich_song(song) for song in songs]
+def _schedule_song_pool_refill(pool_key: str, user_id: int, lang: str, context: dict) -> None:
+    pool = _song_pools.get(pool_key) or {}
+    if time.time() - float(pool.get("refilled_at", 0)) < _SONG_POOL_MIN_REFILL_INTERVAL_SECONDS:
+        return
+    if _song_pool_refills.do_in_background(pool_key, lambda: _refill_song_pool(pool_key, user_id, lang, context)):
+        logger.info("song_pool_refill scheduled pool=%s", pool_key)
 
-    max_workers = min(4, len(songs))
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        return list(executor.map(enrich_song, songs))
+
+def _mood_bucket(mood_level: int, granularity: str) -> str:
+    if granularity == "coarse":
+        return "low" if mood_level <= 2 else "high" if mood_level >= 4 else "mid"
+    return str(mood_level)
+
+
+def _high_priority_bucket(high_priority_count: int) -> str:
+    return "2+" if high_priority_count >= 2 else str(high_priority_count)
 
 
 def _cache_key(
     user_id: int,
     lang: str,
     mood_level: int,
-    task_count: int,
-    mood_note: str,
-    recommendation_context: str,
+    strategy: str,
+    focus_task: str,
+    high_priority_count: int,
+    granularity: str = "",
 ) -> str:
-    raw = " | ".join(
-        [
-            str(user_id),
-            lang,
-            str(mood_level),
-            str(task_count),
-            mood_note.strip(),
-            recommendation_context.strip(),
-        ]
-    )
-    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+    """Key the response cache by the features that actually steer the songs.
+
+    ``coarse`` keeps only the mood bucket and strategy, ``standard`` adds the
+    focus-task kind and a high-priority-count bucket, and ``fine`` also pins
+    the focus task title.
+    """
+
+    granularity = granularity or _CACHE_KEY_GRANULARITY
+    features = [str(user_id), lang, _mood_bucket(mood_level, granularity), strategy]
+    if granularity in {"standard", "fine"}:
+        features.extend([_focus_task_mode(focus_task), _high_priority_bucket(high_priority_count)])
+    if granularity == "fine":
+        features.append(" ".join(focus_task.split()).casefold())
+    return hashlib.md5(" | ".join(features).encode("utf-8")).hexdigest()
 
 
 def _get_cached_recommendations(cache_key: str):
-    now = time.time()
-    with _recommendation_cache_lock:
-        entry = _recommendation_cache.get(cache_key)
-        if not entry:
-            return None
-        expires_at, payload = entry
-        if expires_at <= now:
-            _recommendation_cache.pop(cache_key, None)
-            return None
-        return {
-            **payload,
-            "songs": [dict(song) for song in payload.get("songs", [])],
-            "top_tasks": list(payload.get("top_tasks", [])),
-        }
+    return _recommendation_cache.get(cache_key)
 
 
 def _set_cached_recommendations(cache_key: str, payload: dict):
-    with _recommendation_cache_lock:
-        _recommendation_cache[cache_key] = (
-            time.time() + _RECOMMENDATION_CACHE_TTL_SECONDS,
-            {
-                **payload,
-                "songs": [dict(song) for song in payload.get("songs", [])],
-                "top_tasks": list(payload.get("top_tasks", [])),
-            },
-        )
+    _recommendation_cache.set(cache_key, payload)
 
 
 def _song_signature(song: dict) -> str:
@@ -97,16 +185,7 @@ def _song_label(song: dict) -> str:
 
 
 def _get_recent_song_history(user_id: int) -> list[dict[str, str]]:
-    now = time.time()
-    with _recent_song_history_lock:
-        entry = _recent_song_history.get(user_id)
-        if not entry:
-            return []
-        expires_at, songs = entry
-        if expires_at <= now:
-            _recent_song_history.pop(user_id, None)
-            return []
-        return [dict(song) for song in songs]
+    return _recent_song_history.get(user_id, [])
 
 
 def _remember_recent_songs(user_id: int, songs: list[dict]) -> None:
@@ -126,13 +205,13 @@ def _remember_recent_songs(user_id: int, songs: list[dict]) -> None:
         )
         if len(history) >= 24:
             break
-    with _recent_song_history_lock:
-        _recent_song_history[user_id] = (time.time() + _RECENT_SONG_HISTORY_TTL_SECONDS, history)
+    _recent_song_history.set(user_id, history)
 
 
 def _select_fresher_songs(user_id: int, songs: list[dict], limit: int = 8) -> list[dict]:
     recent = _get_recent_song_history(user_id)
-    recent_signatures = {item.get("signature", "") for item in recent}
+    # History is newest first; songs shown longest ago are repeated first.
+    recent_rank = {item.get("signature", ""): index for index, item in enumerate(recent)}
     selected = []
     deferred = []
     seen = set()
@@ -142,9 +221,10 @@ def _select_fresher_songs(user_id: int, songs: list[dict], limit: int = 8) -> li
         if not signature or signature in seen:
             continue
         seen.add(signature)
-        target = deferred if signature in recent_signatures else selected
+        target = deferred if signature in recent_rank else selected
         target.append(song)
 
+    deferred.sort(key=lambda song: recent_rank[_song_signature(song)], reverse=True)
     chosen = (selected + deferred)[:limit]
     _remember_recent_songs(user_id, chosen)
     return chosen
@@ -169,21 +249,23 @@ def _planned_task_summary(db, user, today: str) -> str:
     return "\n".join(lines[:4])
 
 
-def _infer_recommendation_strategy(mood_level: int, focus_task: str, high_priority_count: int) -> str:
+def _focus_task_mode(focus_task: str) -> str:
     focus = (focus_task or "").lower()
     deep_focus_keywords = ("write", "draft", "study", "read", "code", "analy", "论文", "写", "读", "整理", "实验", "代码")
     social_keywords = ("call", "meeting", "interview", "present", "demo", "汇报", "面试", "答辩", "演示")
     admin_keywords = ("email", "reply", "organize", "admin", "回复", "安排", "整理")
 
     if any(keyword in focus for keyword in deep_focus_keywords):
-        task_mode = "deep-focus"
-    elif any(keyword in focus for keyword in social_keywords):
-        task_mode = "confidence-social"
-    elif any(keyword in focus for keyword in admin_keywords):
-        task_mode = "light-admin"
-    else:
-        task_mode = "general-momentum"
+        return "deep-focus"
+    if any(keyword in focus for keyword in social_keywords):
+        return "confidence-social"
+    if any(keyword in focus for keyword in admin_keywords):
+        return "light-admin"
+    return "general-momentum"
 
+
+def _infer_recommendation_strategy(mood_level: int, focus_task: str, high_priority_count: int) -> str:
+    task_mode = _focus_task_mode(focus_task)
     if mood_level <= 2 and task_mode == "deep-focus":
         return "gentle grounding focus"
     if mood_level <= 2:
@@ -197,7 +279,7 @@ def _infer_recommendation_strategy(mood_level: int, focus_task: str, high_priori
     return "balanced focus"
 
 
-def _song_context_summary(db, user, today: str, mood_level: int) -> tuple[list[str], str, str, str]:
+def _song_context_summary(db, user, today: str, mood_level: int) -> tuple[list[str], str, str, str, int]:
     storage_key = plan_storage_key(user.id, today)
     plan = db.query(DailyPlan).filter(DailyPlan.date == storage_key).first()
     active_tasks = (
@@ -245,100 +327,144 @@ def _song_context_summary(db, user, today: str, mood_level: int) -> tuple[list[s
         summary_lines.extend(f"- {task.title} (priority {task.priority})" for task in visible_tasks)
     summary_lines.append(f"High-priority active task count: {high_priority_count}")
     summary_lines.append(f"Recommendation strategy: {strategy}")
-    return top_titles, focus_task, strategy, "\n".join(summary_lines)
+    return top_titles, focus_task, strategy, "\n".join(summary_lines), high_priority_count
+
+
+def _recommendation_inputs(db, request: Request, today: str) -> dict:
+    user = require_current_user(db, request)
+
+    # Get today's mood
+    mood_entry = (
+        db.query(MoodEntry)
+        .filter(MoodEntry.user_id == user.id, MoodEntry.date == today)
+        .first()
+    )
+    mood_level = mood_entry.mood_level if mood_entry else 3  # default neutral
+
+    # Get active task count
+    task_count = (
+        db.query(Task)
+        .filter(Task.user_id == user.id, Task.status == TaskStatus.ACTIVE.value)
+        .count()
+    )
+    (
+        top_tasks,
+        focus_task,
+        recommendation_strategy,
+        recommendation_context,
+        high_priority_count,
+    ) = _song_context_summary(db, user, today, mood_level)
+    return {
+        "user_id": user.id,
+        "mood_level": mood_level,
+        "task_count": task_count,
+        "mood_note": mood_entry.note if mood_entry else "",
+        "top_tasks": top_tasks,
+        "focus_task": focus_task,
+        "strategy": recommendation_strategy,
+        "recommendation_context": recommendation_context,
+        "high_priority_count": high_priority_count,
+    }
 
 
 @router.get("/songs/recommend")
-def recommend_songs(request: Request, lang: str = "en", refresh_token: str = ""):
+async def recommend_songs(request: Request, lang: str = "en", refresh_token: str = ""):
     today = local_today_iso()
-    with get_db() as db:
-        user = require_current_user(db, request)
-
-        # Get today's mood
-        mood_entry = (
-            db.query(MoodEntry)
-            .filter(MoodEntry.user_id == user.id, MoodEntry.date == today)
-            .first()
-        )
-        mood_level = mood_entry.mood_level if mood_entry else 3  # default neutral
-
-        # Get active task count
-        task_count = (
-            db.query(Task)
-            .filter(Task.user_id == user.id, Task.status == TaskStatus.ACTIVE.value)
-            .count()
-        )
-        mood_note = mood_entry.note if mood_entry else ""
-        top_tasks, focus_task, recommendation_strategy, recommendation_context = _song_context_summary(
-            db, user, today, mood_level
-        )
-        recommendation_cache_key = _cache_key(
-            user.id,
-            lang,
-            mood_level,
-            task_count,
-            mood_note,
-            recommendation_context,
-        )
+    async with get_async_read_db() as db:
+        inputs = await db.run_sync(_recommendation_inputs, request, today)
+    user_id = inputs["user_id"]
+    mood_level = inputs["mood_level"]
+    task_count = inputs["task_count"]
+    top_tasks = inputs["top_tasks"]
+    focus_task = inputs["focus_task"]
+    recommendation_strategy = inputs["strategy"]
+    recommendation_cache_key = _cache_key(
+        user_id,
+        lang,
+        mood_level,
+        recommendation_strategy,
+        focus_task,
+        inputs["high_priority_count"],
+    )
 
-        llm = get_llm_service(lang=lang)
-        normalized_refresh_token = refresh_token.strip()
-        should_bypass_cache = bool(
-            normalized_refresh_token and normalized_refresh_token.lower() not in {"0", "false", "none"}
+    normalized_refresh_token = refresh_token.strip()
+    should_bypass_cache = bool(
+        normalized_refresh_token and normalized_refresh_token.lower() not in {"0", "false", "none"}
+    )
+    cached_payload = None if should_bypass_cache else _get_cached_recommendations(recommendation_cache_key)
+    if cached_payload is not None:
+        logger.info(
+            "song_recommendation user_id=%s cache_hit=%s pool_hit=%s generation_ms=%.2f song_count=%s "
+            "key_granularity=%s cache_hit_rate=%.3f",
+            user_id,
+            True,
+            False,
+            0.0,
+            len(cached_payload.get("songs", [])),
+            _CACHE_KEY_GRANULARITY,
+            _recommendation_cache.hit_rate,
         )
-        cached_payload = None if should_bypass_cache else _get_cached_recommendations(recommendation_cache_key)
-        cache_hit = cached_payload is not None
-        llm_duration_ms = 0.0
-        if cached_payload is not None:
-            logger.info(
-                "song_recommendation user_id=%s cache_hit=%s llm_ms=%.2f enrich_ms=%.2f song_count=%s",
-                user.id,
-                cache_hit,
-                llm_duration_ms,
-                0.0,
-                len(cached_payload.get("songs", [])),
-            )
-            return cached_payload
-
-        if cached_payload is None:
-            recent_labels = [item.get("label", "") for item in _get_recent_song_history(user.id)[:12]]
-            llm_started_at = time.perf_counter()
-            songs = llm.recommend_songs(
-                mood_level,
-                task_count,
-                lang=lang,
-                mood_note=mood_note,
-                top_tasks=recommendation_context,
-                refresh_token=refresh_token or "initial-load",
-                exclude_songs=recent_labels,
-            )
-            llm_duration_ms = (time.perf_counter() - llm_started_at) * 1000
-
-        songs = _select_fresher_songs(user.id, songs, limit=8)
-
-        enrich_started_at = time.perf_counter()
-        songs = _enrich_songs(songs)
-        enrich_duration_ms = (time.perf_counter() - enrich_started_at) * 1000
-
-        payload = {
+        # Songs are shared across equivalent contexts; the task summary
+        # around them always reflects the current request.
+        return {
+            **cached_payload,
             "mood_level": mood_level,
             "task_count": task_count,
             "top_tasks": top_tasks,
             "focus_task": focus_task,
-            "strategy": recommendation_strategy,
-            "songs": songs,
         }
 
-        if not should_bypass_cache:
-            _set_cached_recommendations(recommendation_cache_key, payload)
-
-        logger.info(
-            "song_recommendation user_id=%s cache_hit=%s llm_ms=%.2f enrich_ms=%.2f song_count=%s",
-            user.id,
-            cache_hit,
-            llm_duration_ms,
-            enrich_duration_ms,
-            len(songs),
+    generation_context = {
+        "mood_level": mood_level,
+        "task_count": task_count,
+        "mood_note": inputs["mood_note"],
+        "recommendation_context": inputs["recommendation_context"],
+    }
+    pool_key = _song_pool_key(user_id, lang, mood_level, recommendation_strategy)
+    pool = _song_pools.get(pool_key)
+    pool_hit = bool(pool and pool.get("songs"))
+    generation_duration_ms = 0.0
+    if not pool_hit:
+        # Cold pool: this request has to wait for one generation, shared
+        # with any concurrent request for the same pool.
+        generation_started_at = time.perf_counter()
+        pool = await run_upstream(
+            _song_pool_refills.do,
+            pool_key,
+            lambda: _refill_song_pool(
+                pool_key, user_id, lang, generation_context, deadline_seconds=_SONG_POOL_COLD_DEADLINE_SECONDS
+            ),
         )
+        generation_duration_ms = (time.perf_counter() - generation_started_at) * 1000
+    elif any(not song.get("cover_url") for song in pool["songs"]):
+        pool = await anyio.to_thread.run_sync(_backfill_pool_artwork, pool_key, pool)
+
+    songs = _select_fresher_songs(user_id, pool["songs"], limit=8)
+    if _unseen_pool_songs(user_id, pool["songs"]) < _SONG_POOL_LOW_WATERMARK:
+        _schedule_song_pool_refill(pool_key, user_id, lang, generation_context)
+
+    payload = {
+        "mood_level": mood_level,
+        "task_count": task_count,
+        "top_tasks": top_tasks,
+        "focus_task": focus_task,
+        "strategy": recommendation_strategy,
+        "songs": songs,
+    }
+
+    if not should_bypass_cache:
+        _set_cached_recommendations(recommendation_cache_key, payload)
+
+    logger.info(
+        "song_recommendation user_id=%s cache_hit=%s pool_hit=%s generation_ms=%.2f song_count=%s "
+        "key_granularity=%s cache_hit_rate=%.3f",
+        user_id,
+        False,
+        pool_hit,
+        generation_duration_ms,
+        len(songs),
+        _CACHE_KEY_GRANULARITY,
+        _recommendation_cache.hit_rate,
+    )
 
-        return payload
+    return payload
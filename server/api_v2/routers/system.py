@@ -0,0 +1,82 @@
+from fastapi import APIRouter, HTTPException, Request
+
+from api_v2.schemas import BatchPlanRequest
+from api_v2.user_context import require_admin_user, require_current_user
+from core.batch_planner import BatchJobRunning, batch_job, start_batch_job
+from core.cache import cache_stats, get_backend
+from core.http_pool import pool_stats
+from core.llm import resilience_stats
+from core.planner import decision_stats
+from core.spotify import enrichment_stats
+from database.db import get_read_db, pool_stats as db_pool_stats
+
+router = APIRouter(prefix="/system", tags=["system"])
+
+
+@router.get("/cache")
+def get_cache_stats(request: Request):
+    with get_read_db() as db:
+        require_current_user(db, request)
+    backend = get_backend()
+    return {
+        "backend": backend.name,
+        "shared_across_processes": backend.shared_across_processes,
+        "namespaces": cache_stats(),
+    }
+
+
+@router.get("/metrics")
+def get_metrics(request: Request):
+    with get_read_db() as db:
+        require_current_user(db, request)
+    return {
+        "song_enrichment": enrichment_stats(),
+        "http_pools": pool_stats(),
+        "llm": resilience_stats(),
+        "plan_decisions": decision_stats(),
+    }
+
+
+@router.get("/db")
+def get_db_pool_stats(request: Request):
+    with get_read_db() as db:
+        require_current_user(db, request)
+    return db_pool_stats()
+
+
+@router.post("/plans/batch", status_code=202)
+def run_batch_plans(payload: BatchPlanRequest, request: Request):
+    """Start a batch run; poll ``GET /api/system/plans/batch/{job_id}`` for its summary."""
+
+    with get_read_db() as db:
+        require_admin_user(db, request)
+    try:
+        return start_batch_job(
+            target_date=payload.date,
+            user_ids=payload.user_ids,
+            lang=payload.lang,
+            capacity_units=payload.capacity_units,
+            force=payload.force,
+        )
+    except BatchJobRunning as exc:
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "error_code": "BATCH_PLAN_RUNNING",
+                "message": "A batch plan run is already in progress",
+                "job_id": exc.job_id,
+            },
+        )
+
+
+@router.get("/plans/batch/{job_id}")
+def get_batch_plan_job(job_id: str, request: Request):
+    with get_read_db() as db:
+        require_admin_user(db, request)
+    job = batch_job(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail={"error_code": "JOB_NOT_FOUND", "message": "Batch plan job not found"},
+        )
+    return job
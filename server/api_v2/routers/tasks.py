@@ -1,5 +1,6 @@
 from datetime import datetime, timezone
 import re
+from typing import Any, Dict, List
 from fastapi import APIRouter, HTTPException, Query, Request
 
 from api_v2.user_context import require_current_user
@@ -12,7 +13,8 @@ from core.task_kind import (
     normalize_task_kind,
     strip_task_kind_markers,
 )
-from core.time import APP_TIMEZONE, local_date_offset_iso, local_today_iso, normalize_date_string
+from core.recurrence import complete_occurrence, completed_on, reopen_occurrence
+from core.time import APP_TIMEZONE, datetime_to_iso, local_date_offset_iso, local_today_iso, normalize_date_string
 from database.db import get_db
 from database.models import Task, TaskHistory, TaskStatus, HistoryAction
 
@@ -23,6 +25,18 @@ def _is_recurring(task: Task) -> bool:
     return (task.task_kind or "temporary") in {"daily", "weekly"}
 
 
+def _task_payloads(db, tasks: List[Task]) -> List[Dict[str, Any]]:
+    # A recurring task's completed_at is that of today's occurrence, if any.
+    done_today = completed_on(db, [task.id for task in tasks if _is_recurring(task)], local_today_iso())
+    payloads = []
+    for task in tasks:
+        payload = task.to_dict()
+        if _is_recurring(task):
+            payload["completed_at"] = datetime_to_iso(done_today.get(task.id))
+        payloads.append(payload)
+    return payloads
+
+
 def _cleanup_concierge_title(title: str) -> str:
     cleaned = (title or "").strip()
     if not cleaned:
@@ -120,7 +134,7 @@ def list_tasks(request: Request, status: str = Query(default="active"), q: str =
             task for task in tasks
             if not (task.decision_reason == "Created by concierge." and _is_junk_concierge_title(task.title))
         ]
-        return [t.to_dict() for t in visible_tasks]
+        return _task_payloads(db, visible_tasks)
 
 
 @router.post("", status_code=201)
@@ -319,7 +333,8 @@ def update_task(task_id: int, payload: TaskUpdateRequest, request: Request):
             ))
 
         is_recurring = _is_recurring(task)
-        already_completed_today = bool(
+        done_today = bool(completed_on(db, [task.id], today_key)) if is_recurring else False
+        already_completed_today = done_today if is_recurring else bool(
             task.completed_at and (
                 (task.completed_at if task.completed_at.tzinfo else task.completed_at.replace(tzinfo=timezone.utc))
                 .astimezone(APP_TIMEZONE)
@@ -335,19 +350,20 @@ def update_task(task_id: int, payload: TaskUpdateRequest, request: Request):
             payload.status == TaskStatus.DELETED.value and payload.status != previous_status
         )
         should_restore = bool(
-            payload.status == TaskStatus.ACTIVE.value and (task.completed_at is not None or task.deleted_at is not None)
+            payload.status == TaskStatus.ACTIVE.value
+            and (done_today or task.completed_at is not None or task.deleted_at is not None)
         )
 
         if should_complete or should_delete or should_restore:
             if should_complete:
                 task.completion_count += 1
-                task.completed_at = datetime.now(timezone.utc)
-                task.source = "manual"
-                task.decision_reason = (
-                    "Recurring task completed for this cycle by user."
-                    if is_recurring
-                    else "Marked as completed by user."
-                )
+                if is_recurring:
+                    # The task itself stays as it is; only today's occurrence is done.
+                    complete_occurrence(db, task, today_key)
+                else:
+                    task.completed_at = datetime.now(timezone.utc)
+                    task.source = "manual"
+                    task.decision_reason = "Marked as completed by user."
                 db.add(TaskHistory(
                     task_id=task.id,
                     date=today_key,
@@ -369,7 +385,9 @@ def update_task(task_id: int, payload: TaskUpdateRequest, request: Request):
                     ai_reasoning="Task deleted by user.",
                 ))
             elif should_restore:
-                # Restore: clear completed_at and deleted_at
+                # Restore: reopen today's occurrence, clear completed_at and deleted_at
+                if is_recurring:
+                    reopen_occurrence(db, task, today_key)
                 task.completed_at = None
                 task.deleted_at = None
                 task.source = "manual"
@@ -382,7 +400,7 @@ def update_task(task_id: int, payload: TaskUpdateRequest, request: Request):
                 ))
 
         db.flush()
-        return task.to_dict()
+        return _task_payloads(db, [task])[0]
 
 
 @router.delete("/{task_id}")
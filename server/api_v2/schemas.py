@@ -46,6 +46,17 @@ class PlanGenerateRequest(BaseModel):
     lang: str = "en"
     capacity_units: Optional[int] = Field(default=None, ge=1, le=24)
     force: bool = False
+    # Refresh the stored plan, placing task changes without the planner when
+    # the ranking boundary allows; ``force`` always replans in full.
+    maintain: bool = False
+
+
+class BatchPlanRequest(BaseModel):
+    date: Optional[str] = None
+    lang: str = "en"
+    capacity_units: Optional[int] = Field(default=None, ge=1, le=24)
+    force: bool = False
+    user_ids: Optional[List[int]] = None
 
 
 class FeedbackEntry(BaseModel):
@@ -0,0 +1,258 @@
+"""Read → compute → write for handlers that call the LLM.
+
+The inputs are snapshotted into plain dataclasses in a read session, the
+session is closed, the slow call runs on the upstream pool, and the result is
+applied in a short write transaction. That transaction first re-checks the
+snapshot (``StaleSnapshot`` if the rows it was built from changed in the
+meantime); the whole cycle is then retried, up to ``WRITE_ATTEMPTS`` times.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime
+import logging
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from api_v2.user_context import plan_storage_key
+from core.incremental_planner import DEFER, KEEP, IncrementalPlan, cached_plan_state, forget_plan_states, remember_plan_state
+from core.offload import run_upstream
+from core.rules import normalize_capacity_units
+from database.db import get_async_db, get_async_read_db
+from database.models import DailyPlan, HistoryAction, PlanTask, PlanTaskStatus, Task, TaskHistory, TaskStatus
+
+logger = logging.getLogger(__name__)
+
+WRITE_ATTEMPTS = 2
+
+
+class StaleSnapshot(Exception):
+    """The rows a snapshot was built from changed before the write phase."""
+
+
+@dataclass(frozen=True)
+class TaskSnapshot:
+    id: int
+    updated_at: Optional[datetime]
+    fields: Dict[str, Any] = field(hash=False, compare=False, repr=False)
+
+    @classmethod
+    def of(cls, task: Task) -> "TaskSnapshot":
+        return cls(id=task.id, updated_at=task.updated_at, fields=task.to_dict())
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Same shape as ``Task.to_dict`` so the planner accepts either.
+        return dict(self.fields)
+
+
+@dataclass(frozen=True)
+class PlanSnapshot:
+    user_id: int
+    target_date: str
+    tasks: Tuple[TaskSnapshot, ...]
+    existing_plan_id: Optional[int]
+    # False when the plan covers a chosen subset (onboarding imports) rather
+    # than every active task, so unrelated new tasks are not a conflict.
+    all_active: bool = True
+    existing_plan_created_at: Optional[datetime] = None
+
+    @property
+    def storage_key(self) -> str:
+        return plan_storage_key(self.user_id, self.target_date)
+
+
+@dataclass(frozen=True)
+class PlanMaintenance:
+    """Placement changes for an existing plan, computed without the planner."""
+
+    kept: Tuple[int, ...]
+    deferred: Tuple[int, ...]
+    state: IncrementalPlan = field(compare=False, repr=False)
+
+
+def active_tasks_for_planning(db, user_id: int):
+    return (
+        db.query(Task)
+        .filter(Task.user_id == user_id, Task.status == TaskStatus.ACTIVE.value)
+        .order_by(Task.priority.desc(), Task.created_at.asc())
+        .all()
+    )
+
+
+def snapshot_plan_inputs(db, user_id: int, target_date: str, task_ids: Optional[Iterable[int]] = None) -> PlanSnapshot:
+    tasks = active_tasks_for_planning(db, user_id)
+    if task_ids is not None:
+        wanted = set(task_ids)
+        tasks = [task for task in tasks if task.id in wanted]
+    existing_plan = (
+        db.query(DailyPlan.id, DailyPlan.created_at)
+        .filter(DailyPlan.date == plan_storage_key(user_id, target_date))
+        .first()
+    )
+    return PlanSnapshot(
+        user_id=user_id,
+        target_date=target_date,
+        tasks=tuple(TaskSnapshot.of(task) for task in tasks),
+        existing_plan_id=existing_plan.id if existing_plan else None,
+        all_active=task_ids is None,
+        existing_plan_created_at=existing_plan.created_at if existing_plan else None,
+    )
+
+
+def check_plan_snapshot(db, snapshot: PlanSnapshot) -> None:
+    current = dict(
+        db.query(Task.id, Task.updated_at)
+        .filter(Task.user_id == snapshot.user_id, Task.status == TaskStatus.ACTIVE.value)
+        .all()
+    )
+    expected = {task.id: task.updated_at for task in snapshot.tasks}
+    if snapshot.all_active:
+        changed = current != expected
+    else:
+        changed = any(task_id not in current or current[task_id] != version for task_id, version in expected.items())
+    plan = db.query(DailyPlan.id, DailyPlan.created_at).filter(DailyPlan.date == snapshot.storage_key).first()
+    plan_version = (plan.id, plan.created_at) if plan else (None, None)
+    if changed or plan_version != (snapshot.existing_plan_id, snapshot.existing_plan_created_at):
+        raise StaleSnapshot(f"plan inputs for user {snapshot.user_id} on {snapshot.target_date} changed")
+
+
+def delete_plan(db, plan_id: int) -> None:
+    """Delete a stored plan and its cached incremental state."""
+
+    db.delete(db.get(DailyPlan, plan_id))
+    db.flush()
+    forget_plan_states([plan_id])
+
+
+def store_plan(
+    db,
+    snapshot: PlanSnapshot,
+    plan_result: Dict[str, Any],
+    category_reason: Optional[str] = None,
+    default_reason: str = "",
+) -> DailyPlan:
+    """Check ``snapshot`` and write ``plan_result`` as the day's plan, replacing the old one."""
+
+    check_plan_snapshot(db, snapshot)
+    if snapshot.existing_plan_id is not None:
+        delete_plan(db, snapshot.existing_plan_id)
+
+    if category_reason is not None:
+        category_by_id = {
+            item["task_id"]: item.get("category", "unclassified") for item in plan_result.get("classified_tasks", [])
+        }
+        for task in db.query(Task).filter(Task.id.in_(list(category_by_id))).all():
+            task.category = category_by_id[task.id]
+            task.source = "ai"
+            task.decision_reason = category_reason
+
+    daily_plan = DailyPlan(
+        date=snapshot.storage_key,
+        reasoning=plan_result.get("reasoning", ""),
+        overload_warning=plan_result.get("overload_warning", ""),
+        max_tasks=plan_result.get("max_tasks", 4),
+    )
+    db.add(daily_plan)
+    try:
+        db.flush()
+    except IntegrityError as exc:
+        raise StaleSnapshot(f"plan {snapshot.storage_key} was created concurrently") from exc
+
+    for index, selected in enumerate(plan_result.get("selected_tasks", [])):
+        db.add(PlanTask(
+            plan_id=daily_plan.id,
+            task_id=selected["task_id"],
+            status=PlanTaskStatus.PLANNED.value,
+            order=index,
+        ))
+        db.add(TaskHistory(
+            task_id=selected["task_id"],
+            date=snapshot.target_date,
+            action=HistoryAction.PLANNED.value,
+            ai_reasoning=selected.get("reason") or default_reason,
+        ))
+    db.flush()
+    if snapshot.all_active:
+        remember_plan_state(daily_plan.id, daily_plan.created_at, IncrementalPlan(
+            plan_result.get("capacity_summary", {}).get("capacity_units"),
+            [task.to_dict() for task in snapshot.tasks],
+            [selected["task_id"] for selected in plan_result.get("selected_tasks", [])],
+        ))
+    return db.get(DailyPlan, daily_plan.id)
+
+
+def maintain_plan(snapshot: PlanSnapshot, capacity_units: Optional[int] = None) -> Optional[PlanMaintenance]:
+    """Place the task changes since the existing plan was stored, or None to replan in full."""
+
+    if snapshot.existing_plan_id is None or not snapshot.all_active:
+        return None
+    state = cached_plan_state(snapshot.existing_plan_id, snapshot.existing_plan_created_at)
+    if state is None or state.capacity_units != normalize_capacity_units(capacity_units):
+        return None
+    changes = state.sync(task.to_dict() for task in snapshot.tasks)
+    if changes is None:
+        return None
+    return PlanMaintenance(
+        kept=tuple(task_id for task_id, outcome in changes.items() if outcome == KEEP),
+        deferred=tuple(task_id for task_id, outcome in changes.items() if outcome == DEFER),
+        state=state,
+    )
+
+
+def apply_plan_maintenance(db, snapshot: PlanSnapshot, maintenance: PlanMaintenance, default_reason: str = "") -> DailyPlan:
+    """Check ``snapshot`` and update the existing plan's rows in place."""
+
+    check_plan_snapshot(db, snapshot)
+    plan = db.get(DailyPlan, snapshot.existing_plan_id)
+    rows = {plan_task.task_id: plan_task for plan_task in plan.plan_tasks}
+    next_order = max((plan_task.order for plan_task in rows.values()), default=-1) + 1
+    for task_id in maintenance.deferred:
+        if task_id in rows:
+            db.delete(rows[task_id])
+    for task_id in maintenance.kept:
+        if task_id in rows:
+            # Already in the plan: keep its position and any feedback status.
+            continue
+        db.add(PlanTask(plan_id=plan.id, task_id=task_id, status=PlanTaskStatus.PLANNED.value, order=next_order))
+        next_order += 1
+        db.add(TaskHistory(
+            task_id=task_id,
+            date=snapshot.target_date,
+            action=HistoryAction.PLANNED.value,
+            ai_reasoning=default_reason,
+        ))
+    plan.max_tasks = len(maintenance.state.kept_ids)
+    plan.input_version = None
+    plan.artifacts = "{}"
+    db.flush()
+    remember_plan_state(plan.id, plan.created_at, maintenance.state)
+    db.expire(plan)
+    return db.get(DailyPlan, plan.id)
+
+
+async def read_compute_write(
+    read: Callable[..., Any],
+    compute: Callable[[Any], Any],
+    write: Callable[..., Any],
+    attempts: int = WRITE_ATTEMPTS,
+) -> Any:
+    """Run ``read(db)``, then ``compute(snapshot)`` with no session open, then ``write(db, snapshot, result)``.
+
+    ``read`` and ``write`` are sync functions run on the async session via
+    ``run_sync``. ``StaleSnapshot`` from ``write`` restarts the cycle; it is
+    re-raised once ``attempts`` are used up.
+    """
+
+    for attempt in range(1, attempts + 1):
+        async with get_async_read_db() as db:
+            snapshot = await db.run_sync(read)
+        result = await run_upstream(compute, snapshot)
+        try:
+            async with get_async_db() as db:
+                return await db.run_sync(write, snapshot, result)
+        except StaleSnapshot as exc:
+            if attempt == attempts:
+                raise
+            logger.info("two_phase_conflict attempt=%s/%s %s", attempt, attempts, exc)
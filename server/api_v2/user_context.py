@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import json
+import os
 from typing import Any, Dict
 
 from fastapi import HTTPException
@@ -11,6 +12,8 @@ from fastapi import Request
 from database.models import AppSetting, User, UserSession
 
 ONBOARDING_KEY_PREFIX = "prototype_onboarding"
+# Usernames allowed to call operational endpoints such as batch planning.
+ADMIN_USERNAMES = {name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()}
 
 
 def read_setting(db, key: str, default: Dict[str, Any]) -> Dict[str, Any]:
@@ -86,3 +89,13 @@ def require_current_user(db, request: Request) -> User:
             detail={"error_code": "SESSION_REQUIRED", "message": "Log in first"},
         )
     return session.user
+
+
+def require_admin_user(db, request: Request) -> User:
+    user = require_current_user(db, request)
+    if user.username not in ADMIN_USERNAMES:
+        raise HTTPException(
+            status_code=403,
+            detail={"error_code": "ADMIN_REQUIRED", "message": "This action is limited to administrators"},
+        )
+    return user
@@ -0,0 +1,349 @@
+"""Plan generation for many users at once, for nightly precomputation.
+
+``generate_plans_for_date`` plans a target date for every user with active
+tasks (or a given list) in four phases, so the morning rush reads stored
+plans instead of waiting on ``POST /plans/generate``:
+
+1. load: active tasks and existing plans in a few bulk queries;
+2. snapshot: ``build_capacity_snapshot`` per user, in a process pool for
+   very large batches;
+3. decide: the LLM decision step with bounded concurrency (forced decisions
+   skip the LLM as usual);
+4. write: bulk inserts of ``DailyPlan``/``PlanTask``/``TaskHistory`` in short
+   chunked transactions. Users whose tasks changed since the load, or who got
+   a plan meanwhile, are skipped.
+
+``start_batch_job`` runs it on a background thread for the admin endpoint,
+one run at a time per process; ``batch_job`` reports its progress.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
+
+from sqlalchemy import delete, insert, update
+
+from core.incremental_planner import forget_plan_states
+from core.planner import generate_plan_from_snapshot
+from core.rules import build_capacity_snapshots
+from core.time import local_date_offset_iso
+from database.db import get_db, get_read_db
+from database.models import DailyPlan, HistoryAction, PlanTask, PlanTaskStatus, Task, TaskHistory, TaskStatus
+
+logger = logging.getLogger("deletion-planner-batch")
+
+BATCH_PLAN_PROCESSES = int(os.getenv("BATCH_PLAN_PROCESSES", "0")) or (os.cpu_count() or 1)
+BATCH_PLAN_LLM_CONCURRENCY = int(os.getenv("BATCH_PLAN_LLM_CONCURRENCY", "4"))
+# Snapshots are cheap (~0.1ms per user) and pickling the task dicts costs
+# about as much, so the spawned pool only pays off for very large batches.
+PROCESS_POOL_MIN_USERS = 20000
+SNAPSHOT_CHUNK_USERS = 100
+WRITE_CHUNK_USERS = 200
+QUERY_CHUNK = 500
+
+
+def _chunks(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _storage_key(user_id: int, target_date: str) -> str:
+    return f"{user_id}:{target_date}"
+
+
+def _existing_plan_ids(db, user_ids: List[int], target_date: str) -> Dict[int, int]:
+    found: Dict[int, int] = {}
+    for chunk in _chunks(user_ids, QUERY_CHUNK):
+        keys = [_storage_key(user_id, target_date) for user_id in chunk]
+        for plan_id, key in db.query(DailyPlan.id, DailyPlan.date).filter(DailyPlan.date.in_(keys)).all():
+            found[int(key.split(":", 1)[0])] = plan_id
+    return found
+
+
+def _task_versions(db, user_ids: List[int]) -> Dict[int, Dict[int, Any]]:
+    versions: Dict[int, Dict[int, Any]] = {user_id: {} for user_id in user_ids}
+    for chunk in _chunks(user_ids, QUERY_CHUNK):
+        rows = (
+            db.query(Task.user_id, Task.id, Task.updated_at)
+            .filter(Task.user_id.in_(chunk), Task.status == TaskStatus.ACTIVE.value)
+            .all()
+        )
+        for user_id, task_id, updated_at in rows:
+            versions[user_id][task_id] = updated_at
+    return versions
+
+
+def _load(target_date: str, user_ids: Optional[List[int]], force: bool):
+    tasks_by_user: Dict[int, List[Dict[str, Any]]] = {}
+    versions: Dict[int, Dict[int, Any]] = {}
+    with get_read_db() as db:
+        query = db.query(Task).filter(Task.status == TaskStatus.ACTIVE.value)
+        if user_ids is not None:
+            query = query.filter(Task.user_id.in_(user_ids))
+        for task in query.order_by(Task.user_id, Task.priority.desc(), Task.created_at.asc()).yield_per(1000):
+            tasks_by_user.setdefault(task.user_id, []).append(task.to_dict())
+            versions.setdefault(task.user_id, {})[task.id] = task.updated_at
+        existing = _existing_plan_ids(db, list(tasks_by_user), target_date)
+    skipped_existing = 0
+    if not force:
+        skipped_existing = sum(1 for user_id in existing if user_id in tasks_by_user)
+        for user_id in existing:
+            tasks_by_user.pop(user_id, None)
+    return tasks_by_user, versions, existing, skipped_existing
+
+
+def _snapshots(
+    tasks_by_user: Dict[int, List[Dict[str, Any]]],
+    capacity_units: Optional[int],
+    processes: int,
+) -> Dict[int, Dict[str, Any]]:
+    items = list(tasks_by_user.items())
+    if processes <= 1 or len(items) < PROCESS_POOL_MIN_USERS:
+        return dict(build_capacity_snapshots(items, capacity_units))
+    # Spawned workers import only core.rules, never the app or its DB engines.
+    context = multiprocessing.get_context("spawn")
+    results: Dict[int, Dict[str, Any]] = {}
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+        futures = [
+            pool.submit(build_capacity_snapshots, chunk, capacity_units)
+            for chunk in _chunks(items, SNAPSHOT_CHUNK_USERS)
+        ]
+        for future in futures:
+            results.update(future.result())
+    return results
+
+
+def _decide(
+    tasks_by_user: Dict[int, List[Dict[str, Any]]],
+    snapshots: Dict[int, Dict[str, Any]],
+    target_date: str,
+    lang: str,
+    llm_concurrency: int,
+) -> Tuple[Dict[int, Dict[str, Any]], int]:
+    def decide(user_id: int) -> Tuple[int, Optional[Dict[str, Any]]]:
+        try:
+            return user_id, generate_plan_from_snapshot(tasks_by_user[user_id], snapshots[user_id], target_date, lang)
+        except Exception as exc:  # noqa: BLE001 - one user's failure must not abort the batch
+            logger.warning("Batch plan decision failed user_id=%s: %s", user_id, exc)
+            return user_id, None
+
+    results: Dict[int, Dict[str, Any]] = {}
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, llm_concurrency), thread_name_prefix="batch-plan") as pool:
+        for user_id, result in pool.map(decide, list(snapshots)):
+            if result is None:
+                failed += 1
+            else:
+                results[user_id] = result
+    return results, failed
+
+
+def _write_chunk(
+    db,
+    chunk: List[int],
+    results: Dict[int, Dict[str, Any]],
+    versions: Dict[int, Dict[int, Any]],
+    existing: Dict[int, int],
+    target_date: str,
+    force: bool,
+) -> Tuple[int, int]:
+    current_plans = _existing_plan_ids(db, chunk, target_date)
+    current_versions = _task_versions(db, chunk)
+    ready: List[int] = []
+    stale = 0
+    for user_id in chunk:
+        if current_versions.get(user_id, {}) != versions.get(user_id, {}) or current_plans.get(user_id) != (
+            existing.get(user_id) if force else None
+        ):
+            stale += 1
+        else:
+            ready.append(user_id)
+    if not ready:
+        return 0, stale
+
+    replaced = [current_plans[user_id] for user_id in ready if user_id in current_plans]
+    if replaced:
+        db.execute(delete(PlanTask).where(PlanTask.plan_id.in_(replaced)))
+        db.execute(delete(DailyPlan).where(DailyPlan.id.in_(replaced)))
+        forget_plan_states(replaced)
+
+    plans = {
+        user_id: DailyPlan(
+            date=_storage_key(user_id, target_date),
+            reasoning=results[user_id].get("reasoning", ""),
+            overload_warning=results[user_id].get("overload_warning", ""),
+            max_tasks=results[user_id].get("max_tasks", 4),
+        )
+        for user_id in ready
+    }
+    db.add_all(plans.values())
+    db.flush()
+
+    plan_task_rows: List[Dict[str, Any]] = []
+    history_rows: List[Dict[str, Any]] = []
+    category_rows: List[Dict[str, Any]] = []
+    for user_id in ready:
+        result = results[user_id]
+        for index, selected in enumerate(result.get("selected_tasks", [])):
+            plan_task_rows.append({
+                "plan_id": plans[user_id].id,
+                "task_id": selected["task_id"],
+                "status": PlanTaskStatus.PLANNED.value,
+                "order": index,
+            })
+            history_rows.append({
+                "task_id": selected["task_id"],
+                "date": target_date,
+                "action": HistoryAction.PLANNED.value,
+                "ai_reasoning": selected.get("reason", ""),
+            })
+        category_rows.extend(
+            {
+                "id": item["task_id"],
+                "category": item.get("category", "unclassified"),
+                "source": "ai",
+                "decision_reason": "Category inferred by planning engine.",
+            }
+            for item in result.get("classified_tasks", [])
+        )
+    if plan_task_rows:
+        db.execute(insert(PlanTask), plan_task_rows)
+        db.execute(insert(TaskHistory), history_rows)
+    if category_rows:
+        db.execute(update(Task), category_rows)
+    return len(ready), stale
+
+
+def generate_plans_for_date(
+    target_date: Optional[str] = None,
+    user_ids: Optional[List[int]] = None,
+    lang: str = "en",
+    capacity_units: Optional[int] = None,
+    force: bool = False,
+    processes: int = BATCH_PLAN_PROCESSES,
+    llm_concurrency: int = BATCH_PLAN_LLM_CONCURRENCY,
+) -> Dict[str, Any]:
+    """Plan ``target_date`` (default: tomorrow) for every user with active tasks.
+
+    Users who already have a plan that day are skipped unless ``force``.
+    Returns counts, per-phase timings and throughput in users per second.
+    """
+
+    target_date = target_date or local_date_offset_iso(1)
+    started = time.perf_counter()
+    phases: Dict[str, float] = {}
+
+    def mark(name: str, since: float) -> float:
+        now = time.perf_counter()
+        phases[name] = round((now - since) * 1000, 2)
+        return now
+
+    tasks_by_user, versions, existing, skipped_existing = _load(target_date, user_ids, force)
+    step = mark("load", started)
+    snapshots = _snapshots(tasks_by_user, capacity_units, processes)
+    step = mark("snapshot", step)
+    results, failed = _decide(tasks_by_user, snapshots, target_date, lang, llm_concurrency)
+    step = mark("decide", step)
+
+    planned = stale = 0
+    for chunk in _chunks(sorted(results), WRITE_CHUNK_USERS):
+        with get_db() as db:
+            written, skipped = _write_chunk(db, chunk, results, versions, existing, target_date, force)
+        planned += written
+        stale += skipped
+    mark("write", step)
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "target_date": target_date,
+        "users": len(tasks_by_user) + skipped_existing,
+        "planned": planned,
+        "skipped_existing": skipped_existing,
+        "skipped_stale": stale,
+        "failed": failed,
+        "tasks": sum(len(tasks) for tasks in tasks_by_user.values()),
+        "duration_s": round(elapsed, 3),
+        "users_per_second": round(planned / elapsed, 1) if elapsed > 0 else 0.0,
+        "phases_ms": phases,
+    }
+    logger.info(
+        "batch_plans target_date=%s planned=%s skipped_existing=%s skipped_stale=%s failed=%s users_per_second=%s",
+        target_date,
+        planned,
+        skipped_existing,
+        stale,
+        failed,
+        summary["users_per_second"],
+    )
+    return summary
+
+
+# ── background runs ────────────────────────────────────────
+
+# Finished jobs kept for status lookups, newest last.
+MAX_FINISHED_JOBS = 20
+
+_jobs: Dict[str, Dict[str, Any]] = {}
+_running_job_id: Optional[str] = None
+_jobs_lock = threading.Lock()
+
+
+class BatchJobRunning(Exception):
+    """A batch run is already in progress in this process."""
+
+    def __init__(self, job_id: str) -> None:
+        super().__init__(f"batch plan job {job_id} is still running")
+        self.job_id = job_id
+
+
+def _run_batch_job(job_id: str, options: Dict[str, Any]) -> None:
+    global _running_job_id
+    try:
+        summary, error, status = generate_plans_for_date(**options), None, "completed"
+    except Exception as exc:  # noqa: BLE001 - reported through the job status
+        logger.exception("batch plan job %s failed", job_id)
+        summary, error, status = None, str(exc), "failed"
+    with _jobs_lock:
+        _jobs[job_id].update(status=status, summary=summary, error=error, finished_at=time.time())
+        _running_job_id = None
+        finished = [key for key, job in _jobs.items() if job["status"] != "running"]
+        for key in finished[:-MAX_FINISHED_JOBS]:
+            del _jobs[key]
+
+
+def start_batch_job(**options: Any) -> Dict[str, Any]:
+    """Start ``generate_plans_for_date(**options)`` in the background and return the new job.
+
+    Raises ``BatchJobRunning`` while an earlier run has not finished.
+    """
+
+    global _running_job_id
+    with _jobs_lock:
+        if _running_job_id is not None:
+            raise BatchJobRunning(_running_job_id)
+        job_id = uuid4().hex
+        _jobs[job_id] = {
+            "job_id": job_id,
+            "status": "running",
+            "started_at": time.time(),
+            "finished_at": None,
+            "summary": None,
+            "error": None,
+        }
+        _running_job_id = job_id
+        job = dict(_jobs[job_id])
+    threading.Thread(target=_run_batch_job, args=(job_id, options), name="batch-plan-job", daemon=True).start()
+    return job
+
+
+def batch_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job is not None else None
@@ -0,0 +1,218 @@
+"""Namespaced cache factory with pluggable storage backends.
+
+Backends are selected with ``CACHE_BACKEND``:
+
+- ``memory`` (default): bounded LRU + TTL per process.
+- ``sqlite``: one SQLite file shared by every worker on the host
+  (``CACHE_SQLITE_PATH``).
+- ``redis``: any Redis-compatible server (``CACHE_REDIS_URL``); needs the
+  optional ``redis`` package and falls back to ``memory`` when unavailable.
+
+Values are stored as JSON so every backend returns fresh copies and nothing
+executable crosses process boundaries.
+
+``Cache.get_or_load`` adds read-through loading on top: concurrent misses for
+one key share a single loader call (see ``core.cache.single_flight``) and
+entries past their freshness window are served stale while one background
+refresh runs.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.cache.base import BaseCacheBackend
+from core.cache.memory import MemoryCacheBackend
+from core.cache.single_flight import SingleFlight
+
+logger = logging.getLogger("deletion-planner-cache")
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_SQLITE_PATH = (Path(__file__).resolve().parents[2] / "cache.db").resolve()
+
+_backend: Optional[BaseCacheBackend] = None
+_backend_lock = threading.Lock()
+_caches: Dict[str, "Cache"] = {}
+_caches_lock = threading.Lock()
+
+
+def _build_backend() -> BaseCacheBackend:
+    kind = (os.getenv("CACHE_BACKEND") or "memory").strip().lower() or "memory"
+    if kind == "sqlite":
+        from core.cache.sqlite import SQLiteCacheBackend
+
+        return SQLiteCacheBackend(os.getenv("CACHE_SQLITE_PATH") or str(DEFAULT_SQLITE_PATH))
+    if kind == "redis":
+        try:
+            from core.cache.redis_backend import RedisCacheBackend
+
+            return RedisCacheBackend(
+                os.getenv("CACHE_REDIS_URL") or "redis://localhost:6379/0",
+                key_prefix=os.getenv("CACHE_KEY_PREFIX") or "daymark",
+            )
+        except Exception as exc:
+            logger.warning("Redis cache backend unavailable (%s); using in-process memory cache.", exc)
+    elif kind != "memory":
+        logger.warning("Unknown CACHE_BACKEND=%s; using in-process memory cache.", kind)
+    return MemoryCacheBackend()
+
+
+def get_backend() -> BaseCacheBackend:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _build_backend()
+                logger.info("Cache backend initialized: %s", _backend.name)
+    return _backend
+
+
+class Cache:
+    """One namespace on the shared backend, with its own bounds and counters."""
+
+    def __init__(self, namespace: str, max_entries: Optional[int] = DEFAULT_MAX_ENTRIES, ttl_seconds: Optional[float] = None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._counter_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_hits = 0
+        self._flight = SingleFlight()
+
+    @property
+    def backend(self) -> BaseCacheBackend:
+        return get_backend()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        raw = self.backend.get(self.namespace, str(key))
+        with self._counter_lock:
+            if raw is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if raw is None:
+            return default
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> Any:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        evicted = self.backend.set(
+            self.namespace,
+            str(key),
+            json.dumps(value, ensure_ascii=False),
+            ttl_seconds=ttl,
+            max_entries=self.max_entries,
+        )
+        if evicted:
+            with self._counter_lock:
+                self.evictions += evicted
+        return value
+
+    def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Tuple[Any, Optional[float]]],
+        stale_seconds: float = 0,
+    ) -> Any:
+        """Read-through lookup with single-flight loading and stale-while-revalidate.
+
+        ``loader`` returns ``(value, ttl_seconds)``; a ``None`` TTL uses the
+        namespace default. Entries stay readable for ``stale_seconds`` after
+        they stop being fresh. Entries are stored wrapped with their freshness
+        deadline, so a namespace read through here should not also be written
+        with ``set``.
+        """
+
+        key = str(key)
+        entry = self.get(key)
+        if entry is not None:
+            fresh_until = entry.get("fresh_until")
+            if fresh_until is None or fresh_until > time.time():
+                return entry["value"]
+            with self._counter_lock:
+                self.stale_hits += 1
+            self._flight.do_in_background(key, lambda: self._load(key, loader, stale_seconds, refresh=True))
+            return entry["value"]
+        return json.loads(self._flight.do(key, lambda: self._load(key, loader, stale_seconds)))["value"]
+
+    def _load(self, key: str, loader, stale_seconds: float, refresh: bool = False) -> str:
+        if not refresh:
+            # Another caller may have filled the entry between our miss and
+            # claiming the flight.
+            raw = self.backend.get(self.namespace, key)
+            if raw is not None:
+                return raw
+        value, ttl_seconds = loader()
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        envelope = {"value": value, "fresh_until": time.time() + ttl if ttl is not None else None}
+        raw = json.dumps(envelope, ensure_ascii=False)
+        evicted = self.backend.set(
+            self.namespace,
+            key,
+            raw,
+            ttl_seconds=ttl + stale_seconds if ttl is not None else None,
+            max_entries=self.max_entries,
+        )
+        if evicted:
+            with self._counter_lock:
+                self.evictions += evicted
+        return raw
+
+    def delete(self, key: str) -> None:
+        self.backend.delete(self.namespace, str(key))
+
+    def clear(self) -> None:
+        self.backend.clear(self.namespace)
+
+    @property
+    def hit_rate(self) -> float:
+        with self._counter_lock:
+            lookups = self.hits + self.misses
+            return round(self.hits / lookups, 4) if lookups else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counter_lock:
+            hits, misses, evictions, stale_hits = self.hits, self.misses, self.evictions, self.stale_hits
+        return {
+            "namespace": self.namespace,
+            "backend": self.backend.name,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "evictions": evictions,
+            "stale_hits": stale_hits,
+            "loads": self._flight.executed,
+            "shared_loads": self._flight.shared,
+            **self.backend.usage(self.namespace),
+        }
+
+
+def get_cache(
+    namespace: str,
+    max_entries: Optional[int] = DEFAULT_MAX_ENTRIES,
+    ttl_seconds: Optional[float] = None,
+) -> Cache:
+    """Return the cache registered under ``namespace``, creating it once."""
+
+    with _caches_lock:
+        cache = _caches.get(namespace)
+        if cache is None:
+            cache = Cache(namespace, max_entries=max_entries, ttl_seconds=ttl_seconds)
+            _caches[namespace] = cache
+        return cache
+
+
+def cache_stats() -> List[Dict[str, Any]]:
+    with _caches_lock:
+        caches = list(_caches.values())
+    return [cache.stats() for cache in sorted(caches, key=lambda item: item.namespace)]
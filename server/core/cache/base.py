@@ -0,0 +1,46 @@
+"""Abstract storage interface for pluggable cache backends."""
+
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+
+class BaseCacheBackend(ABC):
+    """Storage contract shared by the in-process, SQLite and Redis backends.
+
+    Backends store already-serialized text values under a (namespace, key)
+    pair. Serialization, hit/miss accounting and default TTLs live in
+    ``core.cache.Cache`` so every backend behaves the same to callers.
+    """
+
+    name = "base"
+    shared_across_processes = False
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        """Return the stored value, or None when missing or expired."""
+        ...
+
+    @abstractmethod
+    def set(
+        self,
+        namespace: str,
+        key: str,
+        value: str,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ) -> int:
+        """Store one value and return how many entries were evicted to fit it."""
+        ...
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self, namespace: str) -> None:
+        ...
+
+    @abstractmethod
+    def usage(self, namespace: str) -> Dict[str, int]:
+        """Return ``{"entries": int, "size_bytes": int}`` for one namespace."""
+        ...
@@ -0,0 +1,91 @@
+"""Bounded in-process LRU cache with per-entry TTL."""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from core.cache.base import BaseCacheBackend
+
+
+class MemoryCacheBackend(BaseCacheBackend):
+    """Per-process backend; each namespace has its own lock and LRU order."""
+
+    name = "memory"
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, "OrderedDict[str, Tuple[Optional[float], str, int]]"] = {}
+        self._sizes: Dict[str, int] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def _namespace(self, namespace: str):
+        lock = self._locks.get(namespace)
+        if lock is None:
+            with self._registry_lock:
+                lock = self._locks.get(namespace)
+                if lock is None:
+                    self._entries[namespace] = OrderedDict()
+                    self._sizes[namespace] = 0
+                    lock = threading.Lock()
+                    self._locks[namespace] = lock
+        return lock, self._entries[namespace]
+
+    def _drop(self, namespace: str, entries, key: str) -> None:
+        _, _, size = entries.pop(key)
+        self._sizes[namespace] -= size
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        lock, entries = self._namespace(namespace)
+        with lock:
+            entry = entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._drop(namespace, entries, key)
+                return None
+            entries.move_to_end(key)
+            return value
+
+    def set(
+        self,
+        namespace: str,
+        key: str,
+        value: str,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ) -> int:
+        expires_at = time.time() + ttl_seconds if ttl_seconds is not None else None
+        size = len(value.encode("utf-8"))
+        lock, entries = self._namespace(namespace)
+        evicted = 0
+        with lock:
+            if key in entries:
+                self._drop(namespace, entries, key)
+            entries[key] = (expires_at, value, size)
+            self._sizes[namespace] += size
+            if max_entries is not None:
+                while len(entries) > max_entries:
+                    self._drop(namespace, entries, next(iter(entries)))
+                    evicted += 1
+        return evicted
+
+    def delete(self, namespace: str, key: str) -> None:
+        lock, entries = self._namespace(namespace)
+        with lock:
+            if key in entries:
+                self._drop(namespace, entries, key)
+
+    def clear(self, namespace: str) -> None:
+        lock, entries = self._namespace(namespace)
+        with lock:
+            entries.clear()
+            self._sizes[namespace] = 0
+
+    def usage(self, namespace: str) -> Dict[str, int]:
+        lock, entries = self._namespace(namespace)
+        with lock:
+            return {"entries": len(entries), "size_bytes": self._sizes[namespace]}
@@ -0,0 +1,105 @@
+"""Redis-compatible cache backend (Redis, Valkey, KeyDB, Dragonfly)."""
+
+from __future__ import annotations
+
+import time
+from typing import Dict, Optional
+
+from core.cache.base import BaseCacheBackend
+
+
+class RedisCacheBackend(BaseCacheBackend):
+    """Cross-host backend. Requires the optional ``redis`` package.
+
+    Each namespace keeps a sorted set of keys by last access (for LRU
+    trimming to ``max_entries``) and a hash of value sizes (for accounting).
+    """
+
+    name = "redis"
+    shared_across_processes = True
+
+    def __init__(self, url: str, key_prefix: str = "daymark") -> None:
+        import redis  # optional dependency; ImportError is handled by the factory
+
+        self.url = url
+        self.key_prefix = key_prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        self._client.ping()
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{self.key_prefix}:{namespace}:{key}"
+
+    def _lru_key(self, namespace: str) -> str:
+        return f"{self.key_prefix}:{namespace}:__lru"
+
+    def _size_key(self, namespace: str) -> str:
+        return f"{self.key_prefix}:{namespace}:__sizes"
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        raw = self._client.get(self._key(namespace, key))
+        if raw is None:
+            pipe = self._client.pipeline()
+            pipe.zrem(self._lru_key(namespace), key)
+            pipe.hdel(self._size_key(namespace), key)
+            pipe.execute()
+            return None
+        self._client.zadd(self._lru_key(namespace), {key: time.time()})
+        return raw.decode("utf-8") if isinstance(raw, bytes) else raw
+
+    def set(
+        self,
+        namespace: str,
+        key: str,
+        value: str,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ) -> int:
+        pipe = self._client.pipeline()
+        if ttl_seconds is not None:
+            pipe.set(self._key(namespace, key), value, px=max(1, int(ttl_seconds * 1000)))
+        else:
+            pipe.set(self._key(namespace, key), value)
+        pipe.zadd(self._lru_key(namespace), {key: time.time()})
+        pipe.hset(self._size_key(namespace), key, len(value.encode("utf-8")))
+        pipe.execute()
+
+        if max_entries is None:
+            return 0
+        overflow = int(self._client.zcard(self._lru_key(namespace))) - max_entries
+        if overflow <= 0:
+            return 0
+        victims = [
+            item[0].decode("utf-8") if isinstance(item[0], bytes) else item[0]
+            for item in self._client.zpopmin(self._lru_key(namespace), overflow)
+        ]
+        if victims:
+            pipe = self._client.pipeline()
+            pipe.delete(*[self._key(namespace, victim) for victim in victims])
+            pipe.hdel(self._size_key(namespace), *victims)
+            pipe.execute()
+        return len(victims)
+
+    def delete(self, namespace: str, key: str) -> None:
+        pipe = self._client.pipeline()
+        pipe.delete(self._key(namespace, key))
+        pipe.zrem(self._lru_key(namespace), key)
+        pipe.hdel(self._size_key(namespace), key)
+        pipe.execute()
+
+    def clear(self, namespace: str) -> None:
+        keys = [
+            item.decode("utf-8") if isinstance(item, bytes) else item
+            for item in self._client.zrange(self._lru_key(namespace), 0, -1)
+        ]
+        pipe = self._client.pipeline()
+        if keys:
+            pipe.delete(*[self._key(namespace, key) for key in keys])
+        pipe.delete(self._lru_key(namespace), self._size_key(namespace))
+        pipe.execute()
+
+    def usage(self, namespace: str) -> Dict[str, int]:
+        sizes = self._client.hvals(self._size_key(namespace))
+        return {
+            "entries": int(self._client.zcard(self._lru_key(namespace))),
+            "size_bytes": sum(int(size) for size in sizes),
+        }
@@ -0,0 +1,111 @@
+"""Per-key call deduplication ("single flight") with striped locks.
+
+Concurrent callers asking for the same key share one in-flight call: the
+first caller runs the loader, the others wait for its result. Bookkeeping is
+sharded over a fixed number of lock stripes so unrelated keys never contend
+on one global lock.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+import zlib
+
+logger = logging.getLogger("deletion-planner-cache")
+
+DEFAULT_STRIPES = 64
+_REFRESH_WORKERS = 4
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    def __init__(self, stripes: int = DEFAULT_STRIPES) -> None:
+        self._locks: List[threading.Lock] = [threading.Lock() for _ in range(stripes)]
+        self._calls: List[Dict[str, _Call]] = [{} for _ in range(stripes)]
+        self.executed = 0
+        self.shared = 0
+
+    def _stripe(self, key: str) -> int:
+        return zlib.crc32(key.encode("utf-8")) % len(self._locks)
+
+    def _claim(self, key: str):
+        stripe = self._stripe(key)
+        with self._locks[stripe]:
+            call = self._calls[stripe].get(key)
+            if call is not None:
+                self.shared += 1
+                return stripe, call, False
+            call = _Call()
+            self._calls[stripe][key] = call
+            self.executed += 1
+            return stripe, call, True
+
+    def _run(self, stripe: int, key: str, call: _Call, fn: Callable[[], Any]) -> None:
+        try:
+            call.result = fn()
+        except BaseException as exc:  # noqa: BLE001 - re-raised to every waiter
+            call.error = exc
+        finally:
+            with self._locks[stripe]:
+                self._calls[stripe].pop(key, None)
+            call.done.set()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run ``fn`` once per key among concurrent callers and share the result."""
+
+        stripe, call, leader = self._claim(key)
+        if leader:
+            self._run(stripe, key, call, fn)
+        else:
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do_in_background(self, key: str, fn: Callable[[], Any]) -> bool:
+        """Schedule ``fn`` unless a call for ``key`` is already running.
+
+        Returns True when a new background call was started.
+        """
+
+        stripe, call, leader = self._claim(key)
+        if not leader:
+            return False
+        _refresh_executor().submit(self._run_logged, stripe, key, call, fn)
+        return True
+
+    def _run_logged(self, stripe: int, key: str, call: _Call, fn: Callable[[], Any]) -> None:
+        self._run(stripe, key, call, fn)
+        if call.error is not None:
+            logger.warning("Background cache refresh failed for %s: %s", key, call.error)
+
+    def in_flight(self) -> int:
+        total = 0
+        for lock, calls in zip(self._locks, self._calls):
+            with lock:
+                total += len(calls)
+        return total
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _refresh_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=_REFRESH_WORKERS, thread_name_prefix="cache-refresh")
+    return _executor
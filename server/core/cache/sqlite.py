@@ -0,0 +1,125 @@
+"""SQLite-file cache shared by every worker process on one host.
+
+Point ``CACHE_SQLITE_PATH`` at a tmpfs location such as ``/dev/shm`` to keep
+the shared cache in memory while still crossing process boundaries.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from core.cache.base import BaseCacheBackend
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS cache_entries ("
+    "namespace TEXT NOT NULL, "
+    "key TEXT NOT NULL, "
+    "value TEXT NOT NULL, "
+    "size_bytes INTEGER NOT NULL, "
+    "expires_at REAL, "
+    "accessed_at REAL NOT NULL, "
+    "PRIMARY KEY (namespace, key))",
+    "CREATE INDEX IF NOT EXISTS idx_cache_entries_lru ON cache_entries(namespace, accessed_at)",
+)
+
+
+class SQLiteCacheBackend(BaseCacheBackend):
+    """Cross-process backend with LRU eviction by last access time."""
+
+    name = "sqlite"
+    shared_across_processes = True
+
+    def __init__(self, path: str) -> None:
+        self.path = str(Path(path).expanduser())
+        self._local = threading.local()
+        with self._connect() as conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        now = time.time()
+        if expires_at is not None and expires_at <= now:
+            conn.execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key))
+            return None
+        conn.execute(
+            "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+            (now, namespace, key),
+        )
+        return value
+
+    def set(
+        self,
+        namespace: str,
+        key: str,
+        value: str,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ) -> int:
+        conn = self._connect()
+        now = time.time()
+        expires_at = now + ttl_seconds if ttl_seconds is not None else None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries(namespace, key, value, size_bytes, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, value, len(value.encode("utf-8")), expires_at, now),
+            )
+            evicted = 0
+            if max_entries is not None:
+                conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+                    (namespace, now),
+                )
+                count = conn.execute(
+                    "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (namespace,)
+                ).fetchone()[0]
+                overflow = count - max_entries
+                if overflow > 0:
+                    conn.execute(
+                        "DELETE FROM cache_entries WHERE rowid IN ("
+                        "SELECT rowid FROM cache_entries WHERE namespace = ? ORDER BY accessed_at ASC LIMIT ?)",
+                        (namespace, overflow),
+                    )
+                    evicted = overflow
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return evicted
+
+    def delete(self, namespace: str, key: str) -> None:
+        self._connect().execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key)
+        )
+
+    def clear(self, namespace: str) -> None:
+        self._connect().execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+
+    def usage(self, namespace: str) -> Dict[str, int]:
+        entries, size_bytes = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM cache_entries WHERE namespace = ?",
+            (namespace,),
+        ).fetchone()
+        return {"entries": int(entries), "size_bytes": int(size_bytes)}
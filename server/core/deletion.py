@@ -4,7 +4,8 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Optional
 
-from core.llm import get_llm_service
+from core.llm import get_llm_service, llm_budget
+from core.planner import PLAN_LLM_BUDGET_SECONDS
 from core.rules import build_capacity_snapshot, localize_rule_reasons
 
 
@@ -22,17 +23,18 @@ def check_deletion_candidates(
     llm = get_llm_service(lang=lang)
 
     suggestions: List[Dict[str, Any]] = []
-    for task in task_dicts:
-        task_id = int(task["id"])
-        candidate = candidate_map.get(task_id)
-        if not candidate:
-            continue
-        rule_reasons = localize_rule_reasons(list(candidate.get("rule_reasons", [])), lang)
-        suggestion = dict(task)
-        suggestion["trigger_reasons"] = rule_reasons
-        suggestion["deletion_reasoning"] = llm.generate_deletion_reasoning(
-            task, rule_reasons
-        )
-        suggestions.append(suggestion)
+    with llm_budget(PLAN_LLM_BUDGET_SECONDS):
+        for task in task_dicts:
+            task_id = int(task["id"])
+            candidate = candidate_map.get(task_id)
+            if not candidate:
+                continue
+            rule_reasons = localize_rule_reasons(list(candidate.get("rule_reasons", [])), lang)
+            suggestion = dict(task)
+            suggestion["trigger_reasons"] = rule_reasons
+            suggestion["deletion_reasoning"] = llm.generate_deletion_reasoning(
+                task, rule_reasons
+            )
+            suggestions.append(suggestion)
 
     return suggestions
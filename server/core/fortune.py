@@ -0,0 +1,454 @@
+"""Daily fortune generation shared by the API and the pre-generation job."""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+from core.cache import get_cache
+from core.llm import get_llm_service
+from core.tarot_catalog import enrich_fortune_card
+from core.time import local_now, local_today_iso
+from database.db import get_db, get_read_db
+from database.models import DailyFortune, DailyPlan, MoodEntry, PlanTaskStatus, Task, TaskStatus, User
+
+logger = logging.getLogger("deletion-planner-fortune")
+
+# Generated fortunes keyed by the user and a digest of everything the prompt
+# sees, so an identical request on the same day (another worker, a retry, a
+# job re-run) never pays for a second LLM round trip. Readings are never
+# shared between users, even when their inputs match.
+_FORTUNE_PROMPT_CACHE_TTL_SECONDS = 60 * 60 * 36
+_fortune_prompt_cache = get_cache("fortune.generated", max_entries=4096, ttl_seconds=_FORTUNE_PROMPT_CACHE_TTL_SECONDS)
+
+PREGENERATE_ACTIVE_WITHIN_DAYS = 7
+PREGENERATE_MAX_WORKERS = int(os.getenv("FORTUNE_PREGENERATE_MAX_WORKERS", "4"))
+PREGENERATE_RETRIES = 2
+PREGENERATE_MINUTES_AFTER_MIDNIGHT = int(os.getenv("FORTUNE_PREGENERATE_MINUTES_AFTER_MIDNIGHT", "5"))
+
+
+def get_zodiac(birthday: str) -> dict:
+    """Derive Western + Chinese zodiac from birthday string YYYY-MM-DD."""
+    if not birthday:
+        return {
+            "western": "Unknown",
+            "western_zh": "未知星座",
+            "chinese": "Unknown",
+            "chinese_zh": "未知生肖",
+            "has_birthday": False,
+        }
+    try:
+        parts = birthday.split("-")
+        month, day = int(parts[1]), int(parts[2])
+        year = int(parts[0])
+    except (IndexError, ValueError):
+        return {
+            "western": "Unknown",
+            "western_zh": "未知星座",
+            "chinese": "Unknown",
+            "chinese_zh": "未知生肖",
+            "has_birthday": False,
+        }
+
+    # Western zodiac
+    western_signs = [
+        ((1, 20), "Aquarius", "水瓶座"), ((2, 19), "Pisces", "双鱼座"),
+        ((3, 21), "Aries", "白羊座"), ((4, 20), "Taurus", "金牛座"),
+        ((5, 21), "Gemini", "双子座"), ((6, 21), "Cancer", "巨蟹座"),
+        ((7, 23), "Leo", "狮子座"), ((8, 23), "Virgo", "处女座"),
+        ((9, 23), "Libra", "天秤座"), ((10, 23), "Scorpio", "天蝎座"),
+        ((11, 22), "Sagittarius", "射手座"), ((12, 22), "Capricorn", "摩羯座"),
+    ]
+    western, western_zh = "Capricorn", "摩羯座"
+    for (m, d), sign_en, sign_zh in western_signs:
+        if (month, day) >= (m, d):
+            western, western_zh = sign_en, sign_zh
+
+    # Chinese zodiac
+    animals_en = ["Rat", "Ox", "Tiger", "Rabbit", "Dragon", "Snake",
+                  "Horse", "Goat", "Monkey", "Rooster", "Dog", "Pig"]
+    animals_zh = ["鼠", "牛", "虎", "兔", "龙", "蛇", "马", "羊", "猴", "鸡", "狗", "猪"]
+    idx = (year - 1900) % 12
+    chinese = animals_en[idx]
+    chinese_zh = animals_zh[idx]
+
+    return {
+        "western": western,
+        "western_zh": western_zh,
+        "chinese": chinese,
+        "chinese_zh": chinese_zh,
+        "has_birthday": True,
+    }
+
+
+def get_user_context(db, user, today: str) -> dict:
+    """Gather plan/task/mood context for fortune generation."""
+    storage_key = f"{user.id}:{today}"
+
+    plan = db.query(DailyPlan).filter(DailyPlan.date == storage_key).first()
+    planned_tasks = []
+    if plan:
+        for plan_task in sorted(plan.plan_tasks, key=lambda item: item.order):
+            task = plan_task.task
+            if not task:
+                continue
+            if plan_task.status != PlanTaskStatus.PLANNED.value:
+                continue
+            if task.status != TaskStatus.ACTIVE.value:
+                continue
+            planned_tasks.append(task)
+
+    # Active tasks
+    tasks = (
+        db.query(Task)
+        .filter(Task.user_id == user.id, Task.status == TaskStatus.ACTIVE.value)
+        .order_by(Task.priority.desc())
+        .limit(10)
+        .all()
+    )
+    if planned_tasks:
+        task_summaries = [f"- {t.title} (priority {t.priority})" for t in planned_tasks[:5]]
+    else:
+        task_summaries = [f"- {t.title} (priority {t.priority})" for t in tasks[:5]]
+
+    # Today's mood
+    mood = (
+        db.query(MoodEntry)
+        .filter(MoodEntry.user_id == user.id, MoodEntry.date == today)
+        .first()
+    )
+
+    return {
+        "task_count": len(tasks),
+        "planned_task_count": len(planned_tasks),
+        "top_tasks": "\n".join(task_summaries[:5]) if task_summaries else "No tasks yet",
+        "planned_tasks": [task.title for task in planned_tasks[:5]],
+        "focus_task": planned_tasks[0].title if planned_tasks else (tasks[0].title if tasks else ""),
+        "mood_level": mood.mood_level if mood else None,
+        "mood_note": mood.note if mood else "",
+    }
+
+
+@dataclass(frozen=True)
+class FortuneInputs:
+    """Everything the fortune prompt sees, read before the LLM call."""
+
+    user_id: int
+    today: str
+    birthday: str
+    zodiac: Dict[str, Any]
+    user_context: Dict[str, Any]
+    # ``fortune_data`` of the stored row at read time (None: no row yet);
+    # the write phase compares it to detect a concurrent store.
+    stored_data: Optional[str] = None
+
+
+def fortune_inputs(db, user, today: str, existing: DailyFortune | None = None) -> FortuneInputs:
+    birthday = user.birthday or ""
+    return FortuneInputs(
+        user_id=user.id,
+        today=today,
+        birthday=birthday,
+        zodiac=get_zodiac(birthday),
+        user_context=get_user_context(db, user, today),
+        stored_data=existing.fortune_data if existing is not None else None,
+    )
+
+
+def compose_fortune(inputs: FortuneInputs, lang: str, use_cache: bool = True) -> Optional[Dict[str, Any]]:
+    """Build the stored fortune payload from ``inputs`` (no DB access)."""
+
+    digest = hashlib.sha1(
+        json.dumps(
+            [inputs.user_id, inputs.birthday, inputs.today, lang, inputs.zodiac, inputs.user_context],
+            ensure_ascii=False,
+            sort_keys=True,
+        ).encode("utf-8")
+    ).hexdigest()
+    if use_cache:
+        cached = _fortune_prompt_cache.get(digest)
+        if cached is not None:
+            return cached
+
+    fortune = get_llm_service(lang=lang).generate_fortune(
+        inputs.birthday, inputs.today, lang=lang,
+        zodiac=inputs.zodiac, user_context=inputs.user_context,
+    )
+    if not fortune:
+        return None
+
+    # Attach zodiac info
+    fortune = enrich_fortune_card(fortune, lang)
+    fortune["zodiac"] = inputs.zodiac
+    fortune["lang"] = lang
+    return _fortune_prompt_cache.set(digest, fortune)
+
+
+def generate_fortune(db, user, today: str, lang: str, use_cache: bool = True) -> Optional[Dict[str, Any]]:
+    """Build the stored fortune payload for one user and day (no DB writes)."""
+
+    return compose_fortune(fortune_inputs(db, user, today), lang, use_cache=use_cache)
+
+
+# Stored rows are language-neutral: the drawn card and zodiac once, plus the
+# generated text per language. Catalog fields (card name, imagery, keywords)
+# are joined from core.tarot_catalog when rendering.
+FORTUNE_RECORD_FORMAT = 2
+_CATALOG_FIELDS = ("card", "card_key", "card_symbol", "card_image_url", "card_imagery", "card_keywords")
+_NEUTRAL_FIELDS = ("card_number", "is_reversed", "zodiac")
+_REQUIRED_TEXT_FIELDS = ("focus_task", "planned_tasks", "visual_theme")
+_RENDERED_FORTUNE_TTL_SECONDS = 60 * 60 * 24
+_rendered_fortunes = get_cache("fortune.rendered", max_entries=8192, ttl_seconds=_RENDERED_FORTUNE_TTL_SECONDS)
+
+
+def normalize_fortune_record(data: Any) -> Dict[str, Any]:
+    """Return the language-neutral record, converting legacy flat rows."""
+
+    if not isinstance(data, dict):
+        return {"format": FORTUNE_RECORD_FORMAT, "texts": {}}
+    if data.get("format") == FORTUNE_RECORD_FORMAT:
+        return data
+    lang = data.get("lang") or "en"
+    record: Dict[str, Any] = {
+        "format": FORTUNE_RECORD_FORMAT,
+        "card_number": data.get("card_number", 0),
+        "is_reversed": bool(data.get("is_reversed", False)),
+        "lang": lang,
+        "texts": {
+            lang: {
+                key: value
+                for key, value in data.items()
+                if key not in _CATALOG_FIELDS and key not in _NEUTRAL_FIELDS and key not in {"lang", "generated"}
+            }
+        },
+    }
+    if "zodiac" in data:
+        record["zodiac"] = data["zodiac"]
+    return record
+
+
+def merge_fortune_record(
+    existing: Dict[str, Any] | None,
+    fortune: Dict[str, Any],
+    lang: str,
+    replace: bool = False,
+) -> Dict[str, Any]:
+    """Add one generated language to a stored record.
+
+    Other languages are kept only while they describe the same card; a
+    different draw (or ``replace``) starts a fresh record.
+    """
+
+    record = normalize_fortune_record({**fortune, "lang": lang})
+    if existing and not replace:
+        previous = normalize_fortune_record(existing)
+        same_draw = (
+            previous.get("card_number") == record["card_number"]
+            and bool(previous.get("is_reversed")) == record["is_reversed"]
+        )
+        if same_draw:
+            record["texts"] = {**previous.get("texts", {}), **record["texts"]}
+    return record
+
+
+def render_fortune(record: Dict[str, Any], lang: str) -> Optional[Dict[str, Any]]:
+    text = record.get("texts", {}).get(lang)
+    if not text or "zodiac" not in record or any(key not in text for key in _REQUIRED_TEXT_FIELDS):
+        return None
+    rendered = enrich_fortune_card(
+        {**text, "card_number": record.get("card_number", 0), "is_reversed": record.get("is_reversed", False)},
+        lang,
+    )
+    rendered["zodiac"] = record["zodiac"]
+    rendered["lang"] = lang
+    return rendered
+
+
+def rendered_fortune_json(row: DailyFortune, lang: str) -> Optional[str]:
+    """Serialized response for one stored fortune, memoized per (row, lang).
+
+    The memo key carries a checksum of the stored JSON, so a regenerated row
+    never serves an older rendering.
+    """
+
+    raw = row.fortune_data or "{}"
+    memo_key = f"{row.id}:{lang}:{zlib.crc32(raw.encode('utf-8')):08x}"
+    cached = _rendered_fortunes.get(memo_key)
+    if cached is not None:
+        return cached
+    try:
+        record = normalize_fortune_record(json.loads(raw))
+    except json.JSONDecodeError:
+        return None
+    rendered = render_fortune(record, lang)
+    if rendered is None:
+        return None
+    return _rendered_fortunes.set(memo_key, json.dumps({**rendered, "generated": True}, ensure_ascii=False))
+
+
+def store_fortune(
+    db,
+    user_id: int,
+    today: str,
+    fortune: Dict[str, Any],
+    lang: str,
+    existing: DailyFortune | None = None,
+    replace: bool = False,
+) -> DailyFortune:
+    if existing is None:
+        existing = (
+            db.query(DailyFortune)
+            .filter(DailyFortune.user_id == user_id, DailyFortune.date == today)
+            .first()
+        )
+    previous = None
+    if existing is not None:
+        try:
+            previous = json.loads(existing.fortune_data or "{}")
+        except json.JSONDecodeError:
+            previous = None
+    record = merge_fortune_record(previous, fortune, lang, replace=replace)
+    payload = json.dumps(record, ensure_ascii=False)
+    if existing:
+        existing.fortune_data = payload
+    else:
+        existing = DailyFortune(user_id=user_id, date=today, fortune_data=payload)
+        db.add(existing)
+    db.flush()
+    return existing
+
+
+def _stored_fortune(db, user_id: int, target_date: str) -> DailyFortune | None:
+    return (
+        db.query(DailyFortune)
+        .filter(DailyFortune.user_id == user_id, DailyFortune.date == target_date)
+        .first()
+    )
+
+
+def _active_fortune_users(target_date: str, active_within_days: int) -> List[tuple[int, str]]:
+    """Users who opened a fortune recently, with the language they last used."""
+
+    since = (date.fromisoformat(target_date) - timedelta(days=active_within_days)).isoformat()
+    with get_db() as db:
+        rows = (
+            db.query(DailyFortune.user_id, DailyFortune.date, DailyFortune.fortune_data)
+            .filter(DailyFortune.date >= since)
+            .order_by(DailyFortune.date.asc(), DailyFortune.id.asc())
+            .all()
+        )
+    latest_lang: Dict[int, str] = {}
+    done = set()
+    for user_id, fortune_date, raw in rows:
+        if fortune_date == target_date:
+            done.add(user_id)
+            continue
+        try:
+            lang = normalize_fortune_record(json.loads(raw or "{}")).get("lang") or "en"
+        except json.JSONDecodeError:
+            lang = "en"
+        latest_lang[user_id] = lang
+    return [(user_id, lang) for user_id, lang in latest_lang.items() if user_id not in done]
+
+
+def _pregenerate_one(user_id: int, lang: str, target_date: str, retries: int) -> bool:
+    for attempt in range(retries + 1):
+        try:
+            with get_read_db() as db:
+                user = db.get(User, user_id)
+                if user is None:
+                    return False
+                if _stored_fortune(db, user_id, target_date) is not None:
+                    return True
+                inputs = fortune_inputs(db, user, target_date)
+            fortune = compose_fortune(inputs, lang)
+            if not fortune:
+                raise RuntimeError("empty fortune")
+            with get_db() as db:
+                # A user who opened the app meanwhile already has today's row.
+                if _stored_fortune(db, user_id, target_date) is None:
+                    store_fortune(db, user_id, target_date, fortune, lang)
+                return True
+        except Exception as exc:
+            logger.warning(
+                "Fortune pre-generation failed user_id=%s attempt=%s/%s: %s", user_id, attempt + 1, retries + 1, exc
+            )
+            if attempt < retries:
+                time.sleep(min(2 ** attempt, 10))
+    return False
+
+
+def pregenerate_daily_fortunes(
+    target_date: str | None = None,
+    max_workers: int = PREGENERATE_MAX_WORKERS,
+    retries: int = PREGENERATE_RETRIES,
+    active_within_days: int = PREGENERATE_ACTIVE_WITHIN_DAYS,
+) -> Dict[str, Any]:
+    """Fill today's ``DailyFortune`` rows for recently active fortune users."""
+
+    target_date = target_date or local_today_iso()
+    started = time.perf_counter()
+    users = _active_fortune_users(target_date, active_within_days)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="fortune-pregen") as executor:
+        results = list(executor.map(lambda item: _pregenerate_one(item[0], item[1], target_date, retries), users))
+    summary = {
+        "date": target_date,
+        "users": len(users),
+        "generated": sum(1 for ok in results if ok),
+        "failed": sum(1 for ok in results if not ok),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+    logger.info("fortune_pregeneration %s", summary)
+    return summary
+
+
+def _seconds_until_next_run(minutes_after_midnight: int) -> float:
+    now = local_now()
+    next_run = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    next_run += timedelta(minutes=minutes_after_midnight)
+    today_run = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(minutes=minutes_after_midnight)
+    if now < today_run:
+        next_run = today_run
+    return max(1.0, (next_run - now).total_seconds())
+
+
+_scheduler_started = False
+_scheduler_lock = threading.Lock()
+
+
+def start_fortune_pregeneration_scheduler() -> bool:
+    """Run the pre-generation job daily shortly after local midnight.
+
+    Enabled with ``FORTUNE_PREGENERATE=1``; with several workers, enable it in
+    one process only (or run ``scripts/pregenerate_fortunes.py`` from cron).
+    """
+
+    global _scheduler_started
+    if os.getenv("FORTUNE_PREGENERATE", "").strip().lower() not in {"1", "true", "yes"}:
+        return False
+    with _scheduler_lock:
+        if _scheduler_started:
+            return False
+        _scheduler_started = True
+
+    def loop() -> None:
+        while True:
+            delay = _seconds_until_next_run(PREGENERATE_MINUTES_AFTER_MIDNIGHT)
+            logger.info("Next fortune pre-generation at %s", (local_now() + timedelta(seconds=delay)).isoformat())
+            time.sleep(delay)
+            try:
+                pregenerate_daily_fortunes()
+            except Exception as exc:
+                logger.warning("Fortune pre-generation run failed: %s", exc)
+
+    threading.Thread(target=loop, name="fortune-pregen-scheduler", daemon=True).start()
+    return True
@@ -0,0 +1,122 @@
+"""Capacity-aware scheduling of the backlog across the coming days.
+
+``plan_horizon`` assigns every active task to a day of an N-day horizon in
+one rule-based pass, without the LLM:
+
+1. recurring tasks are pinned to their occurrences (every day for daily
+   tasks, ``recurrence_weekday`` for weekly ones, read from an
+   ``OccurrenceIndex`` when one covers the horizon) and reserve that day's
+   capacity first, except occurrences already in ``completed``;
+2. one-off tasks are packed earliest-deadline-first: in order of due date
+   and then the rule layer's rank, each goes to the first day up to its due
+   date with enough capacity left. Tasks without a due date, or due after
+   the horizon, may take any day; overdue tasks may only take the first;
+3. a non-negotiable task that fits nowhere still goes on the allowed day
+   with the most room left (overloading it). Anything else that fits nowhere
+   is returned as ``unscheduled``.
+
+First fit over at most ``MAX_HORIZON_DAYS`` days is O(n · days) after the
+O(n log n) sort.
+"""
+
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from core.recurrence import OccurrenceIndex, is_recurring
+from core.rules import estimate_effort_units, is_non_negotiable, keep_score, normalize_capacity_units, rank_key
+from core.task_kind import recurs_on
+from core.time import normalize_date_string
+
+DEFAULT_HORIZON_DAYS = 7
+MAX_HORIZON_DAYS = 14
+
+
+def plan_horizon(
+    tasks: List[Dict[str, Any]],
+    start: date,
+    days: int = DEFAULT_HORIZON_DAYS,
+    capacity_units: Optional[int] = None,
+    day_capacities: Optional[Sequence[Optional[int]]] = None,
+    occurrences: Optional[OccurrenceIndex] = None,
+    completed: Optional[Set[Tuple[int, str]]] = None,
+) -> Dict[str, Any]:
+    """Schedule ``tasks`` (as ``Task.to_dict``) over ``days`` days from ``start``.
+
+    ``day_capacities`` overrides ``capacity_units`` per day, by position.
+    ``completed`` holds the ``(task_id, date)`` occurrences already done.
+    """
+
+    days = max(1, min(MAX_HORIZON_DAYS, int(days)))
+    dates = [start + timedelta(days=offset) for offset in range(days)]
+    capacities = [normalize_capacity_units(capacity_units)] * days
+    for index, capacity in enumerate(list(day_capacities or [])[:days]):
+        if capacity is not None:
+            capacities[index] = normalize_capacity_units(capacity)
+    used = [0] * days
+    recurring: List[List[int]] = [[] for _ in range(days)]
+    packed: List[List[int]] = [[] for _ in range(days)]
+    unscheduled: List[Dict[str, Any]] = []
+    completed = completed or set()
+    recurring_efforts = {int(task["id"]): estimate_effort_units(task) for task in tasks if is_recurring(task)}
+
+    def pin(index: int, task_id: int) -> None:
+        if (task_id, dates[index].isoformat()) not in completed:
+            recurring[index].append(task_id)
+            used[index] += recurring_efforts[task_id]
+
+    if occurrences is not None and occurrences.covers(dates[0].isoformat(), dates[-1].isoformat()):
+        for day_key, task_id in occurrences.between(dates[0].isoformat(), dates[-1].isoformat()):
+            if task_id in recurring_efforts:
+                pin((date.fromisoformat(day_key) - start).days, task_id)
+    else:
+        for task in tasks:
+            if is_recurring(task):
+                for index, day in enumerate(dates):
+                    if recurs_on(task, day):
+                        pin(index, int(task["id"]))
+
+    one_off = []
+    for task in tasks:
+        if is_recurring(task):
+            continue
+        effort_units = estimate_effort_units(task)
+        non_negotiable = is_non_negotiable(task)
+        due_date = normalize_date_string(task.get("due_date"))
+        if due_date is None or due_date > dates[-1].isoformat():
+            last_index = days - 1
+        else:
+            last_index = max(0, (date.fromisoformat(due_date) - start).days)
+        score = keep_score(task, effort_units, non_negotiable)
+        one_off.append((last_index, rank_key(task, non_negotiable, score), int(task["id"]), effort_units, non_negotiable, due_date))
+
+    one_off.sort()
+    for last_index, _, task_id, effort_units, non_negotiable, due_date in one_off:
+        target = next(
+            (index for index in range(last_index + 1) if used[index] + effort_units <= capacities[index]),
+            None,
+        )
+        if target is None and non_negotiable:
+            target = max(range(last_index + 1), key=lambda index: (capacities[index] - used[index], -index))
+        if target is None:
+            unscheduled.append({"task_id": task_id, "effort_units": effort_units, "due_date": due_date})
+            continue
+        packed[target].append(task_id)
+        used[target] += effort_units
+
+    return {
+        "start_date": start.isoformat(),
+        "days": [
+            {
+                "date": day.isoformat(),
+                "capacity_units": capacities[index],
+                "used_units": used[index],
+                "overloaded": used[index] > capacities[index],
+                "task_ids": recurring[index] + packed[index],
+                "recurring_task_ids": recurring[index],
+            }
+            for index, day in enumerate(dates)
+        ],
+        "unscheduled": unscheduled,
+    }
@@ -0,0 +1,170 @@
+"""Keep-alive HTTPS connection pools shared per upstream host.
+
+``urllib.request`` opens a new TCP + TLS connection for every call. Outbound
+lookups that run many times per request (iTunes, Spotify) go through these
+pools instead so connections are reused and the number of concurrent
+connections to one host stays bounded process-wide.
+
+The LLM provider uses an uncapped pool of its own (``max_connections=None``):
+its concurrency is already bounded by the callers, and a call waiting for a
+connection slot would spend its latency budget before reaching the upstream.
+"""
+
+from __future__ import annotations
+
+import http.client
+import json
+import logging
+import os
+import queue
+import threading
+import urllib.parse
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger("deletion-planner-http")
+
+DEFAULT_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS_PER_HOST", "8"))
+_RETRYABLE_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+
+class UpstreamHTTPError(Exception):
+    def __init__(self, status: int, body: bytes) -> None:
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.body = body
+
+
+class HostPool:
+    """LIFO pool of keep-alive connections to one ``scheme://host``.
+
+    At most ``max_connections`` requests run at once; None leaves it uncapped.
+    """
+
+    def __init__(self, scheme: str, netloc: str, max_connections: Optional[int] = DEFAULT_MAX_CONNECTIONS) -> None:
+        self.scheme = scheme
+        self.netloc = netloc
+        self.max_connections = max_connections
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections) if max_connections is not None else None
+        self._stats_lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.in_use = 0
+
+    def _new_connection(self, timeout: float) -> http.client.HTTPConnection:
+        with self._stats_lock:
+            self.created += 1
+        if self.scheme == "http":
+            return http.client.HTTPConnection(self.netloc, timeout=timeout)
+        return http.client.HTTPSConnection(self.netloc, timeout=timeout)
+
+    def _checkout(self, timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            return self._new_connection(timeout), False
+        with self._stats_lock:
+            self.reused += 1
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 10,
+    ) -> Tuple[int, bytes]:
+        if self._slots is not None and not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No free connection to {self.netloc} within {timeout}s")
+        with self._stats_lock:
+            self.in_use += 1
+        try:
+            conn, reused = self._checkout(timeout)
+            try:
+                response = self._send(conn, method, path, body, headers)
+            except _RETRYABLE_ERRORS:
+                conn.close()
+                if not reused:
+                    raise
+                # The server dropped an idle keep-alive connection; retry once fresh.
+                conn = self._new_connection(timeout)
+                response = self._send(conn, method, path, body, headers)
+            except Exception:
+                conn.close()
+                raise
+            data = response.read()
+            if response.will_close:
+                conn.close()
+            else:
+                self._idle.put(conn)
+            return response.status, data
+        finally:
+            with self._stats_lock:
+                self.in_use -= 1
+            if self._slots is not None:
+                self._slots.release()
+
+    @staticmethod
+    def _send(conn, method, path, body, headers) -> http.client.HTTPResponse:
+        conn.request(method, path, body=body, headers=headers or {})
+        return conn.getresponse()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "host": self.netloc,
+                "max_connections": self.max_connections,
+                "in_use": self.in_use,
+                "idle": self._idle.qsize(),
+                "created": self.created,
+                "reused": self.reused,
+            }
+
+
+_pools: Dict[Tuple[str, str, Optional[int]], HostPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(scheme: str, netloc: str, max_connections: Optional[int] = DEFAULT_MAX_CONNECTIONS) -> HostPool:
+    key = (scheme, netloc, max_connections)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = HostPool(scheme, netloc, max_connections)
+            _pools[key] = pool
+        return pool
+
+
+def request_json(
+    url: str,
+    method: str = "GET",
+    data: Optional[bytes] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = 10,
+    max_connections: Optional[int] = DEFAULT_MAX_CONNECTIONS,
+) -> Any:
+    """Send one request through the pool for the URL's host and decode JSON.
+
+    Raises ``UpstreamHTTPError`` for non-2xx responses.
+    """
+
+    parsed = urllib.parse.urlsplit(url)
+    path = parsed.path or "/"
+    if parsed.query:
+        path = f"{path}?{parsed.query}"
+    status, body = get_pool(parsed.scheme, parsed.netloc, max_connections).request(
+        method, path, body=data, headers=headers, timeout=timeout
+    )
+    if status >= 400:
+        raise UpstreamHTTPError(status, body)
+    return json.loads(body.decode("utf-8"))
+
+
+def pool_stats() -> list[Dict[str, Any]]:
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in sorted(pools, key=lambda item: item.netloc)]
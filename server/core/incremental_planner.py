@@ -0,0 +1,249 @@
+"""Incremental maintenance of a stored day plan.
+
+``IncrementalPlan`` keeps a plan's keep/defer split together with the rule
+layer's ranking (the ``build_capacity_snapshot`` order) and its capacity
+accounting, so a single task change is placed with a few bisections instead
+of a full replan:
+
+- a task that fits the remaining capacity is kept;
+- a flexible task that does not fit, and ranks below every kept flexible
+  task, is deferred;
+- removing a task changes nothing else, unless the freed capacity now admits
+  a deferred task that did not fit before.
+
+Anything else moves the ranking boundary — a kept task would have to yield,
+or a deferred one would now get in — and the operation returns
+``REGENERATE``. The state is then no longer meaningful: the caller replans in
+full and builds a new state from the stored result.
+
+States are cached per stored plan id in the ``plans.incremental`` namespace
+and stamped with the plan's ``created_at``: SQLite reuses the id of a deleted
+row, so a state only applies to the exact plan it was built for. Callers
+evict the state wherever they delete or replace a plan.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from core.cache import get_cache
+from core.rules import estimate_effort_units, is_non_negotiable, keep_score, normalize_capacity_units, rank_key
+
+KEEP = "keep"
+DEFER = "defer"
+REMOVE = "remove"
+UNCHANGED = "unchanged"
+REGENERATE = "regenerate"
+
+_PLAN_STATE_TTL_SECONDS = 36 * 3600
+_plan_states = get_cache("plans.incremental", max_entries=4096, ttl_seconds=_PLAN_STATE_TTL_SECONDS)
+
+
+@dataclass(frozen=True)
+class RankedTask:
+    task_id: int
+    # ``rank_key`` plus the task id, so keys are unique within a plan.
+    key: Tuple[Any, ...]
+    effort_units: int
+    non_negotiable: bool
+
+    @classmethod
+    def of(cls, task: Dict[str, Any]) -> "RankedTask":
+        effort_units = estimate_effort_units(task)
+        non_negotiable = is_non_negotiable(task)
+        score = keep_score(task, effort_units, non_negotiable)
+        task_id = int(task["id"])
+        return cls(task_id, rank_key(task, non_negotiable, score) + (task_id,), effort_units, non_negotiable)
+
+
+def _discard_sorted(items: List[Any], value: Any) -> None:
+    index = bisect_left(items, value)
+    if index < len(items) and items[index] == value:
+        del items[index]
+
+
+class IncrementalPlan:
+    """Keep/defer sets of one plan, ordered by rank, with capacity accounting."""
+
+    def __init__(self, capacity_units: Optional[int], tasks: Iterable[Dict[str, Any]], kept_ids: Iterable[int]):
+        self.capacity_units = normalize_capacity_units(capacity_units)
+        self.selected_units = 0
+        self._tasks: Dict[int, RankedTask] = {}
+        self._kept: Set[int] = set()
+        self._kept_flexible: List[Tuple[Any, ...]] = []
+        self._deferred: List[Tuple[Any, ...]] = []
+        self._deferred_efforts: List[int] = []
+        kept = {int(task_id) for task_id in kept_ids}
+        for task in tasks:
+            ranked = RankedTask.of(task)
+            self._insert(ranked, ranked.task_id in kept)
+
+    @property
+    def remaining_units(self) -> int:
+        return self.capacity_units - self.selected_units
+
+    @property
+    def kept_ids(self) -> Set[int]:
+        return set(self._kept)
+
+    @property
+    def deferred_ids(self) -> Set[int]:
+        return set(self._tasks) - self._kept
+
+    def _insert(self, ranked: RankedTask, kept: bool) -> None:
+        self._tasks[ranked.task_id] = ranked
+        if kept:
+            self._kept.add(ranked.task_id)
+            self.selected_units += ranked.effort_units
+            if not ranked.non_negotiable:
+                insort(self._kept_flexible, ranked.key)
+        else:
+            insort(self._deferred, ranked.key)
+            insort(self._deferred_efforts, ranked.effort_units)
+
+    def _discard(self, ranked: RankedTask) -> None:
+        del self._tasks[ranked.task_id]
+        if ranked.task_id in self._kept:
+            self._kept.discard(ranked.task_id)
+            self.selected_units -= ranked.effort_units
+            if not ranked.non_negotiable:
+                _discard_sorted(self._kept_flexible, ranked.key)
+        else:
+            _discard_sorted(self._deferred, ranked.key)
+            _discard_sorted(self._deferred_efforts, ranked.effort_units)
+
+    def _admits_deferred(self, remaining_before: int) -> bool:
+        # Freed capacity that lets in a deferred task which did not fit before.
+        if not self._deferred_efforts:
+            return False
+        smallest = self._deferred_efforts[0]
+        return remaining_before < smallest <= self.remaining_units
+
+    def _place(self, ranked: RankedTask) -> str:
+        if ranked.effort_units <= self.remaining_units or (ranked.non_negotiable and not self._kept_flexible):
+            self._insert(ranked, kept=True)
+            return KEEP
+        if not ranked.non_negotiable and (not self._kept_flexible or ranked.key > self._kept_flexible[-1]):
+            self._insert(ranked, kept=False)
+            return DEFER
+        return REGENERATE
+
+    # ── operations ──────────────────────────────────────────
+
+    def on_task_added(self, task: Dict[str, Any]) -> str:
+        ranked = RankedTask.of(task)
+        if ranked.task_id in self._tasks:
+            return self.on_task_updated(task)
+        return self._place(ranked)
+
+    def on_task_removed(self, task_id: int) -> str:
+        ranked = self._tasks.get(int(task_id))
+        if ranked is None:
+            return UNCHANGED
+        remaining_before = self.remaining_units
+        self._discard(ranked)
+        return REGENERATE if self._admits_deferred(remaining_before) else REMOVE
+
+    def on_task_completed(self, task_id: int) -> str:
+        return self.on_task_removed(task_id)
+
+    def on_task_deleted(self, task_id: int) -> str:
+        return self.on_task_removed(task_id)
+
+    def on_task_updated(self, task: Dict[str, Any]) -> str:
+        """Re-place a task whose priority (or anything else feeding its rank) changed."""
+
+        ranked = RankedTask.of(task)
+        previous = self._tasks.get(ranked.task_id)
+        if previous is None:
+            return self._place(ranked)
+        if previous == ranked:
+            return UNCHANGED
+        was_kept = ranked.task_id in self._kept
+        outranked_before = bool(self._deferred) and self._deferred[0] < previous.key
+        remaining_before = self.remaining_units
+        self._discard(previous)
+        outcome = self._place(ranked)
+        if outcome == REGENERATE or self._admits_deferred(remaining_before):
+            return REGENERATE
+        if (
+            was_kept
+            and outcome == KEEP
+            and not ranked.non_negotiable
+            and not outranked_before
+            and self._deferred
+            and self._deferred[0] < ranked.key
+        ):
+            # A kept task fell below a deferred one.
+            return REGENERATE
+        return outcome
+
+    def on_priority_changed(self, task: Dict[str, Any]) -> str:
+        return self.on_task_updated(task)
+
+    def sync(self, tasks: Iterable[Dict[str, Any]]) -> Optional[Dict[int, str]]:
+        """Apply the difference to ``tasks``, the current active tasks.
+
+        Returns ``{task_id: outcome}`` for the tasks whose placement changed,
+        or ``None`` as soon as one change needs a full replan.
+        """
+
+        current = {int(task["id"]): task for task in tasks}
+        changes: Dict[int, str] = {}
+        for task_id in [task_id for task_id in self._tasks if task_id not in current]:
+            outcome = self.on_task_removed(task_id)
+            if outcome == REGENERATE:
+                return None
+            changes[task_id] = outcome
+        for task_id, task in current.items():
+            outcome = self.on_task_updated(task)
+            if outcome == REGENERATE:
+                return None
+            if outcome != UNCHANGED:
+                changes[task_id] = outcome
+        return changes
+
+    # ── persistence ─────────────────────────────────────────
+
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            "capacity_units": self.capacity_units,
+            "kept": sorted(self._kept),
+            "tasks": [
+                [ranked.task_id, list(ranked.key), ranked.effort_units, ranked.non_negotiable]
+                for ranked in self._tasks.values()
+            ],
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "IncrementalPlan":
+        plan = cls(state["capacity_units"], [], [])
+        kept = set(state["kept"])
+        for task_id, key, effort_units, non_negotiable in state["tasks"]:
+            plan._insert(RankedTask(task_id, tuple(key), effort_units, non_negotiable), task_id in kept)
+        return plan
+
+
+def _created_stamp(created_at: Optional[datetime]) -> Optional[str]:
+    # Naive and aware values of the same instant compare equal: the row
+    # comes back from SQLite without its timezone.
+    return None if created_at is None else created_at.replace(tzinfo=None).isoformat()
+
+
+def remember_plan_state(plan_id: int, created_at: Optional[datetime], plan: IncrementalPlan) -> None:
+    _plan_states.set(str(plan_id), {"created_at": _created_stamp(created_at), **plan.to_state()})
+
+
+def cached_plan_state(plan_id: int, created_at: Optional[datetime]) -> Optional[IncrementalPlan]:
+    state = _plan_states.get(str(plan_id))
+    if state is None or state.get("created_at") != _created_stamp(created_at):
+        return None
+    return IncrementalPlan.from_state(state)
+
+
+def forget_plan_states(plan_ids: Iterable[int]) -> None:
+    for plan_id in plan_ids:
+        _plan_states.delete(str(plan_id))
@@ -3,17 +3,26 @@
 import json
 import logging
 import os
-from typing import Any, Dict
+import threading
+from typing import Any, Dict, Tuple
+import zlib
 
 from core.llm.base import BaseLLMService
 from core.llm.mock import MockLLMService
 from core.llm.deepseek_provider import DeepSeekLLMService
+from core.llm.resilience import LLMUnavailable, llm_budget, remaining_budget, resilience_stats  # noqa: F401
 
 logger = logging.getLogger("deletion-planner-llm")
 
 _runtime_config: Dict[str, str] = {}
 _db_loaded = False
 
+# Long-lived provider instances keyed by (provider, model, lang, key digest).
+# Providers hold no per-call state, so one instance serves every request.
+_services: Dict[Tuple[str, str, str, int], BaseLLMService] = {}
+_mock_services: Dict[str, MockLLMService] = {}
+_services_lock = threading.Lock()
+
 
 def _load_from_db() -> None:
     """Load LLM config from app_settings table once."""
@@ -88,6 +97,23 @@ def set_runtime_config(updates: Dict[str, Any]) -> None:
         os.environ["DEEPSEEK_MODEL"] = model
 
     _save_to_db()
+    clear_llm_services()
+
+
+def clear_llm_services() -> None:
+    """Drop cached provider instances so the next call picks up new settings."""
+
+    with _services_lock:
+        _services.clear()
+
+
+def get_mock_service(lang: str = "en") -> MockLLMService:
+    with _services_lock:
+        service = _mock_services.get(lang)
+        if service is None:
+            service = MockLLMService(lang=lang)
+            _mock_services[lang] = service
+        return service
 
 
 def get_llm_service(lang: str = "en") -> BaseLLMService:
@@ -96,8 +122,18 @@ def get_llm_service(lang: str = "en") -> BaseLLMService:
     config = get_runtime_config()
     provider = str(config.get("provider") or os.getenv("LLM_PROVIDER") or "deepseek").strip().lower() or "deepseek"
 
-    if provider == "deepseek" and config.get("api_key"):
-        return DeepSeekLLMService(lang=lang)
     if provider == "mock":
-        return MockLLMService(lang=lang)
-    return DeepSeekLLMService(lang=lang)
+        return get_mock_service(lang)
+
+    api_key = config.get("api_key") or ""
+    model = config.get("model") or "deepseek-chat"
+    key = ("deepseek", model, lang, zlib.crc32(api_key.encode("utf-8")))
+    with _services_lock:
+        service = _services.get(key)
+    if service is not None:
+        return service
+
+    fallback = get_mock_service(lang)
+    service = DeepSeekLLMService(lang=lang, api_key=api_key, model=model, fallback=fallback)
+    with _services_lock:
+        return _services.setdefault(key, service)
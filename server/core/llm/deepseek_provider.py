@@ -5,10 +5,13 @@ from __future__ import annotations
 import json
 import logging
 import os
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
+from core.http_pool import request_json
 from core.llm.base import BaseLLMService
 from core.llm.mock import MockLLMService
+from core.llm.prompts import build_task_table, estimate_tokens, visible_ids
+from core.llm.resilience import get_resilience
 from core.tarot_catalog import enrich_fortune_card, tarot_reference_lines
 
 logger = logging.getLogger(__name__)
@@ -64,13 +67,22 @@ Be direct but kind. {lang_instruction}
 class DeepSeekLLMService(BaseLLMService):
     """DeepSeek API provider for AI-powered planning decisions."""
 
-    def __init__(self, lang: str = "en"):
+    def __init__(
+        self,
+        lang: str = "en",
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        fallback: Optional[MockLLMService] = None,
+    ):
         super().__init__(lang=lang)
-        from core.llm import get_runtime_config
-        config = get_runtime_config()
-        self.api_key = config.get("api_key") or ""
-        self.model = config.get("model") or "deepseek-chat"
-        self._fallback = MockLLMService(lang=lang)
+        if api_key is None or model is None:
+            from core.llm import get_runtime_config
+            config = get_runtime_config()
+            api_key = config.get("api_key") if api_key is None else api_key
+            model = config.get("model") if model is None else model
+        self.api_key = api_key or ""
+        self.model = model or "deepseek-chat"
+        self._fallback = fallback or MockLLMService(lang=lang)
 
         if not self.api_key:
             logger.warning("DEEPSEEK_API_KEY not set; DeepSeek provider will fall back to mock.")
@@ -81,8 +93,17 @@ class DeepSeekLLMService(BaseLLMService):
         return "Respond in English."
 
     def _call_deepseek(self, system: str, user: str, max_tokens: int = 1024) -> str:
-        import urllib.request
+        """Call DeepSeek through the circuit breaker, hedging and latency budget.
 
+        Raises ``LLMUnavailable`` when the call is skipped, which every caller
+        already treats like any other failure and answers from the mock.
+        """
+
+        return get_resilience("deepseek").call(
+            lambda timeout: self._post_chat(system, user, max_tokens, timeout)
+        )
+
+    def _post_chat(self, system: str, user: str, max_tokens: int, timeout: float) -> str:
         url = os.getenv("DEEPSEEK_API_BASE", "https://api.deepseek.com") + "/chat/completions"
         payload = json.dumps(
             {
@@ -96,19 +117,19 @@ class DeepSeekLLMService(BaseLLMService):
             }
         ).encode("utf-8")
 
-        request = urllib.request.Request(
+        body = request_json(
             url,
+            method="POST",
             data=payload,
             headers={
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {self.api_key}",
             },
-            method="POST",
+            timeout=timeout,
+            # Own uncapped pool: waiting for a slot would spend the call's
+            # latency budget before it ever reached the upstream.
+            max_connections=None,
         )
-
-        with urllib.request.urlopen(request, timeout=30) as response:
-            body = json.loads(response.read().decode("utf-8"))
-
         return body["choices"][0]["message"]["content"].strip()
 
     @staticmethod
@@ -127,25 +148,13 @@ class DeepSeekLLMService(BaseLLMService):
         tasks: List[Dict[str, Any]] = context.get("tasks", [])
         rule_snapshot: Dict[str, Any] = context.get("rule_snapshot", {})
         target_date = context.get("target_date", "today")
-        task_meta = rule_snapshot.get("task_meta", {})
-
-        rows = []
-        for task in tasks:
-            task_id = int(task["id"])
-            meta = task_meta.get(task_id, {})
-            rows.append(
-                f'{task_id} | {task.get("title", "")} | '
-                f'P{task.get("priority", 0)} | '
-                f'{meta.get("effort_units", 1)}u | '
-                f'def:{task.get("deferral_count", 0)} | '
-                f'done:{task.get("completion_count", 0)} | '
-                f'{"YES" if meta.get("non_negotiable") else "no"} | '
-                f'{meta.get("keep_score", 0)}'
-            )
-        task_table = "\n".join(rows) if rows else "(no tasks)"
+
+        task_table, shown_ids = build_task_table(tasks, rule_snapshot)
 
         deletion_info = []
         for candidate in rule_snapshot.get("deletion_candidates", []):
+            if int(candidate["task_id"]) not in shown_ids:
+                continue
             deletion_info.append(
                 f'id={candidate["task_id"]} reasons={candidate.get("rule_reasons", [])}'
             )
@@ -157,11 +166,18 @@ class DeepSeekLLMService(BaseLLMService):
             required_units=rule_snapshot.get("required_units", 0),
             is_overloaded=rule_snapshot.get("is_overloaded", False),
             task_table=task_table,
-            selected_ids=rule_snapshot.get("selected_task_ids", []),
-            deferred_ids=rule_snapshot.get("deferred_task_ids", []),
+            selected_ids=visible_ids(rule_snapshot.get("selected_task_ids", []), shown_ids),
+            deferred_ids=visible_ids(rule_snapshot.get("deferred_task_ids", []), shown_ids),
             deletion_candidates="; ".join(deletion_info) or "none",
             lang_instruction=self._lang_instruction(),
         )
+        prompt_tokens = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(prompt)
+        logger.info(
+            "DeepSeek decision prompt tasks_shown=%s tasks_total=%s prompt_tokens=%s",
+            len(shown_ids),
+            len(tasks),
+            prompt_tokens,
+        )
 
         try:
             raw = self._strip_markdown_fences(self._call_deepseek(SYSTEM_PROMPT, prompt))
@@ -174,6 +190,8 @@ class DeepSeekLLMService(BaseLLMService):
                 "delete": result.get("delete", []),
                 "reasoning": result.get("reasoning", ""),
                 "confidence": float(result.get("confidence", 0.7)),
+                "seen_task_ids": sorted(shown_ids),
+                "prompt_tokens": prompt_tokens,
             }
         except Exception as exc:
             logger.error("DeepSeek recommend_decisions failed: %s", exc)
@@ -0,0 +1,137 @@
+"""Token-budgeted rendering of the planner's task table.
+
+Large task lists are cut down to the rows the model can actually act on:
+every non-negotiable task, the tasks on either side of the capacity cut, the
+leading deletion candidates, and then the highest ``keep_score`` tasks until
+the row limit or token budget is reached. Everything else is summarized as
+one line of aggregate statistics.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Dict, List, Set, Tuple
+
+PROMPT_TASK_TOKEN_BUDGET = int(os.getenv("LLM_PROMPT_TASK_TOKEN_BUDGET", "2500"))
+PROMPT_TOP_K_TASKS = int(os.getenv("LLM_PROMPT_TOP_K_TASKS", "40"))
+BOUNDARY_TASKS = 3
+PROMPT_DELETION_CANDIDATES = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: ~4 characters per token, one per CJK character."""
+
+    wide = sum(1 for char in text if ord(char) > 0x2E7F)
+    return (len(text) - wide + 3) // 4 + wide
+
+
+def _task_row(task: Dict[str, Any], meta: Dict[str, Any]) -> str:
+    return (
+        f'{int(task["id"])} | {task.get("title", "")} | '
+        f'P{task.get("priority", 0)} | '
+        f'{meta.get("effort_units", 1)}u | '
+        f'def:{task.get("deferral_count", 0)} | '
+        f'done:{task.get("completion_count", 0)} | '
+        f'{"YES" if meta.get("non_negotiable") else "no"} | '
+        f'{meta.get("keep_score", 0)}'
+    )
+
+
+def _required_ids(rule_snapshot: Dict[str, Any]) -> List[int]:
+    task_meta = rule_snapshot.get("task_meta", {})
+    selected = list(rule_snapshot.get("selected_task_ids", []))
+    deferred = list(rule_snapshot.get("deferred_task_ids", []))
+    flexible_selected = [task_id for task_id in selected if not task_meta.get(task_id, {}).get("non_negotiable")]
+    required = list(rule_snapshot.get("non_negotiable_task_ids", []))
+    required += flexible_selected[-BOUNDARY_TASKS:]
+    required += deferred[:BOUNDARY_TASKS]
+    required += [
+        int(candidate["task_id"])
+        for candidate in rule_snapshot.get("deletion_candidates", [])[:PROMPT_DELETION_CANDIDATES]
+    ]
+    return required
+
+
+def _tail_summary(tasks: List[Dict[str, Any]], task_meta: Dict[int, Dict[str, Any]]) -> str:
+    effort = sum(int(task_meta.get(int(task["id"]), {}).get("effort_units", 1)) for task in tasks)
+    deferrals = sum(int(task.get("deferral_count", 0) or 0) for task in tasks)
+    scores = [float(task_meta.get(int(task["id"]), {}).get("keep_score", 0)) for task in tasks]
+    priorities: Dict[int, int] = {}
+    for task in tasks:
+        priority = int(task.get("priority", 0) or 0)
+        priorities[priority] = priorities.get(priority, 0) + 1
+    spread = ", ".join(f"P{priority}:{count}" for priority, count in sorted(priorities.items(), reverse=True))
+    return (
+        f"(+{len(tasks)} lower-ranked tasks not listed: {effort}u total effort, "
+        f"{deferrals} total deferrals, keep_score {min(scores)}-{max(scores)}, priorities {spread}; "
+        "they keep the rule layer's decision)"
+    )
+
+
+def build_task_table(
+    tasks: List[Dict[str, Any]],
+    rule_snapshot: Dict[str, Any],
+    token_budget: int = PROMPT_TASK_TOKEN_BUDGET,
+    top_k: int = PROMPT_TOP_K_TASKS,
+) -> Tuple[str, Set[int]]:
+    """Render the task table within ``token_budget`` and return the ids shown.
+
+    Required rows are always shown, even past the budget; the budget and
+    ``top_k`` only limit how many further rows are added by ``keep_score``.
+    """
+
+    if not tasks:
+        return "(no tasks)", set()
+    task_meta = rule_snapshot.get("task_meta", {})
+    by_id = {int(task["id"]): task for task in tasks}
+    rows = {task_id: _task_row(task, task_meta.get(task_id, {})) for task_id, task in by_id.items()}
+
+    shown: Set[int] = {task_id for task_id in _required_ids(rule_snapshot) if task_id in by_id}
+    used = sum(estimate_tokens(rows[task_id]) for task_id in shown)
+    ranked = sorted(
+        (task_id for task_id in by_id if task_id not in shown),
+        key=lambda task_id: (-float(task_meta.get(task_id, {}).get("keep_score", 0)), task_id),
+    )
+    for task_id in ranked:
+        if len(shown) >= max(top_k, 1):
+            break
+        cost = estimate_tokens(rows[task_id])
+        if used + cost > token_budget:
+            break
+        shown.add(task_id)
+        used += cost
+
+    lines = [rows[task_id] for task_id in by_id if task_id in shown]
+    omitted = [task for task_id, task in by_id.items() if task_id not in shown]
+    if omitted:
+        lines.append(_tail_summary(omitted, task_meta))
+    return "\n".join(lines), shown
+
+
+def visible_ids(ids: List[int], shown: Set[int]) -> str:
+    """Render an id list restricted to the rows in the table."""
+
+    visible = [task_id for task_id in ids if task_id in shown]
+    hidden = len(ids) - len(visible)
+    return f"{visible} (+{hidden} not listed)" if hidden else str(visible)
+
+
+def compact_json(payload: Dict[str, Any], token_budget: int = 600, text_limit: int = 160) -> str:
+    """Serialize ``payload`` without whitespace, trimming long strings and lists to fit."""
+
+    def trim(value: Any, limit: int) -> Any:
+        if isinstance(value, str):
+            return value if len(value) <= limit else value[: limit - 1] + "…"
+        if isinstance(value, (list, tuple)):
+            return [trim(item, limit) for item in value]
+        if isinstance(value, dict):
+            return {key: trim(item, limit) for key, item in value.items()}
+        return value
+
+    limit = text_limit
+    while True:
+        text = json.dumps(trim(payload, limit), ensure_ascii=False, separators=(",", ":"))
+        if estimate_tokens(text) <= token_budget or limit <= 20:
+            return text
+        limit //= 2
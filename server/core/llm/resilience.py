@@ -0,0 +1,305 @@
+"""Circuit breaker, hedged requests and latency budgets for upstream LLM calls.
+
+Every DeepSeek call goes through ``LLMResilience.call``. A call is skipped
+(``LLMUnavailable``) when the breaker is open or the caller's latency budget
+is nearly spent, so callers fall back to the mock provider straight away
+instead of waiting on a degraded upstream. Once the recent p95 latency is
+known, a call that has not answered within that p95 fires one hedge request
+and whichever answers first wins.
+
+Calls run on the caller's thread unless they can be hedged. The shared
+worker pool is only used while it has an idle worker, so time spent queueing
+never counts as upstream latency or as a breaker failure.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import deque
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Iterator, Optional
+
+logger = logging.getLogger("deletion-planner-llm")
+
+CALL_TIMEOUT_SECONDS = float(os.getenv("LLM_CALL_TIMEOUT_SECONDS", "30"))
+MIN_BUDGET_SECONDS = float(os.getenv("LLM_MIN_BUDGET_SECONDS", "2"))
+LATENCY_SLO_SECONDS = float(os.getenv("LLM_LATENCY_SLO_SECONDS", "10"))
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+HEDGE_ENABLED = os.getenv("LLM_HEDGE", "1") != "0"
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+_MAX_WORKERS = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+_deadline: ContextVar[Optional[float]] = ContextVar("llm_deadline", default=None)
+
+
+class LLMUnavailable(Exception):
+    """The call was not attempted; the caller should use its fallback."""
+
+
+@contextmanager
+def llm_budget(seconds: float) -> Iterator[None]:
+    """Bound the total time LLM calls made inside the block may take.
+
+    Nested budgets never extend an outer one.
+    """
+
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget() -> Optional[float]:
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class LLMResilience:
+    """Breaker state, latency window and counters for one upstream."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURES,
+        cooldown_seconds: float = BREAKER_COOLDOWN_SECONDS,
+        latency_slo_seconds: float = LATENCY_SLO_SECONDS,
+        hedge: bool = HEDGE_ENABLED,
+        hedge_delay_seconds: Optional[float] = None,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.latency_slo_seconds = latency_slo_seconds
+        self.hedge = hedge
+        self._fixed_hedge_delay = hedge_delay_seconds
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._consecutive_failures = 0
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.counters: Dict[str, int] = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "slow_calls": 0,
+            "short_circuited": 0,
+            "budget_skips": 0,
+            "trips": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+        }
+
+    # ── breaker ─────────────────────────────────────────────
+
+    def _admit(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.counters["short_circuited"] += 1
+            return False
+
+    def _record(self, ok: bool, latency: Optional[float] = None) -> None:
+        with self._lock:
+            self._probe_in_flight = False
+            slow = latency is not None and latency > self.latency_slo_seconds
+            if ok:
+                self.counters["successes"] += 1
+                self._latencies.append(latency or 0.0)
+            else:
+                self.counters["failures"] += 1
+            if slow:
+                self.counters["slow_calls"] += 1
+            if ok and not slow:
+                self._consecutive_failures = 0
+                self._state = self.CLOSED
+                return
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.counters["trips"] += 1
+                    logger.warning(
+                        "LLM circuit for %s opened after %s failed or slow calls",
+                        self.name,
+                        self._consecutive_failures,
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    # ── latency ─────────────────────────────────────────────
+
+    def _percentile(self, fraction: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge:
+            return None
+        if self._fixed_hedge_delay is not None:
+            return self._fixed_hedge_delay
+        with self._lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+        return self._percentile(0.95)
+
+    # ── calls ───────────────────────────────────────────────
+
+    def call(self, fn: Callable[[float], Any]) -> Any:
+        """Run ``fn(timeout)`` under the breaker, the caller's budget and hedging.
+
+        Raises ``LLMUnavailable`` when the call is skipped; any error from
+        ``fn`` (or ``TimeoutError`` when the budget runs out) is re-raised.
+        """
+
+        remaining = remaining_budget()
+        if remaining is not None and remaining < MIN_BUDGET_SECONDS:
+            with self._lock:
+                self.counters["budget_skips"] += 1
+            raise LLMUnavailable(f"{self.name}: {max(remaining, 0):.1f}s of latency budget left")
+        if not self._admit():
+            raise LLMUnavailable(f"{self.name}: circuit open")
+
+        with self._lock:
+            self.counters["calls"] += 1
+        timeout = CALL_TIMEOUT_SECONDS if remaining is None else min(CALL_TIMEOUT_SECONDS, remaining)
+        started = time.monotonic()
+        try:
+            result = self._call_hedged(fn, timeout)
+        except Exception:
+            self._record(False)
+            raise
+        except BaseException:
+            # Interrupted on our side; says nothing about the upstream.
+            with self._lock:
+                self._probe_in_flight = False
+            raise
+        self._record(True, time.monotonic() - started)
+        return result
+
+    def _call_hedged(self, fn: Callable[[float], Any], timeout: float) -> Any:
+        delay = self.hedge_delay()
+        primary = _submit(fn, timeout) if delay is not None and delay < timeout else None
+        if primary is None:
+            # Nothing to hedge, or every worker is busy: call on this thread.
+            return fn(timeout)
+        deadline = time.monotonic() + timeout
+
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        hedge = _submit(fn, max(deadline - time.monotonic(), 0.1))
+        if hedge is None:
+            return self._result(primary, deadline)
+        with self._lock:
+            self.counters["hedges"] += 1
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.counters["hedge_wins"] += 1
+                    return future.result()
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        raise TimeoutError(f"{self.name}: no response within {timeout:.1f}s")
+
+    @staticmethod
+    def _result(future: Future, deadline: float) -> Any:
+        done, _ = wait([future], timeout=max(deadline - time.monotonic(), 0))
+        if not done:
+            raise TimeoutError("LLM call exceeded its latency budget")
+        return future.result()
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95 = self._percentile(0.5), self._percentile(0.95)
+        with self._lock:
+            counters = dict(self.counters)
+            state = self._state
+        return {
+            "state": state,
+            "p50_ms": None if p50 is None else round(p50 * 1000, 1),
+            "p95_ms": None if p95 is None else round(p95 * 1000, 1),
+            **counters,
+        }
+
+
+_upstreams: Dict[str, LLMResilience] = {}
+_upstreams_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+# One permit per pool worker, held from submit until the call returns.
+_idle_workers = threading.BoundedSemaphore(_MAX_WORKERS)
+
+
+def get_resilience(name: str) -> LLMResilience:
+    with _upstreams_lock:
+        upstream = _upstreams.get(name)
+        if upstream is None:
+            upstream = LLMResilience(name)
+            _upstreams[name] = upstream
+        return upstream
+
+
+def resilience_stats() -> Dict[str, Dict[str, Any]]:
+    with _upstreams_lock:
+        upstreams = dict(_upstreams)
+    return {name: upstream.stats() for name, upstream in sorted(upstreams.items())}
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _upstreams_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=_MAX_WORKERS, thread_name_prefix="llm-call")
+    return _pool
+
+
+def _submit(fn: Callable[[float], Any], timeout: float) -> Optional[Future]:
+    """Start ``fn(timeout)`` on an idle pool worker, or return None when all are busy."""
+
+    if not _idle_workers.acquire(blocking=False):
+        return None
+
+    def run() -> Any:
+        try:
+            return fn(timeout)
+        finally:
+            _idle_workers.release()
+
+    try:
+        return _executor().submit(run)
+    except BaseException:
+        _idle_workers.release()
+        raise
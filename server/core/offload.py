@@ -0,0 +1,39 @@
+"""Run blocking upstream work (LLM, Spotify) from ``async def`` handlers.
+
+Upstream calls get their own thread limiter instead of Starlette's default
+threadpool, so a burst of slow LLM requests cannot starve the sync handlers
+and DB work sharing that pool. The caller's context variables (for example
+the LLM latency budget) carry over into the worker thread.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Callable
+
+import anyio.to_thread
+from anyio import CapacityLimiter
+from anyio.lowlevel import RunVar
+
+UPSTREAM_THREADS = int(os.getenv("UPSTREAM_THREADS", "64"))
+
+# One limiter per event loop, built lazily inside it.
+_limiter: RunVar[CapacityLimiter] = RunVar("upstream_limiter")
+
+
+def _upstream_limiter() -> CapacityLimiter:
+    try:
+        return _limiter.get()
+    except LookupError:
+        limiter = CapacityLimiter(UPSTREAM_THREADS)
+        _limiter.set(limiter)
+        return limiter
+
+
+async def run_upstream(fn: Callable[..., Any], *args: Any) -> Any:
+    """Await ``fn(*args)`` on the upstream thread pool.
+
+    Call this only after the request's DB session is closed.
+    """
+
+    return await anyio.to_thread.run_sync(fn, *args, limiter=_upstream_limiter())
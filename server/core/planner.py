@@ -2,11 +2,20 @@
 
 from __future__ import annotations
 
+import os
+import threading
 from typing import Any, Dict, List, Optional
 
-from core.llm import get_llm_service
+from core.llm import get_llm_service, get_mock_service, llm_budget
 from core.rules import build_capacity_snapshot, localize_rule_reasons, normalize_capacity_units
 
+# Upper bound on the time one plan may spend waiting on the LLM; once it is
+# spent the remaining reasoning comes from the mock provider.
+PLAN_LLM_BUDGET_SECONDS = float(os.getenv("PLAN_LLM_BUDGET_SECONDS", "12"))
+
+_decision_stats = {"llm_calls": 0, "skipped_under_capacity": 0, "skipped_all_non_negotiable": 0}
+_decision_stats_lock = threading.Lock()
+
 
 def _ordered_unique(ids: List[int], preferred_order: List[int]) -> List[int]:
     seen = set()
@@ -62,6 +71,9 @@ def _apply_guardrails(
     rule_selected = list(snapshot.get("selected_task_ids", []))
     non_negotiable = set(snapshot.get("non_negotiable_task_ids", []))
     allowed_ids = set(all_task_ids)
+    # Tasks left out of a compacted prompt keep the rule layer's decision; the
+    # model may only keep or delete ids it was actually shown.
+    seen_ids = set(ai_result.get("seen_task_ids") or all_task_ids) & allowed_ids
 
     def _safe_int(value: Any) -> Optional[int]:
         try:
@@ -72,13 +84,14 @@ def _apply_guardrails(
     ai_keep: List[int] = []
     for value in ai_result.get("keep", []):
         maybe_id = _safe_int(value)
-        if maybe_id is None or maybe_id not in allowed_ids:
+        if maybe_id is None or maybe_id not in seen_ids:
             continue
         ai_keep.append(maybe_id)
     if not ai_keep:
         ai_keep = list(rule_selected)
 
     keep_ids = set(ai_keep)
+    keep_ids.update(task_id for task_id in rule_selected if task_id not in seen_ids)
     keep_ids.update(non_negotiable)
 
     def total_effort(ids: List[int]) -> int:
@@ -110,7 +123,7 @@ def _apply_guardrails(
         maybe_id = _safe_int(item.get("task_id", 0))
         if maybe_id is None or maybe_id <= 0:
             continue
-        if maybe_id in non_negotiable or maybe_id in keep_set or maybe_id not in allowed_ids:
+        if maybe_id in non_negotiable or maybe_id in keep_set or maybe_id not in seen_ids:
             continue
         ai_delete.append({"task_id": maybe_id, "reason": str(item.get("reason", "")).strip()})
 
@@ -130,6 +143,36 @@ def _apply_guardrails(
     }
 
 
+def _forced_decision(snapshot: Dict[str, Any]) -> Optional[str]:
+    """Name the reason the rule result cannot be changed, or None if the LLM has a choice.
+
+    - ``under_capacity``: everything fits and nothing is a deletion candidate,
+      so the plan is simply "keep all".
+    - ``all_non_negotiable``: every selected task is protected and no flexible
+      task fits the remaining capacity, so guardrails would undo any change.
+    """
+
+    if not snapshot.get("is_overloaded") and not snapshot.get("deletion_candidates"):
+        return "under_capacity"
+    selected = snapshot.get("selected_task_ids", [])
+    non_negotiable = set(snapshot.get("non_negotiable_task_ids", []))
+    if selected and all(task_id in non_negotiable for task_id in selected):
+        return "all_non_negotiable"
+    return None
+
+
+def _record_decision(forced: Optional[str]) -> None:
+    with _decision_stats_lock:
+        _decision_stats[f"skipped_{forced}" if forced else "llm_calls"] += 1
+
+
+def decision_stats() -> Dict[str, int]:
+    with _decision_stats_lock:
+        stats = dict(_decision_stats)
+    stats["skipped"] = stats["skipped_under_capacity"] + stats["skipped_all_non_negotiable"]
+    return stats
+
+
 def _build_deletion_suggestions(
     task_by_id: Dict[int, Dict[str, Any]],
     snapshot: Dict[str, Any],
@@ -281,6 +324,16 @@ def generate_daily_plan(
 ) -> Dict[str, Any]:
     """Generate one capacity-aware plan with explainable deletion recommendations."""
 
+    with llm_budget(PLAN_LLM_BUDGET_SECONDS):
+        return _generate_daily_plan(tasks, target_date, lang=lang, capacity_units=capacity_units)
+
+
+def _generate_daily_plan(
+    tasks,
+    target_date: str,
+    lang: str = "en",
+    capacity_units: Optional[int] = None,
+) -> Dict[str, Any]:
     task_dicts = [task.to_dict() for task in tasks]
     if not task_dicts:
         return {
@@ -304,7 +357,35 @@ def generate_daily_plan(
         }
 
     snapshot = build_capacity_snapshot(task_dicts, capacity_units=capacity_units)
-    llm = get_llm_service(lang=lang)
+    return _plan_from_snapshot(task_dicts, snapshot, target_date, lang)
+
+
+def generate_plan_from_snapshot(
+    task_dicts: List[Dict[str, Any]],
+    snapshot: Dict[str, Any],
+    target_date: str,
+    lang: str = "en",
+) -> Dict[str, Any]:
+    """Like ``generate_daily_plan`` for a capacity snapshot built by the caller.
+
+    The batch engine builds snapshots for many users in a process pool and
+    only runs the decision step here.
+    """
+
+    with llm_budget(PLAN_LLM_BUDGET_SECONDS):
+        return _plan_from_snapshot(task_dicts, snapshot, target_date, lang)
+
+
+def _plan_from_snapshot(
+    task_dicts: List[Dict[str, Any]],
+    snapshot: Dict[str, Any],
+    target_date: str,
+    lang: str,
+) -> Dict[str, Any]:
+    forced = _forced_decision(snapshot)
+    _record_decision(forced)
+    # A forced decision is answered with the rule result and templated text.
+    llm = get_mock_service(lang) if forced else get_llm_service(lang=lang)
     ai_result = llm.recommend_decisions(
         {
             "target_date": target_date,
@@ -428,9 +509,7 @@ def regenerate_reasoning(
         lang=lang,
     )
 
-    from core.llm.mock import MockLLMService
-
-    mock_llm = MockLLMService(lang=lang)
+    mock_llm = get_mock_service(lang)
     delete_items = [
         {"task_id": item["task_id"], "reason": ""}
         for item in snapshot.get("deletion_candidates", [])[:3]
@@ -0,0 +1,188 @@
+"""Occurrences of the backlog over a rolling window, and per-occurrence completion.
+
+``OccurrenceIndex`` expands every active task into the dates it occurs on
+within ``OCCURRENCE_WINDOW_DAYS`` from a start date — every day for daily
+tasks, ``recurrence_weekday`` for weekly ones (from their ``due_date`` on),
+the due date for one-off tasks — and keeps them sorted by date, so "what is
+on day X" or "what happens this week" is two bisections instead of a scan of
+the backlog. Indexes are cached per user in the ``tasks.occurrences``
+namespace, keyed by the tasks' ``updated_at`` versions, so any task change
+rebuilds on the next lookup.
+
+Completing a recurring task records a ``TaskOccurrence`` row for that date
+instead of stamping the task itself; ``completed_on`` reads them back.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+import hashlib
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from core.cache import get_cache
+from core.time import local_today, normalize_date_string
+from database.models import Task, TaskOccurrence, TaskStatus
+
+OCCURRENCE_WINDOW_DAYS = 28
+RECURRING_KINDS = {"daily", "weekly"}
+
+_INDEX_TTL_SECONDS = 24 * 3600
+_indexes = get_cache("tasks.occurrences", max_entries=2048, ttl_seconds=_INDEX_TTL_SECONDS)
+
+
+def is_recurring(task: Dict[str, Any]) -> bool:
+    return (task.get("task_kind") or "temporary") in RECURRING_KINDS
+
+
+def _first_occurrence(task: Dict[str, Any], start: date) -> Optional[date]:
+    starts = normalize_date_string(task.get("due_date"))
+    first = max(start, date.fromisoformat(starts)) if starts else start
+    if task.get("task_kind") == "weekly":
+        weekday = task.get("recurrence_weekday")
+        if weekday is None:
+            return None
+        first += timedelta(days=(int(weekday) - first.weekday()) % 7)
+    return first
+
+
+@dataclass(frozen=True)
+class OccurrenceIndex:
+    """``(date, task_id)`` pairs of one user's tasks over ``[start, end]``, sorted by date."""
+
+    start: str
+    end: str
+    dates: Tuple[str, ...]
+    task_ids: Tuple[int, ...]
+
+    @classmethod
+    def build(cls, tasks: Iterable[Dict[str, Any]], start: date, days: int = OCCURRENCE_WINDOW_DAYS) -> "OccurrenceIndex":
+        """Expand ``tasks`` (as ``Task.to_dict``, in display order) over ``days`` days from ``start``."""
+
+        end = start + timedelta(days=days - 1)
+        end_key = end.isoformat()
+        pairs: List[Tuple[str, int]] = []
+        for task in tasks:
+            task_id = int(task["id"])
+            if not is_recurring(task):
+                due_date = normalize_date_string(task.get("due_date"))
+                if due_date and start.isoformat() <= due_date <= end_key:
+                    pairs.append((due_date, task_id))
+                continue
+            day = _first_occurrence(task, start)
+            step = timedelta(days=7 if task.get("task_kind") == "weekly" else 1)
+            while day is not None and day <= end:
+                pairs.append((day.isoformat(), task_id))
+                day += step
+        # Stable on the date alone, so tasks keep their order within a day.
+        pairs.sort(key=lambda pair: pair[0])
+        return cls(
+            start=start.isoformat(),
+            end=end_key,
+            dates=tuple(day for day, _ in pairs),
+            task_ids=tuple(task_id for _, task_id in pairs),
+        )
+
+    def covers(self, first: str, last: Optional[str] = None) -> bool:
+        return self.start <= first and (last or first) <= self.end
+
+    def between(self, first: str, last: str) -> List[Tuple[str, int]]:
+        """Occurrences on ``first`` through ``last`` (inclusive), by date."""
+
+        low = bisect_left(self.dates, first)
+        high = bisect_right(self.dates, last)
+        return list(zip(self.dates[low:high], self.task_ids[low:high]))
+
+    def on(self, day: str) -> List[int]:
+        return [task_id for _, task_id in self.between(day, day)]
+
+    def to_state(self) -> Dict[str, Any]:
+        return {"start": self.start, "end": self.end, "dates": list(self.dates), "task_ids": list(self.task_ids)}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "OccurrenceIndex":
+        return cls(state["start"], state["end"], tuple(state["dates"]), tuple(state["task_ids"]))
+
+
+def _tasks_version(tasks: List[Dict[str, Any]]) -> str:
+    digest = hashlib.sha1()
+    for task in sorted(tasks, key=lambda item: int(item["id"])):
+        digest.update(f"{task['id']}:{task.get('updated_at')};".encode())
+    return digest.hexdigest()
+
+
+def occurrence_index(user_id: int, tasks: List[Dict[str, Any]], start: Optional[date] = None) -> OccurrenceIndex:
+    """The cached index of ``tasks`` (a user's active tasks) from ``start`` (default: today)."""
+
+    start = start or local_today()
+    key = f"{user_id}:{start.isoformat()}:{_tasks_version(tasks)}"
+    state = _indexes.get(key)
+    if state is not None:
+        return OccurrenceIndex.from_state(state)
+    index = OccurrenceIndex.build(tasks, start)
+    _indexes.set(key, index.to_state())
+    return index
+
+
+# ── per-occurrence completion ──────────────────────────────
+
+
+def complete_occurrence(db, task: Task, day: str) -> bool:
+    """Record ``task`` as done on ``day``; False if it already was.
+
+    The insert runs in a savepoint and ``uq_task_occurrences_task_date``
+    decides, so of two concurrent completions exactly one records the
+    occurrence and neither fails the request.
+    """
+
+    try:
+        with db.begin_nested():
+            db.add(TaskOccurrence(
+                user_id=task.user_id,
+                task_id=task.id,
+                date=day,
+                status=TaskStatus.COMPLETED.value,
+                completed_at=datetime.now(timezone.utc),
+            ))
+    except IntegrityError:
+        return False
+    return True
+
+
+def reopen_occurrence(db, task: Task, day: str) -> bool:
+    """Undo ``complete_occurrence``; False if ``task`` was not done on ``day``."""
+
+    removed = (
+        db.query(TaskOccurrence)
+        .filter(TaskOccurrence.task_id == task.id, TaskOccurrence.date == day)
+        .delete(synchronize_session=False)
+    )
+    return bool(removed)
+
+
+def completed_on(db, task_ids: Iterable[int], day: str) -> Dict[int, datetime]:
+    """``{task_id: completed_at}`` for the tasks among ``task_ids`` done on ``day``."""
+
+    task_ids = list(task_ids)
+    if not task_ids:
+        return {}
+    rows = (
+        db.query(TaskOccurrence.task_id, TaskOccurrence.completed_at)
+        .filter(TaskOccurrence.task_id.in_(task_ids), TaskOccurrence.date == day)
+        .all()
+    )
+    return {task_id: completed_at for task_id, completed_at in rows}
+
+
+def completed_between(db, user_id: int, first: str, last: str) -> Set[Tuple[int, str]]:
+    """``(task_id, date)`` of every occurrence ``user_id`` completed on ``first`` through ``last``."""
+
+    rows = (
+        db.query(TaskOccurrence.task_id, TaskOccurrence.date)
+        .filter(TaskOccurrence.user_id == user_id, TaskOccurrence.date >= first, TaskOccurrence.date <= last)
+        .all()
+    )
+    return {(task_id, day) for task_id, day in rows}
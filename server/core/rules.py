@@ -3,7 +3,7 @@
 from __future__ import annotations
 
 import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 DEFAULT_CAPACITY_UNITS = 6
 MIN_CAPACITY_UNITS = 1
@@ -155,6 +155,17 @@ def localize_rule_reasons(reasons: List[str], lang: str = "en") -> List[str]:
     return [localize_rule_reason(reason, lang) for reason in reasons]
 
 
+def rank_key(task: Dict[str, Any], non_negotiable: bool, score: float) -> Tuple[int, float, int, str]:
+    """Sort key of the capacity pass: non-negotiable first, then by keep score."""
+
+    return (
+        0 if non_negotiable else 1,
+        -score,
+        -int(task.get("priority", 0) or 0),
+        str(task.get("created_at") or ""),
+    )
+
+
 def build_capacity_snapshot(
     tasks: List[Dict[str, Any]],
     capacity_units: Optional[int] = None,
@@ -176,14 +187,7 @@ def build_capacity_snapshot(
             }
         )
 
-    enriched.sort(
-        key=lambda item: (
-            0 if item["non_negotiable"] else 1,
-            -item["keep_score"],
-            -int(item["task"].get("priority", 0) or 0),
-            str(item["task"].get("created_at") or ""),
-        )
-    )
+    enriched.sort(key=lambda item: rank_key(item["task"], item["non_negotiable"], item["keep_score"]))
 
     selected_ids: List[int] = []
     deferred_ids: List[int] = []
@@ -256,3 +260,16 @@ def build_capacity_snapshot(
         "deletion_candidates": deletion_candidates,
         "task_meta": task_meta,
     }
+
+
+def build_capacity_snapshots(
+    batch: List[Tuple[int, List[Dict[str, Any]]]],
+    capacity_units: Optional[int] = None,
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """``build_capacity_snapshot`` for ``(user_id, tasks)`` pairs.
+
+    Module-level and dependency-free so worker processes can run it without
+    importing the web app.
+    """
+
+    return [(user_id, build_capacity_snapshot(tasks, capacity_units=capacity_units)) for user_id, tasks in batch]
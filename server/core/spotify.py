@@ -3,46 +3,36 @@
 from __future__ import annotations
 
 import base64
-import json
+from datetime import timedelta
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 import logging
 import os
 import threading
 import time
 import urllib.parse
-import urllib.request
-from typing import Dict
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.cache import get_cache
+from core.http_pool import request_json
+from core.track_catalog import get_track, load_tracks, save_tracks, song_track_key, tracks_to_refresh
 
 logger = logging.getLogger(__name__)
 _CACHE_TTL_SECONDS = 60 * 60 * 6
 _NEGATIVE_CACHE_TTL_SECONDS = 60 * 15
-_public_track_cache: dict[str, tuple[float, Dict[str, str]]] = {}
-_spotify_track_cache: dict[str, tuple[float, Dict[str, str]]] = {}
-_enriched_song_cache: dict[str, tuple[float, Dict[str, str]]] = {}
-_cache_lock = threading.Lock()
-
-
-def _cache_get(cache: dict[str, tuple[float, Dict[str, str]]], key: str) -> Dict[str, str] | None:
-    now = time.time()
-    with _cache_lock:
-        entry = cache.get(key)
-        if not entry:
-            return None
-        expires_at, payload = entry
-        if expires_at <= now:
-            cache.pop(key, None)
-            return None
-        return dict(payload)
-
-
-def _cache_set(
-    cache: dict[str, tuple[float, Dict[str, str]]],
-    key: str,
-    payload: Dict[str, str],
-    ttl_seconds: int,
-) -> Dict[str, str]:
-    with _cache_lock:
-        cache[key] = (time.time() + ttl_seconds, dict(payload))
-    return payload
+# Expired entries are still served for this long while one background refresh
+# replaces them, so popular songs never block on the upstream APIs again.
+_STALE_WHILE_REVALIDATE_SECONDS = 60 * 60 * 24
+_SPOTIFY_BATCH_SIZE = 50
+_PUBLIC_TRACK_FIELDS = ("cover_url", "preview_url", "album", "artist")
+_public_track_cache = get_cache("spotify.public_tracks", max_entries=4096, ttl_seconds=_CACHE_TTL_SECONDS)
+_spotify_track_cache = get_cache("spotify.tracks", max_entries=4096, ttl_seconds=_CACHE_TTL_SECONDS)
+_enriched_song_cache = get_cache("spotify.enriched_songs", max_entries=4096, ttl_seconds=_CACHE_TTL_SECONDS)
+# One process-wide pool caps concurrent outbound enrichment work no matter how
+# many recommendation requests are in flight.
+_ENRICH_MAX_WORKERS = int(os.getenv("SONG_ENRICH_MAX_WORKERS", "8"))
+_ENRICH_DEADLINE_SECONDS = float(os.getenv("SONG_ENRICH_DEADLINE_SECONDS", "2.5"))
+_enrich_executor = ThreadPoolExecutor(max_workers=_ENRICH_MAX_WORKERS, thread_name_prefix="song-enrich")
 
 
 def spotify_search_url(name: str, artist: str = "") -> str:
@@ -54,46 +44,33 @@ def _lookup_public_track(name: str, artist: str = "") -> Dict[str, str]:
     query = " ".join(part for part in [name, artist] if part).strip()
     if not query:
         return {"cover_url": "", "preview_url": "", "album": "", "artist": ""}
-    cache_key = query.casefold()
-    cached = _cache_get(_public_track_cache, cache_key)
-    if cached is not None:
-        return cached
+    return _public_track_cache.get_or_load(
+        query.casefold(),
+        lambda: _fetch_public_track(query, name, artist),
+        stale_seconds=_STALE_WHILE_REVALIDATE_SECONDS,
+    )
+
+
+def _fetch_public_track(query: str, name: str, artist: str) -> Tuple[Dict[str, str], Optional[int]]:
     url = "https://itunes.apple.com/search?" + urllib.parse.urlencode(
         {"term": query, "entity": "song", "limit": 1}
     )
-    request = urllib.request.Request(url, method="GET")
     try:
-        with urllib.request.urlopen(request, timeout=4) as response:
-            body = json.loads(response.read().decode("utf-8"))
+        body = request_json(url, timeout=4)
     except Exception as exc:
         logger.warning("Public artwork lookup failed for %s / %s: %s", name, artist, exc)
-        return _cache_set(
-            _public_track_cache,
-            cache_key,
-            {"cover_url": "", "preview_url": "", "album": "", "artist": ""},
-            _NEGATIVE_CACHE_TTL_SECONDS,
-        )
+        return {"cover_url": "", "preview_url": "", "album": "", "artist": ""}, _NEGATIVE_CACHE_TTL_SECONDS
 
     results = body.get("results", [])
     if not results:
-        return _cache_set(
-            _public_track_cache,
-            cache_key,
-            {"cover_url": "", "preview_url": "", "album": "", "artist": ""},
-            _NEGATIVE_CACHE_TTL_SECONDS,
-        )
+        return {"cover_url": "", "preview_url": "", "album": "", "artist": ""}, _NEGATIVE_CACHE_TTL_SECONDS
     item = results[0]
-    return _cache_set(
-        _public_track_cache,
-        cache_key,
-        {
+    return {
         "cover_url": item.get("artworkUrl100", "").replace("100x100bb", "512x512bb"),
         "preview_url": item.get("previewUrl", ""),
         "album": item.get("collectionName", ""),
         "artist": item.get("artistName", ""),
-        },
-        _CACHE_TTL_SECONDS,
-    )
+    }, None
 
 
 class SpotifyClient:
@@ -102,6 +79,7 @@ class SpotifyClient:
         self.client_secret = os.getenv("SPOTIFY_CLIENT_SECRET", "").strip()
         self._access_token = ""
         self._expires_at = 0.0
+        self._token_lock = threading.Lock()
 
     @property
     def enabled(self) -> bool:
@@ -110,6 +88,10 @@ class SpotifyClient:
     def _get_access_token(self) -> str:
         if not self.enabled:
             return ""
+        with self._token_lock:
+            return self._refresh_access_token()
+
+    def _refresh_access_token(self) -> str:
         now = time.time()
         if self._access_token and now < self._expires_at - 60:
             return self._access_token
@@ -118,17 +100,16 @@ class SpotifyClient:
         basic_auth = base64.b64encode(
             f"{self.client_id}:{self.client_secret}".encode("utf-8")
         ).decode("utf-8")
-        request = urllib.request.Request(
+        body = request_json(
             "https://accounts.spotify.com/api/token",
+            method="POST",
             data=payload,
             headers={
                 "Authorization": f"Basic {basic_auth}",
                 "Content-Type": "application/x-www-form-urlencoded",
             },
-            method="POST",
+            timeout=20,
         )
-        with urllib.request.urlopen(request, timeout=20) as response:
-            body = json.loads(response.read().decode("utf-8"))
 
         self._access_token = body.get("access_token", "")
         expires_in = int(body.get("expires_in", 3600) or 3600)
@@ -136,19 +117,30 @@ class SpotifyClient:
         return self._access_token
 
     def search_track(self, name: str, artist: str = "", album: str = "") -> Dict[str, str]:
-        cache_key = " | ".join(part.strip().casefold() for part in [name, artist, album])
-        cached = _cache_get(_spotify_track_cache, cache_key)
-        if cached is not None:
-            return cached
         fallback = {
             "spotify_url": spotify_search_url(name, artist),
             "cover_url": "",
             "album": album,
             "artist": artist,
         }
+        if not self.enabled:
+            return fallback
+        return _spotify_track_cache.get_or_load(
+            " | ".join(part.strip().casefold() for part in [name, artist, album]),
+            lambda: self._fetch_track(name, artist, album, fallback),
+            stale_seconds=_STALE_WHILE_REVALIDATE_SECONDS,
+        )
+
+    def _fetch_track(
+        self,
+        name: str,
+        artist: str,
+        album: str,
+        fallback: Dict[str, str],
+    ) -> Tuple[Dict[str, str], Optional[int]]:
         token = self._get_access_token()
         if not token:
-            return fallback
+            return fallback, _NEGATIVE_CACHE_TTL_SECONDS
 
         query_parts = []
         if name:
@@ -161,85 +153,270 @@ class SpotifyClient:
         url = "https://api.spotify.com/v1/search?" + urllib.parse.urlencode(
             {"q": query, "type": "track", "limit": 3, "market": "US"}
         )
-        request = urllib.request.Request(
-            url,
-            headers={"Authorization": f"Bearer {token}"},
-            method="GET",
-        )
-
         try:
-            with urllib.request.urlopen(request, timeout=6) as response:
-                body = json.loads(response.read().decode("utf-8"))
+            body = request_json(url, headers={"Authorization": f"Bearer {token}"}, timeout=6)
         except Exception as exc:
             logger.warning("Spotify track search failed for %s / %s: %s", name, artist, exc)
-            return _cache_set(_spotify_track_cache, cache_key, fallback, _NEGATIVE_CACHE_TTL_SECONDS)
+            return fallback, _NEGATIVE_CACHE_TTL_SECONDS
 
         items = body.get("tracks", {}).get("items", [])
         if not items:
-            return _cache_set(_spotify_track_cache, cache_key, fallback, _NEGATIVE_CACHE_TTL_SECONDS)
-
-        track = items[0]
-        images = track.get("album", {}).get("images", [])
-        artists = ", ".join(item.get("name", "") for item in track.get("artists", []))
-        return _cache_set(
-            _spotify_track_cache,
-            cache_key,
-            {
-            "spotify_url": track.get("external_urls", {}).get("spotify", fallback["spotify_url"]),
-            "cover_url": images[0]["url"] if images else "",
-            "album": track.get("album", {}).get("name", album),
-            "artist": artists or artist,
-            "preview_url": track.get("preview_url") or "",
-            "spotify_track_id": track.get("id", ""),
-            },
-            _CACHE_TTL_SECONDS,
-        )
+            return fallback, _NEGATIVE_CACHE_TTL_SECONDS
+
+        return _track_metadata(items[0], fallback["spotify_url"], album, artist), None
+
+    def get_tracks(self, track_ids: List[str]) -> Dict[str, Dict[str, str]]:
+        """Fetch known tracks by id, up to 50 per ``/v1/tracks`` call."""
+
+        token = self._get_access_token()
+        if not token:
+            return {}
+        resolved: Dict[str, Dict[str, str]] = {}
+        unique_ids = list(dict.fromkeys(track_id for track_id in track_ids if track_id))
+        for start in range(0, len(unique_ids), _SPOTIFY_BATCH_SIZE):
+            chunk = unique_ids[start:start + _SPOTIFY_BATCH_SIZE]
+            url = "https://api.spotify.com/v1/tracks?" + urllib.parse.urlencode(
+                {"ids": ",".join(chunk), "market": "US"}
+            )
+            try:
+                body = request_json(url, headers={"Authorization": f"Bearer {token}"}, timeout=6)
+            except Exception as exc:
+                logger.warning("Spotify batch track lookup failed for %s ids: %s", len(chunk), exc)
+                continue
+            for track in body.get("tracks") or []:
+                if track and track.get("id"):
+                    resolved[track["id"]] = _track_metadata(track, "", "", "")
+        return resolved
+
+
+def _track_metadata(track: Dict[str, Any], fallback_url: str, album: str, artist: str) -> Dict[str, str]:
+    images = track.get("album", {}).get("images", [])
+    artists = ", ".join(item.get("name", "") for item in track.get("artists", []))
+    return {
+        "spotify_url": track.get("external_urls", {}).get("spotify", fallback_url),
+        "cover_url": images[0]["url"] if images else "",
+        "album": track.get("album", {}).get("name", album),
+        "artist": artists or artist,
+        "preview_url": track.get("preview_url") or "",
+        "spotify_track_id": track.get("id", ""),
+    }
 
 
 _spotify_client = SpotifyClient()
 
 
 def enrich_song(song: Dict[str, str]) -> Dict[str, str]:
-    cache_key = " | ".join(
-        part.strip().casefold()
-        for part in [song.get("name", ""), song.get("artist", ""), song.get("album", "")]
+    metadata = _enriched_song_cache.get_or_load(
+        song_track_key(song),
+        lambda: (_load_song_metadata(song), None),
+        stale_seconds=_STALE_WHILE_REVALIDATE_SECONDS,
     )
-    cached = _cache_get(_enriched_song_cache, cache_key)
-    if cached is not None:
-        return {**song, **cached}
+    return {**song, **metadata}
+
+
+def _load_song_metadata(song: Dict[str, str]) -> Dict[str, str]:
+    stored = get_track(song)
+    if stored is not None:
+        return stored
+    metadata, source = _resolve_song(song)
+    save_tracks([(song, metadata, source)])
+    return metadata
+
+
+def _resolve_song(song: Dict[str, str]) -> Tuple[Dict[str, str], str]:
+    """Resolve metadata over the network; returns ``(metadata, source)``."""
 
     track = _spotify_client.search_track(
         song.get("name", ""),
         song.get("artist", ""),
         song.get("album", ""),
     )
-    enriched = dict(song)
-    public_track = _lookup_public_track(song.get("name", ""), song.get("artist", ""))
-    enriched["spotify_url"] = track.get("spotify_url") or song.get("spotify_url") or spotify_search_url(
-        song.get("name", ""),
-        song.get("artist", ""),
-    )
-    enriched["cover_url"] = track.get("cover_url") or public_track.get("cover_url") or song.get("cover_url", "")
-    enriched["album"] = track.get("album") or public_track.get("album") or song.get("album", "")
-    enriched["artist"] = track.get("artist") or public_track.get("artist") or song.get("artist", "")
-    if track.get("preview_url"):
-        enriched["preview_url"] = track["preview_url"]
-    elif public_track.get("preview_url"):
-        enriched["preview_url"] = public_track["preview_url"]
+    # iTunes only fills gaps, so skip it once Spotify answered every field.
+    if all(track.get(field) for field in _PUBLIC_TRACK_FIELDS):
+        public_track: Dict[str, str] = {}
+    else:
+        public_track = _lookup_public_track(song.get("name", ""), song.get("artist", ""))
+    metadata = {
+        "spotify_url": track.get("spotify_url") or song.get("spotify_url") or spotify_search_url(
+            song.get("name", ""),
+            song.get("artist", ""),
+        ),
+        "cover_url": track.get("cover_url") or public_track.get("cover_url") or song.get("cover_url", ""),
+        "album": track.get("album") or public_track.get("album") or song.get("album", ""),
+        "artist": track.get("artist") or public_track.get("artist") or song.get("artist", ""),
+        "preview_url": track.get("preview_url") or public_track.get("preview_url") or song.get("preview_url", ""),
+        "spotify_track_id": track.get("spotify_track_id") or song.get("spotify_track_id", ""),
+    }
     if track.get("spotify_track_id"):
-        enriched["spotify_track_id"] = track["spotify_track_id"]
-    metadata_only = {
-        "spotify_url": enriched.get("spotify_url", ""),
-        "cover_url": enriched.get("cover_url", ""),
-        "album": enriched.get("album", ""),
-        "artist": enriched.get("artist", ""),
-        "preview_url": enriched.get("preview_url", ""),
-        "spotify_track_id": enriched.get("spotify_track_id", ""),
+        source = "spotify"
+    elif public_track.get("cover_url"):
+        source = "itunes"
+    else:
+        source = "none"
+    return metadata, source
+
+
+class _EnrichmentMetrics:
+    def __init__(self, window: int = 512) -> None:
+        self._lock = threading.Lock()
+        self._latencies_ms: deque[float] = deque(maxlen=window)
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.deadline_misses = 0
+
+    def submitted(self) -> float:
+        with self._lock:
+            self.queued += 1
+        return time.perf_counter()
+
+    def started(self) -> None:
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+
+    def finished(self, submitted_at: float, ok: bool) -> None:
+        with self._lock:
+            self.running -= 1
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self._latencies_ms.append((time.perf_counter() - submitted_at) * 1000)
+
+    def missed_deadline(self, count: int) -> None:
+        with self._lock:
+            self.deadline_misses += count
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies_ms)
+            counters = {
+                "queue_depth": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "deadline_misses": self.deadline_misses,
+            }
+
+        def percentile(ratio: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * ratio))], 2)
+
+        return {
+            "max_workers": _ENRICH_MAX_WORKERS,
+            "deadline_seconds": _ENRICH_DEADLINE_SECONDS,
+            **counters,
+            "latency_ms_p50": percentile(0.5),
+            "latency_ms_p95": percentile(0.95),
+        }
+
+
+_enrich_metrics = _EnrichmentMetrics()
+
+
+def _enrich_tracked(song: Dict[str, str], submitted_at: float) -> Dict[str, str]:
+    _enrich_metrics.started()
+    ok = False
+    try:
+        enriched = enrich_song(song)
+        ok = True
+        return enriched
+    finally:
+        _enrich_metrics.finished(submitted_at, ok)
+
+
+def _without_artwork(song: Dict[str, str]) -> Dict[str, str]:
+    return {
+        **song,
+        "spotify_url": song.get("spotify_url") or spotify_search_url(song.get("name", ""), song.get("artist", "")),
+        "cover_url": song.get("cover_url", ""),
+    }
+
+
+def enrich_songs(songs: List[Dict[str, str]], deadline_seconds: Optional[float] = None) -> List[Dict[str, str]]:
+    """Enrich songs on the shared pool, keeping the input order.
+
+    Songs still unresolved when the deadline passes are returned without
+    artwork; their lookups keep running and fill the cache for later requests.
+    """
+
+    if not songs:
+        return []
+    deadline = _ENRICH_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds
+    try:
+        catalog = load_tracks(songs)
+    except Exception as exc:
+        logger.warning("Track catalog lookup failed: %s", exc)
+        catalog = {}
+    futures = {
+        index: _enrich_executor.submit(_enrich_tracked, song, _enrich_metrics.submitted())
+        for index, song in enumerate(songs)
+        if song_track_key(song) not in catalog
+    }
+    if futures:
+        wait(list(futures.values()), timeout=deadline)
+
+    results = []
+    missed = 0
+    for index, song in enumerate(songs):
+        future = futures.get(index)
+        if future is None:
+            results.append({**song, **catalog[song_track_key(song)]})
+            continue
+        if not future.done():
+            missed += 1
+            results.append(_without_artwork(song))
+            continue
+        try:
+            results.append(future.result())
+        except Exception as exc:
+            logger.warning("Song enrichment failed for %s: %s", song.get("name", ""), exc)
+            results.append(_without_artwork(song))
+    if missed:
+        _enrich_metrics.missed_deadline(missed)
+        logger.info("song_enrichment deadline_missed=%s of %s", missed, len(songs))
+    return results
+
+
+def enrichment_stats() -> Dict[str, Any]:
+    return _enrich_metrics.snapshot()
+
+
+def prefetch_track_catalog(limit: int = 200, recommended_within_days: int = 7) -> Dict[str, int]:
+    """Warm the catalog for recently recommended songs that are pending or stale.
+
+    Songs with a known Spotify id are refreshed through batched ``/v1/tracks``
+    calls; the rest are resolved individually on the shared enrichment pool.
+    """
+
+    candidates = tracks_to_refresh(limit=limit, recommended_within=timedelta(days=recommended_within_days))
+    resolved: List[Tuple[Dict[str, str], Dict[str, str], str]] = []
+    by_id = _spotify_client.get_tracks([song["spotify_track_id"] for song in candidates]) if _spotify_client.enabled else {}
+    remaining = []
+    for song in candidates:
+        metadata = by_id.get(song["spotify_track_id"])
+        if metadata and all(metadata.get(field) for field in _PUBLIC_TRACK_FIELDS):
+            resolved.append((song, metadata, "spotify"))
+        else:
+            remaining.append(song)
+
+    failed = 0
+    futures = [_enrich_executor.submit(_resolve_song, song) for song in remaining]
+    for song, future in zip(remaining, futures):
+        try:
+            metadata, source = future.result()
+        except Exception as exc:
+            failed += 1
+            logger.warning("Track prefetch failed for %s: %s", song.get("name", ""), exc)
+            continue
+        resolved.append((song, metadata, source))
+    save_tracks(resolved)
+    return {
+        "candidates": len(candidates),
+        "batched": len(candidates) - len(remaining),
+        "resolved": len(resolved),
+        "failed": failed,
     }
-    _cache_set(
-        _enriched_song_cache,
-        cache_key,
-        metadata_only,
-        _CACHE_TTL_SECONDS,
-    )
-    return enriched
@@ -2,7 +2,8 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, List
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
 from urllib.parse import quote
 
 
@@ -258,14 +259,15 @@ MAJOR_ARCANA: List[Dict[str, Any]] = [
 MAJOR_ARCANA_BY_NUMBER = {card["number"]: card for card in MAJOR_ARCANA}
 
 
-def tarot_reference_lines() -> List[str]:
-    return [
+@lru_cache(maxsize=1)
+def tarot_reference_lines() -> Tuple[str, ...]:
+    return tuple(
         (
             f'{card["number"]}: {card["en"]} | imagery: {card["imagery"]} | '
             f'upright: {", ".join(card["upright"])} | reversed: {", ".join(card["reversed"])}'
         )
         for card in MAJOR_ARCANA
-    ]
+    )
 
 
 def get_tarot_card(number: int) -> Dict[str, Any]:
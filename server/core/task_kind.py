@@ -2,10 +2,11 @@
 
 from __future__ import annotations
 
-from typing import Optional, Tuple
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
 import re
 
-from core.time import next_weekday_iso, upcoming_weekday_iso
+from core.time import next_weekday_iso, normalize_date_string, upcoming_weekday_iso
 
 VALID_TASK_KINDS = {"daily", "weekly", "temporary"}
 
@@ -19,6 +20,11 @@ WEEKDAY_PATTERNS = [
     (6, [r"每周日", r"每周天", r"星期日", r"星期天", r"周日", r"周天", r"礼拜日", r"礼拜天", r"\bsundays?\b", r"\bsuns?\b"]),
 ]
 
+# One alternation per weekday, for matching a whole task text at once.
+WEEKDAY_REGEXES = [
+    (weekday, re.compile("|".join(patterns), re.IGNORECASE)) for weekday, patterns in WEEKDAY_PATTERNS
+]
+
 WEEKLY_RECURRENCE_KEYWORDS = [
     "weekly",
     "every week",
@@ -65,6 +71,13 @@ ZH_RELATIVE_WEEKDAY_PATTERNS = {
     "0": 6,
 }
 
+# (this <weekday>, next <weekday>, weekday), in EN_RELATIVE_WEEKDAY_PATTERNS order.
+_EN_RELATIVE_WEEKDAY_REGEXES = [
+    (re.compile(rf"\bthis {re.escape(token)}\b"), re.compile(rf"\bnext {re.escape(token)}\b"), weekday)
+    for token, weekday in EN_RELATIVE_WEEKDAY_PATTERNS.items()
+]
+_ZH_RELATIVE_WEEKDAY_RE = re.compile(r"(这|本|下)(?:周|星期)([一二三四五六日天12345670])")
+
 
 def normalize_task_kind(value: Optional[str]) -> str:
     if value in VALID_TASK_KINDS:
@@ -72,6 +85,24 @@ def normalize_task_kind(value: Optional[str]) -> str:
     return "temporary"
 
 
+def recurs_on(task: Dict[str, Any], day: date) -> bool:
+    """Whether a daily or weekly task (as ``Task.to_dict``) occurs on ``day``.
+
+    A recurring task's ``due_date`` is the first day it applies.
+    """
+
+    kind = task.get("task_kind") or "temporary"
+    if kind not in {"daily", "weekly"}:
+        return False
+    starts = normalize_date_string(task.get("due_date"))
+    if starts and starts > day.isoformat():
+        return False
+    if kind == "weekly":
+        weekday = task.get("recurrence_weekday")
+        return weekday is not None and int(weekday) == day.weekday()
+    return True
+
+
 def normalize_recurrence_weekday(value: Optional[int]) -> Optional[int]:
     if value is None:
         return None
@@ -114,8 +145,8 @@ def infer_recurrence_weekday(
         return normalized
 
     combined = f"{title} {description}".strip().lower()
-    for weekday, patterns in WEEKDAY_PATTERNS:
-        if any(re.search(pattern, combined, flags=re.IGNORECASE) for pattern in patterns):
+    for weekday, pattern in WEEKDAY_REGEXES:
+        if pattern.search(combined):
             return weekday
     return None
 
@@ -133,13 +164,13 @@ def infer_relative_due_date(title: str, description: str = "") -> Optional[str]:
     if not normalized:
         return None
 
-    for token, weekday in EN_RELATIVE_WEEKDAY_PATTERNS.items():
-        if re.search(rf"\bthis {re.escape(token)}\b", normalized):
+    for this_weekday, next_weekday, weekday in _EN_RELATIVE_WEEKDAY_REGEXES:
+        if this_weekday.search(normalized):
             return upcoming_weekday_iso(weekday)
-        if re.search(rf"\bnext {re.escape(token)}\b", normalized):
+        if next_weekday.search(normalized):
             return next_weekday_iso(weekday)
 
-    zh_match = re.search(r"(这|本|下)(?:周|星期)([一二三四五六日天12345670])", combined)
+    zh_match = _ZH_RELATIVE_WEEKDAY_RE.search(combined)
     if zh_match:
         weekday = ZH_RELATIVE_WEEKDAY_PATTERNS.get(zh_match.group(2))
         if weekday is None:
@@ -110,3 +110,14 @@ def ensure_utc(value: datetime | None) -> datetime | None:
 def datetime_to_iso(value: datetime | None) -> str | None:
     aware = ensure_utc(value)
     return aware.isoformat() if aware else None
+
+
+def local_date_iso(value: datetime | str | None) -> str | None:
+    """Local calendar date of a stored timestamp; naive values are UTC."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    aware = ensure_utc(value)
+    return aware.astimezone(APP_TIMEZONE).date().isoformat() if aware else None
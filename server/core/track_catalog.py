@@ -0,0 +1,161 @@
+"""Persistent catalog of resolved song metadata (``track_catalog`` table).
+
+Song enrichment reads through this table before any network call, so a song
+that was resolved once is served from the database by every worker until the
+entry ages out and the prefetch job refreshes it.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from database.db import get_db
+from database.models import TrackCatalogEntry
+
+logger = logging.getLogger("deletion-planner-track-catalog")
+
+TRACK_FIELDS = ("spotify_url", "cover_url", "album", "artist", "preview_url", "spotify_track_id")
+RESOLVED_MAX_AGE = timedelta(days=30)
+UNRESOLVED_MAX_AGE = timedelta(days=1)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _normalize(value: str) -> str:
+    return " ".join(str(value or "").split()).casefold()
+
+
+def track_key(name: str, artist: str = "", album: str = "") -> str:
+    return " | ".join(_normalize(part) for part in (name, artist, album))
+
+
+def song_track_key(song: Dict[str, str]) -> str:
+    return track_key(song.get("name", ""), song.get("artist", ""), song.get("album", ""))
+
+
+def _is_current(entry: TrackCatalogEntry, now: datetime) -> bool:
+    if entry.resolved_at is None:
+        return False
+    max_age = UNRESOLVED_MAX_AGE if entry.source == "none" else RESOLVED_MAX_AGE
+    return now - entry.resolved_at.replace(tzinfo=None) < max_age
+
+
+def _metadata(entry: TrackCatalogEntry) -> Dict[str, str]:
+    return {field: getattr(entry, field) or "" for field in TRACK_FIELDS}
+
+
+def load_tracks(songs: Iterable[Dict[str, str]], remember: bool = True) -> Dict[str, Dict[str, str]]:
+    """Return current catalog metadata keyed by track key, in one query.
+
+    With ``remember`` the songs are also recorded as recommended now; songs
+    missing from the catalog get a pending row for the prefetch job.
+    """
+
+    by_key = {song_track_key(song): song for song in songs}
+    by_key.pop(track_key(""), None)
+    if not by_key:
+        return {}
+    now = _utcnow()
+    found: Dict[str, Dict[str, str]] = {}
+    try:
+        with get_db() as db:
+            entries = db.query(TrackCatalogEntry).filter(TrackCatalogEntry.lookup_key.in_(list(by_key))).all()
+            for entry in entries:
+                if _is_current(entry, now):
+                    found[entry.lookup_key] = _metadata(entry)
+                if remember:
+                    entry.last_recommended_at = now
+            if remember:
+                known = {entry.lookup_key for entry in entries}
+                for key, song in by_key.items():
+                    if key not in known:
+                        db.add(_new_entry(key, song, now))
+    except IntegrityError:
+        # Another worker inserted the same pending row first; the lookups
+        # above are still valid.
+        logger.info("Track catalog pending rows raced with another worker.")
+    return found
+
+
+def _new_entry(key: str, song: Dict[str, str], now: datetime) -> TrackCatalogEntry:
+    return TrackCatalogEntry(
+        lookup_key=key,
+        name=str(song.get("name", ""))[:255],
+        artist=str(song.get("artist", ""))[:255],
+        album=str(song.get("album", ""))[:255],
+        last_recommended_at=now,
+    )
+
+
+def save_tracks(resolved: List[tuple[Dict[str, str], Dict[str, str], str]]) -> None:
+    """Upsert ``(song, metadata, source)`` triples into the catalog."""
+
+    if not resolved:
+        return
+    now = _utcnow()
+    rows = {song_track_key(song): (song, metadata, source) for song, metadata, source in resolved}
+    try:
+        with get_db() as db:
+            existing = {
+                entry.lookup_key: entry
+                for entry in db.query(TrackCatalogEntry).filter(TrackCatalogEntry.lookup_key.in_(list(rows))).all()
+            }
+            for key, (song, metadata, source) in rows.items():
+                entry = existing.get(key)
+                if entry is None:
+                    entry = _new_entry(key, song, now)
+                    db.add(entry)
+                for field in TRACK_FIELDS:
+                    setattr(entry, field, str(metadata.get(field, "") or ""))
+                entry.source = source
+                entry.resolved_at = now
+    except IntegrityError:
+        logger.info("Track catalog upsert raced with another worker; keeping the stored row.")
+
+
+def tracks_to_refresh(limit: int = 200, recommended_within: timedelta = timedelta(days=7)) -> List[Dict[str, str]]:
+    """Recently recommended catalog rows that are pending or out of date."""
+
+    now = _utcnow()
+    with get_db() as db:
+        entries = (
+            db.query(TrackCatalogEntry)
+            .filter(
+                TrackCatalogEntry.last_recommended_at >= now - recommended_within,
+                or_(
+                    TrackCatalogEntry.resolved_at.is_(None),
+                    TrackCatalogEntry.resolved_at < now - UNRESOLVED_MAX_AGE,
+                ),
+            )
+            .order_by(TrackCatalogEntry.last_recommended_at.desc())
+            .limit(limit * 4)
+            .all()
+        )
+        candidates = [entry for entry in entries if not _is_current(entry, now)][:limit]
+        return [
+            {
+                "name": entry.name or "",
+                "artist": entry.artist or "",
+                "album": entry.album or "",
+                "spotify_track_id": entry.spotify_track_id or "",
+            }
+            for entry in candidates
+        ]
+
+
+def catalog_size() -> Dict[str, int]:
+    with get_db() as db:
+        total = db.query(TrackCatalogEntry).count()
+        resolved = db.query(TrackCatalogEntry).filter(TrackCatalogEntry.resolved_at.isnot(None)).count()
+    return {"entries": total, "resolved": resolved}
+
+
+def get_track(song: Dict[str, str]) -> Optional[Dict[str, str]]:
+    return load_tracks([song], remember=False).get(song_track_key(song))
@@ -0,0 +1,103 @@
+"""Per-worker warm-up started from ``startup()``.
+
+Everything that would otherwise be paid by the first request a worker serves
+is done here instead: the LLM runtime config is read from the database and
+the tarot reference block used in fortune prompts is built. ``start_warm_up``
+runs it on a background thread so the worker can already answer ``/health``;
+the readiness endpoint stays at 503 until ``warm_up`` has finished, so a
+rolling deploy never routes traffic to a cold worker.
+"""
+
+from __future__ import annotations
+
+import gc
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("deletion-planner-warmup")
+
+_report: Optional[Dict[str, Any]] = None
+_report_lock = threading.Lock()
+
+
+def _load_llm_config() -> Dict[str, Any]:
+    from core.llm import get_llm_service, get_runtime_config
+
+    config = get_runtime_config()
+    for lang in ("en", "zh"):
+        get_llm_service(lang=lang)
+    return {"provider": config.get("provider", "")}
+
+
+def _build_tarot_reference() -> Dict[str, Any]:
+    from core.tarot_catalog import MAJOR_ARCANA, tarot_reference_lines
+
+    tarot_reference_lines()
+    return {"cards": len(MAJOR_ARCANA)}
+
+
+_STEPS: tuple[tuple[str, Callable[[], Dict[str, Any]]], ...] = (
+    ("llm_config", _load_llm_config),
+    ("tarot_catalog", _build_tarot_reference),
+)
+
+
+def warm_up(extra_timings_ms: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """Run every warm-up step, record the startup report and mark the worker ready.
+
+    A failing step is logged and reported but does not keep the worker out of
+    rotation; it only means that step is paid lazily by the first request.
+    """
+
+    started = time.perf_counter()
+    steps: Dict[str, Dict[str, Any]] = {}
+    for name, step in _STEPS:
+        step_started = time.perf_counter()
+        try:
+            details = step()
+            status = "ok"
+        except Exception as exc:  # noqa: BLE001 - warm-up must never block startup
+            logger.warning("Warm-up step %s failed: %s", name, exc)
+            details, status = {"error": str(exc)}, "failed"
+        steps[name] = {"status": status, "duration_ms": round((time.perf_counter() - step_started) * 1000, 2), **details}
+
+    # Objects created so far live for the whole process; moving them out of the
+    # collected generations keeps them out of every later GC pass.
+    gc.freeze()
+
+    report: Dict[str, Any] = {
+        "steps": steps,
+        "timings_ms": {name: round(value, 2) for name, value in (extra_timings_ms or {}).items()},
+        "warm_up_ms": round((time.perf_counter() - started) * 1000, 2),
+        "frozen_objects": gc.get_freeze_count(),
+        "completed_at": time.time(),
+    }
+    global _report
+    with _report_lock:
+        _report = report
+    logger.info(
+        "warm-up complete warm_up_ms=%.2f %s",
+        report["warm_up_ms"],
+        " ".join(f"{name}_ms={step['duration_ms']:.2f}" for name, step in steps.items()),
+    )
+    return report
+
+
+def start_warm_up(extra_timings_ms: Optional[Dict[str, float]] = None) -> threading.Thread:
+    """Run ``warm_up`` on a daemon thread; ``is_ready`` turns true when it finishes."""
+
+    thread = threading.Thread(target=warm_up, args=(extra_timings_ms,), name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready() -> bool:
+    with _report_lock:
+        return _report is not None
+
+
+def startup_report() -> Optional[Dict[str, Any]]:
+    with _report_lock:
+        return _report
@@ -1,11 +1,19 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from contextlib import contextmanager
+from sqlalchemy import create_engine, event, insert, select, update
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
 import json
+import logging
 import os
+import threading
+import time
 from pathlib import Path
 
-from database.models import Base
+from database.models import AppSetting, Base
+
+logger = logging.getLogger("deletion-planner-db")
 
 DEFAULT_SQLITE_PATH = (Path(__file__).resolve().parents[1] / "deletion_planner.db").resolve()
 
@@ -15,22 +23,375 @@ DATABASE_URL = os.getenv(
     f"sqlite:///{DEFAULT_SQLITE_PATH}"
 )
 
-engine = create_engine(
-    DATABASE_URL,
-    echo=False,
+# ── SQLite production profile ─────────────────────────────
+# "tuned" (default) enables WAL and the pragmas below, a separate read-only
+# connection pool and serialized writers; "default" keeps stock SQLite
+# behaviour (used as the benchmark baseline).
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "tuned").strip().lower()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-32000")),
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    "temp_store": "MEMORY",
+}
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+
+# ── Server database pool ──────────────────────────────────
+# Sync handlers run on the anyio threadpool (THREADPOOL_WORKERS threads per
+# uvicorn worker), so the pool keeps a quarter of that warm and may burst to
+# one connection per thread; a request thread never waits on pool_timeout
+# while a thread is free. Connections are recycled instead of pinged.
+THREADPOOL_WORKERS = int(os.getenv("THREADPOOL_WORKERS", "40"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", str(max(5, THREADPOOL_WORKERS // 4))))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", str(max(0, THREADPOOL_WORKERS - DB_POOL_SIZE))))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "0") == "1"
+# PgBouncer in transaction mode cannot route server-side prepared statements.
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0") == "1"
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_sqlite_file(url: str) -> bool:
+    return _is_sqlite(url) and ":memory:" not in url and url.rstrip("/") not in ("sqlite:", "sqlite:/")
+
+
+def _sqlite_pragma_listener(read_only: bool):
+    def configure(dbapi_connection, _record) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in SQLITE_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            if read_only:
+                cursor.execute("PRAGMA query_only=ON")
+        finally:
+            cursor.close()
+
+    return configure
+
+
+class TimedQueuePool(QueuePool):
+    """``QueuePool`` that records how long each checkout waited."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.checkout_ms: "deque[float]" = deque(maxlen=1000)
+        self.checkouts = 0
+        self.connections_created = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.checkouts += 1
+            self.checkout_ms.append((time.perf_counter() - started) * 1000)
+
+    def _create_connection(self):
+        self.connections_created += 1
+        return super()._create_connection()
+
+    def recreate(self):
+        # Carry counters across dispose(); the samples restart empty.
+        pool = super().recreate()
+        pool.checkouts = self.checkouts
+        pool.connections_created = self.connections_created
+        return pool
+
+    def stats(self):
+        samples = sorted(self.checkout_ms)
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else 0.0
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": self.overflow(),
+            "checkouts": self.checkouts,
+            "connections_created": self.connections_created,
+            "checkout_p95_ms": round(p95, 3),
+        }
+
+
+def _server_connect_args(url: str):
+    if not DB_PGBOUNCER:
+        return {}
+    if "+psycopg" in url:
+        return {"prepare_threshold": None}
+    if "+asyncpg" in url:
+        return {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+    return {}
+
+
+def create_engines(url: str, tuned: bool = True):
+    """Return ``(engine, read_engine)`` for ``url``.
+
+    Outside the tuned SQLite profile both names refer to the same engine.
+    """
+
+    if not _is_sqlite(url):
+        engine = create_engine(
+            url,
+            echo=False,
+            poolclass=TimedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_pre_ping=DB_POOL_PRE_PING,
+            pool_use_lifo=True,
+            connect_args=_server_connect_args(url),
+        )
+        return engine, engine
+
     # SQLite needs check_same_thread=False for Flask's threaded mode
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
-    pool_pre_ping=True,
-)
+    connect_args = {"check_same_thread": False}
+    if not (tuned and _is_sqlite_file(url)):
+        engine = create_engine(url, echo=False, connect_args=connect_args, pool_pre_ping=True)
+        return engine, engine
+
+    connect_args["timeout"] = SQLITE_BUSY_TIMEOUT_MS / 1000
+    engine = create_engine(url, echo=False, connect_args=connect_args, poolclass=TimedQueuePool)
+    read_engine = create_engine(
+        url,
+        echo=False,
+        connect_args=connect_args,
+        poolclass=TimedQueuePool,
+        pool_size=SQLITE_READ_POOL_SIZE,
+        max_overflow=SQLITE_READ_POOL_SIZE,
+    )
+    event.listen(engine, "connect", _sqlite_pragma_listener(read_only=False))
+    event.listen(read_engine, "connect", _sqlite_pragma_listener(read_only=True))
+    return engine, read_engine
+
+
+class _WriterGate:
+    """Serializes write transactions within the process.
+
+    SQLite allows one writer at a time; queueing writers here instead of in
+    SQLite's busy handler avoids ``database is locked`` errors under load. A
+    session takes the gate on its first flush or DML statement and releases
+    it when its transaction ends. A waiter gives up after the busy timeout and
+    falls back to SQLite's own locking.
+    """
+
+    def __init__(self, timeout_seconds: float) -> None:
+        self._lock = threading.Lock()
+        self._owner_thread = None
+        self.timeout_seconds = timeout_seconds
+        self.acquired = 0
+        self.contended = 0
+        self.timeouts = 0
+
+    def hold(self, session: Session) -> None:
+        if session.info.get("_writer_gate"):
+            return
+        if self._owner_thread == threading.get_ident():
+            # A nested session on the thread that already writes: waiting
+            # would only deadlock against ourselves.
+            return
+        if not self._lock.acquire(blocking=False):
+            self.contended += 1
+            if not self._lock.acquire(timeout=self.timeout_seconds):
+                self.timeouts += 1
+                logger.warning("SQLite writer gate wait exceeded %.1fs; continuing unserialized", self.timeout_seconds)
+                return
+        self.acquired += 1
+        self._owner_thread = threading.get_ident()
+        session.info["_writer_gate"] = True
+
+    def release(self, session: Session) -> None:
+        if session.info.pop("_writer_gate", False):
+            self._owner_thread = None
+            self._lock.release()
+
+    def install(self, session_factory) -> None:
+        @event.listens_for(session_factory, "before_flush")
+        def _before_flush(session, _flush_context, _instances):
+            self.hold(session)
+
+        @event.listens_for(session_factory, "do_orm_execute")
+        def _before_execute(state):
+            if not state.is_select:
+                self.hold(state.session)
+
+        @event.listens_for(session_factory, "after_transaction_end")
+        def _after_transaction_end(session, transaction):
+            if transaction.parent is None:
+                self.release(session)
+
+    def stats(self):
+        return {
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "timeouts": self.timeouts,
+            "held": self._lock.locked(),
+        }
+
+
+SQLITE_TUNED = _is_sqlite(DATABASE_URL) and SQLITE_PROFILE == "tuned"
+engine, read_engine = create_engines(DATABASE_URL, tuned=SQLITE_TUNED)
 
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+ReadSessionLocal = sessionmaker(bind=read_engine, autocommit=False, autoflush=False)
+
+# ── Async sessions ────────────────────────────────────────
+# Created on first use so the sync-only scripts and tools never need an
+# async driver installed.
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+psycopg",
+    "postgresql+psycopg2": "postgresql+psycopg",
+}
+_async_engine = None
+_AsyncSessionLocal = None
+_AsyncReadSessionLocal = None
+_async_lock = threading.Lock()
+
+
+def async_database_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+def _begin_immediate(async_engine) -> None:
+    """Open every transaction on ``async_engine`` with ``BEGIN IMMEDIATE``.
+
+    The writer gate serializes sync sessions with a thread lock, which the
+    event loop cannot wait on. Async writers take SQLite's write lock up front
+    instead, so they queue behind each other and behind sync writers on the
+    busy timeout rather than failing with "database is locked" at commit.
+    """
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _driver_autocommit(dbapi_connection, _record):
+        # Leave BEGIN to the hook below instead of the driver's implicit one.
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(async_engine.sync_engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def _async_session_factory(read_only: bool = False):
+    global _async_engine, _AsyncSessionLocal, _AsyncReadSessionLocal
+    if _AsyncSessionLocal is None:
+        with _async_lock:
+            if _AsyncSessionLocal is None:
+                from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+                url = async_database_url(DATABASE_URL)
+                async_read_engine = None
+                if _is_sqlite(url):
+                    # Opening a SQLite file is cheap, and unpooled connections
+                    # never outlive the event loop that opened them.
+                    async_engine = create_async_engine(
+                        url,
+                        echo=False,
+                        poolclass=NullPool,
+                        connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+                    )
+                    if SQLITE_TUNED:
+                        event.listen(async_engine.sync_engine, "connect", _sqlite_pragma_listener(read_only=False))
+                        _begin_immediate(async_engine)
+                        # Readers keep deferred transactions and never hold the write lock.
+                        async_read_engine = create_async_engine(
+                            url,
+                            echo=False,
+                            poolclass=NullPool,
+                            connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+                        )
+                        event.listen(async_read_engine.sync_engine, "connect", _sqlite_pragma_listener(read_only=True))
+                else:
+                    async_engine = create_async_engine(
+                        url,
+                        echo=False,
+                        pool_size=DB_POOL_SIZE,
+                        max_overflow=DB_MAX_OVERFLOW,
+                        pool_recycle=DB_POOL_RECYCLE,
+                        pool_timeout=DB_POOL_TIMEOUT,
+                        pool_pre_ping=DB_POOL_PRE_PING,
+                        pool_use_lifo=True,
+                        connect_args=_server_connect_args(url),
+                    )
+                _async_engine = async_engine
+                _AsyncReadSessionLocal = async_sessionmaker(
+                    bind=async_read_engine or async_engine, autoflush=False, expire_on_commit=False
+                )
+                _AsyncSessionLocal = async_sessionmaker(
+                    bind=async_engine, autoflush=False, expire_on_commit=False
+                )
+    return _AsyncReadSessionLocal if read_only else _AsyncSessionLocal
+
+writer_gate = _WriterGate(SQLITE_BUSY_TIMEOUT_MS / 1000)
+if SQLITE_TUNED:
+    writer_gate.install(SessionLocal)
+
+
+# Bump whenever the models or ``_ensure_sqlite_compat_schema`` change: the next
+# start runs the full create/patch pass once and re-stamps the database.
+SCHEMA_VERSION = 3
+SCHEMA_VERSION_KEY = "schema_version"
+
+
+def schema_version():
+    """Version stamped in ``app_settings``, or None for an unstamped database."""
+    table = AppSetting.__table__
+    try:
+        with engine.connect() as conn:
+            raw = conn.execute(select(table.c.value).where(table.c.key == SCHEMA_VERSION_KEY)).scalar()
+    except (OperationalError, ProgrammingError):
+        return None
+    try:
+        return int(json.loads(raw)["version"]) if raw else None
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+def _stamp_schema_version():
+    table = AppSetting.__table__
+    value = json.dumps({"version": SCHEMA_VERSION})
+    with engine.begin() as conn:
+        updated = conn.execute(
+            update(table).where(table.c.key == SCHEMA_VERSION_KEY).values(value=value)
+        ).rowcount
+        if not updated:
+            conn.execute(insert(table).values(key=SCHEMA_VERSION_KEY, value=value))
 
 
 def init_db():
-    """Create all tables if they don't exist."""
-    Base.metadata.create_all(bind=engine)
-    _ensure_sqlite_compat_schema()
-    _migrate_legacy_single_user_data()
+    """Bring the schema up to date and return per-step timings in milliseconds.
+
+    A database already stamped with ``SCHEMA_VERSION`` costs one lookup; the
+    create/patch pass only runs on new or older databases. Legacy single-user
+    data is migrated by ``scripts/migrate_legacy_data.py``, not here.
+    """
+    timings = {}
+
+    def timed(name, step):
+        started = time.perf_counter()
+        result = step()
+        timings[name] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    current = timed("schema_check", schema_version)
+    if current is not None and current >= SCHEMA_VERSION:
+        return timings
+    timed("create_all", lambda: Base.metadata.create_all(bind=engine))
+    timed("compat_schema", _ensure_sqlite_compat_schema)
+    if timed("legacy_check", legacy_data_pending):
+        logger.warning(
+            "Legacy single-user data found; run scripts/migrate_legacy_data.py to assign it to a user"
+        )
+    timed("stamp", _stamp_schema_version)
+    logger.info("Schema upgraded from version %s to %s", current, SCHEMA_VERSION)
+    return timings
 
 
 def _ensure_sqlite_compat_schema():
@@ -88,6 +449,13 @@ def _ensure_sqlite_compat_schema():
         conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS idx_daily_plans_date ON daily_plans(date)")
         conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS idx_task_history_date ON task_history(date)")
 
+        plan_cols = conn.exec_driver_sql("PRAGMA table_info(daily_plans)").fetchall()
+        plan_col_names = {row[1] for row in plan_cols}
+        if "input_version" not in plan_col_names:
+            conn.exec_driver_sql("ALTER TABLE daily_plans ADD COLUMN input_version VARCHAR(64)")
+        if "artifacts" not in plan_col_names:
+            conn.exec_driver_sql("ALTER TABLE daily_plans ADD COLUMN artifacts TEXT DEFAULT '{}'")
+
         # ── User table new columns ──
         user_cols = conn.exec_driver_sql("PRAGMA table_info(users)").fetchall()
         user_col_names = {row[1] for row in user_cols}
@@ -118,6 +486,18 @@ def _ensure_sqlite_compat_schema():
         )
         conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS idx_daily_fortunes_user_date ON daily_fortunes(user_id, date)")
 
+        conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS task_occurrences ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "user_id INTEGER NOT NULL, "
+            "task_id INTEGER NOT NULL, "
+            "date VARCHAR(10) NOT NULL, "
+            "status VARCHAR(20) DEFAULT 'completed', "
+            "completed_at DATETIME, "
+            "CONSTRAINT uq_task_occurrences_task_date UNIQUE (task_id, date))"
+        )
+        conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS idx_task_occurrences_user_date ON task_occurrences(user_id, date)")
+
         conn.exec_driver_sql(
             "CREATE TABLE IF NOT EXISTS focus_sessions ("
             "id INTEGER PRIMARY KEY AUTOINCREMENT, "
@@ -131,14 +511,31 @@ def _ensure_sqlite_compat_schema():
         conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS idx_focus_sessions_user_date ON focus_sessions(user_id, date)")
 
 
-def _migrate_legacy_single_user_data():
+_LEGACY_SETTINGS_QUERY = "SELECT key, value FROM app_settings WHERE key IN ('prototype_onboarding', 'prototype_session')"
+_LEGACY_PLANS_QUERY = "SELECT id, date FROM daily_plans WHERE instr(date, ':') = 0"
+
+
+def legacy_data_pending():
+    """Whether the pre-multi-user settings or unscoped plans are still present."""
     if "sqlite" not in DATABASE_URL:
-        return
+        return False
+    with engine.connect() as conn:
+        return bool(
+            conn.exec_driver_sql(_LEGACY_SETTINGS_QUERY + " LIMIT 1").first()
+            or conn.exec_driver_sql(_LEGACY_PLANS_QUERY + " LIMIT 1").first()
+        )
+
+
+def migrate_legacy_single_user_data():
+    """Assign single-user prototype data to a user account (one-shot).
+
+    Returns what was migrated; a database without legacy data is left as is.
+    """
+    if "sqlite" not in DATABASE_URL or not legacy_data_pending():
+        return {"migrated": False}
 
     with engine.begin() as conn:
-        rows = conn.exec_driver_sql(
-            "SELECT key, value FROM app_settings WHERE key IN ('prototype_onboarding', 'prototype_session')"
-        ).fetchall()
+        rows = conn.exec_driver_sql(_LEGACY_SETTINGS_QUERY).fetchall()
         raw = {key: value for key, value in rows}
         legacy_onboarding = None
         legacy_session = None
@@ -178,9 +575,7 @@ def _migrate_legacy_single_user_data():
                 conn.exec_driver_sql("SELECT id FROM users WHERE username = ?", (legacy_name,)).fetchone()[0]
             )
 
-        unnamed_plans = conn.exec_driver_sql(
-            "SELECT id, date FROM daily_plans WHERE instr(date, ':') = 0"
-        ).fetchall()
+        unnamed_plans = conn.exec_driver_sql(_LEGACY_PLANS_QUERY).fetchall()
         if unnamed_plans:
             conn.exec_driver_sql(
                 "UPDATE tasks SET user_id = ? WHERE user_id = 1",
@@ -204,6 +599,11 @@ def _migrate_legacy_single_user_data():
                     (onboarding_key, json.dumps(legacy_onboarding, ensure_ascii=False)),
                 )
 
+        # Both rows now live on the user; dropping them marks the migration done.
+        conn.exec_driver_sql("DELETE FROM app_settings WHERE key IN ('prototype_onboarding', 'prototype_session')")
+
+    return {"migrated": True, "user_id": legacy_user_id, "username": legacy_name, "plans": len(unnamed_plans)}
+
 
 @contextmanager
 def get_db():
@@ -217,3 +617,75 @@ def get_db():
         raise
     finally:
         session.close()
+
+
+def pool_stats():
+    """Connection pool state for the write and read engines."""
+
+    def describe(target):
+        pool = target.pool
+        if isinstance(pool, TimedQueuePool):
+            return pool.stats()
+        return {"pool": type(pool).__name__, "status": pool.status()}
+
+    stats = {
+        "dialect": engine.dialect.name,
+        "driver": engine.dialect.driver,
+        "pgbouncer_mode": DB_PGBOUNCER,
+        "threadpool_workers": THREADPOOL_WORKERS,
+        "write_pool": describe(engine),
+        "read_pool": describe(read_engine) if read_engine is not engine else None,
+        "async_pool": {"status": _async_engine.pool.status()} if _async_engine is not None else None,
+    }
+    if SQLITE_TUNED:
+        stats["writer_gate"] = writer_gate.stats()
+    return stats
+
+
+@contextmanager
+def get_read_db():
+    """Session for read-only request paths.
+
+    With the tuned SQLite profile it comes from a separate pool of
+    ``query_only`` connections, so readers never queue behind the writer; on
+    other databases it is an ordinary session that is never committed.
+    """
+    session = ReadSessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+
+
+@asynccontextmanager
+async def get_async_db():
+    """Async counterpart of ``get_db`` for ``async def`` handlers.
+
+    Handlers keep the transaction short: read or write inside the block and
+    await upstream calls (LLM, Spotify) outside it. Existing sync helpers run
+    on the async connection through ``await session.run_sync(fn, ...)``.
+    """
+    session = _async_session_factory()()
+    try:
+        yield session
+        await session.commit()
+    except BaseException:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+
+@asynccontextmanager
+async def get_async_read_db():
+    """Async session for read-only phases; never committed.
+
+    With the tuned SQLite profile its connections are ``query_only``.
+    """
+    session = _async_session_factory(read_only=True)()
+    try:
+        yield session
+    finally:
+        await session.rollback()
+        await session.close()
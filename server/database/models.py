@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Column, Integer, String, Text, DateTime, ForeignKey, Index
+    Column, Integer, String, Text, DateTime, ForeignKey, Index, UniqueConstraint
 )
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime, timezone
@@ -103,6 +103,7 @@ class Task(Base):
     user = relationship("User", back_populates="tasks")
     plan_tasks = relationship("PlanTask", back_populates="task", cascade="all, delete-orphan")
     history = relationship("TaskHistory", back_populates="task", cascade="all, delete-orphan")
+    occurrences = relationship("TaskOccurrence", back_populates="task", cascade="all, delete-orphan")
 
     def to_dict(self):
         return {
@@ -139,6 +140,10 @@ class DailyPlan(Base):
     reasoning = Column(Text, default="")
     overload_warning = Column(Text, default="")
     max_tasks = Column(Integer, default=4)
+    # Rendered plan views ({"<lang>:<capacity>": view}) and the hash of the
+    # task inputs they were derived from; stale once the hash changes.
+    input_version = Column(String(64), nullable=True)
+    artifacts = Column(Text, default="{}")
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
     # Relationships
@@ -215,6 +220,25 @@ class TaskHistory(Base):
         }
 
 
+class TaskOccurrence(Base):
+    """Per-date state of a recurring task; only completed occurrences have a row."""
+    __tablename__ = "task_occurrences"
+    __table_args__ = (
+        UniqueConstraint("task_id", "date", name="uq_task_occurrences_task_date"),
+        Index("idx_task_occurrences_user_date", "user_id", "date"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
+    date = Column(String(10), nullable=False)  # YYYY-MM-DD
+    status = Column(String(20), default=TaskStatus.COMPLETED.value)
+    completed_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    # Relationships
+    task = relationship("Task", back_populates="occurrences")
+
+
 class AppSetting(Base):
     """Key-value store for application settings (e.g. LLM config)."""
     __tablename__ = "app_settings"
@@ -265,3 +289,25 @@ class FocusSession(Base):
     duration_minutes = Column(Integer, nullable=False)
     session_type = Column(String(10), default="work")  # work/break
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class TrackCatalogEntry(Base):
+    """Resolved Spotify/iTunes metadata for one recommended song."""
+    __tablename__ = "track_catalog"
+    __table_args__ = (
+        Index("idx_track_catalog_recommended", "last_recommended_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    lookup_key = Column(String(512), nullable=False, unique=True)  # normalized "name | artist | album"
+    name = Column(String(255), default="")
+    artist = Column(String(255), default="")
+    album = Column(String(255), default="")
+    spotify_url = Column(Text, default="")
+    cover_url = Column(Text, default="")
+    preview_url = Column(Text, default="")
+    spotify_track_id = Column(String(64), default="")
+    source = Column(String(20), default="")  # spotify / itunes / none; empty until resolved
+    resolved_at = Column(DateTime, nullable=True)
+    last_recommended_at = Column(DateTime, nullable=True)
+
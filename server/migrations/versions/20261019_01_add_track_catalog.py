@@ -0,0 +1,42 @@
+"""add persistent track catalog
+
+Revision ID: 20261019_01
+Revises: 20260214_01
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261019_01"
+down_revision = "20260214_01"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if "track_catalog" in sa.inspect(bind).get_table_names():
+        return
+    op.create_table(
+        "track_catalog",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("lookup_key", sa.String(length=512), nullable=False, unique=True),
+        sa.Column("name", sa.String(length=255), server_default=""),
+        sa.Column("artist", sa.String(length=255), server_default=""),
+        sa.Column("album", sa.String(length=255), server_default=""),
+        sa.Column("spotify_url", sa.Text(), server_default=""),
+        sa.Column("cover_url", sa.Text(), server_default=""),
+        sa.Column("preview_url", sa.Text(), server_default=""),
+        sa.Column("spotify_track_id", sa.String(length=64), server_default=""),
+        sa.Column("source", sa.String(length=20), server_default=""),
+        sa.Column("resolved_at", sa.DateTime(), nullable=True),
+        sa.Column("last_recommended_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("idx_track_catalog_recommended", "track_catalog", ["last_recommended_at"])
+
+
+def downgrade():
+    op.drop_index("idx_track_catalog_recommended", table_name="track_catalog")
+    op.drop_table("track_catalog")
@@ -0,0 +1,33 @@
+"""add persisted plan artifacts
+
+Revision ID: 20261019_02
+Revises: 20261019_01
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261019_02"
+down_revision = "20261019_01"
+branch_labels = None
+depends_on = None
+
+
+def _safe_add_column(table, column):
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    columns = [c["name"] for c in inspector.get_columns(table)]
+    if column.name not in columns:
+        op.add_column(table, column)
+
+
+def upgrade():
+    _safe_add_column("daily_plans", sa.Column("input_version", sa.String(length=64), nullable=True))
+    _safe_add_column("daily_plans", sa.Column("artifacts", sa.Text(), nullable=True, server_default="{}"))
+
+
+def downgrade():
+    op.drop_column("daily_plans", "artifacts")
+    op.drop_column("daily_plans", "input_version")
@@ -0,0 +1,37 @@
+"""add task occurrences
+
+Revision ID: 20261019_03
+Revises: 20261019_02
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261019_03"
+down_revision = "20261019_02"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if "task_occurrences" in sa.inspect(bind).get_table_names():
+        return
+    op.create_table(
+        "task_occurrences",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("task_id", sa.Integer(), sa.ForeignKey("tasks.id"), nullable=False),
+        sa.Column("date", sa.String(length=10), nullable=False),
+        sa.Column("status", sa.String(length=20), server_default="completed"),
+        sa.Column("completed_at", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("task_id", "date", name="uq_task_occurrences_task_date"),
+    )
+    op.create_index("idx_task_occurrences_user_date", "task_occurrences", ["user_id", "date"])
+
+
+def downgrade():
+    op.drop_index("idx_task_occurrences_user_date", table_name="task_occurrences")
+    op.drop_table("task_occurrences")
@@ -0,0 +1,161 @@
+"""Mixed read/write concurrency benchmark for the SQLite profiles.
+
+Runs the same workload — worker processes (standing in for uvicorn workers),
+each with reader threads querying ``app_settings`` and writer threads
+upserting into it, every operation in its own session — against a fresh
+database file twice: once with stock SQLite settings (one pool for
+everything, rollback journal) and once with the tuned profile (WAL, pragmas,
+``query_only`` read pool, serialized writers). Prints throughput, latency and
+the number of ``database is locked`` errors for each.
+
+Usage:
+    python scripts/bench_sqlite_concurrency.py [--seconds 5] [--processes 4] [--readers 4] [--writers 2]
+"""
+
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVER_DIR))
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from database.db import SQLITE_BUSY_TIMEOUT_MS, _WriterGate, create_engines  # noqa: E402
+from database.models import AppSetting, Base  # noqa: E402
+
+BENCH_DB = SERVER_DIR / "bench_sqlite_concurrency.db"
+KEYS = 200
+
+
+def _remove_db() -> None:
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        path = Path(f"{BENCH_DB}{suffix}")
+        if path.exists():
+            path.unlink()
+
+
+def _percentile(samples: list[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _sessions(profile: str):
+    tuned = profile == "tuned"
+    engine, read_engine = create_engines(f"sqlite:///{BENCH_DB}", tuned=tuned)
+    Writes = sessionmaker(bind=engine, autoflush=False)
+    Reads = sessionmaker(bind=read_engine, autoflush=False)
+    if tuned:
+        _WriterGate(SQLITE_BUSY_TIMEOUT_MS / 1000).install(Writes)
+    return engine, read_engine, Writes, Reads
+
+
+def _worker(profile: str, seconds: float, readers: int, writers: int, process_index: int) -> dict:
+    engine, read_engine, Writes, Reads = _sessions(profile)
+    lock = threading.Lock()
+    results = {"read": [], "write": [], "locked": 0, "errors": 0}
+    stop_at = time.perf_counter() + seconds
+
+    def record(kind: str, started: float) -> None:
+        with lock:
+            results[kind].append((time.perf_counter() - started) * 1000)
+
+    def fail(exc: Exception) -> None:
+        with lock:
+            results["locked" if "locked" in str(exc) else "errors"] += 1
+
+    def reader(seed: int) -> None:
+        index = seed
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                with Reads() as db:
+                    db.query(AppSetting).filter(AppSetting.key.like("bench:%")).count()
+                    db.query(AppSetting).filter(AppSetting.key == f"bench:{index % KEYS}").first()
+                record("read", started)
+            except OperationalError as exc:
+                fail(exc)
+            index += 7
+
+    def writer(seed: int) -> None:
+        index = seed
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                with Writes() as db:
+                    row = db.query(AppSetting).filter(AppSetting.key == f"bench:{index % KEYS}").first()
+                    row.value = json.dumps({"n": index})
+                    db.add(AppSetting(key=f"bench:w:{process_index}:{seed}:{index}", value="{}"))
+                    db.commit()
+                record("write", started)
+            except OperationalError as exc:
+                fail(exc)
+            index += 13
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    if read_engine is not engine:
+        read_engine.dispose()
+    return results
+
+
+def _run(profile: str, seconds: float, processes: int, readers: int, writers: int) -> dict:
+    _remove_db()
+    engine, _, Writes, _ = _sessions(profile)
+    Base.metadata.create_all(bind=engine)
+    with Writes() as db:
+        db.add_all(AppSetting(key=f"bench:{index}", value="{}") for index in range(KEYS))
+        db.commit()
+    engine.dispose()
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [
+            pool.submit(_worker, profile, seconds, readers, writers, index)
+            for index in range(processes)
+        ]
+        parts = [future.result() for future in futures]
+    _remove_db()
+
+    reads = [sample for part in parts for sample in part["read"]]
+    writes = [sample for part in parts for sample in part["write"]]
+    return {
+        "reads_per_s": round(len(reads) / seconds, 1),
+        "writes_per_s": round(len(writes) / seconds, 1),
+        "read_p95_ms": round(_percentile(reads, 0.95), 2),
+        "write_p95_ms": round(_percentile(writes, 0.95), 2),
+        "locked_errors": sum(part["locked"] for part in parts),
+        "other_errors": sum(part["errors"] for part in parts),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4, help="reader threads per process")
+    parser.add_argument("--writers", type=int, default=2, help="writer threads per process")
+    args = parser.parse_args()
+
+    summary = {
+        profile: _run(profile, args.seconds, args.processes, args.readers, args.writers)
+        for profile in ("default", "tuned")
+    }
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
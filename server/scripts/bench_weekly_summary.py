@@ -0,0 +1,138 @@
+"""Memory/latency benchmark for the weekly summary endpoint.
+
+Seeds one user with a growing amount of this week's task history and plan
+tasks, then measures the peak Python allocation and wall time of
+``GET /api/weekly-summary``. The aggregate queries should keep peak memory
+flat as history grows; the legacy row-materializing variant is measured
+alongside for comparison.
+
+Usage:
+    python scripts/bench_weekly_summary.py [--sizes 1000,10000,50000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from uuid import uuid4
+
+SERVER_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVER_DIR))
+
+BENCH_DB = SERVER_DIR / "bench_weekly_summary.db"
+os.environ["DATABASE_URL"] = f"sqlite:///{BENCH_DB}"
+os.environ["LLM_PROVIDER"] = "mock"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from api_v2.main import app, _rate_buckets  # noqa: E402
+from api_v2.user_context import plan_storage_key  # noqa: E402
+from core.time import local_today  # noqa: E402
+from database.db import engine, get_db, init_db  # noqa: E402
+from database.models import DailyPlan, PlanTask, PlanTaskStatus, Task, TaskHistory  # noqa: E402
+
+ACTIONS = ("created", "planned", "completed", "deferred", "deleted")
+
+
+def _login(client: TestClient) -> int:
+    _rate_buckets.clear()
+    res = client.post(
+        "/api/session/login",
+        json={"display_name": f"bench-weekly-{uuid4().hex[:8]}", "password": "bench-pass"},
+    )
+    assert res.status_code == 200, res.text
+    client.headers["X-Session-Token"] = res.json()["session_token"]
+    return int(res.json()["user_id"])
+
+
+def _seed(user_id: int, history_rows: int) -> None:
+    today = local_today().isoformat()
+    with get_db() as db:
+        task = Task(user_id=user_id, title="bench task")
+        db.add(task)
+        plan = DailyPlan(date=plan_storage_key(user_id, today))
+        db.add(plan)
+        db.flush()
+        task_id, plan_id = task.id, plan.id
+
+    with engine.begin() as conn:
+        conn.execute(
+            TaskHistory.__table__.insert(),
+            [
+                {"task_id": task_id, "date": today, "action": ACTIONS[index % len(ACTIONS)], "ai_reasoning": "bench"}
+                for index in range(history_rows)
+            ],
+        )
+        conn.execute(
+            PlanTask.__table__.insert(),
+            [
+                {
+                    "plan_id": plan_id,
+                    "task_id": task_id,
+                    "status": PlanTaskStatus.COMPLETED.value if index % 3 == 0 else PlanTaskStatus.PLANNED.value,
+                    "order": index,
+                }
+                for index in range(history_rows // 4)
+            ],
+        )
+
+
+def _legacy_weekly_counts(user_id: int) -> None:
+    today = local_today().isoformat()
+    with get_db() as db:
+        entries = (
+            db.query(TaskHistory)
+            .join(Task)
+            .filter(Task.user_id == user_id, TaskHistory.date <= today)
+            .all()
+        )
+        for action in ACTIONS:
+            sum(1 for entry in entries if entry.action == action)
+        plan_tasks = db.query(PlanTask).join(DailyPlan).filter(DailyPlan.date.like(f"{user_id}:%")).all()
+        sum(1 for item in plan_tasks if item.status == PlanTaskStatus.COMPLETED.value)
+
+
+def _measure(fn) -> tuple[float, float]:
+    tracemalloc.start()
+    started = time.perf_counter()
+    fn()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed_ms, peak / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    args = parser.parse_args()
+    sizes = [int(item) for item in args.sizes.split(",") if item.strip()]
+
+    if BENCH_DB.exists():
+        BENCH_DB.unlink()
+    init_db()
+    client = TestClient(app)
+
+    print(f"{'history rows':>12} | {'endpoint ms':>11} | {'endpoint peak KiB':>17} | {'legacy ms':>9} | {'legacy peak KiB':>15}")
+    for size in sizes:
+        user_id = _login(client)
+        _seed(user_id, size)
+
+        def call_endpoint() -> None:
+            res = client.get("/api/weekly-summary?lang=en")
+            assert res.status_code == 200, res.text
+
+        endpoint_ms, endpoint_kib = _measure(call_endpoint)
+        legacy_ms, legacy_kib = _measure(lambda: _legacy_weekly_counts(user_id))
+        print(f"{size:>12} | {endpoint_ms:>11.1f} | {endpoint_kib:>17.1f} | {legacy_ms:>9.1f} | {legacy_kib:>15.1f}")
+
+    if BENCH_DB.exists():
+        BENCH_DB.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Assign single-user prototype data to a user account (one-shot).
+
+Databases created before multi-user sessions keep their onboarding state in
+the unscoped ``prototype_onboarding``/``prototype_session`` settings and their
+plans under bare ``YYYY-MM-DD`` dates. This moves them to a user (the name
+from the legacy session, else ``legacy``). Startup only warns when such data
+is found; run this once per database. Running it again is a no-op.
+
+Usage:
+    python scripts/migrate_legacy_data.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv(os.path.join(SERVER_DIR, ".env"))
+
+from database.db import init_db, migrate_legacy_single_user_data  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+
+    init_db()
+    print(json.dumps(migrate_legacy_single_user_data(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Warm the persistent track catalog from recently recommended songs.
+
+Resolves catalog rows that were recommended recently but are still pending
+or out of date, so repeat recommendations are served from the database
+without outbound Spotify/iTunes calls. Meant to run from cron or a scheduler
+against the production DATABASE_URL.
+
+Usage:
+    python scripts/prefetch_track_catalog.py [--limit 200] [--days 7]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv(os.path.join(SERVER_DIR, ".env"))
+
+from core.spotify import prefetch_track_catalog  # noqa: E402
+from core.track_catalog import catalog_size  # noqa: E402
+from database.db import init_db  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--limit", type=int, default=200, help="maximum songs to resolve in this run")
+    parser.add_argument("--days", type=int, default=7, help="only songs recommended within this many days")
+    args = parser.parse_args()
+
+    init_db()
+    summary = prefetch_track_catalog(limit=args.limit, recommended_within_days=args.days)
+    print(json.dumps({**summary, "catalog": catalog_size()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
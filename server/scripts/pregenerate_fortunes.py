@@ -0,0 +1,54 @@
+"""Pre-generate today's daily fortunes for recently active users.
+
+Run shortly after local midnight (APP_TIMEZONE in core/time.py), e.g. from
+cron with ``5 0 * * *``, so the first visit of the day reads a stored row
+instead of waiting on the LLM. Alternatively set FORTUNE_PREGENERATE=1 on one
+API worker to run the same job in-process.
+
+Usage:
+    python scripts/pregenerate_fortunes.py [--date YYYY-MM-DD] [--workers 4] [--retries 2] [--days 7]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv(os.path.join(SERVER_DIR, ".env"))
+
+from core.fortune import (  # noqa: E402
+    PREGENERATE_ACTIVE_WITHIN_DAYS,
+    PREGENERATE_MAX_WORKERS,
+    PREGENERATE_RETRIES,
+    pregenerate_daily_fortunes,
+)
+from database.db import init_db  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--date", default=None, help="target date, defaults to today in APP_TIMEZONE")
+    parser.add_argument("--workers", type=int, default=PREGENERATE_MAX_WORKERS, help="concurrent LLM calls")
+    parser.add_argument("--retries", type=int, default=PREGENERATE_RETRIES, help="retries per user")
+    parser.add_argument("--days", type=int, default=PREGENERATE_ACTIVE_WITHIN_DAYS, help="activity window in days")
+    args = parser.parse_args()
+
+    init_db()
+    summary = pregenerate_daily_fortunes(
+        target_date=args.date,
+        max_workers=args.workers,
+        retries=args.retries,
+        active_within_days=args.days,
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
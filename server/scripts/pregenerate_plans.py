@@ -0,0 +1,54 @@
+"""Precompute daily plans for every user with active tasks.
+
+Run in the evening (or shortly after local midnight with ``--date`` set to
+today) so the morning's first plan view reads a stored plan instead of
+waiting on generation. The same engine backs ``POST /api/system/plans/batch``.
+
+Usage:
+    python scripts/pregenerate_plans.py [--date YYYY-MM-DD] [--lang en] [--processes N] [--llm-concurrency 4] [--force]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv(os.path.join(SERVER_DIR, ".env"))
+
+from core.batch_planner import (  # noqa: E402
+    BATCH_PLAN_LLM_CONCURRENCY,
+    BATCH_PLAN_PROCESSES,
+    generate_plans_for_date,
+)
+from database.db import init_db  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--date", default=None, help="target date, defaults to tomorrow in APP_TIMEZONE")
+    parser.add_argument("--lang", default="en", help="language of the generated reasoning")
+    parser.add_argument("--processes", type=int, default=BATCH_PLAN_PROCESSES, help="processes for capacity snapshots")
+    parser.add_argument("--llm-concurrency", type=int, default=BATCH_PLAN_LLM_CONCURRENCY, help="concurrent LLM decisions")
+    parser.add_argument("--force", action="store_true", help="replace plans that already exist for the date")
+    args = parser.parse_args()
+
+    init_db()
+    summary = generate_plans_for_date(
+        target_date=args.date,
+        lang=args.lang,
+        force=args.force,
+        processes=args.processes,
+        llm_concurrency=args.llm_concurrency,
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -45,6 +45,35 @@ def test_health_endpoint():
     assert res.json()["ok"] is True
 
 
+def test_ready_endpoint_reports_warm_up():
+    from core.warmup import warm_up
+
+    warm_up({"init_db": 1.0})
+    res = client.get("/ready")
+    assert res.status_code == 200
+    body = res.json()
+    assert body["ready"] is True
+    steps = body["startup"]["steps"]
+    assert steps["llm_config"]["status"] == "ok"
+    assert steps["tarot_catalog"]["cards"] == 22
+    assert "regex" not in steps
+    assert body["startup"]["timings_ms"]["init_db"] == 1.0
+
+
+def test_ready_endpoint_is_unavailable_until_warm_up_finishes(monkeypatch):
+    import core.warmup as warmup
+
+    monkeypatch.setattr(warmup, "_report", None)
+    res = client.get("/ready")
+    assert res.status_code == 503
+    assert res.json()["error_code"] == "WARMING_UP"
+
+    warmup.start_warm_up({"init_db": 2.0}).join(timeout=30)
+    res = client.get("/ready")
+    assert res.status_code == 200
+    assert res.json()["startup"]["timings_ms"]["init_db"] == 2.0
+
+
 def test_session_and_onboarding_flow():
     client.headers.pop("X-Session-Token", None)
     session = client.get("/api/session")
@@ -125,6 +154,44 @@ def test_onboarding_commitments_become_daily_tasks():
     assert goal["task_kind"] == "temporary"
 
 
+def test_onboarding_is_all_or_nothing_when_planning_fails(monkeypatch):
+    import pytest
+
+    from api_v2.routers import session as session_router
+
+    login_as(unique_username("onboarding-atomic"), "demo-pass")
+    kept = client.post("/api/tasks", json={"title": "Existing errand"}).json()["id"]
+    payload = {
+        "commitments": "Standup",
+        "goals": "Ship the portfolio",
+        "brain_dump": "Reply to emails\nBook dentist",
+        "daily_capacity": 4,
+        "lang": "en",
+        "reset_existing": True,
+    }
+
+    def failing_plan(*_args, **_kwargs):
+        raise RuntimeError("planner unavailable")
+
+    original = session_router.generate_daily_plan
+    monkeypatch.setattr(session_router, "generate_daily_plan", failing_plan)
+    with pytest.raises(RuntimeError):
+        client.post("/api/onboarding/complete", json=payload)
+    assert [task["id"] for task in client.get("/api/tasks?status=active").json()] == [kept]
+    assert client.get("/api/onboarding").json()["completed"] is False
+
+    monkeypatch.setattr(session_router, "generate_daily_plan", original)
+    res = client.post("/api/onboarding/complete", json=payload)
+    assert res.status_code == 201
+    body = res.json()
+    titles = {task["id"]: task["title"] for task in client.get("/api/tasks?status=active").json()}
+    assert sorted(titles.values()) == ["Book dentist", "Reply to emails", "Ship the portfolio", "Standup"]
+    assert body["created_task_count"] == 4
+    assert {item["task_id"] for item in body["plan"]["tasks"]} <= set(titles)
+    assert set(body["plan"]["selected_task_ids"]) | set(body["plan"]["deferred_task_ids"]) == set(titles)
+    assert all(task["id"] in titles for task in body["plan"]["deferred_tasks"])
+
+
 def test_onboarding_plain_commitments_stay_daily():
     login = client.post(
         "/api/session/login",
@@ -1877,3 +1944,1088 @@ def test_review_insights_include_mood_and_focus_signals():
     assert body["daily"]
     assert body["weekly"]
     assert body["monthly"]
+
+
+def test_review_insights_cache_closed_periods_by_snapshot(monkeypatch):
+    from api_v2.routers import analytics
+
+    login_as(unique_username("review-cache"), "assistant-pass")
+    monkeypatch.setattr(
+        "core.llm.get_runtime_config",
+        lambda: {"provider": "deepseek", "api_key": "fake-key", "model": "deepseek-chat"},
+    )
+    calls = []
+
+    def fake_call(self, system, user, max_tokens=1024):
+        calls.append(user)
+        return f"review #{len(calls)}"
+
+    monkeypatch.setattr(
+        "core.llm.deepseek_provider.DeepSeekLLMService._call_deepseek",
+        fake_call,
+    )
+
+    first = client.get("/api/review-insights?date=2025-01-15&month=2025-01&lang=en")
+    assert first.status_code == 200
+    assert len(calls) == 3
+    assert all(first.json()[scope].startswith("review #") for scope in ("daily", "weekly", "monthly"))
+
+    analytics._review_text_cache.clear()
+    second = client.get("/api/review-insights?date=2025-01-16&month=2025-01&lang=en")
+    assert second.status_code == 200
+    assert len(calls) == 4
+    assert second.json()["monthly"] == first.json()["monthly"]
+    assert second.json()["weekly"] == first.json()["weekly"]
+
+
+def test_cache_backends_bound_entries_and_expire(tmp_path):
+    from core.cache import Cache
+    from core.cache.memory import MemoryCacheBackend
+    from core.cache.sqlite import SQLiteCacheBackend
+
+    for backend in (MemoryCacheBackend(), SQLiteCacheBackend(str(tmp_path / "cache.db"))):
+        backend.set("ns", "a", '"1"', max_entries=2)
+        backend.set("ns", "b", '"2"', max_entries=2)
+        assert backend.get("ns", "a") == '"1"'
+        assert backend.set("ns", "c", '"3"', max_entries=2) == 1
+        assert backend.get("ns", "b") is None
+        assert backend.get("ns", "a") == '"1"'
+        backend.set("ns", "gone", '"x"', ttl_seconds=-1)
+        assert backend.get("ns", "gone") is None
+        assert backend.get("other", "a") is None
+        assert backend.usage("ns")["entries"] == 2
+
+    cache = Cache("test.cache_stats", max_entries=4)
+    cache.set("k", {"value": [1, 2]})
+    assert cache.get("k") == {"value": [1, 2]}
+    assert cache.get("missing", []) == []
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["entries"] == 1
+
+
+def test_system_cache_stats_endpoint():
+    login_as(unique_username("cache-stats"), "cache-pass")
+    res = client.get("/api/system/cache")
+    assert res.status_code == 200
+    body = res.json()
+    assert body["backend"] == "memory"
+    namespaces = {item["namespace"] for item in body["namespaces"]}
+    assert {"analytics.stats", "songs.recommendations", "spotify.tracks"} <= namespaces
+
+
+def test_song_enrichment_single_flight_and_stale_refresh(monkeypatch):
+    import threading
+    import time as _time
+    from core import spotify
+    from core.cache import Cache
+
+    spotify._enriched_song_cache.clear()
+    spotify._public_track_cache.clear()
+    calls = []
+
+    def slow_fetch(query, name, artist):
+        calls.append(query)
+        _time.sleep(0.05)
+        return {"cover_url": "https://img.example/cover.jpg", "preview_url": "", "album": "A", "artist": artist}, None
+
+    monkeypatch.setattr("core.spotify._fetch_public_track", slow_fetch)
+    song = {"name": f"Single Flight {uuid4().hex[:8]}", "artist": "Herd", "album": ""}
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(spotify.enrich_song(song))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert {item["cover_url"] for item in results} == {"https://img.example/cover.jpg"}
+
+    cache = Cache("test.stale_refresh", max_entries=4)
+    loads = []
+
+    def loader():
+        loads.append(len(loads))
+        return f"v{len(loads)}", 0.01
+
+    assert cache.get_or_load("k", loader, stale_seconds=60) == "v1"
+    _time.sleep(0.02)
+    assert cache.get_or_load("k", loader, stale_seconds=60) == "v1"
+    deadline = _time.time() + 2
+    while cache.get("k")["value"] != "v2" and _time.time() < deadline:
+        _time.sleep(0.01)
+    assert cache.get("k")["value"] == "v2"
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_enrich_songs_returns_unresolved_songs_after_deadline(monkeypatch):
+    import time as _time
+    from core import spotify
+
+    suffix = uuid4().hex[:8]
+
+    def fake_enrich(song):
+        if song["name"].startswith("slow"):
+            _time.sleep(0.3)
+        return {**song, "cover_url": "https://img.example/fast.jpg"}
+
+    monkeypatch.setattr("core.spotify.enrich_song", fake_enrich)
+    misses_before = spotify.enrichment_stats()["deadline_misses"]
+    songs = spotify.enrich_songs(
+        [{"name": f"fast {suffix}", "artist": "A"}, {"name": f"slow {suffix}", "artist": "B"}],
+        deadline_seconds=0.1,
+    )
+    assert [song["name"] for song in songs] == [f"fast {suffix}", f"slow {suffix}"]
+    assert songs[0]["cover_url"] == "https://img.example/fast.jpg"
+    assert songs[1]["cover_url"] == ""
+    assert songs[1]["spotify_url"].startswith("https://open.spotify.com/search/")
+    assert spotify.enrichment_stats()["deadline_misses"] == misses_before + 1
+
+    login_as(unique_username("metrics"), "metrics-pass")
+    res = client.get("/api/system/metrics")
+    assert res.status_code == 200
+    assert res.json()["song_enrichment"]["max_workers"] >= 1
+
+
+def test_http_pool_reuses_keep_alive_connections():
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from core.http_pool import get_pool, request_json
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            body = json.dumps({"path": self.path}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        assert request_json(f"{base}/a?x=1") == {"path": "/a?x=1"}
+        assert request_json(f"{base}/b") == {"path": "/b"}
+        stats = get_pool("http", f"127.0.0.1:{server.server_address[1]}").stats()
+        assert stats["created"] == 1
+        assert stats["reused"] == 1
+
+        # The LLM's uncapped pool is separate from the host's capped one.
+        assert request_json(f"{base}/llm", max_connections=None) == {"path": "/llm"}
+        llm_pool = get_pool("http", f"127.0.0.1:{server.server_address[1]}", None)
+        assert llm_pool.stats()["max_connections"] is None and llm_pool.stats()["created"] == 1
+        assert get_pool("http", f"127.0.0.1:{server.server_address[1]}").stats()["created"] == 1
+    finally:
+        server.shutdown()
+
+
+def test_track_catalog_serves_repeat_enrichment_without_network(monkeypatch):
+    from core import spotify
+
+    calls = []
+
+    def fake_resolve(song):
+        calls.append(song["name"])
+        return {
+            "spotify_url": "https://open.spotify.com/track/abc",
+            "cover_url": "https://img.example/catalog.jpg",
+            "album": "Catalog",
+            "artist": song["artist"],
+            "preview_url": "",
+            "spotify_track_id": "abc",
+        }, "spotify"
+
+    monkeypatch.setattr("core.spotify._resolve_song", fake_resolve)
+    songs = [{"name": f"Catalog Song {uuid4().hex[:8]}", "artist": "Cache  Band", "album": ""}]
+    first = spotify.enrich_songs(songs, deadline_seconds=2)
+    assert calls == [songs[0]["name"]]
+    assert first[0]["cover_url"] == "https://img.example/catalog.jpg"
+
+    spotify._enriched_song_cache.clear()
+    again = spotify.enrich_songs([{**songs[0], "name": songs[0]["name"].upper(), "artist": "cache band"}], deadline_seconds=2)
+    assert len(calls) == 1
+    assert again[0]["cover_url"] == "https://img.example/catalog.jpg"
+
+
+def test_resolve_song_skips_itunes_when_spotify_filled_every_field(monkeypatch):
+    from core import spotify
+
+    itunes_calls = []
+    monkeypatch.setattr(
+        spotify._spotify_client,
+        "search_track",
+        lambda name, artist="", album="": {
+            "spotify_url": "https://open.spotify.com/track/full",
+            "cover_url": "https://img.example/full.jpg",
+            "album": "Full",
+            "artist": artist,
+            "preview_url": "https://p.example/full.mp3",
+            "spotify_track_id": "full",
+        },
+    )
+    monkeypatch.setattr("core.spotify._lookup_public_track", lambda *args: itunes_calls.append(args) or {})
+    metadata, source = spotify._resolve_song({"name": "Full Song", "artist": "Band"})
+    assert source == "spotify"
+    assert metadata["cover_url"] == "https://img.example/full.jpg"
+    assert itunes_calls == []
+
+
+def test_prefetch_track_catalog_resolves_recently_recommended_songs(monkeypatch):
+    from core import spotify
+    from core.track_catalog import get_track, load_tracks
+
+    song = {"name": f"Prefetch Song {uuid4().hex[:8]}", "artist": "Warm", "album": ""}
+    assert load_tracks([song]) == {}
+    assert get_track(song) is None
+
+    monkeypatch.setattr(
+        "core.spotify._resolve_song",
+        lambda item: ({"cover_url": "https://img.example/warm.jpg", "artist": item["artist"]}, "itunes"),
+    )
+    summary = spotify.prefetch_track_catalog(limit=500)
+    assert summary["resolved"] >= 1
+    assert get_track(song)["cover_url"] == "https://img.example/warm.jpg"
+
+
+def test_song_recommendations_pick_from_pool_without_new_generation(monkeypatch):
+    from core.llm.mock import MockLLMService
+
+    login_as(unique_username("songs-pool"), "songs-pass")
+    client.post("/api/tasks", json={"title": "Write thesis draft", "priority": 5})
+    client.post("/api/mood", json={"mood_level": 2, "note": "need calm focus"})
+    calls = []
+    original = MockLLMService.recommend_songs
+
+    def counting(self, *args, **kwargs):
+        calls.append(kwargs.get("refresh_token"))
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(MockLLMService, "recommend_songs", counting)
+    first = client.get("/api/songs/recommend?lang=en&refresh_token=one")
+    client.post("/api/tasks", json={"title": "Reply to advisor email", "priority": 2})
+    second = client.get("/api/songs/recommend?lang=en&refresh_token=two")
+    third = client.get("/api/songs/recommend?lang=en")
+    assert all(res.status_code == 200 for res in (first, second, third))
+    assert calls == ["initial-load"]
+    first_names = [song["name"] for song in first.json()["songs"]]
+    second_names = [song["name"] for song in second.json()["songs"]]
+    assert first_names != second_names
+    assert set(first_names) == set(second_names)
+
+
+def test_song_pool_backfills_artwork_that_missed_the_enrichment_deadline(monkeypatch):
+    from api_v2.routers import songs as songs_router
+    from core.track_catalog import save_tracks
+
+    suffix = uuid4().hex[:8]
+    slow = {"name": f"slow {suffix}", "artist": "B", "cover_url": "", "spotify_url": ""}
+    fast = {"name": f"fast {suffix}", "artist": "A", "cover_url": "https://img.example/fast.jpg"}
+    pool_key = f"backfill:{suffix}"
+    songs_router._song_pools.set(pool_key, {"songs": [fast, slow], "generation": 1})
+
+    pool = songs_router._backfill_pool_artwork(pool_key, songs_router._song_pools.get(pool_key))
+    assert pool["songs"][1]["cover_url"] == ""
+
+    save_tracks([(slow, {"cover_url": "https://img.example/slow.jpg", "album": "Late"}, "spotify")])
+    pool = songs_router._backfill_pool_artwork(pool_key, songs_router._song_pools.get(pool_key))
+    assert [song["cover_url"] for song in pool["songs"]] == ["https://img.example/fast.jpg", "https://img.example/slow.jpg"]
+    assert songs_router._song_pools.get(pool_key)["songs"][1]["album"] == "Late"
+
+
+def test_song_cache_key_ignores_context_text_that_does_not_change_features():
+    from api_v2.routers import songs
+
+    login_as(unique_username("songs-key"), "songs-pass")
+    client.post("/api/tasks", json={"title": "Write thesis draft", "priority": 5})
+    client.post("/api/mood", json={"mood_level": 3, "note": ""})
+    hits_before = songs._recommendation_cache.hits
+
+    first = client.get("/api/songs/recommend?lang=en")
+    client.post("/api/tasks", json={"title": "Water the plants", "priority": 1})
+    second = client.get("/api/songs/recommend?lang=en")
+    assert first.status_code == 200 and second.status_code == 200
+    assert second.json()["songs"] == first.json()["songs"]
+    assert "Water the plants" in second.json()["top_tasks"]
+    assert songs._recommendation_cache.hits == hits_before + 1
+
+    standard = songs._cache_key(1, "en", 3, "balanced focus", "Write thesis", 0, granularity="standard")
+    assert standard == songs._cache_key(1, "en", 3, "balanced focus", "Draft chapter", 0, granularity="standard")
+    assert standard != songs._cache_key(1, "en", 3, "balanced focus", "Reply email", 0, granularity="standard")
+    assert songs._cache_key(1, "en", 4, "x", "Reply email", 3, granularity="coarse") == songs._cache_key(
+        1, "en", 5, "x", "Write thesis", 0, granularity="coarse"
+    )
+    assert songs._cache_key(1, "en", 3, "x", "Write thesis", 0, granularity="fine") != songs._cache_key(
+        1, "en", 3, "x", "Draft chapter", 0, granularity="fine"
+    )
+
+
+def test_fortune_pregeneration_fills_today_and_reads_do_not_write(monkeypatch):
+    from core import fortune as fortune_core
+    from core.time import local_date_offset_iso, local_today_iso
+    from database.db import get_db
+    from database.models import DailyFortune
+
+    login_as(unique_username("fortune-pregen"), "fortune-pass")
+    assert client.post("/api/fortune/daily?lang=zh").status_code == 200
+    user_id = client.get("/api/session").json()["user_id"]
+    today = local_today_iso()
+    with get_db() as db:
+        row = db.query(DailyFortune).filter(DailyFortune.user_id == user_id, DailyFortune.date == today).one()
+        row.date = local_date_offset_iso(-1)
+
+    failures = []
+    original = fortune_core.compose_fortune
+
+    def flaky_compose(inputs, lang, use_cache=True):
+        if inputs.user_id == user_id and not failures:
+            failures.append(inputs.today)
+            raise RuntimeError("upstream timeout")
+        return original(inputs, lang, use_cache=use_cache)
+
+    monkeypatch.setattr("core.fortune.compose_fortune", flaky_compose)
+    monkeypatch.setattr("core.fortune.time.sleep", lambda seconds: None)
+    summary = fortune_core.pregenerate_daily_fortunes(target_date=today, max_workers=2)
+    assert summary["failed"] == 0
+    assert failures == [today]
+
+    with get_db() as db:
+        stored = db.query(DailyFortune).filter(DailyFortune.user_id == user_id, DailyFortune.date == today).one()
+        raw_before = stored.fortune_data
+    assert json.loads(raw_before)["lang"] == "zh"
+
+    monkeypatch.setattr("core.fortune.get_llm_service", lambda **kwargs: (_ for _ in ()).throw(AssertionError("LLM called")))
+    res = client.get("/api/fortune/today?lang=zh")
+    assert res.status_code == 200
+    assert res.json()["generated"] is True
+    assert client.post("/api/fortune/daily?lang=zh").status_code == 200
+    with get_db() as db:
+        stored = db.query(DailyFortune).filter(DailyFortune.user_id == user_id, DailyFortune.date == today).one()
+        assert stored.fortune_data == raw_before
+
+
+def test_fortune_prompt_cache_is_not_shared_between_users(monkeypatch):
+    from core import fortune as fortune_core
+
+    calls = []
+
+    class CountingService:
+        def generate_fortune(self, birthday, today, lang="en", zodiac=None, user_context=None):
+            calls.append(today)
+            return {"card": "The Star", "summary": f"reading {len(calls)}"}
+
+    monkeypatch.setattr("core.fortune.get_llm_service", lambda **kwargs: CountingService())
+    shared = {"today": "2026-10-19", "birthday": "", "zodiac": {}, "user_context": {}}
+    first = fortune_core.compose_fortune(fortune_core.FortuneInputs(user_id=-101, **shared), "en")
+    assert fortune_core.compose_fortune(fortune_core.FortuneInputs(user_id=-101, **shared), "en") == first
+    second = fortune_core.compose_fortune(fortune_core.FortuneInputs(user_id=-102, **shared), "en")
+    assert len(calls) == 2
+    assert second["summary"] != first["summary"]
+
+
+def test_fortune_rows_store_language_neutral_record():
+    from core.time import local_today_iso
+    from database.db import get_db
+    from database.models import DailyFortune
+
+    login_as(unique_username("fortune-neutral"), "fortune-pass")
+    zh = client.post("/api/fortune/daily?lang=zh")
+    en = client.post("/api/fortune/daily?lang=en")
+    assert zh.status_code == 200 and en.status_code == 200
+    assert zh.json()["card_number"] == en.json()["card_number"]
+    assert en.json()["card_image_url"]
+
+    user_id = client.get("/api/session").json()["user_id"]
+    with get_db() as db:
+        row = db.query(DailyFortune).filter(DailyFortune.user_id == user_id, DailyFortune.date == local_today_iso()).one()
+        record = json.loads(row.fortune_data)
+    assert record["format"] == 2
+    assert set(record["texts"]) == {"zh", "en"}
+    assert "card_image_url" not in record["texts"]["en"]
+    assert "card_keywords" not in record
+
+    again_zh = client.get("/api/fortune/today?lang=zh")
+    assert again_zh.json()["generated"] is True
+    assert again_zh.json()["interpretation"] == zh.json()["interpretation"]
+
+
+def test_llm_services_are_reused_until_config_changes(monkeypatch):
+    import core.llm as llm
+
+    monkeypatch.setattr(llm, "_runtime_config", {})
+    monkeypatch.setattr(llm, "_save_to_db", lambda: None)
+    monkeypatch.setenv("LLM_PROVIDER", "deepseek")
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "registry-key")
+    monkeypatch.setenv("DEEPSEEK_MODEL", "deepseek-chat")
+    llm.clear_llm_services()
+
+    first = llm.get_llm_service(lang="en")
+    assert llm.get_llm_service(lang="en") is first
+    assert llm.get_llm_service(lang="zh") is not first
+    assert first._fallback is llm.get_mock_service("en")
+
+    llm.set_runtime_config({"model": "deepseek-reasoner"})
+    swapped = llm.get_llm_service(lang="en")
+    assert swapped is not first
+    assert swapped.model == "deepseek-reasoner"
+    llm.clear_llm_services()
+
+
+def test_llm_circuit_breaker_trips_and_short_circuits():
+    from core.llm.resilience import LLMResilience, LLMUnavailable
+
+    breaker = LLMResilience("test-breaker", failure_threshold=2, cooldown_seconds=60, hedge=False)
+    calls = []
+
+    def failing(timeout):
+        calls.append(timeout)
+        raise ConnectionError("upstream down")
+
+    for _ in range(2):
+        try:
+            breaker.call(failing)
+        except ConnectionError:
+            pass
+    assert breaker.state == "open"
+
+    try:
+        breaker.call(failing)
+        raise AssertionError("open circuit should skip the call")
+    except LLMUnavailable:
+        pass
+    assert len(calls) == 2
+    assert breaker.stats()["short_circuited"] == 1
+
+
+def test_llm_hedged_request_and_latency_budget():
+    import threading
+    import time as _time
+    from core.llm.resilience import LLMResilience, LLMUnavailable, llm_budget
+
+    hedged = LLMResilience("test-hedge", hedge=True, hedge_delay_seconds=0.05)
+    first_call = threading.Event()
+
+    def slow_then_fast(timeout):
+        if not first_call.is_set():
+            first_call.set()
+            _time.sleep(0.5)
+            return "slow"
+        return "fast"
+
+    assert hedged.call(slow_then_fast) == "fast"
+    assert hedged.stats()["hedges"] == 1
+    assert hedged.stats()["hedge_wins"] == 1
+
+    with llm_budget(1):
+        try:
+            hedged.call(lambda timeout: "never")
+            raise AssertionError("a nearly spent budget should skip the LLM")
+        except LLMUnavailable:
+            pass
+    assert hedged.stats()["budget_skips"] == 1
+
+
+def test_llm_calls_never_queue_behind_busy_workers(monkeypatch):
+    import threading
+    import time as _time
+
+    from core.llm import resilience
+    from core.llm.resilience import LLMResilience
+
+    def answer(timeout):
+        _time.sleep(0.05)
+        return threading.get_ident()
+
+    plain = LLMResilience("test-inline", hedge=False)
+    assert plain.call(answer) == threading.get_ident()
+
+    # Every worker busy: no hedge, no queueing, the call runs on this thread.
+    monkeypatch.setattr(resilience, "_idle_workers", threading.BoundedSemaphore(1))
+    resilience._idle_workers.acquire()
+    hedged = LLMResilience("test-saturated", failure_threshold=1, hedge=True, hedge_delay_seconds=0.01)
+    assert hedged.call(answer) == threading.get_ident()
+    stats = hedged.stats()
+    assert stats["hedges"] == 0 and stats["failures"] == 0 and stats["state"] == "closed"
+
+
+def test_deepseek_falls_back_to_mock_when_circuit_is_open(monkeypatch):
+    from core.llm.deepseek_provider import DeepSeekLLMService
+    from core.llm.resilience import LLMResilience
+
+    breaker = LLMResilience("deepseek", failure_threshold=1, cooldown_seconds=60, hedge=False)
+    monkeypatch.setattr("core.llm.deepseek_provider.get_resilience", lambda name: breaker)
+    posts = []
+
+    def failing_post(self, system, user, max_tokens, timeout):
+        posts.append(timeout)
+        raise TimeoutError("slow upstream")
+
+    monkeypatch.setattr(DeepSeekLLMService, "_post_chat", failing_post)
+    service = DeepSeekLLMService(lang="en", api_key="fake-key", model="deepseek-chat")
+    task = {"title": "Reorganize shelves", "priority": 1, "deferral_count": 4, "completion_count": 0}
+    first = service.generate_deletion_reasoning(task, ["Deferred 4 times"])
+    second = service.generate_deletion_reasoning(task, ["Deferred 4 times"])
+    assert first and second
+    assert len(posts) == 1
+    assert breaker.state == "open"
+
+
+def test_decision_prompt_is_compacted_and_guardrails_keep_unseen_tasks():
+    from core.llm.prompts import build_task_table, estimate_tokens
+    from core.planner import _apply_guardrails
+    from core.rules import build_capacity_snapshot
+
+    tasks = [
+        {
+            "id": task_id,
+            "title": f"must file report {task_id}" if task_id == 7 else f"Backlog item {task_id}",
+            "priority": task_id % 5,
+            "deferral_count": task_id % 4,
+            "completion_count": 0,
+            "category": "core" if task_id == 7 else "general",
+        }
+        for task_id in range(1, 301)
+    ]
+    snapshot = build_capacity_snapshot(tasks, capacity_units=6)
+    table, shown = build_task_table(tasks, snapshot, token_budget=400, top_k=20)
+
+    assert 7 in shown
+    assert len(shown) < 40
+    assert "lower-ranked tasks not listed" in table
+    assert estimate_tokens(table) < estimate_tokens("\n".join(task["title"] for task in tasks))
+
+    unseen_selected = [task_id for task_id in snapshot["selected_task_ids"] if task_id not in shown]
+    unseen_any = next(task_id for task_id in range(1, 301) if task_id not in shown)
+    guarded = _apply_guardrails(
+        {
+            "keep": [7],
+            "defer": [],
+            "delete": [{"task_id": unseen_any, "reason": "hallucinated"}],
+            "seen_task_ids": sorted(shown),
+        },
+        snapshot,
+        [task["id"] for task in tasks],
+    )
+    assert 7 in guarded["keep_ids"]
+    assert all(task_id in guarded["keep_ids"] for task_id in unseen_selected)
+    assert all(item["reason"] != "hallucinated" for item in guarded["delete_items"])
+
+
+def test_forced_plan_decisions_skip_the_llm(monkeypatch):
+    from core.planner import _forced_decision, decision_stats, generate_daily_plan
+    from core.rules import build_capacity_snapshot
+
+    class _Task:
+        def __init__(self, task_id, title, priority=2):
+            self._data = {"id": task_id, "title": title, "priority": priority, "deferral_count": 0, "completion_count": 0}
+
+        def to_dict(self):
+            return dict(self._data)
+
+    monkeypatch.setattr(
+        "core.llm.get_runtime_config",
+        lambda: {"provider": "deepseek", "api_key": "fake-key", "model": "deepseek-chat"},
+    )
+    monkeypatch.setattr(
+        "core.llm.deepseek_provider.DeepSeekLLMService._call_deepseek",
+        lambda self, system, user, max_tokens=1024: (_ for _ in ()).throw(AssertionError("LLM called")),
+    )
+
+    tasks = [_Task(1, "Write notes"), _Task(2, "Reply to email")]
+    assert _forced_decision(build_capacity_snapshot([task.to_dict() for task in tasks], capacity_units=6)) == "under_capacity"
+    before = decision_stats()["skipped_under_capacity"]
+    plan = generate_daily_plan(tasks, "2026-10-19", lang="en", capacity_units=6)
+    assert sorted(plan["selected_task_ids"]) == [1, 2]
+    assert plan["reasoning"]
+    assert decision_stats()["skipped_under_capacity"] == before + 1
+
+    protected = build_capacity_snapshot(
+        [{"id": 1, "title": "must ship release", "priority": 5}, {"id": 2, "title": "Long essay", "priority": 1, "effort_units": 9}],
+        capacity_units=2,
+    )
+    assert protected["is_overloaded"]
+    assert _forced_decision(protected) == "all_non_negotiable"
+
+
+def test_sqlite_read_sessions_are_read_only_and_writes_are_serialized():
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from database.db import get_db, get_read_db, writer_gate
+    from database.models import AppSetting
+
+    with get_read_db() as db:
+        assert db.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert db.execute(text("PRAGMA query_only")).scalar() == 1
+        try:
+            db.execute(text("INSERT INTO app_settings(key, value) VALUES ('read-pool-write', '{}')"))
+            raise AssertionError("read sessions must not write")
+        except OperationalError:
+            pass
+
+    before = writer_gate.stats()["acquired"]
+    key = f"writer-gate:{uuid4().hex[:8]}"
+    with get_db() as db:
+        db.add(AppSetting(key=key, value="{}"))
+    assert writer_gate.stats()["acquired"] == before + 1
+    assert writer_gate.stats()["held"] is False
+    with get_read_db() as db:
+        assert db.query(AppSetting).filter(AppSetting.key == key).count() == 1
+
+
+def test_system_db_pool_stats_endpoint():
+    login_as(unique_username("db-pool-stats"), "db-pass")
+    res = client.get("/api/system/db")
+    assert res.status_code == 200
+    body = res.json()
+    assert body["dialect"] == "sqlite"
+    assert body["write_pool"]["checkouts"] > 0
+    assert body["write_pool"]["checkout_p95_ms"] >= 0
+    assert body["read_pool"]["checkouts"] > 0
+    assert "acquired" in body["writer_gate"]
+
+
+def test_async_session_layer_round_trip():
+    import sqlite3
+
+    import anyio
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    from database.db import async_database_url, get_async_db, get_async_read_db
+    from database.models import AppSetting
+
+    assert async_database_url("sqlite:///./x.db") == "sqlite+aiosqlite:///./x.db"
+    assert async_database_url("postgresql://u@h/db") == "postgresql+psycopg://u@h/db"
+    assert async_database_url("postgresql+asyncpg://u@h/db") == "postgresql+asyncpg://u@h/db"
+
+    key = unique_username("async-setting")
+
+    async def scenario():
+        async with get_async_db() as db:
+            db.add(AppSetting(key=key, value='{"ok": true}'))
+        async with get_async_read_db() as db:
+            row = await db.get(AppSetting, key)
+            return row.value
+
+    assert anyio.run(scenario) == '{"ok": true}'
+
+    async def write_lock_taken_at_begin():
+        # An async write session holds SQLite's write lock from its first
+        # statement, so a competing writer waits instead of interleaving.
+        async with get_async_db() as db:
+            await db.get(AppSetting, key)
+            other = sqlite3.connect("test_v2.db", timeout=0)
+            try:
+                other.execute("UPDATE app_settings SET value = value WHERE key = ?", (key,))
+                return False
+            except sqlite3.OperationalError:
+                return True
+            finally:
+                other.close()
+
+    async def read_is_query_only():
+        async with get_async_read_db() as db:
+            try:
+                await db.execute(text("DELETE FROM app_settings WHERE key = :key"), {"key": key})
+                return False
+            except OperationalError:
+                return True
+
+    assert anyio.run(write_lock_taken_at_begin) is True
+    assert anyio.run(read_is_query_only) is True
+
+
+def test_plan_generation_detects_task_changes_during_llm_call(monkeypatch):
+    from api_v2.routers import plans as plans_router
+    from database.db import get_db
+    from database.models import Task
+
+    login_as(unique_username("two-phase-plan"), "plan-pass")
+    task_id = client.post("/api/tasks", json={"title": "Draft quarterly notes", "priority": 2}).json()["id"]
+    original = plans_router.generate_daily_plan
+    calls = []
+
+    def racing_generate(tasks, target_date, **kwargs):
+        calls.append(target_date)
+        if len(calls) == 1:
+            # Another request edits the task while the model is thinking.
+            with get_db() as db:
+                db.get(Task, task_id).priority = 5
+        return original(tasks, target_date, **kwargs)
+
+    monkeypatch.setattr(plans_router, "generate_daily_plan", racing_generate)
+    res = client.post("/api/plans/generate", json={"lang": "en"})
+    assert res.status_code == 201
+    assert len(calls) == 2
+    assert [task["task_id"] for task in res.json()["tasks"]] == [task_id]
+
+    def always_racing(tasks, target_date, **kwargs):
+        with get_db() as db:
+            db.get(Task, task_id).priority += 1
+        return original(tasks, target_date, **kwargs)
+
+    monkeypatch.setattr(plans_router, "generate_daily_plan", always_racing)
+    # A different capacity rules out incremental maintenance, so this replans in full.
+    res = client.post("/api/plans/generate", json={"lang": "en", "force": True, "capacity_units": 3})
+    assert res.status_code == 409
+    assert res.json()["error_code"] == "PLAN_CONFLICT"
+
+
+def test_assistant_plan_refresh_runs_after_the_turn_commits():
+    login_as(unique_username("assistant-replan"), "assistant-pass")
+    ensure_assistant_ready("en")
+    client.post("/api/tasks", json={"title": "Call the landlord"})
+
+    reply = client.post("/api/assistant/chat", json={"message": "regenerate plan", "lang": "en"})
+    assert reply.status_code == 200
+    assistant_messages = [message["content"] for message in reply.json()["messages"] if message["role"] == "assistant"]
+    assert "Today's plan has been refreshed." in assistant_messages[-1]
+
+    plan = client.get("/api/plans/today?lang=en")
+    assert plan.status_code == 200
+    assert any(task["task"]["title"] == "Call the landlord" for task in plan.json()["tasks"])
+
+
+def test_incremental_plan_maintenance_skips_replans_until_the_boundary_moves(monkeypatch):
+    from api_v2.routers import plans as plans_router
+    from core.incremental_planner import DEFER, KEEP, REGENERATE, REMOVE, IncrementalPlan
+    from core.rules import build_capacity_snapshot
+
+    tasks = [
+        {"id": 1, "title": "Write report", "priority": 3, "created_at": "2026-01-01"},
+        {"id": 2, "title": "Tidy desk", "priority": 1, "created_at": "2026-01-02"},
+        {"id": 3, "title": "Sort photos", "priority": 1, "created_at": "2026-01-03"},
+    ]
+    snapshot = build_capacity_snapshot(tasks, capacity_units=5)
+    state = IncrementalPlan(5, tasks, snapshot["selected_task_ids"])
+    assert state.kept_ids == {1, 2} and state.selected_units == snapshot["selected_units"] == 5
+    assert state.on_task_added({"id": 4, "title": "Backup files", "priority": 0, "created_at": "2026-01-04"}) == DEFER
+    assert state.on_task_deleted(4) == REMOVE
+    assert state.on_task_completed(2) == REGENERATE  # task 3 now fits
+    restored = IncrementalPlan.from_state(IncrementalPlan(5, tasks, [1, 2]).to_state())
+    assert restored.on_priority_changed({**tasks[0], "priority": 4}) == KEEP
+    assert restored.kept_ids == {1, 2} and restored.selected_units == 5
+    assert restored.on_priority_changed({**tasks[1], "priority": 0}) == REGENERATE  # falls below task 3
+
+    login_as(unique_username("incremental-plan"), "plan-pass")
+    client.post("/api/tasks", json={"title": "Draft notes", "priority": 2})
+    client.post("/api/tasks", json={"title": "Reply to emails", "priority": 1})
+    assert client.post("/api/plans/generate", json={"lang": "en"}).status_code == 201
+
+    original = plans_router.generate_daily_plan
+    calls = []
+
+    def counting_generate(tasks, target_date, **kwargs):
+        calls.append(target_date)
+        return original(tasks, target_date, **kwargs)
+
+    monkeypatch.setattr(plans_router, "generate_daily_plan", counting_generate)
+    small = client.post("/api/tasks", json={"title": "Water plants"}).json()["id"]
+    res = client.post("/api/plans/generate", json={"lang": "en", "maintain": True})
+    assert res.status_code == 201
+    assert calls == []
+    assert small in [task["task_id"] for task in res.json()["tasks"]]
+
+    # An explicit regenerate always consults the planner, even with nothing changed.
+    assert client.post("/api/plans/generate", json={"lang": "en", "force": True}).status_code == 201
+    assert len(calls) == 1
+
+    client.post("/api/tasks", json={"title": "Must submit tax form", "priority": 5})
+    res = client.post("/api/plans/generate", json={"lang": "en", "maintain": True})
+    assert res.status_code == 201
+    assert len(calls) == 2
+
+
+def test_plan_maintenance_leaves_planned_rows_and_their_feedback_alone(monkeypatch):
+    from api_v2.routers import plans as plans_router
+    from database.db import get_db
+    from database.models import PlanTask, TaskHistory
+
+    login_as(unique_username("maintenance-rows"), "plan-pass")
+    first = client.post("/api/tasks", json={"title": "Draft notes", "priority": 2}).json()["id"]
+    second = client.post("/api/tasks", json={"title": "Reply to emails", "priority": 1}).json()["id"]
+    plan = client.post("/api/plans/generate", json={"lang": "en"}).json()
+    rows = {row["task_id"]: row["id"] for row in plan["tasks"]}
+    assert set(rows) == {first, second}
+    client.post("/api/feedback", json={"results": [{"plan_task_id": rows[second], "status": "missed"}]})
+
+    def no_planner(*_args, **_kwargs):
+        raise AssertionError("a rank change inside the plan should not replan")
+
+    monkeypatch.setattr(plans_router, "generate_daily_plan", no_planner)
+    client.put(f"/api/tasks/{first}", json={"priority": 3})
+    assert client.post("/api/plans/generate", json={"lang": "en", "maintain": True}).status_code == 201
+    with get_db() as db:
+        assert db.get(PlanTask, rows[second]).status == "missed"
+        planned = db.query(TaskHistory).filter(TaskHistory.task_id == first, TaskHistory.action == "planned").count()
+        assert planned == 1
+
+
+def test_incremental_plan_state_never_outlives_its_plan_row():
+    from datetime import datetime, timezone
+
+    from api_v2.two_phase import delete_plan, snapshot_plan_inputs
+    from core.incremental_planner import IncrementalPlan, cached_plan_state, remember_plan_state
+    from core.time import local_today_iso
+    from database.db import get_db
+    from database.models import User
+
+    created_at = datetime(2026, 10, 19, 8, 30, tzinfo=timezone.utc)
+    remember_plan_state(-7, created_at, IncrementalPlan(5, [], []))
+    assert cached_plan_state(-7, created_at.replace(tzinfo=None)) is not None
+    # Same id, different row: SQLite hands out a deleted plan's id again.
+    assert cached_plan_state(-7, datetime(2026, 10, 19, 9, 0)) is None
+
+    username = unique_username("incremental-evict")
+    login_as(username, "plan-pass")
+    client.post("/api/tasks", json={"title": "Draft notes", "priority": 2})
+    assert client.post("/api/plans/generate", json={"lang": "en"}).status_code == 201
+    with get_db() as db:
+        user = db.query(User).filter(User.username == username).one()
+        snapshot = snapshot_plan_inputs(db, user.id, local_today_iso())
+        plan_id, plan_created_at = snapshot.existing_plan_id, snapshot.existing_plan_created_at
+        assert cached_plan_state(plan_id, plan_created_at) is not None
+        delete_plan(db, plan_id)
+    assert cached_plan_state(plan_id, plan_created_at) is None
+
+
+def test_plan_reads_serve_persisted_views_until_tasks_change(monkeypatch):
+    from api_v2.routers import plans as plans_router
+
+    login_as(unique_username("plan-artifacts"), "plan-pass")
+    task_id = client.post("/api/tasks", json={"title": "Plan the offsite", "priority": 2}).json()["id"]
+    generated = client.post("/api/plans/generate", json={"lang": "en"}).json()
+
+    original = plans_router.regenerate_reasoning
+    calls = []
+
+    def counting_reasoning(plan, tasks, lang, **kwargs):
+        calls.append(lang)
+        return original(plan, tasks, lang, **kwargs)
+
+    monkeypatch.setattr(plans_router, "regenerate_reasoning", counting_reasoning)
+    first = client.get("/api/plans/today?lang=en").json()
+    assert calls == []
+    assert first["capacity_summary"] == generated["capacity_summary"]
+    assert first["coach_notes"] == generated["coach_notes"]
+
+    client.get("/api/plans/today?lang=zh")
+    client.get("/api/plans/today?lang=zh")
+    client.post("/api/plans/generate", json={"lang": "zh"})
+    assert calls == ["zh"]
+
+    client.put(f"/api/tasks/{task_id}", json={"priority": 4})
+    refreshed = client.get("/api/plans/today?lang=en").json()
+    assert calls == ["zh", "en"]
+    assert refreshed["tasks"][0]["task"]["priority"] == 4
+    client.get("/api/plans/today?lang=en")
+    assert calls == ["zh", "en"]
+
+    plan_task_id = refreshed["tasks"][0]["id"]
+    client.post("/api/feedback", json={"results": [{"plan_task_id": plan_task_id, "status": "missed"}]})
+    assert client.get("/api/plans/today?lang=en").json()["tasks"] == []
+
+
+def test_horizon_planner_packs_the_backlog_across_the_week(monkeypatch):
+    from datetime import date
+
+    from api_v2.routers import plans as plans_router
+    from core.horizon_planner import plan_horizon
+    from core.time import local_today_iso
+
+    tasks = [
+        {"id": 1, "title": "Stretch", "task_kind": "daily", "created_at": "2026-01-01"},
+        {"id": 2, "title": "Team sync", "task_kind": "weekly", "recurrence_weekday": 2, "created_at": "2026-01-01"},
+        {"id": 3, "title": "Write report", "priority": 3, "due_date": "2026-10-20", "created_at": "2026-01-01"},
+        {"id": 4, "title": "Tidy desk", "priority": 1, "created_at": "2026-01-01"},
+        {"id": 5, "title": "Review slides", "priority": 3, "due_date": "2026-10-19", "created_at": "2026-01-01"},
+        {"id": 6, "title": "Archive mail", "due_date": "2026-10-19", "created_at": "2026-01-01"},
+    ]
+    horizon = plan_horizon(tasks, date(2026, 10, 19), days=3, capacity_units=4)
+    assert [day["task_ids"] for day in horizon["days"]] == [[1, 5], [1, 3], [1, 2, 4]]
+    assert [day["used_units"] for day in horizon["days"]] == [4, 4, 4]
+    assert [item["task_id"] for item in horizon["unscheduled"]] == [6]
+
+    login_as(unique_username("horizon"), "horizon-pass")
+    task_id = client.post("/api/tasks", json={"title": "Renew passport", "priority": 2}).json()["id"]
+    original = plans_router.plan_horizon
+    calls = []
+
+    def counting_horizon(*args, **kwargs):
+        calls.append(args[1])
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(plans_router, "plan_horizon", counting_horizon)
+    week = client.get("/api/plans/week").json()
+    assert len(week["days"]) == 7 and week["start_date"] == local_today_iso()
+    assert week["days"][0]["tasks"][0]["id"] == task_id
+    today = client.get(f"/api/plans/week/{local_today_iso()}").json()
+    assert today["task_ids"] == [task_id]
+    assert len(calls) == 1
+
+    client.post("/api/tasks", json={"title": "Book dentist"})
+    client.get("/api/plans/week")
+    assert len(calls) == 2
+    assert client.get("/api/plans/week/1999-01-01").json()["error_code"] == "DATE_OUTSIDE_HORIZON"
+
+
+def test_recurring_completions_are_tracked_per_occurrence():
+    from datetime import date
+
+    from core.recurrence import OccurrenceIndex
+    from core.time import local_today_iso
+    from database.db import get_db
+    from database.models import Task, TaskOccurrence
+
+    index = OccurrenceIndex.build(
+        [
+            {"id": 1, "task_kind": "daily", "due_date": "2026-10-21"},
+            {"id": 2, "task_kind": "weekly", "recurrence_weekday": 4},
+            {"id": 3, "due_date": "2026-10-20"},
+            {"id": 4, "due_date": "2026-12-01"},
+        ],
+        date(2026, 10, 19),
+        days=7,
+    )
+    assert index.on("2026-10-20") == [3]
+    assert index.between("2026-10-21", "2026-10-23") == [
+        ("2026-10-21", 1), ("2026-10-22", 1), ("2026-10-23", 1), ("2026-10-23", 2),
+    ]
+    assert not index.covers("2026-12-01")
+
+    login_as(unique_username("occurrences"), "occurrence-pass")
+    task_id = client.post("/api/tasks", json={"title": "Stretch", "task_kind": "daily"}).json()["id"]
+    assert client.put(f"/api/tasks/{task_id}", json={"status": "completed"}).json()["completed_at"] is not None
+    with get_db() as db:
+        assert db.get(Task, task_id).completed_at is None
+        assert db.query(TaskOccurrence.date).filter(TaskOccurrence.task_id == task_id).scalar() == local_today_iso()
+    week = client.get("/api/plans/week").json()
+    assert task_id not in week["days"][0]["recurring_task_ids"]
+    assert task_id in week["days"][1]["recurring_task_ids"]
+
+    assert client.put(f"/api/tasks/{task_id}", json={"status": "active"}).json()["completed_at"] is None
+    with get_db() as db:
+        assert db.query(TaskOccurrence).filter(TaskOccurrence.task_id == task_id).count() == 0
+    assert task_id in client.get("/api/plans/week").json()["days"][0]["recurring_task_ids"]
+
+
+def test_concierge_does_not_complete_a_recurring_task_twice_on_one_day():
+    from api_v2.routers.assistant import _execute_actions
+    from database.db import get_db
+    from database.models import Task, TaskHistory, User
+
+    username = unique_username("concierge-occurrence")
+    login_as(username, "occurrence-pass")
+    task_id = client.post("/api/tasks", json={"title": "Water plants", "task_kind": "daily"}).json()["id"]
+    action = {"type": "complete_task", "task_query": "Water plants"}
+    with get_db() as db:
+        user = db.query(User).filter(User.username == username).one()
+        first = _execute_actions(db, user, [action], "en")
+    with get_db() as db:
+        # A second request, as if racing the first: the savepoint absorbs the conflict.
+        user = db.query(User).filter(User.username == username).one()
+        second = _execute_actions(db, user, [action], "en")
+        assert first["summaries"] == ["Completed task: Water plants"]
+        assert second["summaries"] == ["Already done today: Water plants"]
+        assert db.get(Task, task_id).completion_count == 1
+        assert db.query(TaskHistory).filter(TaskHistory.task_id == task_id, TaskHistory.action == "completed").count() == 1
+
+
+def test_init_db_is_one_lookup_once_stamped_and_legacy_migration_is_explicit():
+    from database.db import (
+        SCHEMA_VERSION,
+        get_db,
+        init_db,
+        legacy_data_pending,
+        migrate_legacy_single_user_data,
+        schema_version,
+    )
+    from database.models import AppSetting, User
+
+    assert schema_version() == SCHEMA_VERSION
+    assert list(init_db()) == ["schema_check"]
+
+    legacy_name = unique_username("legacy-owner")
+    with get_db() as db:
+        db.merge(AppSetting(key="prototype_session", value=json.dumps({"display_name": legacy_name, "password": "pw"})))
+        db.merge(AppSetting(key="prototype_onboarding", value=json.dumps({"completed": True})))
+    assert legacy_data_pending() is True
+    assert list(init_db()) == ["schema_check"]
+
+    summary = migrate_legacy_single_user_data()
+    assert summary["migrated"] is True
+    assert summary["username"] == legacy_name
+    assert legacy_data_pending() is False
+    assert migrate_legacy_single_user_data() == {"migrated": False}
+    with get_db() as db:
+        user = db.query(User).filter(User.username == legacy_name).one()
+        copied = db.get(AppSetting, f"prototype_onboarding:{user.id}")
+        assert json.loads(copied.value)["completed"] is True
+
+
+def test_batch_plan_engine_plans_many_users_and_requires_admin(monkeypatch):
+    import threading
+    import time
+
+    from core import batch_planner
+    from core.time import local_date_offset_iso
+
+    target_date = local_date_offset_iso(3)
+    user_ids = []
+    for index in range(2):
+        username = unique_username(f"batch-plan-{index}")
+        login_as(username, "batch-pass")
+        client.post("/api/tasks", json={"title": f"Batch task {index}", "priority": 2})
+        user_ids.append(client.get("/api/session").json()["user_id"])
+
+    payload = {"date": target_date, "user_ids": user_ids}
+    denied = client.post("/api/system/plans/batch", json=payload)
+    assert denied.status_code == 403
+    assert denied.json()["error_code"] == "ADMIN_REQUIRED"
+
+    monkeypatch.setattr("api_v2.user_context.ADMIN_USERNAMES", {username})
+    release = threading.Event()
+    original = batch_planner.generate_plans_for_date
+
+    def gated_generate(**options):
+        release.wait(timeout=10)
+        return original(**options)
+
+    monkeypatch.setattr(batch_planner, "generate_plans_for_date", gated_generate)
+    res = client.post("/api/system/plans/batch", json=payload)
+    assert res.status_code == 202
+    job_id = res.json()["job_id"]
+    assert res.json()["status"] == "running"
+    overlapping = client.post("/api/system/plans/batch", json=payload)
+    assert overlapping.status_code == 409
+    assert overlapping.json()["error_code"] == "BATCH_PLAN_RUNNING"
+    assert overlapping.json()["job_id"] == job_id
+    assert client.get("/api/system/plans/batch/unknown").status_code == 404
+
+    release.set()
+    deadline = time.monotonic() + 10
+    job = client.get(f"/api/system/plans/batch/{job_id}").json()
+    while job["status"] == "running" and time.monotonic() < deadline:
+        time.sleep(0.02)
+        job = client.get(f"/api/system/plans/batch/{job_id}").json()
+    assert job["status"] == "completed"
+    summary = job["summary"]
+    assert summary["planned"] == 2
+    assert summary["users_per_second"] > 0
+    assert set(summary["phases_ms"]) == {"load", "snapshot", "decide", "write"}
+
+    plan = client.get(f"/api/plans/{target_date}")
+    assert plan.status_code == 200
+    assert [task["task"]["title"] for task in plan.json()["tasks"]] == ["Batch task 1"]
+
+    again = batch_planner.generate_plans_for_date(target_date=target_date, user_ids=user_ids)
+    assert again["planned"] == 0
+    assert again["skipped_existing"] == 2
+
+    monkeypatch.setattr(batch_planner, "PROCESS_POOL_MIN_USERS", 1)
+    tasks_by_user = {1: [{"id": 1, "title": "a", "priority": 1}], 2: [{"id": 2, "title": "b", "priority": 3}]}
+    snapshots = batch_planner._snapshots(tasks_by_user, None, processes=2)
+    assert snapshots[2]["selected_task_ids"] == [2]